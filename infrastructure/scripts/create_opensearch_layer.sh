@@ -27,6 +27,9 @@ echo -e "${YELLOW}📦 Installing OpenSearch dependencies...${NC}"
 # Install dependencies to layer directory
 pip install -r src/shared/layers/open-search-dependencies.txt -t "$LAYER_DIR/python" --quiet
 
+# Shared modules (pooled OpenSearch client) imported by the Lambda handlers
+cp src/shared/layers/python/*.py "$LAYER_DIR/python/"
+
 echo -e "${YELLOW}🗜️ Creating layer ZIP package...${NC}"
 
 # Create layer ZIP
@@ -0,0 +1,97 @@
+#!/bin/bash
+
+# Create Reranker Lambda Layer
+# This script creates a Lambda layer with onnxruntime, tokenizers and the exported int8
+# cross-encoder (src/agents/retrieval/models/cross_encoder/export_minilm_onnx.py) for RERANK_BACKEND=onnx
+
+set -e
+
+ENVIRONMENT=${1:-dev}
+REGION=${2:-ap-south-1}
+MODEL_DIR=${3:-dist/models/cross_encoder}
+LAYER_NAME="reranker-onnx-${ENVIRONMENT}"
+
+echo "🔧 Creating Reranker Lambda Layer: $LAYER_NAME"
+
+# Colors for output
+RED='\033[0;31m'
+GREEN='\033[0;32m'
+YELLOW='\033[1;33m'
+BLUE='\033[0;34m'
+NC='\033[0m' # No Color
+
+if [ ! -f "$MODEL_DIR/model.onnx" ] || [ ! -f "$MODEL_DIR/tokenizer.json" ]; then
+    echo -e "${RED}❌ $MODEL_DIR must contain model.onnx and tokenizer.json; run export_minilm_onnx.py first${NC}"
+    exit 1
+fi
+
+# Create layer directory structure (the model ends up in /opt/models/cross_encoder)
+LAYER_DIR="dist/layers/reranker"
+rm -rf "$LAYER_DIR"
+mkdir -p "$LAYER_DIR/python" "$LAYER_DIR/models/cross_encoder"
+
+echo -e "${YELLOW}📦 Installing reranker dependencies...${NC}"
+
+# Lambda runtime wheels, whatever the build machine is
+pip install -r src/shared/layers/reranker-dependencies.txt -t "$LAYER_DIR/python" --quiet \
+    --platform manylinux2014_x86_64 --python-version 3.9 --only-binary=:all:
+
+# numpy comes from the OpenSearch layer, which the reranker function also uses
+rm -rf "$LAYER_DIR/python/numpy" "$LAYER_DIR/python/numpy-"* "$LAYER_DIR/python/numpy.libs"
+
+cp "$MODEL_DIR/model.onnx" "$MODEL_DIR/tokenizer.json" "$LAYER_DIR/models/cross_encoder/"
+
+echo -e "${YELLOW}🗜️ Creating layer ZIP package...${NC}"
+
+# Create layer ZIP
+cd "$LAYER_DIR"
+python -c "
+import zipfile
+import os
+
+def create_layer_zip():
+    with zipfile.ZipFile('../reranker-layer.zip', 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for top in ('python', 'models'):
+            for root, dirs, files in os.walk(top):
+                # Skip __pycache__ directories
+                dirs[:] = [d for d in dirs if d != '__pycache__']
+                for file in files:
+                    # Skip .pyc files
+                    if file.endswith('.pyc'):
+                        continue
+                    file_path = os.path.join(root, file)
+                    zipf.write(file_path, file_path)
+
+create_layer_zip()
+"
+cd - > /dev/null
+
+echo -e "${YELLOW}🚀 Publishing Lambda layer...${NC}"
+
+# Larger than the 50 MB direct-upload limit, so publish from S3
+LAYER_BUCKET=${LAYER_BUCKET:-support-agent-data-${ENVIRONMENT}}
+aws s3 cp "dist/layers/reranker-layer.zip" "s3://$LAYER_BUCKET/layers/reranker-layer.zip" --region "$REGION"
+
+LAYER_VERSION=$(aws lambda publish-layer-version \
+    --layer-name "$LAYER_NAME" \
+    --description "onnxruntime + int8 MiniLM cross-encoder for in-Lambda reranking" \
+    --content "S3Bucket=$LAYER_BUCKET,S3Key=layers/reranker-layer.zip" \
+    --compatible-runtimes python3.9 \
+    --region "$REGION" \
+    --query 'Version' \
+    --output text)
+
+echo -e "${GREEN}✅ Layer created successfully!${NC}"
+echo -e "${BLUE}📋 Layer Details:${NC}"
+echo "Layer Name: $LAYER_NAME"
+echo "Version: $LAYER_VERSION"
+echo "Region: $REGION"
+
+LAYER_ARN="arn:aws:lambda:$REGION:$(aws sts get-caller-identity --query Account --output text):layer:$LAYER_NAME:$LAYER_VERSION"
+echo "Layer ARN: $LAYER_ARN"
+
+# Save to config file
+mkdir -p "infrastructure/configs"
+echo "{\"reranker_layer_arn\": \"$LAYER_ARN\"}" > "infrastructure/configs/reranker-layer-config-$ENVIRONMENT.json"
+
+echo -e "${GREEN}🎉 Reranker layer ready: attach it to aai_cross_encoder_rerank (and aai_retrieval_fast_path) alongside the OpenSearch layer${NC}"
@@ -60,6 +60,7 @@ def main():
         'OPENSEARCH_INDEX': config['opensearch_index'],
         'CONVERSATION_TABLE': config['conversation_table'],
         'SUPPORT_TICKETS_TABLE': config['support_tickets_table'],
+        'CACHE_TABLE': config['cache_table'],
         'RAW_DATA_BUCKET': config['raw_data_bucket'],
         'SEARCH_RESULTS_BUCKET': config['search_results_bucket'],
         'LLM_MODEL': config['llm_model'],
@@ -67,7 +68,12 @@ def main():
         'HF_MODEL_ID': config['hf_model_id'],
         'HF_TASK': config['hf_task'],
         'SUPPORT_EMAIL': config['support_email'],
-        'TTL_DAYS': str(config['ttl_days'])
+        'TTL_DAYS': str(config['ttl_days']),
+        'NORMALIZE_EMBEDDINGS': str(config.get('normalize_embeddings', False)).lower(),
+        'EMBEDDING_DIMENSION': str(config.get('embedding_dimension', 1024)),
+        'COMPACT_DIMENSION': str(config.get('compact_dimension', 0)),
+        'INDEX_PARTITIONING': config.get('index_partitioning', 'none'),
+        'HIERARCHICAL_INDEX': str(config.get('hierarchical_index', False)).lower()
     }
     
     # Agent-specific configurations
@@ -82,6 +88,8 @@ def main():
         'aai_generate_embeddings': 'ingestion',
         'aai_create_opensearch_index': 'ingestion',
         'aai_store_opensearch': 'ingestion',
+        'aai_optimize_index': 'ingestion',
+        'aai_index_snapshot': 'ingestion',
         'aai_hybrid_search_fusion': 'retrieval',
         'aai_cross_encoder_rerank': 'retrieval',
         'aai_mmr_diversity': 'retrieval',
@@ -92,7 +100,8 @@ def main():
         'aai_store_conversation': 'conversation',
         'aai_create_ticket': 'escalation',
         'aai_trigger_step_function_ingestion': 'orchestration',
-        'aai_trigger_step_function_retrieval': 'orchestration'
+        'aai_trigger_step_function_retrieval': 'orchestration',
+        'aai_retrieval_fast_path': 'retrieval'
     }
     
     # Get existing Lambda functions
@@ -8,6 +8,7 @@ locals {
     OPENSEARCH_INDEX     = var.opensearch_index
     CONVERSATION_TABLE   = aws_dynamodb_table.conversation_history.name
     SUPPORT_TICKETS_TABLE = aws_dynamodb_table.support_tickets.name
+    CACHE_TABLE          = aws_dynamodb_table.retrieval_cache.name
     RAW_DATA_BUCKET      = aws_s3_bucket.raw_data.bucket
     SEARCH_RESULTS_BUCKET = aws_s3_bucket.search_results.bucket
     LLM_MODEL            = var.llm_model
@@ -17,6 +18,11 @@ locals {
     SAGEMAKER_ENDPOINT   = aws_sagemaker_endpoint.cross_encoder.name
     SUPPORT_EMAIL        = var.support_email
     TTL_DAYS             = tostring(var.ttl_days)
+    NORMALIZE_EMBEDDINGS = tostring(var.normalize_embeddings)
+    EMBEDDING_DIMENSION  = tostring(var.embedding_dimension)
+    COMPACT_DIMENSION    = tostring(var.compact_dimension)
+    INDEX_PARTITIONING   = var.index_partitioning
+    HIERARCHICAL_INDEX   = tostring(var.hierarchical_index)
   }
 
   # Lambda function definitions
@@ -50,6 +56,14 @@ locals {
       agent = "ingestion"
       source_dir = "${path.root}/../../src/agents/ingestion/lambdas/aai_store_opensearch"
     }
+    "aai_optimize_index" = {
+      agent = "ingestion"
+      source_dir = "${path.root}/../../src/agents/ingestion/lambdas/aai_optimize_index"
+    }
+    "aai_index_snapshot" = {
+      agent = "ingestion"
+      source_dir = "${path.root}/../../src/agents/ingestion/lambdas/aai_index_snapshot"
+    }
     
     # Retrieval Agent Functions
     "aai_hybrid_search_fusion" = {
@@ -102,6 +116,16 @@ locals {
       agent = "orchestration"
       source_dir = "${path.root}/../../src/agents/orchestration/lambdas/aai_trigger_step_function_retrieval"
     }
+    # Runs every retrieval stage in-process, so it is packaged from src/agents and sized like retrieval
+    "aai_retrieval_fast_path" = {
+      agent = "retrieval"
+      source_dir = "${path.root}/../../src/agents"
+    }
+  }
+
+  # Handlers outside the package root (default: lambda_function.lambda_handler)
+  lambda_handlers = {
+    "aai_retrieval_fast_path" = "orchestration/lambdas/aai_retrieval_fast_path/lambda_function.lambda_handler"
   }
 }
 
@@ -126,7 +150,7 @@ resource "aws_lambda_function" "agentic_rag_functions" {
 
   function_name = each.key
   role         = aws_iam_role.lambda_role.arn
-  handler      = "lambda_function.lambda_handler"
+  handler      = lookup(local.lambda_handlers, each.key, "lambda_function.lambda_handler")
   runtime      = "python3.9"
   timeout      = var.agent_configs[each.value.agent].timeout
   memory_size  = var.agent_configs[each.value.agent].memory_size
@@ -135,6 +135,26 @@ resource "aws_dynamodb_table" "support_tickets" {
   tags = var.common_tags
 }
 
+# Shared tier of the retrieval caches (aai_cache): rerank scores, query embeddings, final results,
+# and the index generation counters ingestion bumps to invalidate them
+resource "aws_dynamodb_table" "retrieval_cache" {
+  name         = "AaiRetrievalCache-${var.environment}"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "cache_key"
+
+  attribute {
+    name = "cache_key"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "ttl_epoch"
+    enabled        = true
+  }
+
+  tags = var.common_tags
+}
+
 # S3 Buckets
 resource "aws_s3_bucket" "search_results" {
   bucket = "support-agent-search-results-${var.environment}"
@@ -277,6 +297,17 @@ resource "aws_iam_role_policy" "lambda_permissions" {
           "${aws_dynamodb_table.support_tickets.arn}/index/*"
         ]
       },
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:BatchGetItem",
+          "dynamodb:BatchWriteItem",
+          "dynamodb:GetItem",
+          "dynamodb:PutItem",
+          "dynamodb:UpdateItem"
+        ]
+        Resource = aws_dynamodb_table.retrieval_cache.arn
+      },
       {
         Effect = "Allow"
         Action = [
@@ -41,6 +41,11 @@ output "support_tickets_table_name" {
   value       = aws_dynamodb_table.support_tickets.name
 }
 
+output "cache_table_name" {
+  description = "DynamoDB retrieval cache table name"
+  value       = aws_dynamodb_table.retrieval_cache.name
+}
+
 output "search_results_bucket" {
   description = "S3 bucket for search results"
   value       = aws_s3_bucket.search_results.bucket
@@ -88,6 +93,7 @@ output "environment_config" {
     # DynamoDB configuration
     conversation_table  = aws_dynamodb_table.conversation_history.name
     support_tickets_table = aws_dynamodb_table.support_tickets.name
+    cache_table         = aws_dynamodb_table.retrieval_cache.name
     
     # S3 configuration
     search_results_bucket = aws_s3_bucket.search_results.bucket
@@ -98,6 +104,11 @@ output "environment_config" {
     hf_task     = var.hf_task
     llm_model   = var.llm_model
     embed_model = var.embed_model
+    normalize_embeddings = var.normalize_embeddings
+    embedding_dimension  = var.embedding_dimension
+    compact_dimension    = var.compact_dimension
+    index_partitioning   = var.index_partitioning
+    hierarchical_index   = var.hierarchical_index
     
     # Application configuration
     ttl_days      = var.ttl_days
@@ -65,6 +65,36 @@ variable "embed_model" {
   default     = "amazon.titan-embed-text-v2:0"
 }
 
+variable "normalize_embeddings" {
+  description = "Store and query unit-normalized vectors and use an inner-product kNN space (requires re-indexing)"
+  type        = bool
+  default     = false
+}
+
+variable "embedding_dimension" {
+  description = "Titan v2 embedding size requested at ingest and query time (256, 512 or 1024)"
+  type        = number
+  default     = 1024
+}
+
+variable "compact_dimension" {
+  description = "Two-stage kNN: HNSW-indexed truncated dimension (256 or 512), 0 for single-stage search (requires re-indexing)"
+  type        = number
+  default     = 0
+}
+
+variable "index_partitioning" {
+  description = "Index partitions: none (one index), source (tickets/documents) or source_product (tickets also per product); changing it requires recreating the index and re-ingesting"
+  type        = string
+  default     = "none"
+}
+
+variable "hierarchical_index" {
+  description = "Maintain a per-document / ticket-cluster centroid index (<index>_sources) for hierarchical search; enabling it requires recreating the index and re-ingesting"
+  type        = bool
+  default     = false
+}
+
 variable "opensearch_instance_type" {
   description = "OpenSearch instance type"
   type        = string
@@ -155,6 +185,9 @@ variable "agent_configs" {
         OUTPUT_PREFIX    = "processed/chunks/logs/"
         CHUNK_CHAR_SIZE  = "1200"
         CHUNK_OVERLAP    = "200"
+        OPTIMIZE_MIN_DOCS        = "100"
+        FORCE_MERGE_MIN_DOCS     = "500"
+        FORCE_MERGE_MAX_SEGMENTS = "1"
       }
     }
     retrieval = {
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Adaptive Rerank Benchmark
+Evaluates the ADAPTIVE_RERANK policy of aai_hybrid_search_fusion on an evaluation set built
+from the sample support tickets, running the real search and rerank handlers in-process.
+
+Corpus: tickets as aai_preprocess_csv builds them (product, subject, description, resolution).
+Legs: the fake OpenSearch returns, per query, a BM25 ranking and a kNN ranking over LSA vectors
+(TF-IDF + truncated SVD), so the two legs agree on some queries and not on others.
+Queries: "<subject> <product>" phrasings; a ticket is relevant with grade 2 when subject and
+product match the query, grade 1 when only the subject does.
+Rerank: fake endpoint scoring by word overlap, costing --endpoint-ms + --pair-ms per pair.
+
+Per skip-overlap threshold, reports rerank p50/p95/mean latency against always reranking, skip
+rate, mean rerank depth, nDCG@k against the labels and top-k agreement with full reranking.
+Scoring runs in RERANK_SHARD_SIZE shards concurrently, so a shallower depth only saves time
+when it removes a shard; skips are where the latency goes.
+
+Usage:
+    python monitoring/benchmarks/adaptive_rerank.py --queries 200 --thresholds 0.2,0.4,0.6,0.8
+"""
+
+import argparse
+import collections
+import contextlib
+import csv
+import json
+import math
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import types
+
+import boto3
+import numpy as np
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import REPO_ROOT, load_lambda, use_local_aws_env
+from fakes import FakeOpenSearch, FakeSageMaker
+
+BUCKET = "bench-search-results"
+TICKETS_CSV = os.path.join(REPO_ROOT, "sample-data", "support-tickets", "customer_support_tickets.csv")
+TEMPLATES = ["{subject} {product}", "{subject} on my {product}", "my {product} has a {subject} problem",
+             "help with {product} {subject}"]
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def load_corpus(size):
+    with open(TICKETS_CSV, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))[:size]
+    docs = []
+    for row in rows:
+        text = " ".join(p for p in (row["Product Purchased"], row["Ticket Subject"], row["Ticket Description"],
+                                    row["Resolution"]) if p)
+        docs.append({"_id": f"ticket_{row['Ticket ID']}", "subject": row["Ticket Subject"],
+                     "product": row["Product Purchased"], "text": re.sub(r"\s+", " ", text)})
+    return docs
+
+class Bm25:
+    def __init__(self, texts, k1=1.2, b=0.75):
+        self.k1, self.b = k1, b
+        self.docs = [collections.Counter(tokenize(t)) for t in texts]
+        self.lengths = np.array([sum(d.values()) for d in self.docs], dtype=np.float32)
+        self.avg_length = self.lengths.mean()
+        df = collections.Counter(term for d in self.docs for term in d)
+        n = len(self.docs)
+        self.idf = {term: math.log(1 + (n - c + 0.5) / (c + 0.5)) for term, c in df.items()}
+
+    def scores(self, query):
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.lengths / self.avg_length)
+        for term in set(tokenize(query)):
+            if term not in self.idf:
+                continue
+            tf = np.array([d.get(term, 0) for d in self.docs], dtype=np.float32)
+            scores += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+class Lsa:
+    """TF-IDF projected onto its leading singular vectors: a dense leg that blurs exact terms"""
+
+    def __init__(self, texts, dimension):
+        vocab = {}
+        counts = [collections.Counter(tokenize(t)) for t in texts]
+        for c in counts:
+            for term in c:
+                vocab.setdefault(term, len(vocab))
+        matrix = np.zeros((len(texts), len(vocab)), dtype=np.float32)
+        for i, c in enumerate(counts):
+            for term, tf in c.items():
+                matrix[i, vocab[term]] = 1 + math.log(tf)
+        df = (matrix > 0).sum(axis=0)
+        self.idf = np.log(len(texts) / df).astype(np.float32)
+        matrix *= self.idf
+        _, _, vt = np.linalg.svd(matrix, full_matrices=False)
+        self.vocab = vocab
+        self.components = vt[:dimension]
+        self.vectors = self.embed_rows(matrix)
+
+    def embed_rows(self, matrix):
+        vectors = matrix @ self.components.T
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+    def scores(self, query):
+        row = np.zeros((1, len(self.vocab)), dtype=np.float32)
+        for term, tf in collections.Counter(tokenize(query)).items():
+            if term in self.vocab:
+                row[0, self.vocab[term]] = (1 + math.log(tf)) * self.idf[self.vocab[term]]
+        return self.vectors @ self.embed_rows(row)[0]
+
+def leg_hits(docs, scores, size):
+    top = np.argsort(-scores)[:size]
+    return [{"_id": docs[i]["_id"], "_score": float(scores[i]),
+             "_source": {"text": docs[i]["text"], "source": "support_log", "ticket_id": docs[i]["_id"],
+                         "metadata": {"product_purchased": docs[i]["product"]}}} for i in top]
+
+def ndcg(ranked_ids, grades, k):
+    dcg = sum(grades.get(doc_id, 0) / math.log2(rank + 2) for rank, doc_id in enumerate(ranked_ids[:k]))
+    ideal = sorted(grades.values(), reverse=True)[:k]
+    idcg = sum(g / math.log2(rank + 2) for rank, g in enumerate(ideal))
+    return dcg / idcg if idcg else 0.0
+
+def build_queries(docs, count, seed):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        doc = rng.choice(docs)
+        text = rng.choice(TEMPLATES).format(subject=doc["subject"].lower(), product=doc["product"])
+        grades = {d["_id"]: 2 if d["product"] == doc["product"] else 1 for d in docs if d["subject"] == doc["subject"]}
+        queries.append((text, grades))
+    return queries
+
+def run_rerank(rerank, search_response, query, query_id, plan):
+    response = rerank.lambda_handler({
+        "query_id": query_id, "user_query": query, "candidates": search_response["candidates"],
+        "use_reranker": True, "rerank_backend": "sagemaker", "use_score_cache": False, "rerank_plan": plan
+    }, None)
+    if response["statusCode"] != 200:
+        raise RuntimeError(response["error"])
+    ranked = rerank.load_candidates(response, rerank.s3, BUCKET)
+    return [hit["_id"] for hit, _ in ranked], response["monitoring"]["rerank_time_ms"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Adaptive rerank policy: latency saved vs quality")
+    parser.add_argument("--corpus", type=int, default=3000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--max-results", type=int, default=5)
+    parser.add_argument("--lsa-dimension", type=int, default=64)
+    parser.add_argument("--thresholds", default="0.2,0.4,0.6,0.8", help="ADAPTIVE_SKIP_OVERLAP values to evaluate")
+    parser.add_argument("--skip-gap", type=float, default=0.2, help="ADAPTIVE_SKIP_GAP")
+    parser.add_argument("--endpoint-ms", type=float, default=80.0, help="Assumed fixed cost per endpoint call")
+    parser.add_argument("--pair-ms", type=float, default=6.0, help="Assumed cost per scored pair")
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_local_aws_env(OPENSEARCH_DOMAIN="bench.local", OPENSEARCH_INDEX="bench-index",
+                      SEARCH_RESULTS_BUCKET=BUCKET, SAGEMAKER_ENDPOINT="bench-reranker",
+                      ADAPTIVE_SKIP_GAP=args.skip_gap)
+    docs = load_corpus(args.corpus)
+    bm25 = Bm25([d["text"] for d in docs])
+    lsa = Lsa([d["text"] for d in docs], args.lsa_dimension)
+    queries = build_queries(docs, args.queries, args.seed)
+    k = args.max_results
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr):
+        boto3.client("s3").create_bucket(
+            Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]}
+        )
+        search = load_lambda("retrieval", "aai_hybrid_search_fusion")
+        rerank = load_lambda("retrieval", "aai_cross_encoder_rerank")
+        opensearch = FakeOpenSearch()
+        search.get_opensearch_client = lambda **kw: opensearch
+        sagemaker = FakeSageMaker(latency_ms=args.endpoint_ms, pair_latency_ms=args.pair_ms)
+        rerank.boto3 = types.SimpleNamespace(
+            client=lambda service, **kw: sagemaker if service == "sagemaker-runtime" else boto3.client(service, **kw)
+        )
+
+        fusion_ndcg, full_ndcg, full_ms = [], [], []
+        adaptive = {t: collections.defaultdict(list) for t in thresholds}
+        for i, (query, grades) in enumerate(queries):
+            opensearch.hits = leg_hits(docs, bm25.scores(query), k * 2)
+            opensearch.knn_hits = leg_hits(docs, lsa.scores(query), k * 2)
+            response = search.lambda_handler({"query_id": f"bench-{i}", "user_query": query, "queryEmbedding": [0.0],
+                                              "max_results": k, "adaptive_rerank": False}, None)
+            if response["statusCode"] != 200:
+                raise RuntimeError(response["error"])
+            fused = [hit["_id"] for hit, _ in rerank.load_candidates(response, rerank.s3, BUCKET)]
+            full, elapsed = run_rerank(rerank, response, query, f"bench-full-{i}", None)
+            fusion_ndcg.append(ndcg(fused, grades, k))
+            full_ndcg.append(ndcg(full, grades, k))
+            full_ms.append(elapsed)
+
+            for threshold in thresholds:
+                search.ADAPTIVE_SKIP_OVERLAP = threshold
+                plan = search.plan_rerank(opensearch.hits, opensearch.knn_hits, len(fused), k)
+                ranked, elapsed = run_rerank(rerank, response, query, f"bench-adaptive-{i}", plan)
+                stats = adaptive[threshold]
+                stats["ms"].append(elapsed)
+                stats["skipped"].append(plan["decision"] == "skip")
+                stats["depth"].append(plan["rerank_depth"])
+                stats["ndcg"].append(ndcg(ranked, grades, k))
+                stats["agreement"].append(len(set(ranked[:k]) & set(full[:k])) / k)
+            print(f"query {i + 1}/{len(queries)}", file=sys.stderr)
+
+    results = [{
+        "policy": "always_rerank",
+        "rerank_p50_ms": statistics.median(full_ms),
+        "rerank_p95_ms": percentile(full_ms, 95),
+        "rerank_mean_ms": statistics.mean(full_ms),
+        "skip_rate": 0.0,
+        "mean_rerank_depth": 2 * k,
+        f"ndcg@{k}": statistics.mean(full_ndcg),
+        f"top{k}_agreement_with_full": 1.0
+    }]
+    for threshold, stats in adaptive.items():
+        results.append({
+            "policy": "adaptive",
+            "skip_overlap": threshold,
+            "rerank_p50_ms": statistics.median(stats["ms"]),
+            "rerank_p95_ms": percentile(stats["ms"], 95),
+            "rerank_mean_ms": statistics.mean(stats["ms"]),
+            # p50 only moves once more than half the queries skip; the mean shows the total saved
+            "p50_ms_saved": statistics.median(full_ms) - statistics.median(stats["ms"]),
+            "mean_ms_saved": statistics.mean(full_ms) - statistics.mean(stats["ms"]),
+            "skip_rate": statistics.mean(stats["skipped"]),
+            "mean_rerank_depth": statistics.mean(stats["depth"]),
+            f"ndcg@{k}": statistics.mean(stats["ndcg"]),
+            f"top{k}_agreement_with_full": statistics.mean(stats["agreement"])
+        })
+
+    output = json.dumps({
+        "benchmark": "adaptive_rerank",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        f"fusion_only_ndcg@{k}": statistics.mean(fusion_ndcg),
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Semantic Answer Cache Benchmark
+Replays a repetitive support query stream through aai_trigger_step_function_retrieval with the
+semantic answer cache off and at several --thresholds (moto DynamoDB for CACHE_TABLE). The state
+machine is a stand-in that answers after --execution-ms (an assumption: take it from the
+step_function_duration_ms of real responses), so only the cache's own cost is measured.
+
+Embeddings are bag-of-words: each word hashes to a fixed random vector and a query is their
+normalized sum, so rephrasings ("hi, <question> - please help") land near each other the way a
+real embedding model puts them. Queries are "<ticket subject> with my <product>" from the sample
+tickets, Zipf-distributed, in several phrasings, spread over simulated execution environments
+(each with its own similarity index and LRUs; the DynamoDB tier is shared). The index generation
+is bumped every --ingest-every requests, and a --follow-ups fraction of requests continue an earlier
+session (moto DynamoDB conversation table, written by the stand-in and by the trigger on a hit), and a
+--ticket-requests fraction ask for a ticket ("..., please escalate").
+
+Reports state machine executions, hit rate (semantic / exact), wrong hits (the cached answer was for
+a different question), follow-up hits (should be 0: answers are only reused for a session's first
+question), ticket hits (must be 0: a ticket request always runs the state machine, so aai_create_ticket
+sees it; the benchmark fails otherwise), and trigger p50/p95 overall and on hits vs misses.
+
+Usage:
+    python monitoring/benchmarks/answer_cache.py --requests 400 --thresholds 0.85,0.9,0.95
+"""
+
+import argparse
+import collections
+import contextlib
+import csv
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import boto3
+from boto3.dynamodb.conditions import Key
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import REPO_ROOT, load_lambda, use_local_aws_env
+from fakes import FakeBedrock
+from aai_ticket_intent import wants_ticket
+
+CACHE_TABLE = "bench-retrieval-cache"
+CONVERSATION_TABLE = "bench-conversations"
+INDEX_NAME = "bench-index"
+TICKETS_CSV = os.path.join(REPO_ROOT, "sample-data", "support-tickets", "customer_support_tickets.csv")
+PHRASINGS = ["{q}", "{q}?", "hi, {q}", "{q} - please help", "question: {q}", "why {q}"]
+TICKET_PHRASINGS = ["{q}, please escalate", "{q} - contact support", "{q}, create ticket"]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+class BagOfWordsBedrock(FakeBedrock):
+    """Embeddings that are the normalized sum of per-word vectors, so shared words mean similarity"""
+
+    def vector_for(self, text, dimension=None):
+        words = "".join(c if c.isalnum() else " " for c in text.lower()).split()
+        total = [0.0] * (dimension or self.dimension)
+        for word in words:
+            total = [a + b for a, b in zip(total, super().vector_for(word, dimension))]
+        norm = sum(x * x for x in total) ** 0.5
+        return [x / norm for x in total] if norm else total
+
+class FakeStateMachine:
+    """start_sync_execution stand-in: the answer names the query it was computed for"""
+
+    def __init__(self, execution_ms):
+        self.execution_ms = execution_ms
+        self.executions = 0
+        self.conversations = boto3.resource("dynamodb").Table(CONVERSATION_TABLE)
+
+    def start_sync_execution(self, stateMachineArn, input):
+        self.executions += 1
+        request = json.loads(input)
+        time.sleep(self.execution_ms / 1000)
+        history = self.conversations.query(KeyConditionExpression=Key("session_id").eq(request["session_id"]))["Items"]
+        answer = f"answer for: {request['user_query']}"
+        # StoreConversation
+        self.conversations.put_item(Item={"session_id": request["session_id"], "timestamp": int(time.time() * 1000),
+                                          "user_query": request["user_query"], "agent_response": answer})
+        output = {"answer": answer, "sources": [{"source": "bench", "final_score": 0.9}],
+                  "create_ticket": wants_ticket(request["user_query"]), "history_turns": len(history), "monitoring": {}}
+        return {"status": "SUCCEEDED", "output": json.dumps(output)}
+
+def build_workload(args):
+    rng = random.Random(args.seed)
+    with open(TICKETS_CSV, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    subjects = [s for s, _ in collections.Counter(r["Ticket Subject"] for r in rows).most_common(16)]
+    products = [p for p, _ in collections.Counter(r["Product Purchased"] for r in rows).most_common(10)]
+    questions = [(f"{s.lower()} with my {p}", p) for s in subjects for p in products]
+    rng.shuffle(questions)
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(len(questions))]
+    stream = []
+    for i in range(args.requests):
+        question, product = rng.choices(questions, weights)[0]
+        ticket = rng.random() < args.ticket_requests
+        stream.append({
+            "question": question,
+            "user_query": rng.choice(TICKET_PHRASINGS if ticket else PHRASINGS).format(q=question),
+            "ticket": ticket,
+            "product_filter": product if rng.random() < args.filtered else None,
+            "environment": rng.randrange(args.environments),
+            # A follow-up reuses an earlier request's session
+            "session": rng.choice(stream)["session"] if stream and rng.random() < args.follow_ups else i
+        })
+    return stream
+
+def run_mode(trigger, aai_cache, answer_cache, sfn, stream, threshold, args):
+    aai_cache.reset_caches()
+    # A new generation per mode, so entries stored by an earlier mode are out of scope
+    aai_cache.bump_index_generation(INDEX_NAME)
+    environments = [({}, answer_cache.SemanticIndex(answer_cache.ANSWER_CACHE_SIZE)) for _ in range(args.environments)]
+    answer_cache.reset_answer_cache()
+    answer_cache.ANSWER_CACHE_ENABLED = threshold is not None
+    answer_cache.ANSWER_CACHE_THRESHOLD = threshold or 0.0
+    executions_before = sfn.executions
+    timings, hit_ms, miss_ms = [], [], []
+    tiers = collections.Counter()
+    wrong_hits = follow_up_hits = ticket_hits = 0
+    first_request = {}
+    question_of = {f"answer for: {r['user_query']}": r["question"] for r in stream}
+    for i, request in enumerate(stream):
+        if i and i % args.ingest_every == 0:
+            aai_cache.bump_index_generation(INDEX_NAME)
+        # Route the request to its execution environment's caches
+        aai_cache._caches, answer_cache._index = environments[request["environment"]]
+        body = {"user_query": request["user_query"], "product_filter": request["product_filter"],
+                "session_id": f"bench-{threshold}-{request['session']}"}
+        first_turn = first_request.setdefault(request["session"], i) == i
+        start = time.perf_counter()
+        response = trigger.lambda_handler({"body": body}, None)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if response["statusCode"] != 200:
+            raise RuntimeError(response["body"])
+        result = json.loads(response["body"])
+        timings.append(elapsed_ms)
+        if result["timing"]["answer_cache_hit"]:
+            tiers[result["monitoring"]["answer_cache"]["tier"]] += 1
+            hit_ms.append(elapsed_ms)
+            wrong_hits += question_of[result["answer"]] != request["question"]
+            follow_up_hits += not first_turn
+            ticket_hits += request["ticket"]
+        else:
+            miss_ms.append(elapsed_ms)
+    hits = sum(tiers.values())
+    return {
+        "threshold": threshold,
+        "executions": sfn.executions - executions_before,
+        "hit_rate": hits / len(stream),
+        "semantic_hits": tiers["semantic"],
+        "exact_hits": tiers["exact"],
+        "wrong_hits": wrong_hits,
+        "follow_up_hits": follow_up_hits,
+        "ticket_hits": ticket_hits,
+        "evictions": sum(index.evictions for _, index in environments),
+        "p50_ms": statistics.median(timings),
+        "p95_ms": percentile(timings, 95),
+        "mean_ms": statistics.mean(timings),
+        "hit_p50_ms": statistics.median(hit_ms) if hit_ms else None,
+        "hit_p95_ms": percentile(hit_ms, 95) if hit_ms else None,
+        "miss_p50_ms": statistics.median(miss_ms) if miss_ms else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic answer cache on a repetitive query stream")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--thresholds", default="0.85,0.9,0.95", help="ANSWER_CACHE_THRESHOLD values to compare")
+    parser.add_argument("--environments", type=int, default=4, help="Concurrent Lambda execution environments")
+    parser.add_argument("--ingest-every", type=int, default=200, help="Requests between index generation bumps")
+    parser.add_argument("--filtered", type=float, default=0.3, help="Fraction of requests with a product_filter")
+    parser.add_argument("--ticket-requests", type=float, default=0.1, help="Fraction of requests that ask for a ticket")
+    parser.add_argument("--follow-ups", type=float, default=0.2, help="Fraction of requests that continue an earlier session")
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--bedrock-ms", type=float, default=40.0, help="Assumed embedding invoke_model latency")
+    parser.add_argument("--execution-ms", type=float, default=300.0, help="Assumed synchronous execution time")
+    parser.add_argument("--seed", type=int, default=19)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_local_aws_env(CACHE_TABLE=CACHE_TABLE, CONVERSATION_TABLE=CONVERSATION_TABLE, OPENSEARCH_INDEX=INDEX_NAME, EMBEDDING_DIMENSION=args.dimension,
+                      NORMALIZE_EMBEDDINGS="true", RESULT_CACHE_ENABLED="false")
+    stream = build_workload(args)
+    results = []
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr):
+        dynamodb = boto3.client("dynamodb")
+        dynamodb.create_table(
+            TableName=CACHE_TABLE, BillingMode="PAY_PER_REQUEST",
+            KeySchema=[{"AttributeName": "cache_key", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "cache_key", "AttributeType": "S"}]
+        )
+        dynamodb.create_table(
+            TableName=CONVERSATION_TABLE, BillingMode="PAY_PER_REQUEST",
+            KeySchema=[{"AttributeName": "session_id", "KeyType": "HASH"},
+                       {"AttributeName": "timestamp", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": "session_id", "AttributeType": "S"},
+                                  {"AttributeName": "timestamp", "AttributeType": "N"}]
+        )
+        trigger = load_lambda("orchestration", "aai_trigger_step_function_retrieval")
+        # Imported by the Lambda, after use_local_aws_env
+        import aai_answer_cache
+        import aai_cache
+        sfn = FakeStateMachine(args.execution_ms)
+        trigger.sfn = sfn
+        trigger.bedrock = BagOfWordsBedrock(dimension=args.dimension, latency_ms=args.bedrock_ms)
+        for threshold in [None] + [float(t) for t in args.thresholds.split(",") if t.strip()]:
+            results.append(run_mode(trigger, aai_cache, aai_answer_cache, sfn, stream, threshold, args))
+            print(f"threshold {threshold}: {results[-1]['executions']} executions, hit rate {results[-1]['hit_rate']:.2f}, "
+                  f"wrong hits {results[-1]['wrong_hits']}, follow-up hits {results[-1]['follow_up_hits']}, "
+                  f"ticket hits {results[-1]['ticket_hits']}, p50 {results[-1]['p50_ms']:.1f} ms", file=sys.stderr)
+            if results[-1]["ticket_hits"]:
+                raise RuntimeError(f"threshold {threshold}: {results[-1]['ticket_hits']} ticket requests served from the answer cache")
+
+    output = json.dumps({
+        "benchmark": "answer_cache",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "distinct_questions": len({(r["question"], r["product_filter"]) for r in stream}),
+        "results": results
+    }, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
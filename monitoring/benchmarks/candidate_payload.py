@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Candidate Payload Benchmark
+Runs the retrieval stages (search → rerank → MMR → final results) in-process with moto S3,
+a fake SageMaker endpoint and a fake OpenSearch, once returning full _source (vectors included,
+the pre-filtering behaviour) and once honouring the _source filters with MMR fetching vectors
+by id. Reports per stage the candidate envelope size (and the JSON size the same candidates
+had as a candidates/*.json object), whether it travelled inline, S3 bytes and stage latency.
+
+Usage:
+    python monitoring/benchmarks/candidate_payload.py --hits 20 --dimension 1024 --iterations 10
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import types
+
+import boto3
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import REPO_ROOT, load_lambda, use_local_aws_env
+from fakes import CountingS3, FakeOpenSearch, FakeSageMaker
+import aai_candidate_envelope
+
+BUCKET = "bench-search-results"
+STAGES = ["search_fusion", "cross_encoder", "mmr", "final_results"]
+TICKETS_CSV = os.path.join(REPO_ROOT, "sample-data", "support-tickets", "customer_support_tickets.csv")
+
+def ticket_sentences():
+    with open(TICKETS_CSV, newline="", encoding="utf-8") as f:
+        return [row["Ticket Description"] for row in csv.DictReader(f) if row.get("Ticket Description")]
+
+def chunk_hits(count, dimension, text_chars, seed=3):
+    """Hits shaped like aai_store_opensearch documents: chunk text, ticket metadata, full vector"""
+    rng = random.Random(seed)
+    sentences = ticket_sentences()
+    hits = []
+    for i in range(count):
+        # Real ticket text so compression ratios are representative
+        text = ""
+        while len(text) < text_chars:
+            text += rng.choice(sentences) + " "
+        hits.append({
+            "_id": f"doc_{i}",
+            "_score": 1.0 / (i + 1),
+            "_source": {
+                "text": text[:text_chars],
+                "source": "support_log",
+                "ticket_id": f"T{1000 + i}",
+                "metadata": {"product_purchased": "Camera", "ticket_type": "Technical issue"},
+                "created_at": "2025-01-01T00:00:00",
+                "embedding": [rng.gauss(0, 0.05) for _ in range(dimension)]
+            }
+        })
+    return hits
+
+def run_pipeline(modules, event):
+    results = {}
+    payload = dict(event)
+    for name, module in zip(STAGES, modules):
+        module.s3.reset()
+        response = module.lambda_handler(payload, None)
+        if response["statusCode"] != 200:
+            raise RuntimeError(f"{name}: {response['error']}")
+        stats = dict(module.s3.stats)
+        envelope = response.get("candidates")
+        if envelope:
+            candidates = aai_candidate_envelope.unpack_candidates(envelope, module.s3.client, BUCKET)
+            stats["json_equivalent_bytes"] = len(json.dumps(candidates))
+            stats["envelope_bytes"] = envelope["bytes"]
+            stats["inline"] = "inline" in envelope
+        stats["stage_ms"] = response["monitoring"].get("total_time_ms", response["monitoring"].get("processing_time_ms"))
+        results[name] = stats
+        payload = {**event, "candidates": envelope}
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Candidate payload size with and without _source filtering")
+    parser.add_argument("--hits", type=int, default=20, help="Hits per search leg")
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--text-chars", type=int, default=800, help="Chunk text length (CHUNK_CHAR_SIZE)")
+    parser.add_argument("--max-results", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_local_aws_env(OPENSEARCH_DOMAIN="bench.local", OPENSEARCH_INDEX="bench-index",
+                      SEARCH_RESULTS_BUCKET=BUCKET, SAGEMAKER_ENDPOINT="bench-reranker")
+    report = []
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr):
+        boto3.client("s3").create_bucket(
+            Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]}
+        )
+        modules = [
+            load_lambda("retrieval", "aai_hybrid_search_fusion"),
+            load_lambda("retrieval", "aai_cross_encoder_rerank"),
+            load_lambda("retrieval", "aai_mmr_diversity"),
+            load_lambda("retrieval", "aai_final_results")
+        ]
+        for module in modules:
+            module.s3 = CountingS3(module.s3)
+        sagemaker = FakeSageMaker()
+        modules[1].boto3 = types.SimpleNamespace(
+            client=lambda service, **kw: sagemaker if service == "sagemaker-runtime" else boto3.client(service, **kw)
+        )
+
+        # Half of each leg overlaps, as BM25 and kNN rankings typically do
+        hits = chunk_hits(args.hits + args.hits // 2, args.dimension, args.text_chars)
+        bm25_hits, knn_hits = hits[:args.hits], hits[args.hits // 2:]
+        query_embedding = aai_candidate_envelope.encode_vector(hits[0]["_source"]["embedding"])
+        for mode, honour in [("full_source", False), ("filtered_source", True)]:
+            opensearch = FakeOpenSearch(hits=bm25_hits, knn_hits=knn_hits, honour_source_filter=honour)
+            for module in (modules[0], modules[2]):
+                module.get_opensearch_client = lambda **kw: opensearch
+
+            runs = []
+            for i in range(args.iterations):
+                event = {
+                    "query_id": f"bench-{mode}-{i}",
+                    "user_query": "battery drains after update",
+                    "queryEmbedding": query_embedding,
+                    "max_results": args.max_results,
+                    "use_reranker": True,
+                    "use_mmr": True,
+                    "mmr_lambda": 0.7
+                }
+                runs.append(run_pipeline(modules, event))
+
+            stages = {}
+            for name in STAGES:
+                per_run = [run[name] for run in runs]
+                stages[name] = {
+                    "json_equivalent_bytes": per_run[-1].get("json_equivalent_bytes"),
+                    "envelope_bytes": per_run[-1].get("envelope_bytes"),
+                    "inline": per_run[-1].get("inline"),
+                    "s3_bytes_in": per_run[-1]["bytes_in"],
+                    "s3_bytes_out": per_run[-1]["bytes_out"],
+                    "stage_p50_ms": statistics.median(r["stage_ms"] for r in per_run)
+                }
+            report.append({
+                "mode": mode,
+                "opensearch_requests": opensearch.requests,
+                "stages": stages,
+                "total_s3_bytes": sum(s["s3_bytes_in"] + s["s3_bytes_out"] for s in stages.values()),
+                "pipeline_p50_ms": sum(s["stage_p50_ms"] for s in stages.values())
+            })
+
+    full, filtered = report
+    output = json.dumps({
+        "benchmark": "candidate_payload",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        # Search-stage candidates as the old JSON object with vectors vs the filtered envelope
+        "search_candidates_bytes": {
+            "json_full_source": full["stages"]["search_fusion"]["json_equivalent_bytes"],
+            "envelope_filtered_source": filtered["stages"]["search_fusion"]["envelope_bytes"]
+        },
+        "results": report
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Chunk Collapse Benchmark
+Runs aai_hybrid_search_fusion in-process over a chunked corpus and compares the candidates it
+hands to rerank and synthesis with COLLAPSE_CHUNKS off, on, and on with COLLAPSE_MERGE_ADJACENT.
+
+Corpus, chunked with aai_preprocess_csv's chunk_text_with_overlap (CHUNK_CHAR_SIZE/CHUNK_OVERLAP):
+  - support tickets as aai_preprocess_csv builds them (one or two chunks each)
+  - long "documents" per ticket subject, standing in for Textract PDFs: resolutions of that
+    subject's tickets concatenated, so each spans many adjacent, overlapping chunks
+The fake OpenSearch answers each query with BM25 and LSA (TF-IDF + SVD) rankings over the chunks
+(from adaptive_rerank.py). Queries alternate between "<subject> <product>" phrasings and short
+passages quoted from the long documents.
+
+Reports candidates per query, distinct tickets/documents among them, redundant chunks that
+would be reranked and prompted, collapse ratio, candidate text volume and search stage latency.
+
+Usage:
+    python monitoring/benchmarks/chunk_collapse.py --queries 100 --max-results 5
+"""
+
+import argparse
+import collections
+import contextlib
+import csv
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import boto3
+import numpy as np
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import REPO_ROOT, load_lambda, use_local_aws_env
+from fakes import FakeOpenSearch
+from adaptive_rerank import TEMPLATES, Bm25, Lsa
+
+BUCKET = "bench-search-results"
+TICKETS_CSV = os.path.join(REPO_ROOT, "sample-data", "support-tickets", "customer_support_tickets.csv")
+MODES = {"off": (False, False), "collapse": (True, False), "collapse_merge": (True, True)}
+
+def build_corpus(preprocess, tickets, docs_per_subject, doc_chars):
+    with open(TICKETS_CSV, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    chunks = []
+    for row in rows[:tickets]:
+        record = {"product_purchased": row["Product Purchased"], "subject": row["Ticket Subject"],
+                  "description": row["Ticket Description"], "resolution": row["Resolution"]}
+        for idx, text in enumerate(preprocess.chunk_text_with_overlap(preprocess.build_ticket_text(record))):
+            chunks.append({"source": "support_log", "ticket_id": row["Ticket ID"], "chunk_id": idx, "text": text,
+                           "metadata": {"product_purchased": row["Product Purchased"]}})
+
+    by_subject = collections.defaultdict(list)
+    for row in rows:
+        if row["Resolution"]:
+            by_subject[row["Ticket Subject"]].append(f"{row['Product Purchased']}: {row['Resolution']}")
+    for subject, resolutions in by_subject.items():
+        for d in range(docs_per_subject):
+            body = f"{subject} troubleshooting guide. " + " ".join(resolutions[d::docs_per_subject])[:doc_chars]
+            key = f"processed/json/{subject.lower().replace(' ', '_')}_guide_{d}.json"
+            for idx, text in enumerate(preprocess.chunk_text_with_overlap(body)):
+                chunks.append({"source": key, "chunk_id": idx, "text": text, "metadata": {}})
+    products = sorted({row["Product Purchased"] for row in rows})
+    return chunks, sorted(by_subject), products
+
+def leg_hits(chunks, scores, size):
+    return [{"_id": f"chunk_{i}", "_score": float(scores[i]), "_source": dict(chunks[i])}
+            for i in np.argsort(-scores)[:size]]
+
+def main():
+    parser = argparse.ArgumentParser(description="Fused candidates with and without chunk collapse")
+    parser.add_argument("--tickets", type=int, default=3000)
+    parser.add_argument("--docs-per-subject", type=int, default=2)
+    parser.add_argument("--doc-chars", type=int, default=12000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--max-results", type=int, default=5)
+    parser.add_argument("--passage-words", type=int, default=8, help="Words per document-passage query")
+    parser.add_argument("--lsa-dimension", type=int, default=64)
+    parser.add_argument("--text-max-chars", type=int, default=4000, help="CANDIDATE_TEXT_MAX_CHARS (merge cap)")
+    parser.add_argument("--seed", type=int, default=9)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_local_aws_env(OPENSEARCH_DOMAIN="bench.local", OPENSEARCH_INDEX="bench-index",
+                      SEARCH_RESULTS_BUCKET=BUCKET, CANDIDATE_TEXT_MAX_CHARS=args.text_max_chars)
+    rng = random.Random(args.seed)
+    results = []
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr):
+        boto3.client("s3").create_bucket(
+            Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]}
+        )
+        preprocess = load_lambda("ingestion", "aai_preprocess_csv")
+        search = load_lambda("retrieval", "aai_hybrid_search_fusion")
+        from aai_candidate_envelope import load_candidates
+        chunks, subjects, products = build_corpus(preprocess, args.tickets, args.docs_per_subject, args.doc_chars)
+        bm25 = Bm25([c["text"] for c in chunks])
+        lsa = Lsa([c["text"] for c in chunks], args.lsa_dimension)
+        opensearch = FakeOpenSearch()
+        search.get_opensearch_client = lambda **kw: opensearch
+
+        # Half ask about a ticket-style problem, half quote a passage of a long document
+        guide_chunks = [c["text"].split() for c in chunks if c["source"] != "support_log"]
+        queries = []
+        for i in range(args.queries):
+            if i % 2:
+                words = rng.choice(guide_chunks)
+                start = rng.randrange(max(1, len(words) - args.passage_words))
+                queries.append(" ".join(words[start:start + args.passage_words]))
+            else:
+                queries.append(rng.choice(TEMPLATES).format(subject=rng.choice(subjects).lower(),
+                                                            product=rng.choice(products)))
+        # The legs return up to COLLAPSE_DEPTH_FACTOR * max_results hits, whatever the mode
+        depth = args.max_results * search.COLLAPSE_DEPTH_FACTOR
+        legs = [(leg_hits(chunks, bm25.scores(q), depth), leg_hits(chunks, lsa.scores(q), depth)) for q in queries]
+
+        for mode, (collapse, merge) in MODES.items():
+            stats = collections.defaultdict(list)
+            for i, (query, (bm25_hits, knn_hits)) in enumerate(zip(queries, legs)):
+                opensearch.hits, opensearch.knn_hits = bm25_hits, knn_hits
+                response = search.lambda_handler({
+                    "query_id": f"bench-{mode}-{i}", "user_query": query, "queryEmbedding": [0.0],
+                    "max_results": args.max_results, "collapse_chunks": collapse, "merge_adjacent_chunks": merge
+                }, None)
+                if response["statusCode"] != 200:
+                    raise RuntimeError(response["error"])
+                candidates = load_candidates(response, search.s3, BUCKET)
+                groups = [search.collapse_key(hit) for hit, _ in candidates]
+                top = groups[:args.max_results]
+                stats["candidates"].append(len(candidates))
+                stats["distinct"].append(len(set(groups)))
+                stats["redundant"].append(len(groups) - len(set(groups)))
+                stats["top_k_distinct"].append(len(set(top)))
+                stats["chars"].append(sum(len(hit["_source"]["text"]) for hit, _ in candidates))
+                stats["ratio"].append(response["monitoring"]["collapse"].get("collapse_ratio", 1.0))
+                stats["merged"].append(response["monitoring"]["collapse"].get("merged_chunks", 0))
+                stats["ms"].append(response["monitoring"]["total_time_ms"])
+            results.append({
+                "mode": mode,
+                "mean_candidates": statistics.mean(stats["candidates"]),
+                "mean_distinct_groups": statistics.mean(stats["distinct"]),
+                "mean_redundant_chunks": statistics.mean(stats["redundant"]),
+                f"mean_distinct_in_top{args.max_results}": statistics.mean(stats["top_k_distinct"]),
+                "mean_collapse_ratio": statistics.mean(stats["ratio"]),
+                "mean_merged_chunks": statistics.mean(stats["merged"]),
+                "mean_candidate_chars": statistics.mean(stats["chars"]),
+                "search_p50_ms": statistics.median(stats["ms"])
+            })
+            print(f"{mode}: {results[-1]['mean_distinct_groups']:.1f} distinct of "
+                  f"{results[-1]['mean_candidates']:.1f} candidates", file=sys.stderr)
+
+    output = json.dumps({
+        "benchmark": "chunk_collapse",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "corpus_chunks": len(chunks),
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
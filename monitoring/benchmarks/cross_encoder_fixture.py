@@ -0,0 +1,135 @@
+"""
+Offline stand-in for the exported cross-encoder (export_minilm_onnx.py output): a BERT-style
+ONNX graph with MiniLM-L6 geometry and seeded random weights, int8-quantized the same way, plus
+a WordPiece tokenizer.json trained on the sample support tickets. Scores are meaningless but
+the compute per token matches the real model, so latency and throughput are representative.
+Built once into the temp directory and reused.
+"""
+
+import csv
+import os
+import tempfile
+
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from tokenizers import Tokenizer, models, normalizers, pre_tokenizers, processors, trainers
+
+from lambda_loader import REPO_ROOT
+
+TICKETS_CSV = os.path.join(REPO_ROOT, "sample-data", "support-tickets", "customer_support_tickets.csv")
+SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+
+def build_tokenizer(path, vocab_size):
+    tokenizer = Tokenizer(models.WordPiece(unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.BertNormalizer(lowercase=True)
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    with open(TICKETS_CSV, newline="", encoding="utf-8") as f:
+        texts = [row["Ticket Description"] for row in csv.DictReader(f) if row.get("Ticket Description")]
+    tokenizer.train_from_iterator(texts, trainers.WordPieceTrainer(vocab_size=vocab_size, special_tokens=SPECIAL_TOKENS))
+    cls_id, sep_id = tokenizer.token_to_id("[CLS]"), tokenizer.token_to_id("[SEP]")
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]",
+        pair="[CLS] $A [SEP] $B:1 [SEP]:1",
+        special_tokens=[("[CLS]", cls_id), ("[SEP]", sep_id)]
+    )
+    tokenizer.save(path)
+
+class GraphBuilder:
+    def __init__(self, seed):
+        self.rng = np.random.default_rng(seed)
+        self.nodes = []
+        self.initializers = []
+        self.count = 0
+
+    def name(self, prefix):
+        self.count += 1
+        return f"{prefix}_{self.count}"
+
+    def const(self, value, prefix="const"):
+        name = self.name(prefix)
+        self.initializers.append(numpy_helper.from_array(np.asarray(value), name))
+        return name
+
+    def weight(self, *shape):
+        return self.const((self.rng.standard_normal(shape) * 0.02).astype(np.float32), "w")
+
+    def op(self, op_type, inputs, **attrs):
+        output = self.name(op_type.lower())
+        self.nodes.append(helper.make_node(op_type, inputs, [output], **attrs))
+        return output
+
+    def dense(self, x, fan_in, fan_out):
+        return self.op("Add", [self.op("MatMul", [x, self.weight(fan_in, fan_out)]), self.const(np.zeros(fan_out, np.float32))])
+
+    def layer_norm(self, x, hidden):
+        return self.op("LayerNormalization", [x, self.const(np.ones(hidden, np.float32)), self.const(np.zeros(hidden, np.float32))],
+                       axis=-1, epsilon=1e-12)
+
+    def gelu(self, x):
+        erf = self.op("Erf", [self.op("Div", [x, self.const(np.float32(np.sqrt(2.0)))])])
+        return self.op("Mul", [self.op("Mul", [x, self.op("Add", [erf, self.const(np.float32(1.0))])]), self.const(np.float32(0.5))])
+
+def build_model(path, vocab_size, layers, hidden, heads, intermediate, max_positions=512, seed=11):
+    g = GraphBuilder(seed)
+    head_dim = hidden // heads
+
+    # Embeddings: word + position + token type, then LayerNorm
+    seq_len = g.op("Gather", [g.op("Shape", ["input_ids"]), g.const(np.int64(1))], axis=0)
+    positions = g.op("Range", [g.const(np.int64(0)), seq_len, g.const(np.int64(1))])
+    x = g.op("Add", [
+        g.op("Add", [g.op("Gather", [g.weight(vocab_size, hidden), "input_ids"]),
+                     g.op("Gather", [g.weight(max_positions, hidden), positions])]),
+        g.op("Gather", [g.weight(2, hidden), "token_type_ids"])
+    ])
+    x = g.layer_norm(x, hidden)
+
+    # Additive attention mask [batch, 1, 1, seq]
+    mask = g.op("Cast", ["attention_mask"], to=TensorProto.FLOAT)
+    mask = g.op("Mul", [g.op("Sub", [g.const(np.float32(1.0)), mask]), g.const(np.float32(-10000.0))])
+    mask = g.op("Unsqueeze", [mask, g.const(np.array([1, 2], np.int64))])
+
+    split_heads = g.const(np.array([0, 0, heads, head_dim], np.int64))
+    merge_heads = g.const(np.array([0, 0, hidden], np.int64))
+    for _ in range(layers):
+        q = g.op("Transpose", [g.op("Reshape", [g.dense(x, hidden, hidden), split_heads])], perm=[0, 2, 1, 3])
+        k = g.op("Transpose", [g.op("Reshape", [g.dense(x, hidden, hidden), split_heads])], perm=[0, 2, 3, 1])
+        v = g.op("Transpose", [g.op("Reshape", [g.dense(x, hidden, hidden), split_heads])], perm=[0, 2, 1, 3])
+        scores = g.op("Add", [g.op("Mul", [g.op("MatMul", [q, k]), g.const(np.float32(1 / np.sqrt(head_dim)))]), mask])
+        context = g.op("MatMul", [g.op("Softmax", [scores], axis=-1), v])
+        context = g.op("Reshape", [g.op("Transpose", [context], perm=[0, 2, 1, 3]), merge_heads])
+        x = g.layer_norm(g.op("Add", [x, g.dense(context, hidden, hidden)]), hidden)
+        ffn = g.dense(g.gelu(g.dense(x, hidden, intermediate)), intermediate, hidden)
+        x = g.layer_norm(g.op("Add", [x, ffn]), hidden)
+
+    # Pooler on [CLS] + single-logit classifier, like ms-marco cross-encoders
+    cls = g.op("Gather", [x, g.const(np.int64(0))], axis=1)
+    pooled = g.op("Tanh", [g.dense(cls, hidden, hidden)])
+    logits = g.dense(pooled, hidden, 1)
+    g.nodes.append(helper.make_node("Identity", [logits], ["logits"]))
+
+    inputs = [helper.make_tensor_value_info(name, TensorProto.INT64, ["batch", "sequence"])
+              for name in ("input_ids", "attention_mask", "token_type_ids")]
+    graph = helper.make_graph(g.nodes, "cross_encoder_fixture", inputs,
+                              [helper.make_tensor_value_info("logits", TensorProto.FLOAT, ["batch", 1])], g.initializers)
+    # IR 8 loads in every onnxruntime that supports opset 17, including the layer's pinned version
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)], ir_version=8)
+    onnx.checker.check_model(model)
+
+    fp32_path = path + ".fp32"
+    onnx.save(model, fp32_path)
+    quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+
+def cross_encoder_fixture(layers=6, hidden=384, heads=12, intermediate=1536, vocab_size=30522):
+    """Directory with model.onnx + tokenizer.json, built on first use"""
+    directory = os.path.join(tempfile.gettempdir(), "aai-bench-fixtures",
+                             f"cross_encoder-L{layers}-H{hidden}-A{heads}-I{intermediate}")
+    model_path = os.path.join(directory, "model.onnx")
+    tokenizer_path = os.path.join(directory, "tokenizer.json")
+    if not (os.path.exists(model_path) and os.path.exists(tokenizer_path)):
+        os.makedirs(directory, exist_ok=True)
+        build_tokenizer(tokenizer_path, vocab_size)
+        build_model(model_path, vocab_size, layers, hidden, heads, intermediate)
+    return directory
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Embedded BM25 Benchmark
+Builds the embedded lexical index (aai_lexical_index, as aai_index_snapshot build_lexical_index
+does) over the full support-ticket corpus chunked as aai_preprocess_csv chunks it, plus the long
+per-subject guides of chunk_collapse.py, publishes it to a moto S3 bucket and loads it the way
+aai_hybrid_search_fusion does (download to a local directory, memory-mapped .npy files).
+
+Checks the array-backed postings against a dict-of-dicts BM25 over the same analyzer output and
+the same Lucene formula (scores and top-k must agree), then times "<subject> <product>" queries
+and short guide passages, unfiltered and with a product_filter.
+
+Then runs the search Lambda with the kNN leg on the embedded vector index (random vectors) and the
+BM25 leg on a fake domain versus LEXICAL_SEARCH_BACKEND=embedded. The fake domain answers BM25 from
+the same lexical index and pays --domain-rtt-ms per request plus --base-ms + --posting-ns per
+posting scanned (assumptions, not measurements).
+
+Reports build/publish/cold-load times, index bytes, terms and postings, score agreement, analyze
+and search p50/p95, and the search stage latency per lexical backend.
+
+Usage:
+    python monitoring/benchmarks/embedded_bm25.py --queries 300
+"""
+
+import argparse
+import collections
+import contextlib
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import boto3
+import numpy as np
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import load_lambda, use_local_aws_env
+from adaptive_rerank import TEMPLATES
+from chunk_collapse import build_corpus
+
+BUCKET = "bench-lexical-index"
+INDEX = "bench-index"
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def timed(fn):
+    start = time.time()
+    result = fn()
+    return result, (time.time() - start) * 1000
+
+class ReferenceBm25:
+    """term -> {row: tf} dicts over the same analyzer output, lengths and Lucene BM25 formula"""
+
+    def __init__(self, analyzed, k1, b, encode_length, decode_length):
+        self.k1, self.b = k1, b
+        self.postings = collections.defaultdict(dict)
+        for row, tokens in enumerate(analyzed):
+            for term, freq in collections.Counter(tokens).items():
+                self.postings[term][row] = freq
+        self.lengths = [decode_length(encode_length(len(tokens))) for tokens in analyzed]
+        indexed = [len(tokens) for tokens in analyzed if tokens]
+        self.doc_count = len(indexed)
+        self.avg_length = sum(indexed) / len(indexed)
+
+    def search(self, terms, k, allowed=None):
+        scores = collections.defaultdict(float)
+        for term, query_freq in collections.Counter(terms).items():
+            postings = self.postings.get(term, {})
+            idf = math.log(1 + (self.doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for row, freq in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[row] / self.avg_length)
+                scores[row] += query_freq * idf * freq / (freq + norm)
+        ranked = sorted(((score, row) for row, score in scores.items() if allowed is None or row in allowed),
+                        key=lambda x: (-x[0], x[1]))
+        return ranked[:k]
+
+class DomainOpenSearch:
+    """search/msearch stand-in for the domain's BM25 legs, answered from the lexical index with a modelled cost"""
+
+    def __init__(self, lexical_index, args):
+        self.lexical_index = lexical_index
+        self.args = args
+
+    def _execute(self, index, body):
+        query = body["query"]["bool"]
+        hits, stats = self.lexical_index.search(query["must"][0]["match"]["text"], body["size"],
+                                                (query.get("filter") or [None])[0], index)
+        took = self.args.base_ms + stats["postings_scanned"] * self.args.posting_ns / 1e6
+        return {"took": took, "hits": {"total": {"value": len(hits)}, "hits": hits}}
+
+    def _sleep_until(self, start, took):
+        time.sleep(max(0.0, (self.args.domain_rtt_ms + took) / 1000 - (time.time() - start)))
+
+    def search(self, index=None, body=None, **kwargs):
+        start = time.time()
+        response = self._execute(index, body)
+        self._sleep_until(start, response["took"])
+        return response
+
+    def msearch(self, body, index=None, **kwargs):
+        start = time.time()
+        responses = [self._execute(header["index"], search) for header, search in zip(body[0::2], body[1::2])]
+        self._sleep_until(start, max(r["took"] for r in responses))
+        return {"responses": responses}
+
+def build_queries(chunks, subjects, products, count, passage_words, rng):
+    guides = [c for c in chunks if not c.get("ticket_id")]
+    queries = []
+    for i in range(count):
+        if i % 2 == 0 or not guides:
+            queries.append(rng.choice(TEMPLATES).format(subject=rng.choice(subjects).lower(), product=rng.choice(products)))
+        else:
+            words = rng.choice(guides)["text"].split()
+            start = rng.randrange(max(1, len(words) - passage_words))
+            queries.append(" ".join(words[start:start + passage_words]))
+    return queries
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedded BM25 index vs a dict-based reference and the domain")
+    parser.add_argument("--tickets", type=int, default=100000, help="Tickets to ingest (the CSV holds 8469)")
+    parser.add_argument("--docs-per-subject", type=int, default=2)
+    parser.add_argument("--doc-chars", type=int, default=12000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--passage-words", type=int, default=8)
+    parser.add_argument("--k", type=int, default=10, help="BM25 leg depth (max_results * COLLAPSE_DEPTH_FACTOR)")
+    parser.add_argument("--dimension", type=int, default=256, help="Random vectors for the embedded kNN leg")
+    parser.add_argument("--domain-rtt-ms", type=float, default=15.0, help="Assumed Lambda to domain round trip")
+    parser.add_argument("--base-ms", type=float, default=2.0, help="Assumed fixed cost per domain search")
+    parser.add_argument("--posting-ns", type=float, default=50.0, help="Assumed domain cost per posting scanned")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_local_aws_env(OPENSEARCH_DOMAIN="bench.local", OPENSEARCH_INDEX=INDEX, SEARCH_RESULTS_BUCKET=BUCKET,
+                      VECTOR_INDEX_BUCKET=BUCKET, LEXICAL_INDEX_BUCKET=BUCKET, NORMALIZE_EMBEDDINGS="true",
+                      COLLAPSE_CHUNKS="false")
+    rng = random.Random(args.seed)
+    results = {}
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr), tempfile.TemporaryDirectory() as tmp:
+        boto3.client("s3").create_bucket(
+            Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]}
+        )
+        preprocess = load_lambda("ingestion", "aai_preprocess_csv")
+        search = load_lambda("retrieval", "aai_hybrid_search_fusion")
+        import aai_embedded_index, aai_lexical_index, aai_vector_index
+        aai_embedded_index.TMP_INDEX_DIR = os.path.join(tmp, "lambda")
+        chunks, subjects, products = build_corpus(preprocess, args.tickets, args.docs_per_subject, args.doc_chars)
+        docs = [(INDEX, aai_embedded_index.chunk_doc_id(chunk), chunk) for chunk in chunks]
+        print(f"{len(chunks)} chunks, {sum(1 for c in chunks if c.get('ticket_id'))} from tickets", file=sys.stderr)
+
+        build_dir = os.path.join(tmp, "build")
+        manifest, build_ms = timed(lambda: aai_lexical_index.build_lexical_index(iter(docs), build_dir))
+        published, publish_ms = timed(lambda: aai_lexical_index.publish_lexical_index(build_dir, INDEX, BUCKET))
+        (index, _), cold_ms = timed(lambda: aai_lexical_index.get_lexical_index(INDEX, BUCKET))
+        sizes = {name: os.path.getsize(os.path.join(index.directory, name)) for name in manifest["files"]}
+        results["index"] = {
+            "chunks": manifest["rows"], "terms": manifest["terms"], "postings": manifest["postings"],
+            "bytes": published["total_bytes"],
+            "postings_bytes": sum(sizes[f"{name}.npy"] for name in ("term_offsets", "postings", "freqs", "norms"))
+                              + sizes[aai_lexical_index.TERMS_FILE],
+            "meta_bytes": sizes[aai_embedded_index.META_FILE],
+            "build_ms": build_ms, "publish_ms": publish_ms, "cold_load_ms": cold_ms
+        }
+        print(f"built {manifest['terms']} terms / {manifest['postings']} postings in {build_ms:.0f} ms, "
+              f"{published['total_bytes'] / 1e6:.1f} MB, cold load {cold_ms:.0f} ms", file=sys.stderr)
+
+        analyzed = [aai_lexical_index.analyze(chunk["text"]) for chunk in chunks]
+        reference = ReferenceBm25(analyzed, manifest["k1"], manifest["b"],
+                                  aai_lexical_index.encode_length, aai_lexical_index.decode_length)
+        queries = build_queries(chunks, subjects, products, args.queries, args.passage_words, rng)
+        by_product = collections.defaultdict(set)
+        for row, chunk in enumerate(chunks):
+            product = (chunk.get("metadata") or {}).get("product_purchased")
+            if product:
+                by_product[product].add(row)
+        row_of = {doc_id: row for row, (_, doc_id, _) in enumerate(docs)}
+
+        results["search"] = []
+        for name in ("unfiltered", "product_filter"):
+            analyze_ms, embedded_ms, reference_ms, postings, hits_returned = [], [], [], [], []
+            score_error, topk_agree = 0.0, 0
+            for query in queries:
+                product = rng.choice(products) if name == "product_filter" else None
+                clause = {"term": {"metadata.product_purchased": product}} if product else None
+                terms, ms = timed(lambda: aai_lexical_index.analyze(query))
+                analyze_ms.append(ms)
+                (hits, stats), ms = timed(lambda: index.search(query, args.k, clause))
+                embedded_ms.append(ms)
+                postings.append(stats["postings_scanned"])
+                hits_returned.append(len(hits))
+                expected, ms = timed(lambda: reference.search(terms, args.k, by_product[product] if product else None))
+                reference_ms.append(ms)
+                got = [(hit["_score"], row_of[hit["_id"]]) for hit in hits]
+                score_error = max([score_error] + [abs(a[0] - b[0]) / max(b[0], 1e-9) for a, b in zip(got, expected)])
+                # Rows tied on score may come back in either order
+                topk_agree += len(got) == len(expected) and all(abs(a[0] - b[0]) <= 1e-6 * b[0] for a, b in zip(got, expected))
+            results["search"].append({
+                "filter": name,
+                "queries": len(queries),
+                "topk_score_agreement": topk_agree / len(queries),
+                "max_relative_score_error": score_error,
+                "mean_hits": statistics.mean(hits_returned),
+                "mean_postings_scanned": statistics.mean(postings),
+                "analyze_p50_ms": statistics.median(analyze_ms),
+                "embedded_p50_ms": statistics.median(embedded_ms), "embedded_p95_ms": percentile(embedded_ms, 95),
+                "reference_p50_ms": statistics.median(reference_ms), "reference_p95_ms": percentile(reference_ms, 95)
+            })
+            print(f"{name}: agreement {topk_agree / len(queries):.3f}, embedded p50 "
+                  f"{statistics.median(embedded_ms):.2f} ms / p95 {percentile(embedded_ms, 95):.2f} ms, "
+                  f"dict reference p50 {statistics.median(reference_ms):.2f} ms", file=sys.stderr)
+
+        vectors = np.random.default_rng(args.seed).standard_normal((len(chunks), args.dimension)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        vector_dir = os.path.join(tmp, "vectors")
+        aai_vector_index.build_vector_index(((i, d, s, v) for (i, d, s), v in zip(docs, vectors)), vector_dir, "innerproduct")
+        aai_vector_index.publish_vector_index(vector_dir, INDEX, BUCKET)
+
+        opensearch = DomainOpenSearch(index, args)
+        search.get_opensearch_client = lambda **kw: opensearch
+        results["search_stage"] = []
+        for backend in ("opensearch", "embedded"):
+            search_ms, bm25_ms = [], []
+            for i, query in enumerate(queries):
+                response = search.lambda_handler({
+                    "query_id": f"bench-{backend}-{i}", "user_query": query,
+                    "queryEmbedding": vectors[rng.randrange(len(vectors))].tolist(), "max_results": args.k,
+                    "vector_backend": "embedded", "lexical_backend": backend
+                }, None)
+                if response["statusCode"] != 200:
+                    raise RuntimeError(response["error"])
+                search_ms.append(response["monitoring"]["search_time_ms"])
+                bm25_ms.append(response["monitoring"]["bm25_time_ms"])
+            results["search_stage"].append({
+                "lexical_backend": backend,
+                "bm25_p50_ms": statistics.median(bm25_ms), "bm25_p95_ms": percentile(bm25_ms, 95),
+                "search_p50_ms": statistics.median(search_ms), "search_p95_ms": percentile(search_ms, 95)
+            })
+            print(f"stage {backend}: search p50 {statistics.median(search_ms):.1f} ms", file=sys.stderr)
+        aai_embedded_index.reset_embedded_indexes()
+
+    output = json.dumps({
+        "benchmark": "embedded_bm25",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
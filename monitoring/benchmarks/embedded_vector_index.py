@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Embedded Vector Index Benchmark
+Builds the embedded IVF index (aai_vector_index, as aai_index_snapshot build_vector_index does)
+over the filtered_knn.py corpus, publishes it to a moto S3 bucket and loads it the way
+aai_hybrid_search_fusion does (download to a local directory, memory-mapped .npy files).
+
+Compares, per query:
+  - brute force: NumPy matmul over the whole in-memory matrix (the recall reference)
+  - embedded IVF at each --nprobes, and embedded exact scoring
+  - the same with a product_filter for a common and a rare product (exact below
+    --exact-max-docs matching rows, IVF with nprobe expansion above)
+Then runs the search Lambda with VECTOR_SEARCH_BACKEND opensearch vs embedded against a fake
+domain that pays --domain-rtt-ms per request plus an HNSW cost of --base-ms + --vector-us *
+max(k, --ef) * log2(docs) for a kNN search (assumptions, not measurements). BM25 legs return no
+hits; in embedded mode they are the only request left on the domain.
+
+Reports build/publish/cold-load times, index bytes, recall@k against brute force, p50/p95 search
+latency, and the search stage's kNN and total latency per backend.
+
+Usage:
+    python monitoring/benchmarks/embedded_vector_index.py --docs 20000 --dimension 512 --queries 200
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import boto3
+import numpy as np
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import load_lambda, use_local_aws_env
+from filtered_knn import build_corpus
+
+BUCKET = "bench-vector-index"
+INDEX = "bench-index"
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+class DomainOpenSearch:
+    """search/msearch stand-in for the domain: exact kNN answers with a modelled round trip and search cost"""
+
+    def __init__(self, vectors, products, args):
+        self.vectors = vectors
+        self.products = np.array(products)
+        self.args = args
+
+    def _mask(self, clause):
+        return self.products == clause["term"]["metadata.product_purchased"]
+
+    def _execute(self, body):
+        args = self.args
+        if "aggs" in body:
+            count = int(self._mask(body["aggs"]["filtered"]["filter"]).sum())
+            return {"took": args.base_ms, "hits": {"total": {"value": len(self.vectors)}, "hits": []},
+                    "aggregations": {"filtered": {"doc_count": count}}}
+        query = body["query"]
+        if "script_score" in query:
+            params = query["script_score"]["script"]["params"]
+            vector, mask = params["query_value"], self._mask(query["script_score"]["query"]["bool"]["filter"][0])
+            cost = args.base_ms + mask.sum() * args.vector_us / 1000
+        elif "knn" in query:
+            spec = query["knn"]["embedding"]
+            vector, mask = spec["vector"], self._mask(spec["filter"]) if "filter" in spec else None
+            visited = max(spec["k"], args.ef) * math.log2(len(self.vectors))
+            cost = args.base_ms + visited * args.vector_us / 1000
+        else:
+            return {"took": args.base_ms, "hits": {"total": {"value": 0}, "hits": []}}
+        scores = 1 + self.vectors @ np.asarray(vector, dtype=np.float32)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        top = [i for i in np.argsort(-scores)[:body["size"]] if np.isfinite(scores[i])]
+        hits = [{"_index": INDEX, "_id": f"doc_{i}", "_score": float(scores[i]), "_source": {
+            "text": f"ticket {i}", "source": "support_log", "ticket_id": f"T-{i}",
+            "metadata": {"product_purchased": str(self.products[i])}}} for i in top]
+        return {"took": cost, "hits": {"total": {"value": len(hits)}, "hits": hits}}
+
+    def _sleep_until(self, start, took):
+        time.sleep(max(0.0, (self.args.domain_rtt_ms + took) / 1000 - (time.time() - start)))
+
+    def search(self, index=None, body=None, **kwargs):
+        start = time.time()
+        response = self._execute(body)
+        self._sleep_until(start, response["took"])
+        return response
+
+    def msearch(self, body, index=None, **kwargs):
+        start = time.time()
+        responses = [self._execute(search) for search in body[1::2]]
+        self._sleep_until(start, max(r["took"] for r in responses))
+        return {"responses": responses}
+
+def timed(fn):
+    start = time.time()
+    result = fn()
+    return result, (time.time() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedded IVF vector index vs brute-force NumPy")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=512)
+    parser.add_argument("--clusters", type=int, default=40)
+    parser.add_argument("--spread", type=float, default=0.6, help="Noise around cluster centres")
+    parser.add_argument("--products", type=int, default=30)
+    parser.add_argument("--zipf", type=float, default=1.2)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10, help="kNN depth (max_results * COLLAPSE_DEPTH_FACTOR)")
+    parser.add_argument("--nlist", type=int, default=0, help="VECTOR_INDEX_NLIST (0: 4 * sqrt(docs))")
+    parser.add_argument("--nprobes", default="4,8,16,32")
+    parser.add_argument("--exact-max-docs", type=int, default=2000, help="FILTERED_KNN_EXACT_MAX_DOCS")
+    parser.add_argument("--domain-rtt-ms", type=float, default=15.0, help="Assumed Lambda to domain round trip")
+    parser.add_argument("--base-ms", type=float, default=3.0, help="Assumed fixed cost per domain search")
+    parser.add_argument("--vector-us", type=float, default=2.0, help="Assumed domain cost per vector compared")
+    parser.add_argument("--ef", type=int, default=100, help="HNSW ef_search of the domain cost model")
+    parser.add_argument("--seed", type=int, default=21)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_local_aws_env(OPENSEARCH_DOMAIN="bench.local", OPENSEARCH_INDEX=INDEX, SEARCH_RESULTS_BUCKET=BUCKET,
+                      VECTOR_INDEX_BUCKET=BUCKET, NORMALIZE_EMBEDDINGS="true", COLLAPSE_CHUNKS="false",
+                      FILTERED_KNN_EXACT_MAX_DOCS=args.exact_max_docs)
+    vectors, products, queries = build_corpus(args)
+    queries = queries.astype(np.float32)
+    products = np.array(products)
+    results = {}
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr), tempfile.TemporaryDirectory() as tmp:
+        boto3.client("s3").create_bucket(
+            Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]}
+        )
+        search = load_lambda("retrieval", "aai_hybrid_search_fusion")
+        import aai_embedded_index, aai_vector_index
+        aai_embedded_index.TMP_INDEX_DIR = os.path.join(tmp, "lambda")
+
+        docs = ((INDEX, f"doc_{i}", {"text": f"ticket {i}", "source": "support_log", "ticket_id": f"T-{i}",
+                                     "metadata": {"product_purchased": str(products[i])}}, vectors[i])
+                for i in range(len(vectors)))
+        build_dir = os.path.join(tmp, "build")
+        manifest, build_ms = timed(lambda: aai_vector_index.build_vector_index(docs, build_dir, "innerproduct", args.nlist))
+        published, publish_ms = timed(lambda: aai_vector_index.publish_vector_index(build_dir, INDEX, BUCKET))
+        (index, cold), cold_ms = timed(lambda: aai_vector_index.get_vector_index(INDEX, BUCKET))
+        _, warm_ms = timed(lambda: aai_vector_index.get_vector_index(INDEX, BUCKET))
+        results["index"] = {
+            "rows": manifest["rows"], "nlist": manifest["nlist"], "bytes": published["total_bytes"],
+            "build_ms": build_ms, "publish_ms": publish_ms, "cold_load_ms": cold_ms, "warm_get_ms": warm_ms
+        }
+        print(f"built {manifest['rows']} rows in {build_ms:.0f} ms, cold load {cold_ms:.0f} ms", file=sys.stderr)
+
+        counts = {p: int((products == p).sum()) for p in set(products)}
+        ranked = sorted(counts, key=counts.get, reverse=True)
+        filters = {"unfiltered": None, "common": ranked[0], "rare": ranked[-1]}
+        results["search"] = []
+        for name, product in filters.items():
+            mask = products == product if product else None
+            clause = {"term": {"metadata.product_purchased": product}} if product else None
+            truth, brute_ms = [], []
+            for q in queries:
+                def brute():
+                    rows = np.flatnonzero(mask) if mask is not None else None
+                    scores = vectors @ q if rows is None else vectors[rows] @ q
+                    top = np.argpartition(-scores, min(args.k, len(scores) - 1))[:args.k]
+                    top = top[np.argsort(-scores[top])]
+                    return {f"doc_{i}" for i in (top if rows is None else rows[top])}
+                ids, ms = timed(brute)
+                truth.append(ids)
+                brute_ms.append(ms)
+            runs = [("brute_force", None)] + [(f"ivf_nprobe_{n}", int(n)) for n in args.nprobes.split(",")] + [("exact", 0)]
+            for run, nprobe in runs:
+                recalls, latencies = [], brute_ms
+                if nprobe is not None:
+                    latencies = []
+                    for q, ids in zip(queries, truth):
+                        (hits, _), ms = timed(lambda: index.search(q, args.k, clause, exact=not nprobe, nprobe=nprobe or 1))
+                        latencies.append(ms)
+                        recalls.append(len({h["_id"] for h in hits} & ids) / len(ids))
+                results["search"].append({
+                    "filter": name,
+                    "matching_rows": int(mask.sum()) if mask is not None else len(vectors),
+                    "run": run,
+                    f"recall_at_{args.k}": statistics.mean(recalls) if recalls else 1.0,
+                    "p50_ms": statistics.median(latencies),
+                    "p95_ms": percentile(latencies, 95)
+                })
+                print(f"{name}/{run}: recall {results['search'][-1][f'recall_at_{args.k}']:.3f}, "
+                      f"p50 {results['search'][-1]['p50_ms']:.2f} ms", file=sys.stderr)
+
+        opensearch = DomainOpenSearch(vectors, products, args)
+        search.get_opensearch_client = lambda **kw: opensearch
+        results["search_stage"] = []
+        for backend in ("opensearch", "embedded"):
+            for name, product in filters.items():
+                knn_ms, search_ms = [], []
+                for i, q in enumerate(queries):
+                    response = search.lambda_handler({
+                        "query_id": f"bench-{backend}-{name}-{i}", "user_query": "battery drains",
+                        "queryEmbedding": q.tolist(), "max_results": args.k // 2,
+                        "product_filter": product, "vector_backend": backend
+                    }, None)
+                    if response["statusCode"] != 200:
+                        raise RuntimeError(response["error"])
+                    knn_ms.append(response["monitoring"]["knn_time_ms"])
+                    search_ms.append(response["monitoring"]["search_time_ms"])
+                results["search_stage"].append({
+                    "backend": backend, "filter": name,
+                    "knn_p50_ms": statistics.median(knn_ms), "knn_p95_ms": percentile(knn_ms, 95),
+                    "search_p50_ms": statistics.median(search_ms), "search_p95_ms": percentile(search_ms, 95)
+                })
+                print(f"stage {backend}/{name}: search p50 {results['search_stage'][-1]['search_p50_ms']:.1f} ms",
+                      file=sys.stderr)
+        aai_embedded_index.reset_embedded_indexes()
+
+    output = json.dumps({
+        "benchmark": "embedded_vector_index",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Local stand-ins for the AWS services the Lambda handlers call.
+They mimic the client methods the handlers use and count calls and bytes so
+benchmarks can report per-stage cost without touching a real account.
+"""
+
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+class FakeBedrock:
+    """
+    bedrock-runtime stand-in returning deterministic unit vectors per input text for embedding
+    models, and a canned answer after text_latency_ms for text models
+    """
+
+    def __init__(self, dimension=1024, latency_ms=0.0, throttle_rate=0.0, seed=7, text_latency_ms=0.0):
+        self.dimension = dimension
+        self.latency_ms = latency_ms
+        self.text_latency_ms = text_latency_ms
+        self.throttle_rate = throttle_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.throttled = 0
+
+    def vector_for(self, text, dimension=None):
+        dimension = dimension or self.dimension
+        rng = random.Random(hashlib.sha256(text.encode("utf-8")).hexdigest())
+        vector = [rng.gauss(0, 1) for _ in range(dimension)]
+        norm = sum(x * x for x in vector) ** 0.5
+        return [x / norm for x in vector]
+
+    def invoke_model(self, modelId, body, **kwargs):
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if self.throttle_rate and self.rng.random() < self.throttle_rate:
+            self.throttled += 1
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}, "InvokeModel")
+        request = json.loads(body)
+        if "embed" not in modelId:
+            time.sleep(self.text_latency_ms / 1000)
+            payload = json.dumps({"outputText": f"Answer based on {request['inputText'].count('---') + 1} context chunks."})
+            return {"body": io.BytesIO(payload.encode("utf-8"))}
+        vector = self.vector_for(request["inputText"], request.get("dimensions"))
+        payload = json.dumps({"embedding": vector, "inputTextTokenCount": len(request["inputText"].split())})
+        return {"body": io.BytesIO(payload.encode("utf-8"))}
+
+class FakeIndices:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def exists(self, index):
+        return index in self.owner.indices_created
+
+    def create(self, index, body=None):
+        self.owner.indices_created[index] = body
+        return {"acknowledged": True}
+
+    def delete(self, index):
+        self.owner.indices_created.pop(index, None)
+        return {"acknowledged": True}
+
+    def refresh(self, index=None):
+        return {"_shards": {}}
+
+class FakeSageMaker:
+    """
+    sagemaker-runtime stand-in for the cross-encoder endpoint, scoring pairs by word overlap.
+    Like a serverless endpoint, it throttles above max_concurrency in-flight requests and pays
+    cold_start_ms on a cold_start_rate fraction of requests. Each call costs latency_ms plus
+    pair_latency_ms per scored pair.
+    """
+
+    def __init__(self, latency_ms=0.0, cold_start_ms=0.0, cold_start_rate=0.0, max_concurrency=None, seed=7,
+                 pair_latency_ms=0.0):
+        self.latency_ms = latency_ms
+        self.pair_latency_ms = pair_latency_ms
+        self.cold_start_ms = cold_start_ms
+        self.cold_start_rate = cold_start_rate
+        self.max_concurrency = max_concurrency
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.calls = 0
+        self.cold_starts = 0
+        self.throttled = 0
+
+    def invoke_endpoint(self, EndpointName, Body, **kwargs):
+        with self.lock:
+            self.calls += 1
+            if self.max_concurrency and self.in_flight >= self.max_concurrency:
+                self.throttled += 1
+                raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"}}, "InvokeEndpoint")
+            self.in_flight += 1
+            cold = self.cold_start_rate and self.rng.random() < self.cold_start_rate
+            self.cold_starts += bool(cold)
+        pairs = json.loads(Body)["inputs"]
+        try:
+            time.sleep((self.latency_ms + self.pair_latency_ms * len(pairs) + (self.cold_start_ms if cold else 0.0)) / 1000)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+        scores = []
+        for pair in pairs:
+            query = set(pair["text"].lower().split())
+            doc = set(pair["text_pair"].lower().split())
+            scores.append({"label": "LABEL_0", "score": len(query & doc) / (len(query) or 1)})
+        return {"Body": io.BytesIO(json.dumps(scores).encode("utf-8"))}
+
+def filter_source(source, spec):
+    """Apply an OpenSearch _source spec (False, list of includes, or includes/excludes dict)"""
+    if spec is None or spec is True:
+        return dict(source)
+    if spec is False:
+        return {}
+    if isinstance(spec, (list, str)):
+        spec = {"includes": [spec] if isinstance(spec, str) else spec}
+    includes = spec.get("includes")
+    excludes = set(spec.get("excludes", []))
+    return {k: v for k, v in source.items() if (includes is None or k in includes) and k not in excludes}
+
+def fake_hits(count, prefix, dimension=8, seed=0):
+    rng = random.Random(seed)
+    return [{
+        "_id": f"{prefix}{i}",
+        "_score": 1.0 / (i + 1),
+        "_source": {
+            "text": f"sample chunk {prefix}{i}",
+            "source": "support_log",
+            "ticket_id": f"T-{prefix}{i}",
+            "embedding": [rng.gauss(0, 1) for _ in range(dimension)]
+        }
+    } for i in range(count)]
+
+class FakeOpenSearch:
+    """
+    OpenSearch client stand-in with index/bulk/search/msearch/mget endpoints and optional latency.
+    Searches containing a knn clause sleep knn_latency_ms, others bm25_latency_ms; an
+    _msearch runs its sub-searches concurrently server-side, so it costs the slowest leg.
+    """
+
+    def __init__(self, latency_ms=0.0, bm25_latency_ms=0.0, knn_latency_ms=0.0, hits=None,
+                 knn_hits=None, honour_source_filter=True, **kwargs):
+        self.latency_ms = latency_ms
+        self.honour_source_filter = honour_source_filter
+        self.bm25_latency_ms = bm25_latency_ms
+        self.knn_latency_ms = knn_latency_ms
+        self.hits = hits if hits is not None else fake_hits(20, "doc_")
+        # kNN searches return their own ranking when given, otherwise the same hits
+        self.knn_hits = knn_hits if knn_hits is not None else self.hits
+        self.requests = 0
+        self.docs = {}
+        self.bytes_sent = 0
+        self.indices_created = {}
+        self.indices = FakeIndices(self)
+
+    def _request(self, body):
+        self.requests += 1
+        self.bytes_sent += len(json.dumps(body)) if not isinstance(body, str) else len(body)
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def _is_knn(self, body):
+        return '"knn"' in json.dumps(body)
+
+    def _search_latency(self, body):
+        return self.knn_latency_ms if self._is_knn(body) else self.bm25_latency_ms
+
+    def _search_response(self, body, took):
+        size = body.get("size", 10)
+        spec = body.get("_source") if self.honour_source_filter else None
+        ranked = self.knn_hits if self._is_knn(body) else self.hits
+        hits = [{**h, "_source": filter_source(h["_source"], spec)} for h in ranked[:size]]
+        return {"took": int(took), "hits": {"total": {"value": len(self.hits)}, "hits": hits}}
+
+    def search(self, index=None, body=None, **kwargs):
+        self._request(body)
+        latency = self._search_latency(body)
+        time.sleep(latency / 1000)
+        return self._search_response(body, latency)
+
+    def msearch(self, body, index=None, **kwargs):
+        self._request(body)
+        searches = body[1::2]
+        latencies = [self._search_latency(b) for b in searches]
+        time.sleep(max(latencies, default=0) / 1000)
+        return {"responses": [self._search_response(b, l) for b, l in zip(searches, latencies)]}
+
+    def mget(self, body, index=None, _source_includes=None, **kwargs):
+        self._request(body)
+        by_id = {h["_id"]: h for h in self.hits + self.knn_hits}
+        docs = []
+        ids = body["ids"] if "ids" in body else [doc["_id"] for doc in body["docs"]]
+        for doc_id in ids:
+            hit = by_id.get(doc_id)
+            if hit is None:
+                docs.append({"_id": doc_id, "found": False})
+            else:
+                includes = _source_includes.split(",") if isinstance(_source_includes, str) else _source_includes
+                docs.append({"_id": doc_id, "found": True, "_source": filter_source(hit["_source"], includes)})
+        return {"docs": docs}
+
+    def index(self, index, body, id=None, **kwargs):
+        self._request(body)
+        doc_id = id or f"doc_{len(self.docs)}"
+        self.docs[doc_id] = body
+        return {"_id": doc_id, "result": "created"}
+
+    def bulk(self, body, index=None, **kwargs):
+        self._request(body)
+        lines = body if isinstance(body, list) else [json.loads(l) for l in body.splitlines() if l.strip()]
+        items = []
+        for action, source in zip(lines[0::2], lines[1::2]):
+            meta = next(iter(action.values()))
+            doc_id = meta.get("_id") or f"doc_{len(self.docs)}"
+            self.docs[doc_id] = source
+            items.append({"index": {"_id": doc_id, "status": 201}})
+        return {"errors": False, "items": items}
+
+class CountingBody:
+    def __init__(self, body, counter):
+        self.body = body
+        self.counter = counter
+
+    def read(self, *args):
+        data = self.body.read(*args)
+        self.counter["bytes_in"] += len(data)
+        return data
+
+class CountingS3:
+    """Wraps a boto3 S3 client and counts object reads/writes and payload bytes"""
+
+    def __init__(self, client):
+        self.client = client
+        self.stats = {"get_calls": 0, "put_calls": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def reset(self):
+        for key in self.stats:
+            self.stats[key] = 0
+
+    def get_object(self, **kwargs):
+        self.stats["get_calls"] += 1
+        response = self.client.get_object(**kwargs)
+        response["Body"] = CountingBody(response["Body"], self.stats)
+        return response
+
+    def put_object(self, **kwargs):
+        self.stats["put_calls"] += 1
+        body = kwargs.get("Body", b"")
+        self.stats["bytes_out"] += len(body.encode("utf-8") if isinstance(body, str) else body)
+        return self.client.put_object(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
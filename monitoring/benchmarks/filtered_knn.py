@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Filtered kNN Benchmark
+Runs aai_hybrid_search_fusion in-process with a product_filter against a NumPy-backed fake
+OpenSearch and compares the kNN leg under:
+  - post_filter:  FILTERED_KNN_MODE=post_filter, the previous bool(must: knn, filter: term)
+  - efficient:    filter inside the knn clause, exact scoring for filters matching at most
+                  FILTERED_KNN_EXACT_MAX_DOCS docs, k expansion when the ANN search under-fills
+  - approximate:  efficient with exact scoring disabled (FILTERED_KNN_EXACT_MAX_DOCS=0)
+  - exact:        efficient with exact scoring for every filter
+
+The corpus is unit vectors around --clusters centres, with products drawn from a Zipf
+distribution independently of the vectors. The fake's ANN search is an IVF index (k-means lists)
+probing ceil(k * --probes-per-k) lists, so like HNSW its candidate budget grows with k:
+  - a bool-wrapped knn takes the ANN top-k, then drops the docs outside the filter
+  - a knn clause filter skips non-matching docs while scanning the probed lists
+  - a knn_score script_score scores every doc matching its filter
+Modelled latency (an assumption, not a measurement) is --base-ms plus --vector-us per vector
+scored, applied as a sleep so the handler's own timings include it.
+
+Reports, for common, mid-frequency and rare products: kNN hits returned against the hits wanted,
+recall@k against brute-force filtered top-k, expansions, and kNN / search stage latency.
+
+Usage:
+    python monitoring/benchmarks/filtered_knn.py --docs 20000 --queries 50 --max-results 5
+"""
+
+import argparse
+import collections
+import contextlib
+import json
+import math
+import os
+import statistics
+import sys
+import time
+
+import boto3
+import numpy as np
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import load_lambda, use_local_aws_env
+
+BUCKET = "bench-search-results"
+FILTER_FIELD = "metadata.product_purchased"
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+class VectorIndexOpenSearch:
+    """
+    search/msearch stand-in over an in-memory vector corpus: IVF approximate kNN (post-filtered
+    or filtered during the scan), exact knn_score scripts and filter aggregations. BM25 legs
+    return no hits, so the fused candidates are the kNN leg.
+    """
+
+    def __init__(self, vectors, products, nlist, probes_per_k, base_ms, vector_us, seed):
+        self.vectors = vectors
+        self.products = np.array(products)
+        self.probes_per_k = probes_per_k
+        self.base_ms = base_ms
+        self.vector_us = vector_us
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), nlist, replace=False)]
+        for _ in range(8):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = vectors[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0) / np.linalg.norm(members.mean(axis=0))
+        self.centroids = centroids
+        self.lists = [np.flatnonzero(assignment == c) for c in range(nlist)]
+        self.aggregations = 0
+        self.last_knn_ids = []
+
+    def _hit(self, i, score):
+        return {"_id": f"doc_{i}", "_score": float(score), "_source": {
+            "text": f"ticket {i}", "source": "support_log", "ticket_id": f"T-{i}",
+            "metadata": {"product_purchased": str(self.products[i])}
+        }}
+
+    def _mask(self, filter_clause):
+        return self.products == filter_clause["term"][FILTER_FIELD]
+
+    def _ann(self, vector, k, mask=None):
+        """(doc ids, vectors scored) probing the lists nearest the query; mask filters during the scan"""
+        nprobe = min(len(self.lists), max(1, math.ceil(k * self.probes_per_k)))
+        probed = np.concatenate([self.lists[c] for c in np.argsort(-(self.centroids @ vector))[:nprobe]])
+        if mask is not None:
+            probed = probed[mask[probed]]
+        scores = self.vectors[probed] @ vector
+        return probed[np.argsort(-scores)[:k]], len(probed)
+
+    def _execute(self, body):
+        """(response without took, vectors scored)"""
+        if "aggs" in body:
+            self.aggregations += 1
+            count = int(self._mask(body["aggs"]["filtered"]["filter"]).sum())
+            return {"hits": {"total": {"value": len(self.vectors)}, "hits": []},
+                    "aggregations": {"filtered": {"doc_count": count}}}, 0
+        query, size = body["query"], body.get("size", 10)
+        if "script_score" in query:
+            params = query["script_score"]["script"]["params"]
+            vector = np.asarray(params["query_value"])
+            matching = np.flatnonzero(self._mask(query["script_score"]["query"]["bool"]["filter"][0]))
+            scores = self.vectors[matching] @ vector
+            ids, scored = matching[np.argsort(-scores)[:size]], len(matching)
+        elif "knn" in query:
+            spec = next(iter(query["knn"].values()))
+            mask = self._mask(spec["filter"]) if "filter" in spec else None
+            vector = np.asarray(spec["vector"])
+            ids, scored = self._ann(vector, spec["k"], mask)
+            ids = ids[:size]
+        elif "bool" in query and "knn" in query["bool"]["must"][0]:
+            spec = next(iter(query["bool"]["must"][0]["knn"].values()))
+            vector = np.asarray(spec["vector"])
+            ids, scored = self._ann(vector, spec["k"])
+            ids = ids[self._mask(query["bool"]["filter"][0])[ids]][:size]
+        else:
+            return {"hits": {"total": {"value": 0}, "hits": []}}, 0
+        self.last_knn_ids = [f"doc_{i}" for i in ids]
+        hits = [self._hit(i, 1 + self.vectors[i] @ vector) for i in ids]
+        return {"hits": {"total": {"value": len(hits)}, "hits": hits}}, scored
+
+    def _latency(self, scored):
+        return self.base_ms + scored * self.vector_us / 1000
+
+    def search(self, index=None, body=None, **kwargs):
+        response, scored = self._execute(body)
+        response["took"] = self._latency(scored)
+        time.sleep(response["took"] / 1000)
+        return response
+
+    def msearch(self, body, index=None, **kwargs):
+        responses = []
+        for search_body in body[1::2]:
+            response, scored = self._execute(search_body)
+            response["took"] = self._latency(scored)
+            responses.append(response)
+        time.sleep(max(r["took"] for r in responses) / 1000)
+        return {"responses": responses}
+
+def build_corpus(args):
+    rng = np.random.default_rng(args.seed)
+    centres = rng.normal(size=(args.clusters, args.dimension))
+    vectors = centres[rng.integers(args.clusters, size=args.docs)] + rng.normal(scale=args.spread, size=(args.docs, args.dimension))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    weights = 1 / np.arange(1, args.products + 1) ** args.zipf
+    products = [f"Product {p}" for p in rng.choice(args.products, size=args.docs, p=weights / weights.sum())]
+    queries = centres[rng.integers(args.clusters, size=args.queries)] + rng.normal(scale=args.spread, size=(args.queries, args.dimension))
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return vectors.astype(np.float32), products, queries
+
+def main():
+    parser = argparse.ArgumentParser(description="Post-filtered vs efficient filtered kNN for product_filter")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=64)
+    parser.add_argument("--clusters", type=int, default=40)
+    parser.add_argument("--spread", type=float, default=0.6, help="Noise around cluster centres")
+    parser.add_argument("--products", type=int, default=30)
+    parser.add_argument("--zipf", type=float, default=1.2)
+    parser.add_argument("--nlist", type=int, default=64, help="IVF lists in the fake ANN index")
+    parser.add_argument("--probes-per-k", type=float, default=0.2, help="Lists probed per unit of k")
+    parser.add_argument("--base-ms", type=float, default=5.0, help="Assumed fixed cost per search")
+    parser.add_argument("--vector-us", type=float, default=2.0, help="Assumed cost per vector scored")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--max-results", type=int, default=5)
+    parser.add_argument("--exact-max-docs", type=int, default=2000, help="FILTERED_KNN_EXACT_MAX_DOCS for efficient")
+    parser.add_argument("--seed", type=int, default=21)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_local_aws_env(OPENSEARCH_DOMAIN="bench.local", OPENSEARCH_INDEX="bench-index",
+                      SEARCH_RESULTS_BUCKET=BUCKET, COMPACT_DIMENSION=0)
+    vectors, products, queries = build_corpus(args)
+    counts = collections.Counter(products)
+    ranked = [p for p, _ in counts.most_common()]
+    classes = {"common": ranked[0], "mid": ranked[len(ranked) // 4], "rare": ranked[-1]}
+    configs = {"post_filter": ("post_filter", args.exact_max_docs), "efficient": ("efficient", args.exact_max_docs),
+               "approximate": ("efficient", 0), "exact": ("efficient", args.docs)}
+
+    results = []
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr):
+        boto3.client("s3").create_bucket(
+            Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]}
+        )
+        search = load_lambda("retrieval", "aai_hybrid_search_fusion")
+        opensearch = VectorIndexOpenSearch(vectors, products, args.nlist, args.probes_per_k,
+                                           args.base_ms, args.vector_us, args.seed)
+        search.get_opensearch_client = lambda **kw: opensearch
+        k = args.max_results * search.COLLAPSE_DEPTH_FACTOR
+
+        for product_class, product in classes.items():
+            mask = np.array(products) == product
+            matching = np.flatnonzero(mask)
+            truth = [{f"doc_{i}" for i in matching[np.argsort(-(vectors[matching] @ q))[:k]]} for q in queries]
+            for config, (mode, exact_max_docs) in configs.items():
+                search.FILTERED_KNN_EXACT_MAX_DOCS = exact_max_docs
+                # Each config starts with a cold filter cardinality cache
+                search.filter_stats_cache.clear()
+                aggregations_before = opensearch.aggregations
+                stats = collections.defaultdict(list)
+                for i, query in enumerate(queries):
+                    response = search.lambda_handler({
+                        "query_id": f"bench-{product_class}-{config}-{i}", "user_query": "battery drains",
+                        "queryEmbedding": query.tolist(), "max_results": args.max_results,
+                        "product_filter": product, "filtered_knn_mode": mode
+                    }, None)
+                    if response["statusCode"] != 200:
+                        raise RuntimeError(response["error"])
+                    monitoring = response["monitoring"]
+                    knn_filter = monitoring["knn_filter"]
+                    stats["hits"].append(monitoring["knn_results"])
+                    stats["recall"].append(len(set(opensearch.last_knn_ids) & truth[i]) / len(truth[i]))
+                    stats["underfilled"].append(monitoring["knn_results"] < len(truth[i]))
+                    stats["expansions"].append(knn_filter.get("expansions", 0))
+                    stats["knn_ms"].append(monitoring["knn_time_ms"])
+                    stats["search_ms"].append(monitoring["search_time_ms"])
+                    strategy = knn_filter["strategy"]
+                results.append({
+                    "product_class": product_class,
+                    "filter_cardinality": int(mask.sum()),
+                    "selectivity": float(mask.mean()),
+                    "config": config,
+                    "strategy": strategy,
+                    "hits_wanted": min(k, int(mask.sum())),
+                    "mean_knn_hits": statistics.mean(stats["hits"]),
+                    "underfilled_rate": statistics.mean(stats["underfilled"]),
+                    f"recall_at_{k}": statistics.mean(stats["recall"]),
+                    "mean_expansions": statistics.mean(stats["expansions"]),
+                    "cardinality_lookups": opensearch.aggregations - aggregations_before,
+                    "knn_p50_ms": statistics.median(stats["knn_ms"]),
+                    "knn_p95_ms": percentile(stats["knn_ms"], 95),
+                    "search_p50_ms": statistics.median(stats["search_ms"])
+                })
+                print(f"{product_class}/{config} ({strategy}): {results[-1]['mean_knn_hits']:.1f} hits, "
+                      f"recall {results[-1][f'recall_at_{k}']:.2f}, p50 {results[-1]['knn_p50_ms']:.1f} ms",
+                      file=sys.stderr)
+
+    output = json.dumps({
+        "benchmark": "filtered_knn",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
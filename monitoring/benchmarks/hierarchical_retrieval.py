@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Hierarchical Retrieval Benchmark
+Runs aai_hybrid_search_fusion in-process with flat search and with HIERARCHICAL_SEARCH (source
+centroids first, then only their chunks) over the chunk_collapse.py corpus grown to --scales
+times its size.
+
+Scaling: replica r of the corpus repeats every chunk with its LSA vector perturbed by
+--replica-noise. Replicated documents are new documents (source "<key>#r"); replicated tickets
+are new tickets ("<id>#r") in the same product/type ticket cluster, so documents add sources while
+ticket clusters grow, as they would with more ingested tickets. Source centroids are built from the
+chunks with aai_source_index.source_group and centroid, as aai_store_opensearch does. Replicated
+documents are near-duplicates, so at scale the top sources are spent on copies of the few nearest
+guides (distinct_documents_selected): the documents figures of hierarchical mode at 10x/100x are a
+lower bound for a corpus of distinct documents.
+
+Modelled costs (assumptions, not measurements), applied as sleeps like index_partitions.py:
+BM25 --base-ms + --posting-us per posting of the query terms, and with a filter --posting-us per
+matching doc plus the postings that fall inside the filter; HNSW kNN --base-ms + --vector-us *
+max(k, --ef) * log2(docs); exact knn_score --vector-us per matching doc; filtered HNSW the HNSW cost
+divided by the filter selectivity, capped at the exact cost.
+
+Query sets (graded at the base ticket/document, replicas count as the original):
+  - tickets:   "<subject> <product>" phrasings (nDCG@k as in index_partitions.py)
+  - documents: passages quoted from a guide document (hit@k / MRR of that document)
+
+Reports relevance, search stage p50/p95, chunks searched and kNN strategy per scale and mode.
+
+Usage:
+    python monitoring/benchmarks/hierarchical_retrieval.py --scales 1,10,100 --queries 40
+"""
+
+import argparse
+import collections
+import contextlib
+import csv
+import json
+import math
+import os
+import statistics
+import sys
+import time
+
+import boto3
+import numpy as np
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import load_lambda, use_local_aws_env
+from adaptive_rerank import Bm25, Lsa, ndcg, tokenize
+from chunk_collapse import TICKETS_CSV, build_corpus
+from index_partitions import build_queries, label_subjects, query_vector
+
+BUCKET = "bench-search-results"
+INDEX = "bench-index"
+FILTER_FIELDS = ["source", "metadata.product_purchased", "metadata.type"]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def replica(chunk, r):
+    """Chunk as replica r of the corpus stores it"""
+    if not r:
+        return chunk
+    doc = dict(chunk)
+    if doc["source"] == "support_log":
+        doc["ticket_id"] = f"{doc['ticket_id']}#{r}"
+    else:
+        doc["source"] = f"{doc['source']}#{r}"
+    return doc
+
+def base_key(key):
+    return key.split("#", 1)[0]
+
+class ScaledOpenSearch:
+    """search/msearch stand-in over a replicated chunk index and its source centroid index"""
+
+    def __init__(self, chunks, bm25, vectors, scale, source_index, source_group, centroid, args):
+        self.chunks = chunks
+        self.bm25 = bm25
+        self.vectors = vectors
+        self.scale = scale
+        self.source_index = source_index
+        self.args = args
+        self.postings = collections.Counter(term for d in bm25.docs for term in d)
+
+        # Every filterable field is constant within a source group, so filters are evaluated per
+        # group and broadcast to the chunks
+        group_ids, self.groups, fields = {}, [], []
+        chunk_group = []
+        for r in range(scale):
+            for chunk in chunks:
+                doc = replica(chunk, r)
+                group_id, group = source_group(doc)
+                if group_id not in group_ids:
+                    group_ids[group_id] = len(self.groups)
+                    self.groups.append(group)
+                    metadata = doc.get("metadata") or {}
+                    fields.append([doc["source"], metadata.get("product_purchased"), metadata.get("type")])
+                chunk_group.append(group_ids[group_id])
+        self.chunk_group = np.array(chunk_group)
+        self.group_fields = {name: np.array([f[i] for f in fields], dtype=object) for i, name in enumerate(FILTER_FIELDS)}
+
+        sums = np.zeros((len(self.groups), vectors.shape[1]))
+        np.add.at(sums, self.chunk_group, vectors)
+        counts = np.bincount(self.chunk_group, minlength=len(self.groups))
+        for group, vector_sum, count in zip(self.groups, sums, counts):
+            group["chunk_count"] = int(count)
+            group["embedding"] = centroid(vector_sum.tolist(), int(count), True)
+        self.centroids = np.array([g["embedding"] for g in self.groups], dtype=np.float32)
+        self.selected = []
+
+    def _group_mask(self, clause):
+        if "terms" in clause:
+            field, values = next(iter(clause["terms"].items()))
+            return np.isin(self.group_fields[field], values)
+        if "term" in clause:
+            field, value = next(iter(clause["term"].items()))
+            return self.group_fields[field] == value
+        spec = clause["bool"]
+        mask = np.ones(len(self.groups), dtype=bool)
+        for sub in spec.get("filter", []):
+            mask &= self._group_mask(sub)
+        if spec.get("should"):
+            mask &= np.logical_or.reduce([self._group_mask(sub) for sub in spec["should"]])
+        return mask
+
+    def _mask(self, filters):
+        if not filters:
+            return None
+        mask = np.ones(len(self.groups), dtype=bool)
+        for clause in filters:
+            mask &= self._group_mask(clause)
+        return mask[self.chunk_group]
+
+    def _top(self, scores, mask, size):
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        size = min(size, len(scores))
+        top = np.argpartition(-scores, size - 1)[:size]
+        return [int(j) for j in top[np.argsort(-scores[top])] if np.isfinite(scores[j]) and scores[j] > 0]
+
+    def _hit(self, j, score):
+        base = len(self.chunks)
+        return {"_index": INDEX, "_id": f"chunk_{j}", "_score": float(score),
+                "_source": replica(self.chunks[j % base], j // base)}
+
+    def _search_sources(self, body):
+        spec = body["query"]["knn"]["embedding"]
+        scores = self.centroids @ np.asarray(spec["vector"], dtype=np.float32)
+        top = np.argsort(-scores)[:body["size"]]
+        hits = [{"_id": str(i), "_score": float(1 + scores[i]),
+                 "_source": {k: v for k, v in self.groups[i].items() if k != "embedding"}} for i in top]
+        self.selected = [hit["_source"] for hit in hits]
+        visited = max(spec["k"], self.args.ef) * math.log2(max(len(self.groups), 2))
+        return hits, self.args.base_ms + visited * self.args.vector_us / 1000
+
+    def _search_chunks(self, body):
+        args, n = self.args, len(self.vectors)
+        query = body["query"]
+        if "bool" in query and "match" in query["bool"]["must"][0]:
+            text = query["bool"]["must"][0]["match"]["text"]
+            # Replicas repeat the text, so term statistics and scores are the base corpus's
+            scores = np.tile(self.bm25.scores(text), self.scale)
+            mask = self._mask(query["bool"].get("filter"))
+            postings = sum(self.postings[term] for term in set(tokenize(text))) * self.scale
+            if mask is not None:
+                matching = int(mask.sum())
+                postings = matching + postings * matching / n
+            top = self._top(scores, mask, body["size"])
+            return [self._hit(j, scores[j]) for j in top], args.base_ms + postings * args.posting_us / 1000
+        if "script_score" in query:
+            params = query["script_score"]["script"]["params"]
+            mask = self._mask(query["script_score"]["query"]["bool"]["filter"])
+            scores = 1 + self.vectors @ np.asarray(params["query_value"], dtype=np.float32)
+            top = self._top(scores, mask, body["size"])
+            return [self._hit(j, scores[j]) for j in top], args.base_ms + mask.sum() * args.vector_us / 1000
+        spec = next(iter(query["knn"].values()))
+        mask = self._mask([spec["filter"]] if "filter" in spec else None)
+        scores = 1 + self.vectors @ np.asarray(spec["vector"], dtype=np.float32)
+        top = self._top(scores, mask, body["size"])
+        visited = max(spec["k"], args.ef) * math.log2(max(n, 2))
+        if mask is not None:
+            matching = int(mask.sum())
+            visited = min(visited * n / max(matching, 1), matching)
+        return [self._hit(j, scores[j]) for j in top], args.base_ms + visited * args.vector_us / 1000
+
+    def _execute(self, index, body):
+        if index == self.source_index:
+            hits, took = self._search_sources(body)
+        else:
+            hits, took = self._search_chunks(body)
+        return {"took": took, "hits": {"total": {"value": len(self.vectors)}, "hits": hits}}
+
+    def _sleep_until(self, start, took):
+        """Modelled latency, less the time this fake already spent computing the answer"""
+        time.sleep(max(0.0, took / 1000 - (time.time() - start)))
+
+    def search(self, index=None, body=None, **kwargs):
+        start = time.time()
+        response = self._execute(index, body)
+        self._sleep_until(start, response["took"])
+        return response
+
+    def msearch(self, body, index=None, **kwargs):
+        start = time.time()
+        responses = [self._execute(header["index"], search) for header, search in zip(body[0::2], body[1::2])]
+        self._sleep_until(start, max(r["took"] for r in responses))
+        return {"responses": responses}
+
+def main():
+    parser = argparse.ArgumentParser(description="Flat vs hierarchical (source-first) retrieval as the corpus grows")
+    parser.add_argument("--scales", default="1,10,100", help="Corpus size multiples")
+    parser.add_argument("--tickets", type=int, default=3000)
+    parser.add_argument("--docs-per-subject", type=int, default=2)
+    parser.add_argument("--doc-chars", type=int, default=12000)
+    parser.add_argument("--queries", type=int, default=40, help="Queries per query set")
+    parser.add_argument("--max-results", type=int, default=5)
+    parser.add_argument("--top-sources", type=int, default=20, help="HIERARCHICAL_TOP_SOURCES")
+    parser.add_argument("--passage-words", type=int, default=8)
+    parser.add_argument("--lsa-dimension", type=int, default=64)
+    parser.add_argument("--replica-noise", type=float, default=0.1, help="Norm of the noise added to replica vectors")
+    parser.add_argument("--base-ms", type=float, default=3.0, help="Assumed fixed cost per search")
+    parser.add_argument("--posting-us", type=float, default=0.5, help="Assumed BM25 cost per posting")
+    parser.add_argument("--vector-us", type=float, default=2.0, help="Assumed cost per vector compared")
+    parser.add_argument("--ef", type=int, default=100, help="HNSW ef_search of the cost model")
+    parser.add_argument("--seed", type=int, default=9)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_local_aws_env(OPENSEARCH_DOMAIN="bench.local", OPENSEARCH_INDEX=INDEX, SEARCH_RESULTS_BUCKET=BUCKET,
+                      NORMALIZE_EMBEDDINGS="true", HIERARCHICAL_TOP_SOURCES=args.top_sources)
+    results = []
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr):
+        boto3.client("s3").create_bucket(
+            Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]}
+        )
+        preprocess = load_lambda("ingestion", "aai_preprocess_csv")
+        search = load_lambda("retrieval", "aai_hybrid_search_fusion")
+        from aai_candidate_envelope import load_candidates
+        from aai_source_index import centroid, source_group, source_index
+        chunks, subjects, products = build_corpus(preprocess, args.tickets, args.docs_per_subject, args.doc_chars)
+        label_subjects(chunks, subjects)
+        # build_corpus keeps only the product; ticket clusters also need the ticket type
+        with open(TICKETS_CSV, newline="", encoding="utf-8") as f:
+            ticket_types = {row["Ticket ID"]: row["Ticket Type"] for row in csv.DictReader(f)}
+        for c in chunks:
+            if c["source"] == "support_log":
+                c["metadata"]["type"] = ticket_types[c["ticket_id"]]
+        queries = [q for q in build_queries(chunks, subjects, products, args.queries, args.passage_words, args.seed)
+                   if q[0] != "product"]
+        bm25 = Bm25([c["text"] for c in chunks])
+        lsa = Lsa([c["text"] for c in chunks], args.lsa_dimension)
+        rng = np.random.default_rng(args.seed)
+
+        for scale in [int(s) for s in args.scales.split(",")]:
+            vectors = np.tile(lsa.vectors, (scale, 1))
+            noise = rng.normal(size=vectors[len(chunks):].shape).astype(np.float32)
+            noise *= args.replica_noise / np.linalg.norm(noise, axis=1, keepdims=True)
+            vectors[len(chunks):] += noise
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            opensearch = ScaledOpenSearch(chunks, bm25, vectors, scale, source_index(INDEX),
+                                          source_group, centroid, args)
+            search.get_opensearch_client = lambda **kw: opensearch
+            for mode in ("flat", "hierarchical"):
+                stats = collections.defaultdict(list)
+                for i, (query_set, text, _, grades) in enumerate(queries):
+                    response = search.lambda_handler({
+                        "query_id": f"bench-{scale}-{mode}-{i}", "user_query": text,
+                        "queryEmbedding": query_vector(lsa, text).tolist(),
+                        "max_results": args.max_results, "hierarchical": mode == "hierarchical"
+                    }, None)
+                    if response["statusCode"] != 200:
+                        raise RuntimeError(response["error"])
+                    ranked = [base_key(search.collapse_key(hit)) for hit, _ in load_candidates(response, search.s3, BUCKET)]
+                    if query_set == "documents":
+                        target = next(iter(grades))
+                        rank = ranked.index(target) + 1 if target in ranked else None
+                        stats["documents_hit"].append(bool(rank and rank <= args.max_results))
+                        stats["documents_rr"].append(1 / rank if rank else 0.0)
+                    else:
+                        stats["tickets_ndcg"].append(ndcg(ranked, grades, args.max_results))
+                    monitoring = response["monitoring"]
+                    stats["ms"].append(monitoring["search_time_ms"])
+                    stats["bm25_ms"].append(monitoring["bm25_time_ms"])
+                    stats["knn_ms"].append(monitoring["knn_time_ms"])
+                    hierarchy = monitoring["hierarchy"]
+                    stats["chunks"].append(hierarchy["selected_chunks"] if hierarchy["enabled"] else len(vectors))
+                    stats["select_ms"].append(hierarchy.get("select_time_ms", 0))
+                    if hierarchy["enabled"]:
+                        stats["distinct_documents"].append(len({base_key(g["source"]) for g in opensearch.selected
+                                                                if g["kind"] == "documents"}))
+                    stats["strategy"].append((monitoring["knn_filter"] or {}).get("strategy", "unfiltered"))
+                result = {
+                    "scale": scale,
+                    "mode": mode,
+                    "corpus_chunks": len(vectors),
+                    "source_docs": len(opensearch.groups),
+                    f"tickets_ndcg_at_{args.max_results}": statistics.mean(stats["tickets_ndcg"]),
+                    f"documents_hit_at_{args.max_results}": statistics.mean(stats["documents_hit"]),
+                    "documents_mrr": statistics.mean(stats["documents_rr"]),
+                    "search_p50_ms": statistics.median(stats["ms"]),
+                    "search_p95_ms": percentile(stats["ms"], 95),
+                    "bm25_p50_ms": statistics.median(stats["bm25_ms"]),
+                    "knn_p50_ms": statistics.median(stats["knn_ms"]),
+                    "source_select_p50_ms": statistics.median(stats["select_ms"]),
+                    "mean_chunks_searched": statistics.mean(stats["chunks"]),
+                    "distinct_documents_selected": statistics.mean(stats["distinct_documents"] or [0]),
+                    "knn_strategies": dict(collections.Counter(stats["strategy"]))
+                }
+                results.append(result)
+                print(f"x{scale} {mode}: p50 {result['search_p50_ms']:.1f} ms over "
+                      f"{result['mean_chunks_searched']:.0f} chunks, documents MRR {result['documents_mrr']:.2f}",
+                      file=sys.stderr)
+
+    output = json.dumps({
+        "benchmark": "hierarchical_retrieval",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "base_corpus_chunks": len(chunks),
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
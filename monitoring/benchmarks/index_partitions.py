@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Index Partitioning Benchmark
+Runs aai_hybrid_search_fusion in-process with INDEX_PARTITIONING none, source and
+source_product over the chunk_collapse.py corpus (chunked sample tickets plus long multi-chunk
+documents), routing each chunk with aai_index_partitions.partition_index as
+aai_store_opensearch does.
+
+The fake OpenSearch keeps one BM25 model (own term statistics, from adaptive_rerank.py) per
+index and a shared LSA embedding for the kNN leg. Modelled costs (assumptions, not measurements),
+applied as sleeps: BM25 --base-ms + --posting-us per posting of the query terms in the index; HNSW
+kNN --base-ms + --vector-us * max(k, --ef) * log2(index docs); exact knn_score --vector-us per
+matching doc. _msearch sub-searches run side by side, so a fan-out costs its slowest search.
+
+Query sets:
+  - tickets:   "<subject> <product>" phrasings; a ticket scores 2 when subject and product match,
+               1 when the subject does, and its subject's guide documents 1 (nDCG@k)
+  - documents: passages quoted from a guide document (hit@k / MRR of that document)
+  - product:   ticket queries with product_filter (nDCG@k)
+
+Reports relevance, search stage p50/p95 and searches per query for each partitioning.
+
+Usage:
+    python monitoring/benchmarks/index_partitions.py --queries 60 --max-results 5
+"""
+
+import argparse
+import collections
+import contextlib
+import csv
+import fnmatch
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+import boto3
+import numpy as np
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import load_lambda, use_local_aws_env
+from adaptive_rerank import TEMPLATES, Bm25, Lsa, ndcg, tokenize
+from chunk_collapse import TICKETS_CSV, build_corpus
+
+BUCKET = "bench-search-results"
+INDEX = "bench-index"
+FILTER_FIELD = "metadata.product_purchased"
+MODES = ["none", "source", "source_product"]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+class PartitionedOpenSearch:
+    """search/msearch stand-in over several indices, each with its own BM25 statistics"""
+
+    def __init__(self, chunks, routing, lsa, args):
+        self.chunks = chunks
+        self.lsa = lsa
+        self.args = args
+        self.indices = {}
+        for name in sorted(set(routing)):
+            members = np.array([i for i, r in enumerate(routing) if r == name])
+            bm25 = Bm25([chunks[i]["text"] for i in members])
+            products = np.array([chunks[i]["metadata"].get("product_purchased", "") for i in members])
+            postings = collections.Counter(term for d in bm25.docs for term in d)
+            self.indices[name] = {"members": members, "bm25": bm25, "products": products, "postings": postings}
+        self.searches = 0
+
+    def _resolve(self, index):
+        return [name for name in self.indices if fnmatch.fnmatch(name, index)]
+
+    def _mask(self, entry, filters):
+        mask = np.ones(len(entry["members"]), dtype=bool)
+        for clause in filters or []:
+            mask &= entry["products"] == clause["term"][FILTER_FIELD]
+        return mask
+
+    def _hits(self, entry, scores, mask, size):
+        ranked = [i for i in np.argsort(-scores) if mask[i] and scores[i] > 0][:size]
+        return [(float(scores[i]), entry["members"][i]) for i in ranked]
+
+    def _search_one(self, entry, body):
+        """([(score, chunk)], modelled ms) within one index"""
+        args, n = self.args, len(entry["members"])
+        if "aggs" in body:
+            return [], args.base_ms
+        query = body["query"]
+        if "bool" in query and "match" in query["bool"]["must"][0]:
+            text = query["bool"]["must"][0]["match"]["text"]
+            bm25 = entry["bm25"]
+            postings = sum(entry["postings"][term] for term in set(tokenize(text)))
+            hits = self._hits(entry, bm25.scores(text), self._mask(entry, query["bool"].get("filter")), body["size"])
+            return hits, args.base_ms + postings * args.posting_us / 1000
+        vectors = self.lsa.vectors[entry["members"]]
+        if "script_score" in query:
+            params = query["script_score"]["script"]["params"]
+            mask = self._mask(entry, query["script_score"]["query"]["bool"]["filter"])
+            hits = self._hits(entry, 1 + vectors @ np.asarray(params["query_value"]), mask, body["size"])
+            return hits, args.base_ms + mask.sum() * args.vector_us / 1000
+        if "bool" in query:
+            spec = next(iter(query["bool"]["must"][0]["knn"].values()))
+            filters = query["bool"]["filter"]
+        else:
+            spec = next(iter(query["knn"].values()))
+            filters = [spec["filter"]] if "filter" in spec else []
+        hits = self._hits(entry, 1 + vectors @ np.asarray(spec["vector"]), self._mask(entry, filters), body["size"])
+        visited = max(spec["k"], self.args.ef) * math.log2(max(n, 2))
+        return hits, args.base_ms + visited * args.vector_us / 1000
+
+    def _execute(self, index, body):
+        self.searches += 1
+        names = self._resolve(index)
+        results, took = [], 0.0
+        for name in names:
+            hits, ms = self._search_one(self.indices[name], body)
+            results += [(score, chunk, name) for score, chunk in hits]
+            took = max(took, ms)
+        results.sort(key=lambda r: r[0], reverse=True)
+        hits = [{"_index": name, "_id": f"chunk_{chunk}", "_score": score, "_source": dict(self.chunks[chunk])}
+                for score, chunk, name in results[:body.get("size", 10)]]
+        response = {"took": took or self.args.base_ms, "hits": {"total": {"value": sum(
+            len(self.indices[n]["members"]) for n in names)}, "hits": hits}}
+        if "aggs" in body:
+            count = sum(int(self._mask(self.indices[n], [body["aggs"]["filtered"]["filter"]]).sum()) for n in names)
+            response["aggregations"] = {"filtered": {"doc_count": count}}
+        return response
+
+    def _sleep_until(self, start, took):
+        """Modelled latency, less the time this fake already spent computing the answer"""
+        time.sleep(max(0.0, took / 1000 - (time.time() - start)))
+
+    def search(self, index=None, body=None, **kwargs):
+        start = time.time()
+        response = self._execute(index, body)
+        self._sleep_until(start, response["took"])
+        return response
+
+    def msearch(self, body, index=None, **kwargs):
+        start = time.time()
+        responses = [self._execute(header["index"], search) for header, search in zip(body[0::2], body[1::2])]
+        self._sleep_until(start, max(r["took"] for r in responses))
+        return {"responses": responses}
+
+def label_subjects(chunks, subjects):
+    """Ticket subject per chunk: from the CSV for tickets, from the file name for guides"""
+    with open(TICKETS_CSV, newline="", encoding="utf-8") as f:
+        by_ticket = {row["Ticket ID"]: row["Ticket Subject"] for row in csv.DictReader(f)}
+    by_slug = {s.lower().replace(" ", "_"): s for s in subjects}
+    for c in chunks:
+        if c["source"] == "support_log":
+            c["subject"] = by_ticket[c["ticket_id"]]
+        else:
+            c["subject"] = by_slug[c["source"].split("/")[-1].rsplit("_guide_", 1)[0]]
+
+def query_vector(lsa, text):
+    """The LSA embedding Lsa.scores compares against, as the query embedding stage would return it"""
+    row = np.zeros((1, len(lsa.vocab)), dtype=np.float32)
+    for term, tf in collections.Counter(tokenize(text)).items():
+        if term in lsa.vocab:
+            row[0, lsa.vocab[term]] = (1 + math.log(tf)) * lsa.idf[lsa.vocab[term]]
+    return lsa.embed_rows(row)[0]
+
+def build_queries(chunks, subjects, products, count, passage_words, seed):
+    rng = random.Random(seed)
+    guides = [c for c in chunks if c["source"] != "support_log"]
+    queries = []
+    for i in range(count):
+        subject, product = rng.choice(subjects), rng.choice(products)
+        grades = {}
+        for c in chunks:
+            if c["source"] == "support_log" and c["subject"] == subject:
+                grades[c["ticket_id"]] = 2 if c["metadata"]["product_purchased"] == product else 1
+            elif c["subject"] == subject:
+                grades[c["source"]] = 1
+        text = rng.choice(TEMPLATES).format(subject=subject.lower(), product=product)
+        queries.append(("tickets", text, None, grades))
+        queries.append(("product", text, product, {k: g for k, g in grades.items() if g == 2}))
+        guide = rng.choice(guides)
+        words = guide["text"].split()
+        start = rng.randrange(max(1, len(words) - passage_words))
+        queries.append(("documents", " ".join(words[start:start + passage_words]), None, {guide["source"]: 1}))
+    return queries
+
+def main():
+    parser = argparse.ArgumentParser(description="Single index vs source/product partitioned indexes")
+    parser.add_argument("--tickets", type=int, default=3000)
+    parser.add_argument("--docs-per-subject", type=int, default=2)
+    parser.add_argument("--doc-chars", type=int, default=12000)
+    parser.add_argument("--queries", type=int, default=60, help="Queries per query set")
+    parser.add_argument("--max-results", type=int, default=5)
+    parser.add_argument("--passage-words", type=int, default=8)
+    parser.add_argument("--lsa-dimension", type=int, default=64)
+    parser.add_argument("--base-ms", type=float, default=3.0, help="Assumed fixed cost per search")
+    parser.add_argument("--posting-us", type=float, default=0.5, help="Assumed BM25 cost per posting")
+    parser.add_argument("--vector-us", type=float, default=2.0, help="Assumed cost per vector compared")
+    parser.add_argument("--ef", type=int, default=100, help="HNSW ef_search of the cost model")
+    parser.add_argument("--seed", type=int, default=9)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_local_aws_env(OPENSEARCH_DOMAIN="bench.local", OPENSEARCH_INDEX=INDEX, SEARCH_RESULTS_BUCKET=BUCKET)
+    results = []
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr):
+        boto3.client("s3").create_bucket(
+            Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]}
+        )
+        preprocess = load_lambda("ingestion", "aai_preprocess_csv")
+        search = load_lambda("retrieval", "aai_hybrid_search_fusion")
+        import aai_index_partitions
+        from aai_candidate_envelope import load_candidates
+        chunks, subjects, products = build_corpus(preprocess, args.tickets, args.docs_per_subject, args.doc_chars)
+        label_subjects(chunks, subjects)
+        queries = build_queries(chunks, subjects, products, args.queries, args.passage_words, args.seed)
+        lsa = Lsa([c["text"] for c in chunks], args.lsa_dimension)
+
+        for mode in MODES:
+            routing = [aai_index_partitions.partition_index(INDEX, c, mode) for c in chunks]
+            opensearch = PartitionedOpenSearch(chunks, routing, lsa, args)
+            search.get_opensearch_client = lambda **kw: opensearch
+            search.INDEX_PARTITIONING = mode
+            search.search_partitions = lambda index, product=None, types=None, mode=mode: (
+                aai_index_partitions.search_partitions(index, product, types, mode))
+            search.filter_stats_cache.clear()
+            stats = collections.defaultdict(list)
+            for i, (query_set, text, product, grades) in enumerate(queries):
+                searches_before = opensearch.searches
+                response = search.lambda_handler({
+                    "query_id": f"bench-{mode}-{i}", "user_query": text,
+                    "queryEmbedding": query_vector(lsa, text).tolist(),
+                    "max_results": args.max_results, "product_filter": product
+                }, None)
+                if response["statusCode"] != 200:
+                    raise RuntimeError(response["error"])
+                ranked = [search.collapse_key(hit) for hit, _ in load_candidates(response, search.s3, BUCKET)]
+                if query_set == "documents":
+                    target = next(iter(grades))
+                    rank = ranked.index(target) + 1 if target in ranked else None
+                    stats[f"{query_set}_hit"].append(bool(rank and rank <= args.max_results))
+                    stats[f"{query_set}_rr"].append(1 / rank if rank else 0.0)
+                else:
+                    stats[f"{query_set}_ndcg"].append(ndcg(ranked, grades, args.max_results))
+                stats[f"{query_set}_ms"].append(response["monitoring"]["search_time_ms"])
+                stats[f"{query_set}_searches"].append(opensearch.searches - searches_before)
+            result = {"partitioning": mode, "indices": len(opensearch.indices),
+                      "largest_index_docs": max(len(e["members"]) for e in opensearch.indices.values())}
+            for query_set in ("tickets", "documents", "product"):
+                if query_set == "documents":
+                    result[f"documents_hit_at_{args.max_results}"] = statistics.mean(stats["documents_hit"])
+                    result["documents_mrr"] = statistics.mean(stats["documents_rr"])
+                else:
+                    result[f"{query_set}_ndcg_at_{args.max_results}"] = statistics.mean(stats[f"{query_set}_ndcg"])
+                result[f"{query_set}_search_p50_ms"] = statistics.median(stats[f"{query_set}_ms"])
+                result[f"{query_set}_search_p95_ms"] = percentile(stats[f"{query_set}_ms"], 95)
+                result[f"{query_set}_searches_per_query"] = statistics.mean(stats[f"{query_set}_searches"])
+            results.append(result)
+            print(f"{mode}: {result['indices']} indices, documents MRR {result['documents_mrr']:.2f}, "
+                  f"tickets p50 {result['tickets_search_p50_ms']:.1f} ms", file=sys.stderr)
+
+    output = json.dumps({
+        "benchmark": "index_partitions",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "corpus_chunks": len(chunks),
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Index Snapshot Round-Trip Benchmark
+Creates the index with aai_create_opensearch_index, stores the chunk_collapse.py corpus (chunked
+sample tickets plus long documents, random --dimension vectors) with aai_store_opensearch, exports
+it with aai_index_snapshot and restores the snapshot into a second index, for INDEX_PARTITIONING
+none, source and source_product. OpenSearch is an in-memory stand-in implementing the index,
+template, scroll and bulk APIs those functions use (no latency model); S3 is moto.
+
+Checks the round trip (the benchmark fails otherwise): every chunk is restored under the same _id
+into the partition of the same name under the restored index, with the same fields and float32
+vector, every restored index has the exported mapping, load settings are undone, and a
+partitioned restore leaves the partition template in place for later ingestion.
+
+Reports docs, partitions, snapshot shards and bytes, and export / restore time per partitioning.
+
+Usage:
+    python monitoring/benchmarks/index_snapshot.py --tickets 1000 --dimension 64
+"""
+
+import argparse
+import contextlib
+import copy
+import fnmatch
+import importlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import types
+
+import boto3
+from moto import mock_aws
+from opensearchpy.serializer import JSONSerializer
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import load_lambda, use_local_aws_env
+from chunk_collapse import build_corpus
+
+BUCKET = "bench-raw-data"
+INDEX = "bench-index"
+TARGET = "bench-restored"
+EMBEDDINGS_KEY = "processed/embeddings/bench.json"
+MODES = ["none", "source", "source_product"]
+
+class InMemoryIndices:
+    def __init__(self, client):
+        self.client = client
+
+    def exists(self, index):
+        return index in self.client.indices_data
+
+    def get(self, index, allow_no_indices=False, **kwargs):
+        return {name: {} for name in self.client.resolve(index)}
+
+    def create(self, index, body=None, **kwargs):
+        if index in self.client.indices_data:
+            raise ValueError(f"resource_already_exists_exception: {index}")
+        body = copy.deepcopy(body or {})
+        settings = body.get("settings", {})
+        # OpenSearch reports every setting under "index", including analysis
+        flat = {**{k: v for k, v in settings.items() if k != "index"}, **settings.get("index", {})}
+        self.client.indices_data[index] = {"settings": flat, "mappings": body.get("mappings", {}), "docs": {}}
+        return {"acknowledged": True, "index": index}
+
+    def delete(self, index, **kwargs):
+        if "*" in index:
+            raise ValueError("Wildcard deletes are disabled on this domain")
+        del self.client.indices_data[index]
+        return {"acknowledged": True}
+
+    def get_settings(self, index, **kwargs):
+        return {name: {"settings": {"index": copy.deepcopy(self.client.indices_data[name]["settings"])}}
+                for name in self.client.resolve(index)}
+
+    def get_mapping(self, index, **kwargs):
+        return {name: {"mappings": copy.deepcopy(self.client.indices_data[name]["mappings"])}
+                for name in self.client.resolve(index)}
+
+    def put_settings(self, index, body, **kwargs):
+        for name in self.client.resolve(index):
+            self.client.indices_data[name]["settings"].update(body.get("index", body))
+        return {"acknowledged": True}
+
+    def refresh(self, index=None, **kwargs):
+        return {"_shards": {"failed": 0}}
+
+    def put_index_template(self, name, body, **kwargs):
+        self.client.templates[name] = copy.deepcopy(body)
+        return {"acknowledged": True}
+
+    def get_index_template(self, name, **kwargs):
+        return {"index_templates": [{"name": name, "index_template": copy.deepcopy(self.client.templates[name])}]}
+
+class InMemoryOpenSearch:
+    """Indices, index templates, document writes, scroll and bulk of the opensearch-py client"""
+
+    def __init__(self):
+        self.indices_data = {}
+        self.templates = {}
+        self.scrolls = {}
+        self.lock = threading.Lock()
+        self.indices = InMemoryIndices(self)
+        self.transport = types.SimpleNamespace(serializer=JSONSerializer())
+
+    def resolve(self, pattern):
+        return sorted(name for name in self.indices_data if fnmatch.fnmatchcase(name, pattern))
+
+    def write(self, index, doc_id, source):
+        with self.lock:
+            if index not in self.indices_data:
+                # Created on first write, from the template whose pattern matches
+                template = next((t["template"] for t in self.templates.values()
+                                 if any(fnmatch.fnmatchcase(index, p) for p in t["index_patterns"])), {})
+                self.indices.create(index=index, body=template)
+            self.indices_data[index]["docs"][doc_id] = copy.deepcopy(source)
+
+    def index(self, index, body, id, **kwargs):
+        self.write(index, id, body)
+        return {"_index": index, "_id": id, "result": "created"}
+
+    def bulk(self, body, **kwargs):
+        lines = [json.loads(line) for line in body.splitlines() if line.strip()]
+        items = []
+        for action, source in zip(lines[::2], lines[1::2]):
+            meta = action["index"]
+            self.write(meta["_index"], meta["_id"], source)
+            items.append({"index": {"_index": meta["_index"], "_id": meta["_id"], "status": 201}})
+        return {"errors": False, "items": items}
+
+    def page(self, scroll_id, size):
+        hits, offset = self.scrolls[scroll_id]
+        self.scrolls[scroll_id] = (hits, offset + size)
+        return {"_scroll_id": scroll_id, "_shards": {"total": 1, "successful": 1, "skipped": 0},
+                "hits": {"hits": hits[offset:offset + size]}}
+
+    def search(self, index=None, body=None, scroll=None, size=10, **kwargs):
+        hits = [{"_index": name, "_id": doc_id, "_source": copy.deepcopy(source)}
+                for name in self.resolve(index) for doc_id, source in self.indices_data[name]["docs"].items()]
+        scroll_id = f"scroll-{len(self.scrolls)}"
+        self.scrolls[scroll_id] = (hits, 0)
+        self.scroll_size = size
+        return self.page(scroll_id, size)
+
+    def scroll(self, body=None, **kwargs):
+        return self.page(body["scroll_id"], self.scroll_size)
+
+    def clear_scroll(self, body=None, **kwargs):
+        for scroll_id in body["scroll_id"]:
+            self.scrolls.pop(scroll_id, None)
+        return {"succeeded": True}
+
+def partition_docs(opensearch, index_name):
+    """{(partition suffix, _id): source} of an index and its partitions"""
+    docs = {}
+    for name in opensearch.resolve(index_name) + opensearch.resolve(f"{index_name}-*"):
+        for doc_id, source in opensearch.indices_data[name]["docs"].items():
+            docs[(name[len(index_name):], doc_id)] = source
+    return docs
+
+def check_round_trip(opensearch, mode, index_body):
+    """Problems found comparing the restored index with the exported one"""
+    problems = []
+    exported, restored = partition_docs(opensearch, INDEX), partition_docs(opensearch, TARGET)
+    if set(exported) != set(restored):
+        missing, extra = set(exported) - set(restored), set(restored) - set(exported)
+        problems.append(f"{len(missing)} chunks missing (e.g. {sorted(missing)[:2]}), {len(extra)} unexpected (e.g. {sorted(extra)[:2]})")
+    for key in set(exported) & set(restored):
+        before, after = dict(exported[key]), dict(restored[key])
+        vector_before, vector_after = before.pop("embedding"), after.pop("embedding")
+        if before != after:
+            problems.append(f"{key}: fields differ")
+        elif any(abs(a - b) > 1e-6 * max(1.0, abs(a)) for a, b in zip(vector_before, vector_after)):
+            problems.append(f"{key}: vector differs beyond float32 precision")
+        if len(problems) > 5:
+            break
+    for name in opensearch.resolve(TARGET) + opensearch.resolve(f"{TARGET}-*"):
+        data = opensearch.indices_data[name]
+        if data["mappings"] != index_body["mappings"]:
+            problems.append(f"{name}: mapping differs from the exported one")
+        if data["settings"].get("refresh_interval") == "-1":
+            problems.append(f"{name}: refresh still disabled after the restore")
+    if mode != "none" and f"{TARGET}-partitions" not in opensearch.templates:
+        problems.append("partition template missing after the restore")
+    elif mode != "none" and opensearch.templates[f"{TARGET}-partitions"]["template"] != index_body:
+        problems.append("partition template still carries the load settings")
+    return problems
+
+def run_mode(mode):
+    os.environ["INDEX_PARTITIONING"] = mode
+    # Partition routing is read at import, so the modules are loaded again per mode
+    import aai_index_partitions
+    importlib.reload(aai_index_partitions)
+    create = load_lambda("ingestion", "aai_create_opensearch_index")
+    store = load_lambda("ingestion", "aai_store_opensearch")
+    snapshot = load_lambda("ingestion", "aai_index_snapshot")
+    opensearch = InMemoryOpenSearch()
+    for module in (create, store, snapshot):
+        module.get_opensearch_client = lambda **kw: opensearch
+
+    create.lambda_handler({}, None)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        stored = store.lambda_handler({"bucket": BUCKET, "embeddingKeys": [EMBEDDINGS_KEY]}, None)
+    if stored.get("status") != "stored":
+        raise RuntimeError(f"{mode}: store failed: {stored}")
+
+    start = time.perf_counter()
+    exported = snapshot.lambda_handler({"action": "export", "bucket": BUCKET, "snapshot_id": mode}, None)
+    export_ms = (time.perf_counter() - start) * 1000
+    if exported["statusCode"] != 200:
+        raise RuntimeError(f"{mode}: export failed: {exported.get('body')}")
+    start = time.perf_counter()
+    restored = snapshot.lambda_handler({"action": "restore", "bucket": BUCKET, "target_index": TARGET,
+                                        "snapshot_prefix": exported["snapshot_prefix"]}, None)
+    restore_ms = (time.perf_counter() - start) * 1000
+    if restored["statusCode"] != 200:
+        raise RuntimeError(f"{mode}: restore failed: {restored.get('body')}")
+
+    manifest = snapshot.read_manifest(BUCKET, exported["snapshot_prefix"])
+    problems = check_round_trip(opensearch, mode, manifest["index_body"])
+    if problems:
+        raise RuntimeError(f"{mode}: round trip failed: " + "; ".join(problems))
+    return {
+        "partitioning": mode,
+        "docs": exported["doc_count"],
+        "partitions": len(exported["partitions"]),
+        "restored_partitions": len(restored["partitions"]),
+        "shards": exported["shard_count"],
+        "snapshot_bytes": exported["total_bytes"],
+        "export_ms": export_ms,
+        "restore_ms": restore_ms,
+        "failed": restored["failed_count"]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Index snapshot export and restore round trip per partitioning")
+    parser.add_argument("--tickets", type=int, default=1000)
+    parser.add_argument("--docs-per-subject", type=int, default=2)
+    parser.add_argument("--doc-chars", type=int, default=6000)
+    parser.add_argument("--dimension", type=int, default=64)
+    parser.add_argument("--shard-docs", type=int, default=500, help="SNAPSHOT_SHARD_DOCS")
+    parser.add_argument("--seed", type=int, default=23)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_local_aws_env(OPENSEARCH_DOMAIN="bench.local", OPENSEARCH_INDEX=INDEX, RAW_DATA_BUCKET=BUCKET,
+                      EMBEDDING_DIMENSION=args.dimension, SNAPSHOT_SHARD_DOCS=args.shard_docs, RESTORE_THREADS=2)
+    results = []
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr):
+        boto3.client("s3").create_bucket(Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]})
+        preprocess = load_lambda("ingestion", "aai_preprocess_csv")
+        chunks, _, _ = build_corpus(preprocess, args.tickets, args.docs_per_subject, args.doc_chars)
+        rng = random.Random(args.seed)
+        embeddings = [{**chunk, "embedding": [rng.gauss(0, 1) for _ in range(args.dimension)],
+                       "created_at": "2024-01-01T00:00:00"} for chunk in chunks]
+        boto3.client("s3").put_object(Bucket=BUCKET, Key=EMBEDDINGS_KEY, Body=json.dumps({"embeddings": embeddings}))
+        for mode in MODES:
+            results.append(run_mode(mode))
+            print(f"{mode}: {results[-1]['docs']} docs in {results[-1]['partitions']} partitions, round trip ok, "
+                  f"export {results[-1]['export_ms']:.0f} ms, restore {results[-1]['restore_ms']:.0f} ms", file=sys.stderr)
+
+    output = json.dumps({
+        "benchmark": "index_snapshot",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
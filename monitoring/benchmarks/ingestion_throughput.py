@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Offline Ingestion Throughput Benchmark
+Runs the real ingestion handlers (aai_preprocess_csv, aai_chunk_text,
+aai_generate_embeddings, aai_store_opensearch) end to end in-process against
+moto S3, a fake Bedrock and a fake OpenSearch bulk endpoint, and reports
+per-stage chunks/sec, calls per chunk, bytes moved and peak memory as JSON.
+
+Usage:
+    python monitoring/benchmarks/ingestion_throughput.py --scales 1,5,10 --output ingest.json
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+import types
+
+import boto3
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import REPO_ROOT, load_lambda, use_local_aws_env
+from fakes import CountingS3, FakeBedrock, FakeOpenSearch
+
+BUCKET = "bench-ingestion"
+TICKETS_CSV = os.path.join(REPO_ROOT, "sample-data", "support-tickets", "customer_support_tickets.csv")
+
+# Kaggle header -> schema expected by aai_preprocess_csv (same renames as notebooks/CustomerSupportTickets.ipynb)
+CSV_COLUMNS = {
+    "Ticket ID": "ticket_id",
+    "Product Purchased": "product_purchased",
+    "Ticket Type": "type",
+    "Ticket Subject": "subject",
+    "Ticket Description": "description",
+    "Ticket Status": "status",
+    "Resolution": "resolution",
+    "Ticket Priority": "priority",
+    "Ticket Channel": "channel",
+}
+
+WORDS = ("camera sensor autofocus battery firmware lens shutter payment refund invoice card "
+         "checkout warranty exposure video stabilization mount charger account order delivery").split()
+
+def build_tickets_csv(max_tickets, scale):
+    """Prepare the sample tickets like the notebook does, replicated `scale` times with fresh ids"""
+    with open(TICKETS_CSV, newline="", encoding="utf-8") as f:
+        rows = []
+        for i, row in enumerate(csv.DictReader(f)):
+            if i >= max_tickets:
+                break
+            record = {new: row.get(old, "") for old, new in CSV_COLUMNS.items()}
+            record["description"] = record["description"].replace("{product_purchased}", record["product_purchased"])
+            rows.append(record)
+
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(CSV_COLUMNS.values()))
+    writer.writeheader()
+    for copy in range(scale):
+        for record in rows:
+            writer.writerow({**record, "ticket_id": f"{record['ticket_id']}-{copy}"})
+    return out.getvalue()
+
+def build_textract_layout(doc_index, sections, paragraphs_per_section, rng):
+    """Synthetic Textract layout JSON shaped like the output aai_chunk_text consumes"""
+    blocks = []
+
+    def add_layout(block_type, lines):
+        child_ids = []
+        for line in lines:
+            line_id = f"line-{doc_index}-{len(blocks)}"
+            blocks.append({"Id": line_id, "BlockType": "LINE", "Text": line})
+            child_ids.append(line_id)
+        blocks.append({
+            "Id": f"layout-{doc_index}-{len(blocks)}",
+            "BlockType": block_type,
+            "Relationships": [{"Type": "CHILD", "Ids": child_ids}]
+        })
+
+    for s in range(sections):
+        add_layout("LAYOUT_SECTION_HEADER", [f"Section {s + 1}: {rng.choice(WORDS).title()} guide"])
+        for _ in range(paragraphs_per_section):
+            lines = [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(4)]
+            add_layout("LAYOUT_TEXT", lines)
+    return {"Blocks": blocks}
+
+class Stage:
+    """Measures wall time, peak Python heap and S3 traffic for one pipeline stage"""
+
+    def __init__(self, name, s3_counters):
+        self.name = name
+        self.s3_counters = s3_counters
+        self.result = {}
+
+    def __enter__(self):
+        for counter in self.s3_counters:
+            counter.reset()
+        tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        _, peak = tracemalloc.get_traced_memory()
+        s3_stats = {"get_calls": 0, "put_calls": 0, "bytes_in": 0, "bytes_out": 0}
+        for counter in self.s3_counters:
+            for key, value in counter.stats.items():
+                s3_stats[key] += value
+        self.result = {"stage": self.name, "seconds": elapsed, "peak_memory_bytes": peak, "s3": s3_stats}
+        return False
+
+def finish_stage(stage, chunks, **calls):
+    result = dict(stage.result)
+    result["chunks"] = chunks
+    result["chunks_per_sec"] = chunks / result["seconds"] if result["seconds"] else 0
+    result["bytes_moved"] = result["s3"]["bytes_in"] + result["s3"]["bytes_out"]
+    for name, count in calls.items():
+        result[name] = count
+        result[f"{name}_per_chunk"] = count / chunks if chunks else 0
+    return result
+
+def run_scale(scale, args):
+    use_local_aws_env(
+        EMBED_MODEL="amazon.titan-embed-text-v2:0",
+        OPENSEARCH_DOMAIN="bench.local",
+        OPENSEARCH_INDEX="bench-index",
+        OUTPUT_PREFIX="processed/chunks/logs/",
+    )
+    rng = random.Random(scale)
+
+    with mock_aws():
+        s3 = boto3.client("s3")
+        s3.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]})
+
+        csv_key = "raw/support-tickets/tickets.csv"
+        s3.put_object(Bucket=BUCKET, Key=csv_key, Body=build_tickets_csv(args.tickets, scale).encode("utf-8"))
+        text_keys = []
+        for d in range(args.documents * scale):
+            key = f"processed/json/docs/document_{d}.json"
+            layout = build_textract_layout(d, args.sections, args.paragraphs, rng)
+            s3.put_object(Bucket=BUCKET, Key=key, Body=json.dumps(layout).encode("utf-8"))
+            text_keys.append(key)
+
+        preprocess = load_lambda("ingestion", "aai_preprocess_csv")
+        chunker = load_lambda("ingestion", "aai_chunk_text")
+        embedder = load_lambda("ingestion", "aai_generate_embeddings")
+        store = load_lambda("ingestion", "aai_store_opensearch")
+
+        counters = []
+        for module in (preprocess, chunker, embedder, store):
+            module_s3 = CountingS3(module.s3 if hasattr(module, "s3") else s3)
+            module.s3 = module_s3
+            counters.append(module_s3)
+        # aai_store_opensearch creates its S3 client inside the handler
+        store.boto3 = types.SimpleNamespace(client=lambda service, **kw: counters[3], Session=boto3.Session)
+
+        bedrock = FakeBedrock(dimension=args.dimension, latency_ms=args.bedrock_latency_ms,
+                              throttle_rate=args.throttle_rate)
+        embedder.bedrock = bedrock
+        embedder.embed_model = os.environ["EMBED_MODEL"]
+        pacing = {"sleep_seconds": 0.0}
+
+        def sleep(seconds):
+            pacing["sleep_seconds"] += seconds
+            if not args.skip_pacing:
+                time.sleep(seconds)
+        embedder.time = types.SimpleNamespace(sleep=sleep, time=time.time)
+
+        opensearch = FakeOpenSearch(latency_ms=args.bulk_latency_ms)
+        store.get_opensearch_client = lambda **kw: opensearch
+
+        stages = []
+        batches = []
+        with Stage("aai_preprocess_csv", counters) as stage:
+            response = preprocess.lambda_handler({"bucket": BUCKET, "key": csv_key}, None)
+            batches.extend(response["chunkBatches"])
+        csv_chunks = sum(len(b) for b in response["chunkBatches"])
+        stages.append(finish_stage(stage, csv_chunks, invocations=1))
+
+        with Stage("aai_chunk_text", counters) as stage:
+            pdf_chunks = 0
+            for key in text_keys:
+                response = chunker.lambda_handler({"bucket": BUCKET, "textKey": key}, None)
+                batches.extend(response["chunkBatches"])
+                pdf_chunks += sum(len(b) for b in response["chunkBatches"])
+        stages.append(finish_stage(stage, pdf_chunks, invocations=len(text_keys)))
+
+        total_chunks = csv_chunks + pdf_chunks
+        embedding_keys = []
+        with Stage("aai_generate_embeddings", counters) as stage:
+            for i, batch in enumerate(batches):
+                response = embedder.lambda_handler({
+                    "bucket": BUCKET,
+                    "chunkKeys": batch,
+                    "batchId": f"2025-01-01T00:00:{i:02d}.000Z",
+                    "filename": f"bench_{i}.json"
+                }, None)
+                embedding_keys.append(response["embeddingsKey"])
+        stages.append(finish_stage(stage, total_chunks, invocations=len(batches),
+                                   bedrock_calls=bedrock.calls, bedrock_throttled=bedrock.throttled))
+        stages[-1]["pacing_sleep_seconds"] = pacing["sleep_seconds"]
+
+        with Stage("aai_store_opensearch", counters) as stage:
+            store.lambda_handler({"bucket": BUCKET, "embeddingKeys": embedding_keys}, None)
+        stages.append(finish_stage(stage, total_chunks, invocations=1, opensearch_requests=opensearch.requests))
+        stages[-1]["opensearch_bytes_sent"] = opensearch.bytes_sent
+        stages[-1]["indexed_docs"] = len(opensearch.docs)
+
+    total_seconds = sum(s["seconds"] for s in stages)
+    return {
+        "scale": scale,
+        "chunks": total_chunks,
+        "total_seconds": total_seconds,
+        "end_to_end_chunks_per_sec": total_chunks / total_seconds if total_seconds else 0,
+        "stages": stages
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingestion throughput benchmark")
+    parser.add_argument("--scales", default="1,5,10", help="Comma-separated corpus multipliers")
+    parser.add_argument("--tickets", type=int, default=200, help="Sample tickets per copy")
+    parser.add_argument("--documents", type=int, default=3, help="Synthetic Textract documents per copy")
+    parser.add_argument("--sections", type=int, default=8)
+    parser.add_argument("--paragraphs", type=int, default=4)
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--bedrock-latency-ms", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--bulk-latency-ms", type=float, default=0.0)
+    parser.add_argument("--skip-pacing", action="store_true",
+                        help="Count but do not wait on the handlers' time.sleep pacing/backoff")
+    parser.add_argument("--output", help="Write results JSON here instead of stdout")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    # Handler logging goes to stderr so stdout stays machine-readable
+    with contextlib.redirect_stdout(sys.stderr):
+        runs = [run_scale(int(s), args) for s in args.scales.split(",")]
+    tracemalloc.stop()
+
+    results = {
+        "benchmark": "ingestion_throughput",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "runs": runs
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Load Lambda handler modules by path for in-process benchmarks.
+Every function lives in its own directory as lambda_function.py, so each one is
+imported under a unique module name instead of through sys.path. Shared layer
+modules (src/shared/layers/python) are put on sys.path as they are under /opt/python.
+"""
+
+import importlib.util
+import os
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+AGENTS_DIR = os.path.join(REPO_ROOT, "src", "agents")
+SHARED_LAYER_DIR = os.path.join(REPO_ROOT, "src", "shared", "layers", "python")
+if SHARED_LAYER_DIR not in sys.path:
+    sys.path.insert(0, SHARED_LAYER_DIR)
+
+LOCAL_AWS_ENV = {
+    "AWS_REGION": "ap-south-1",
+    "AWS_DEFAULT_REGION": "ap-south-1",
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_SESSION_TOKEN": "testing",
+}
+
+def use_local_aws_env(**overrides):
+    """Point boto3 at dummy credentials so nothing can reach a real account"""
+    for key, value in {**LOCAL_AWS_ENV, **overrides}.items():
+        os.environ[key] = str(value)
+
+def load_lambda(agent, function_name):
+    """Import src/agents/<agent>/lambdas/<function_name>/lambda_function.py"""
+    path = os.path.join(AGENTS_DIR, agent, "lambdas", function_name, "lambda_function.py")
+    module_name = f"bench_{function_name}"
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
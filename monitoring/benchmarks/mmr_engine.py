@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - MMR Engine Benchmark
+Times the aai_mmr_diversity engines (vectorized NumPy, incremental pure-Python fallback)
+against the original pure-Python simple_mmr at several candidate counts, and checks that
+all engines select the same documents for the same mmr_lambda.
+
+The original implementation is reproduced below as the baseline; it is O(k^2*n*d) and
+takes minutes at 5,000 candidates, so it runs --baseline-repeats times only.
+
+Usage:
+    python monitoring/benchmarks/mmr_engine.py --candidates 50,500,5000 --dimension 1024
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import load_lambda, use_local_aws_env
+
+def original_simple_mmr(candidates, query_embedding, similarity, top_k=10):
+    """simple_mmr as it was before the vectorized engine (fixed 0.7/0.3 weights)"""
+    if len(candidates) <= top_k:
+        return candidates
+    selected = []
+    remaining = list(candidates)
+    while remaining and len(selected) < top_k:
+        best_idx = 0
+        best_score = -1
+        for i, (hit, score) in enumerate(remaining):
+            emb = hit['_source'].get('embedding', [0.0] * 1536)
+            relevance = similarity(query_embedding, emb)
+            max_sim = 0
+            if selected:
+                for sel_hit, _ in selected:
+                    sel_emb = sel_hit['_source'].get('embedding', [0.0] * 1536)
+                    max_sim = max(max_sim, similarity(emb, sel_emb))
+            mmr_score = 0.7 * relevance - 0.3 * max_sim
+            if mmr_score > best_score:
+                best_score = mmr_score
+                best_idx = i
+        selected.append(remaining.pop(best_idx))
+    return selected
+
+def clustered_candidates(count, dimension, seed):
+    """Candidates drawn around a few topic centroids so near-duplicates exist for MMR to suppress"""
+    rng = random.Random(seed)
+    centroids = [[rng.gauss(0, 1) for _ in range(dimension)] for _ in range(8)]
+    candidates = []
+    for i in range(count):
+        centroid = centroids[i % len(centroids)]
+        vector = [c + rng.gauss(0, 0.6) for c in centroid]
+        candidates.append(({"_id": f"doc_{i}", "_source": {"text": f"chunk {i}", "embedding": vector}}, 1.0 / (i + 1)))
+    query = [c + rng.gauss(0, 0.8) for c in centroids[0]]
+    return candidates, query
+
+def time_engine(fn, repeats):
+    timings = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized vs pure-Python MMR")
+    parser.add_argument("--candidates", default="50,500,5000")
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--mmr-lambda", type=float, default=0.7, help="Baseline comparison is only exact at 0.7")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--baseline-repeats", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_local_aws_env(SEARCH_RESULTS_BUCKET="bench-search-results", OPENSEARCH_INDEX="bench-index")
+    mmr = load_lambda("retrieval", "aai_mmr_diversity")
+
+    results = []
+    for count in (int(c) for c in args.candidates.split(",")):
+        candidates, query = clustered_candidates(count, args.dimension, args.seed)
+        ids = lambda selected: [hit["_id"] for hit, _ in selected]
+
+        baseline, baseline_ms = time_engine(
+            lambda: original_simple_mmr(candidates, query, mmr.similarity, args.top_k), args.baseline_repeats)
+        python_sel, python_ms = time_engine(
+            lambda: mmr.simple_mmr(candidates, query, args.top_k, args.mmr_lambda), args.baseline_repeats)
+        numpy_sel, numpy_ms = time_engine(
+            lambda: mmr.numpy_mmr(candidates, query, args.top_k, args.mmr_lambda), args.repeats)
+
+        results.append({
+            "candidates": count,
+            "original_ms": baseline_ms,
+            "incremental_python_ms": python_ms,
+            "numpy_ms": numpy_ms,
+            "speedup_vs_original": baseline_ms / numpy_ms if numpy_ms else None,
+            "same_selection_as_original": ids(baseline) == ids(numpy_sel) if args.mmr_lambda == 0.7 else None,
+            "python_matches_numpy": ids(python_sel) == ids(numpy_sel)
+        })
+        print(f"{count} candidates: original {baseline_ms:.1f} ms, numpy {numpy_ms:.2f} ms", file=sys.stderr)
+
+    output = json.dumps({
+        "benchmark": "mmr_engine",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {**vars(args), "normalize_embeddings": mmr.NORMALIZE_EMBEDDINGS},
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
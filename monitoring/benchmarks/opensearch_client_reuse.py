@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - OpenSearch Client Reuse Benchmark
+Runs aai_hybrid_search_fusion in-process against a local HTTP/1.1 keep-alive stand-in for
+the OpenSearch domain and compares warm-invocation latency when the client is rebuilt on
+every invocation (credential lookup, new auth, new socket) vs the pooled module-scope client
+from aai_opensearch_client. Requests are really SigV4-signed and sent over sockets.
+
+The stand-in speaks plain HTTP; --handshake-ms is slept once per accepted connection to
+stand in for the TCP + TLS handshake to the domain endpoint (measure yours with
+`curl -w '%{time_appconnect}'` against the domain and pass it in).
+
+Usage:
+    python monitoring/benchmarks/opensearch_client_reuse.py --handshake-ms 25 --iterations 50
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import load_lambda, use_local_aws_env
+from fakes import fake_hits
+
+MODES = ["per_invocation", "pooled"]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, handshake_ms, server_ms):
+        super().__init__(address, StandInHandler)
+        self.handshake_ms = handshake_ms
+        self.server_ms = server_ms
+        self.hits = fake_hits(20, "doc_")
+        self.stats = {"connections": 0, "requests": 0, "unsigned_requests": 0}
+        self.stats_lock = threading.Lock()
+
+    def finish_request(self, request, client_address):
+        with self.stats_lock:
+            self.stats["connections"] += 1
+        time.sleep(self.handshake_ms / 1000)
+        super().finish_request(request, client_address)
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Send headers and body in one segment so keep-alive requests don't hit Nagle/delayed-ACK stalls
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def search_response(self, body):
+        return {"took": int(self.server.server_ms), "hits": {"hits": self.server.hits[:body.get("size", 10)]}}
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        with self.server.stats_lock:
+            self.server.stats["requests"] += 1
+            if "AWS4-HMAC-SHA256" not in self.headers.get("Authorization", ""):
+                self.server.stats["unsigned_requests"] += 1
+        time.sleep(self.server.server_ms / 1000)
+
+        if self.path.split("?")[0].endswith("_msearch"):
+            searches = [json.loads(line) for line in body.splitlines() if line.strip()][1::2]
+            payload = {"responses": [self.search_response(s) for s in searches]}
+        else:
+            payload = self.search_response(json.loads(body or "{}"))
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-invocation vs pooled OpenSearch client on warm invocations")
+    parser.add_argument("--handshake-ms", type=float, default=25.0, help="Simulated TCP+TLS setup per new connection")
+    parser.add_argument("--server-ms", type=float, default=5.0, help="Simulated server-side search time")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--search-mode", default="msearch", choices=["sequential", "msearch", "parallel"])
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    server = StandInServer(("127.0.0.1", 0), args.handshake_ms, args.server_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    use_local_aws_env(OPENSEARCH_DOMAIN="127.0.0.1", OPENSEARCH_PORT=server.server_address[1],
+                      OPENSEARCH_USE_SSL="false", OPENSEARCH_INDEX="bench-index",
+                      SEARCH_RESULTS_BUCKET="bench-search-results")
+    results = []
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr):
+        boto3.client("s3").create_bucket(
+            Bucket="bench-search-results",
+            CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]}
+        )
+        search = load_lambda("retrieval", "aai_hybrid_search_fusion")
+        import aai_opensearch_client
+
+        event = {
+            "user_query": "camera battery drains quickly",
+            "queryEmbedding": [0.1] * 8,
+            "max_results": 10,
+            "search_mode": args.search_mode
+        }
+        for mode in MODES:
+            aai_opensearch_client.reset_clients()
+            with server.stats_lock:
+                server.stats.update(connections=0, requests=0, unsigned_requests=0)
+            # First invocation is the cold start in both modes and is excluded from the warm stats
+            search.lambda_handler({**event, "query_id": f"bench-{mode}-cold"}, None)
+
+            stage_ms, search_ms = [], []
+            for i in range(args.iterations):
+                if mode == "per_invocation":
+                    # Pre-pool behaviour: new credentials, AWS4Auth, client and socket every invocation
+                    aai_opensearch_client.reset_clients()
+                response = search.lambda_handler({**event, "query_id": f"bench-{mode}-{i}"}, None)
+                if response["statusCode"] != 200:
+                    raise RuntimeError(response["error"])
+                monitoring = response["monitoring"]
+                stage_ms.append(monitoring["total_time_ms"])
+                search_ms.append(monitoring["search_time_ms"])
+
+            results.append({
+                "mode": mode,
+                "warm_search_p50_ms": statistics.median(search_ms),
+                "warm_search_p95_ms": percentile(search_ms, 95),
+                "warm_stage_p50_ms": statistics.median(stage_ms),
+                "warm_stage_p95_ms": percentile(stage_ms, 95),
+                "server": dict(server.stats),
+                "client_connection_stats": monitoring["opensearch_connections"]
+            })
+
+    server.shutdown()
+    baseline, pooled = results
+    output = json.dumps({
+        "benchmark": "opensearch_client_reuse",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "warm_stage_p50_saving_ms": baseline["warm_stage_p50_ms"] - pooled["warm_stage_p50_ms"],
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
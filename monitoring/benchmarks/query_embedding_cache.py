@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Query Embedding Cache Benchmark
+Replays a repetitive support query stream through aai_query_embedding with the embedding cache
+off, with only the in-process LRU, and with LRU + shared DynamoDB tier (moto), against a fake
+Bedrock whose invoke_model takes --bedrock-ms (an assumption, not a measurement). Requests are
+spread over several simulated execution environments, each with its own LRU, as concurrent
+Lambdas would be; --lru-size below the number of distinct queries shows evictions.
+
+Queries are "<ticket subject> with my <product>" from the sample tickets, drawn from a Zipf
+distribution, with casing/whitespace/punctuation variants that normalize to the same key.
+
+Reports Bedrock calls, hit rate (LRU / shared), evictions, and embedding stage p50/p95 overall
+and on hits vs misses, plus the largest difference between a cached embedding and the one it was
+stored from (float32 storage).
+
+Usage:
+    python monitoring/benchmarks/query_embedding_cache.py --requests 400 --environments 4
+"""
+
+import argparse
+import collections
+import contextlib
+import csv
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import boto3
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import REPO_ROOT, load_lambda, use_local_aws_env
+from fakes import FakeBedrock
+import aai_cache
+
+CACHE_TABLE = "bench-retrieval-cache"
+TICKETS_CSV = os.path.join(REPO_ROOT, "sample-data", "support-tickets", "customer_support_tickets.csv")
+MODES = ["no_cache", "lru_only", "lru_and_dynamodb"]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def build_workload(args):
+    rng = random.Random(args.seed)
+    with open(TICKETS_CSV, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    subjects = [s for s, _ in collections.Counter(r["Ticket Subject"] for r in rows).most_common(16)]
+    products = [p for p, _ in collections.Counter(r["Product Purchased"] for r in rows).most_common(10)]
+    queries = [f"{s} with my {p}" for s in subjects for p in products]
+    rng.shuffle(queries)
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(len(queries))]
+    stream = []
+    for _ in range(args.requests):
+        query = rng.choices(queries, weights)[0]
+        # Same question, typed differently
+        text = rng.choice([query, query.lower(), query + "?", "  " + query.upper() + " ", query.replace(" ", "  ") + "."])
+        stream.append((text, rng.randrange(args.environments)))
+    return stream
+
+def run_mode(embed, bedrock, stream, mode, args):
+    # Imported by the Lambda, after use_local_aws_env
+    from aai_query_vectors import EMBEDDING_CACHE_TTL_SECONDS
+    aai_cache.reset_caches()
+    shared = aai_cache.DynamoCacheStore(CACHE_TABLE) if mode == "lru_and_dynamodb" else None
+    caches = [aai_cache.TieredCache("query_embedding", EMBEDDING_CACHE_TTL_SECONDS, shared, args.lru_size)
+              for _ in range(args.environments)]
+    calls_before = bedrock.calls
+    timings, hit_ms, miss_ms = [], [], []
+    totals = collections.Counter()
+    first = {}
+    max_error = 0.0
+    for query, environment in stream:
+        # Route the request to its execution environment's LRU
+        aai_cache._caches["query_embedding"] = caches[environment]
+        response = embed.lambda_handler({"user_query": query, "encoding": "list",
+                                         "use_embedding_cache": mode != "no_cache"}, None)
+        stats = response["cache"]
+        timings.append(stats["total_time_ms"])
+        if stats["enabled"]:
+            totals.update({k: stats[k] for k in ("lru_hits", "shared_hits", "misses")})
+            (hit_ms if stats["hit"] else miss_ms).append(stats["total_time_ms"])
+            # A hit returns the float32 copy of the embedding last computed for its key by the cache
+            # that served it (each LRU on its own, or the shared tier)
+            key = (environment if shared is None else None, aai_cache.normalize_query(query))
+            if stats["hit"]:
+                max_error = max(max_error, max(abs(x - y) for x, y in zip(first[key], response["embedding"])))
+            else:
+                first[key] = response["embedding"]
+    hits = totals["lru_hits"] + totals["shared_hits"]
+    return {
+        "mode": mode,
+        "bedrock_calls": bedrock.calls - calls_before,
+        "hit_rate": hits / len(stream) if mode != "no_cache" else 0.0,
+        "lru_hits": totals["lru_hits"],
+        "shared_hits": totals["shared_hits"],
+        "lru_evictions": sum(cache.lru.evictions for cache in caches) if mode != "no_cache" else 0,
+        "max_abs_error": max_error,
+        "embed_p50_ms": statistics.median(timings),
+        "embed_p95_ms": percentile(timings, 95),
+        "embed_mean_ms": statistics.mean(timings),
+        "hit_p50_ms": statistics.median(hit_ms) if hit_ms else None,
+        "hit_p95_ms": percentile(hit_ms, 95) if hit_ms else None,
+        "miss_p50_ms": statistics.median(miss_ms) if miss_ms else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Query embedding cache on a repetitive query stream")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--environments", type=int, default=4, help="Concurrent Lambda execution environments")
+    parser.add_argument("--lru-size", type=int, default=5000, help="EMBEDDING_CACHE_SIZE per environment")
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--bedrock-ms", type=float, default=150.0, help="Assumed invoke_model latency")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_local_aws_env(CACHE_TABLE=CACHE_TABLE, EMBEDDING_DIMENSION=args.dimension, NORMALIZE_EMBEDDINGS="true")
+    stream = build_workload(args)
+    results = []
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr):
+        boto3.client("dynamodb").create_table(
+            TableName=CACHE_TABLE, BillingMode="PAY_PER_REQUEST",
+            KeySchema=[{"AttributeName": "cache_key", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "cache_key", "AttributeType": "S"}]
+        )
+        embed = load_lambda("conversation", "aai_query_embedding")
+        bedrock = FakeBedrock(dimension=args.dimension, latency_ms=args.bedrock_ms)
+        embed.bedrock = bedrock
+        for mode in MODES:
+            results.append(run_mode(embed, bedrock, stream, mode, args))
+            print(f"{mode}: {results[-1]['bedrock_calls']} Bedrock calls, hit rate {results[-1]['hit_rate']:.2f}, "
+                  f"p50 {results[-1]['embed_p50_ms']:.2f} ms", file=sys.stderr)
+
+    output = json.dumps({
+        "benchmark": "query_embedding_cache",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "distinct_queries": len({aai_cache.normalize_query(q) for q, _ in stream}),
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
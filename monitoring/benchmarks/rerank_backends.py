@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Rerank Backend Benchmark
+Runs aai_cross_encoder_rerank in-process with RERANK_BACKEND=onnx (int8 cross-encoder on this
+machine's CPU, using the offline MiniLM-geometry fixture from cross_encoder_fixture.py) and with
+the SageMaker endpoint path (fake serverless endpoint with assumed warm latency, cold starts and
+max_concurrency throttling). No network access is needed.
+
+Reports per candidate count the rerank latency of both backends, the ONNX model load (the one-off
+cost per execution environment), and a burst of concurrent requests against the endpoint's
+concurrency cap. ONNX numbers are for one execution environment: pin --onnx-threads to the vCPUs
+your function's memory size provides (1,769 MB = 1 vCPU) for comparable results.
+
+Usage:
+    python monitoring/benchmarks/rerank_backends.py --candidates 20,50 --max-seq-len 256 --iterations 10
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import types
+
+import boto3
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import load_lambda, use_local_aws_env
+from fakes import FakeSageMaker
+from candidate_payload import chunk_hits
+from cross_encoder_fixture import cross_encoder_fixture
+
+BUCKET = "bench-search-results"
+QUERY = "camera battery drains quickly after the latest software update"
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def rerank_latencies(rerank, candidates, backend, iterations):
+    timings = []
+    for i in range(iterations):
+        response = rerank.lambda_handler({
+            "query_id": f"bench-{backend}-{i}",
+            "user_query": QUERY,
+            "candidates": candidates,
+            "use_reranker": True,
+            "rerank_backend": backend
+        }, None)
+        if response["statusCode"] != 200:
+            raise RuntimeError(f"{backend}: {response['error']}")
+        timings.append(response["monitoring"]["rerank_time_ms"])
+    return {"p50_ms": statistics.median(timings), "p95_ms": percentile(timings, 95)}
+
+def endpoint_burst(rerank, candidates, requests, concurrency):
+    """requests reranks from `concurrency` callers at once (parallel Step Functions executions)"""
+    outcomes = []
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def caller():
+        while True:
+            with lock:
+                i = next(remaining, None)
+            if i is None:
+                return
+            response = rerank.lambda_handler({
+                "query_id": f"bench-burst-{i}", "user_query": QUERY, "candidates": candidates,
+                "use_reranker": True, "rerank_backend": "sagemaker"
+            }, None)
+            with lock:
+                outcomes.append(response["statusCode"] == 200)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=caller) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "succeeded": sum(outcomes),
+        "failed_throttled": len(outcomes) - sum(outcomes),
+        "requests_per_second": sum(outcomes) / elapsed
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="In-Lambda ONNX cross-encoder vs SageMaker serverless endpoint")
+    parser.add_argument("--candidates", default="20,50", help="Candidates per rerank request")
+    parser.add_argument("--text-chars", type=int, default=1200, help="Chunk text length (CHUNK_CHAR_SIZE)")
+    parser.add_argument("--max-seq-len", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--onnx-threads", type=int, default=0, help="0 = onnxruntime default (all cores)")
+    parser.add_argument("--endpoint-ms", type=float, default=250.0, help="Assumed warm endpoint latency")
+    parser.add_argument("--endpoint-cold-ms", type=float, default=6000.0, help="Assumed serverless cold start")
+    parser.add_argument("--endpoint-cold-rate", type=float, default=0.05)
+    parser.add_argument("--endpoint-max-concurrency", type=int, default=5)
+    parser.add_argument("--burst-requests", type=int, default=40)
+    parser.add_argument("--burst-concurrency", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    model_dir = cross_encoder_fixture()
+    use_local_aws_env(SEARCH_RESULTS_BUCKET=BUCKET, SAGEMAKER_ENDPOINT="bench-reranker",
+                      RERANK_MODEL_DIR=model_dir, RERANK_MAX_SEQ_LEN=args.max_seq_len,
+                      RERANK_ONNX_BATCH_SIZE=args.batch_size, RERANK_ONNX_THREADS=args.onnx_threads)
+    results = []
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr):
+        boto3.client("s3").create_bucket(
+            Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]}
+        )
+        rerank = load_lambda("retrieval", "aai_cross_encoder_rerank")
+        import aai_onnx_cross_encoder
+        sagemaker = FakeSageMaker(latency_ms=args.endpoint_ms, cold_start_ms=args.endpoint_cold_ms,
+                                  cold_start_rate=args.endpoint_cold_rate, max_concurrency=args.endpoint_max_concurrency)
+        rerank.boto3 = types.SimpleNamespace(
+            client=lambda service, **kw: sagemaker if service == "sagemaker-runtime" else boto3.client(service, **kw)
+        )
+        model_load_ms = aai_onnx_cross_encoder.get_cross_encoder().load_time_ms
+
+        for count in (int(c) for c in args.candidates.split(",")):
+            candidates = [[hit, hit["_score"]] for hit in chunk_hits(count, 0, args.text_chars)]
+            for hit, _ in candidates:
+                hit["_source"].pop("embedding")
+            onnx = rerank_latencies(rerank, candidates, "onnx", args.iterations)
+            endpoint = rerank_latencies(rerank, candidates, "sagemaker", args.iterations)
+            results.append({
+                "candidates": count,
+                "onnx": {**onnx, "pairs_per_second": count / (onnx["p50_ms"] / 1000)},
+                "sagemaker": endpoint
+            })
+            print(f"{count} candidates: onnx p50 {onnx['p50_ms']:.0f} ms, endpoint p50 {endpoint['p50_ms']:.0f} ms",
+                  file=sys.stderr)
+
+        burst_candidates = [[hit, hit["_score"]] for hit in chunk_hits(20, 0, args.text_chars)]
+        burst = endpoint_burst(rerank, burst_candidates, args.burst_requests, args.burst_concurrency)
+
+    output = json.dumps({
+        "benchmark": "rerank_backends",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {**vars(args), "cpu_count": os.cpu_count()},
+        "onnx_model_load_ms": model_load_ms,
+        "onnx_model_bytes": os.path.getsize(os.path.join(model_dir, "model.onnx")),
+        "endpoint_cold_starts": sagemaker.cold_starts,
+        "endpoint_burst": burst,
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
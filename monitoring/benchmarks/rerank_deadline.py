@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Sharded Rerank Deadline Benchmark
+Runs aai_cross_encoder_rerank (SageMaker backend, score cache off) against a fake endpoint
+with a slow tail: --slow-rate of calls take an extra --slow-ms (cold start, throttled retry,
+noisy neighbour). Compares:
+  - single_call: every pair in one invoke_endpoint call with no effective deadline (the
+    previous behaviour)
+  - sharded:     RERANK_SHARD_SIZE pairs per call, RERANK_SHARD_CONCURRENCY at a time, no deadline
+  - deadline:    sharded, with RERANK_DEADLINE_MS; late shards keep their fusion positions
+
+Reports rerank latency percentiles, pairs that fell back to fusion order, and top-k agreement
+with the fully scored ranking.
+
+Usage:
+    python monitoring/benchmarks/rerank_deadline.py --candidates 40 --deadline-ms 400 --iterations 100
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+import types
+
+import boto3
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import load_lambda, use_local_aws_env
+from fakes import FakeSageMaker
+from candidate_payload import chunk_hits
+
+BUCKET = "bench-search-results"
+QUERY = "camera battery drains quickly after the latest software update"
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def run_config(rerank, candidates, name, shard_size, deadline_ms, iterations, top_k, reference):
+    rerank.RERANK_SHARD_SIZE = shard_size
+    timings, fallbacks, agreement = [], [], []
+    for i in range(iterations):
+        response = rerank.lambda_handler({
+            "query_id": f"bench-{name}-{i}", "user_query": QUERY, "candidates": candidates,
+            "use_reranker": True, "rerank_backend": "sagemaker", "use_score_cache": False,
+            "rerank_deadline_ms": deadline_ms
+        }, None)
+        if response["statusCode"] != 200:
+            raise RuntimeError(f"{name}: {response['error']}")
+        monitoring = response["monitoring"]
+        timings.append(monitoring["rerank_time_ms"])
+        fallbacks.append(monitoring["pairs_fallback"])
+        ranked = rerank.load_candidates(response, rerank.s3, BUCKET)
+        agreement.append(len({hit["_id"] for hit, _ in ranked[:top_k]} & reference) / top_k)
+    return {
+        "config": name,
+        "shard_size": shard_size,
+        "deadline_ms": deadline_ms,
+        "rerank_p50_ms": statistics.median(timings),
+        "rerank_p95_ms": percentile(timings, 95),
+        "rerank_p99_ms": percentile(timings, 99),
+        "rerank_max_ms": max(timings),
+        "requests_with_fallback": sum(1 for f in fallbacks if f),
+        "mean_pairs_fallback": statistics.mean(fallbacks),
+        f"top{top_k}_agreement": statistics.mean(agreement)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Single rerank call vs sharded rerank with a deadline")
+    parser.add_argument("--candidates", type=int, default=40)
+    parser.add_argument("--shard-size", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--deadline-ms", type=float, default=400.0)
+    parser.add_argument("--endpoint-ms", type=float, default=60.0, help="Assumed fixed cost per endpoint call")
+    parser.add_argument("--pair-ms", type=float, default=5.0, help="Assumed cost per scored pair")
+    parser.add_argument("--slow-ms", type=float, default=2000.0, help="Extra latency of a slow call")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Fraction of calls that are slow")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_local_aws_env(SEARCH_RESULTS_BUCKET=BUCKET, SAGEMAKER_ENDPOINT="bench-reranker",
+                      RERANK_SHARD_CONCURRENCY=args.concurrency)
+    candidates = [[hit, hit["_score"]] for hit in chunk_hits(args.candidates, 0, 1200)]
+    for hit, _ in candidates:
+        hit["_source"].pop("embedding")
+    # Fusion order arrives best-first
+    candidates.sort(key=lambda c: c[1], reverse=True)
+
+    results = []
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr):
+        boto3.client("s3").create_bucket(
+            Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]}
+        )
+        rerank = load_lambda("retrieval", "aai_cross_encoder_rerank")
+        exact = FakeSageMaker()
+        scores = rerank.score_with_endpoint(QUERY, candidates, exact)
+        reference = {hit["_id"] for (hit, _), _ in sorted(zip(candidates, scores), key=lambda x: x[1], reverse=True)[:args.top_k]}
+
+        sagemaker = FakeSageMaker(latency_ms=args.endpoint_ms, pair_latency_ms=args.pair_ms,
+                                  cold_start_ms=args.slow_ms, cold_start_rate=args.slow_rate)
+        rerank.boto3 = types.SimpleNamespace(
+            client=lambda service, **kw: sagemaker if service == "sagemaker-runtime" else boto3.client(service, **kw)
+        )
+        # No deadline = longer than any slow call
+        unbounded_ms = args.slow_ms * 10
+        for name, shard_size, deadline_ms in (("single_call", args.candidates, unbounded_ms),
+                                              ("sharded", args.shard_size, unbounded_ms),
+                                              ("deadline", args.shard_size, args.deadline_ms)):
+            results.append(run_config(rerank, candidates, name, shard_size, deadline_ms,
+                                      args.iterations, args.top_k, reference))
+            print(f"{name}: p99 {results[-1]['rerank_p99_ms']:.0f} ms, "
+                  f"{results[-1]['requests_with_fallback']} requests with fallback", file=sys.stderr)
+        # Let abandoned shards finish before moto is torn down
+        time.sleep(args.slow_ms / 1000)
+
+    output = json.dumps({
+        "benchmark": "rerank_deadline",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Rerank Score Cache Benchmark
+Replays a repetitive support query stream through aai_cross_encoder_rerank (SageMaker backend,
+fake endpoint whose latency grows with the number of pairs) with the score cache off, with only
+the in-process LRU, and with LRU + shared DynamoDB tier (moto). Requests are spread over several
+simulated execution environments, each with its own LRU, as concurrent Lambdas would be.
+
+Queries are "<ticket subject> with my <product>" from the sample tickets, drawn from a Zipf
+distribution, with casing/punctuation variants; each query keeps a stable top-N candidate set,
+with --churn candidates replaced on a --churn-rate fraction of requests (index updates, fusion ties).
+
+Usage:
+    python monitoring/benchmarks/rerank_score_cache.py --requests 500 --environments 4
+"""
+
+import argparse
+import collections
+import contextlib
+import csv
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import types
+
+import boto3
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import REPO_ROOT, load_lambda, use_local_aws_env
+from fakes import FakeSageMaker
+import aai_cache
+
+BUCKET = "bench-search-results"
+CACHE_TABLE = "bench-retrieval-cache"
+TICKETS_CSV = os.path.join(REPO_ROOT, "sample-data", "support-tickets", "customer_support_tickets.csv")
+MODES = ["no_cache", "lru_only", "lru_and_dynamodb"]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def build_workload(args):
+    rng = random.Random(args.seed)
+    with open(TICKETS_CSV, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    subjects = [s for s, _ in collections.Counter(r["Ticket Subject"] for r in rows).most_common(16)]
+    products = [p for p, _ in collections.Counter(r["Product Purchased"] for r in rows).most_common(10)]
+    queries = [f"{s} with my {p}" for s in subjects for p in products]
+    rng.shuffle(queries)
+    chunks = [{"_id": f"chunk_{i}", "_source": {"text": row["Ticket Description"], "source": "support_log",
+                                               "ticket_id": row["Ticket ID"]}}
+              for i, row in enumerate(rows[:args.chunks])]
+    top_sets = {q: rng.sample(range(len(chunks)), args.candidates) for q in queries}
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(len(queries))]
+
+    stream = []
+    for _ in range(args.requests):
+        query = rng.choices(queries, weights)[0]
+        ids = list(top_sets[query])
+        for slot in rng.sample(range(len(ids)), args.churn if rng.random() < args.churn_rate else 0):
+            ids[slot] = rng.randrange(len(chunks))
+        # Same question, typed differently
+        text = rng.choice([query, query.lower(), query + "?", "  " + query.upper() + " "])
+        stream.append((text, [[chunks[i], 1.0 / (rank + 1)] for rank, i in enumerate(ids)], rng.randrange(args.environments)))
+    return stream
+
+def run_mode(rerank, sagemaker, stream, mode, environments):
+    aai_cache.reset_caches()
+    shared = aai_cache.DynamoCacheStore(CACHE_TABLE) if mode == "lru_and_dynamodb" else None
+    caches = [aai_cache.TieredCache("rerank", rerank.SCORE_CACHE_TTL_SECONDS, shared) for _ in range(environments)]
+    calls_before = sagemaker.calls
+    timings = []
+    totals = collections.Counter()
+    for i, (query, candidates, environment) in enumerate(stream):
+        # Route the request to its execution environment's LRU
+        aai_cache._caches["rerank"] = caches[environment]
+        response = rerank.lambda_handler({
+            "query_id": f"bench-{mode}-{i}", "user_query": query, "candidates": candidates,
+            "use_reranker": True, "use_score_cache": mode != "no_cache"
+        }, None)
+        if response["statusCode"] != 200:
+            raise RuntimeError(response["error"])
+        monitoring = response["monitoring"]
+        timings.append(monitoring["rerank_time_ms"])
+        stats = monitoring["score_cache"]
+        if stats["enabled"]:
+            totals.update({k: stats[k] for k in ("lru_hits", "shared_hits", "misses", "pairs_scored", "endpoint_calls_saved")})
+    pairs = sum(len(c) for _, c, _ in stream)
+    return {
+        "mode": mode,
+        "endpoint_calls": sagemaker.calls - calls_before,
+        "pairs_scored": totals["pairs_scored"] if mode != "no_cache" else pairs,
+        "hit_rate": (totals["lru_hits"] + totals["shared_hits"]) / pairs if mode != "no_cache" else 0.0,
+        "lru_hits": totals["lru_hits"],
+        "shared_hits": totals["shared_hits"],
+        "endpoint_calls_saved": totals["endpoint_calls_saved"],
+        "rerank_p50_ms": statistics.median(timings),
+        "rerank_p95_ms": percentile(timings, 95),
+        "rerank_mean_ms": statistics.mean(timings)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-encoder score cache on a repetitive query stream")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--environments", type=int, default=4, help="Concurrent Lambda execution environments")
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--churn", type=int, default=2, help="Candidates replaced on a churned request")
+    parser.add_argument("--churn-rate", type=float, default=0.3, help="Fraction of requests with churned candidates")
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--endpoint-ms", type=float, default=120.0, help="Assumed fixed cost per endpoint call")
+    parser.add_argument("--pair-ms", type=float, default=6.0, help="Assumed cost per scored pair")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_local_aws_env(SEARCH_RESULTS_BUCKET=BUCKET, SAGEMAKER_ENDPOINT="bench-reranker", CACHE_TABLE=CACHE_TABLE)
+    stream = build_workload(args)
+    results = []
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr):
+        boto3.client("s3").create_bucket(
+            Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]}
+        )
+        boto3.client("dynamodb").create_table(
+            TableName=CACHE_TABLE, BillingMode="PAY_PER_REQUEST",
+            KeySchema=[{"AttributeName": "cache_key", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "cache_key", "AttributeType": "S"}]
+        )
+        rerank = load_lambda("retrieval", "aai_cross_encoder_rerank")
+        sagemaker = FakeSageMaker(latency_ms=args.endpoint_ms, pair_latency_ms=args.pair_ms)
+        rerank.boto3 = types.SimpleNamespace(
+            client=lambda service, **kw: sagemaker if service == "sagemaker-runtime" else boto3.client(service, **kw)
+        )
+        for mode in MODES:
+            results.append(run_mode(rerank, sagemaker, stream, mode, args.environments))
+            # The reported savings must match the calls the cache actually avoided
+            avoided = results[0]["endpoint_calls"] - results[-1]["endpoint_calls"]
+            if mode != "no_cache" and results[-1]["endpoint_calls_saved"] != avoided:
+                raise RuntimeError(f"{mode}: EndpointCallsSaved {results[-1]['endpoint_calls_saved']}, "
+                                   f"{avoided} endpoint calls avoided")
+            print(f"{mode}: {results[-1]['endpoint_calls']} endpoint calls, hit rate {results[-1]['hit_rate']:.2f}",
+                  file=sys.stderr)
+
+    output = json.dumps({
+        "benchmark": "rerank_score_cache",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "distinct_queries": len({aai_cache.normalize_query(q) for q, _, _ in stream}),
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Retrieval Fast Path Benchmark
+Runs the retrieval pipeline's stage handlers in-process (moto S3/DynamoDB/CloudWatch/SES,
+fake Bedrock, SageMaker and OpenSearch with injected latency) two ways:
+  - state_machine: one stage after another in AaiKnowledgeRetrievalRagPipeline order, with
+    --hop-ms slept before every Task state for the Step Functions transition + Lambda invoke
+  - fast_path:     aai_retrieval_fast_path's asyncio DAG in a single invocation
+and reports end-to-end latency plus the DAG's per-stage start offsets and durations.
+
+--hop-ms is an assumption, not a measurement: take it from the gap between consecutive
+TaskStateEntered/LambdaFunctionSucceeded events in your execution history.
+
+Usage:
+    python monitoring/benchmarks/retrieval_fast_path.py --hop-ms 25 --iterations 20
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+import types
+
+import boto3
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import AGENTS_DIR, use_local_aws_env
+from fakes import FakeBedrock, FakeOpenSearch, FakeSageMaker, fake_hits
+
+sys.path.insert(0, os.path.join(AGENTS_DIR, "orchestration", "lambdas", "aai_retrieval_fast_path"))
+
+BUCKET = "bench-search-results"
+CONVERSATION_TABLE = "bench-conversations"
+TICKETS_TABLE = "SupportTickets"
+SUPPORT_EMAIL = "support@yourcompany.com"
+QUERIES = {
+    "answer": "camera battery drains quickly after update",
+    "ticket": "battery still drains, please escalate"
+}
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def create_resources():
+    region = os.environ["AWS_REGION"]
+    boto3.client("s3").create_bucket(Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": region})
+    dynamodb = boto3.client("dynamodb")
+    dynamodb.create_table(
+        TableName=CONVERSATION_TABLE, BillingMode="PAY_PER_REQUEST",
+        KeySchema=[{"AttributeName": "session_id", "KeyType": "HASH"},
+                   {"AttributeName": "timestamp", "KeyType": "RANGE"}],
+        AttributeDefinitions=[{"AttributeName": "session_id", "AttributeType": "S"},
+                              {"AttributeName": "timestamp", "AttributeType": "N"}]
+    )
+    dynamodb.create_table(
+        TableName=TICKETS_TABLE, BillingMode="PAY_PER_REQUEST",
+        KeySchema=[{"AttributeName": "ticket_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "ticket_id", "AttributeType": "S"}]
+    )
+    boto3.client("ses").verify_email_identity(EmailAddress=SUPPORT_EMAIL)
+
+def run_state_machine(dag, request, hop_ms):
+    """Stage handlers in state machine order (the happy path), one Task state at a time"""
+    def task(name, payload):
+        time.sleep(hop_ms / 1000)
+        return dag.load_stage(name).lambda_handler(payload, None)
+
+    request = dag.normalize_request(request)
+    history = task("history", {"session_id": request["session_id"], "limit": request["max_results"]})
+    embedding = task("embedding", {"user_query": request["user_query"]})["embedding"]
+    search = task("search", {**{k: request[k] for k in ("query_id", "user_query", "max_results", "product_filter", "adaptive_rerank", "source_types", "hierarchical", "vector_backend", "lexical_backend", "collapse_chunks")},
+                             "queryEmbedding": embedding})
+    rerank = task("rerank", {"query_id": request["query_id"], "candidates": search["candidates"],
+                             "user_query": request["user_query"], "use_reranker": request["use_reranker"],
+                             "rerank_backend": request["rerank_backend"], "rerank_plan": search["rerank_plan"]})
+    mmr = task("mmr", {**{k: request[k] for k in ("query_id", "use_mmr", "mmr_lambda", "max_results")},
+                       "candidates": rerank["candidates"], "queryEmbedding": embedding})
+    final = task("final", {**{k: request[k] for k in ("query_id", "user_query", "max_results", "use_reranker", "use_mmr")},
+                           "candidates": mmr["candidates"],
+                           "all_monitoring": [search["monitoring"], rerank["monitoring"], mmr["monitoring"]]})
+    answer = task("synthesize", {"user_query": request["user_query"], "chunks": final["chunks"],
+                                 "metadata": final["metadata"], "conversationHistory": history["history"],
+                                 "query_id": request["query_id"], "session_id": request["session_id"]})
+    if answer.get("create_ticket"):
+        task("ticket", {"session_id": request["session_id"], "user_query": request["user_query"],
+                        "agent_response": answer["answer"], "query_id": request["query_id"]})
+    task("store", {"query_id": request["query_id"], "user_query": request["user_query"], "answer": answer["answer"],
+                   "sources": final["metadata"], "session_id": request["session_id"]})
+
+def main():
+    parser = argparse.ArgumentParser(description="Step Functions hop-by-hop vs single-invocation asyncio DAG")
+    parser.add_argument("--hop-ms", type=float, default=25.0, help="Assumed per-Task-state transition + invoke overhead")
+    parser.add_argument("--embed-ms", type=float, default=40.0)
+    parser.add_argument("--llm-ms", type=float, default=400.0)
+    parser.add_argument("--search-ms", type=float, default=30.0)
+    parser.add_argument("--rerank-ms", type=float, default=60.0)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_local_aws_env(OPENSEARCH_DOMAIN="bench.local", OPENSEARCH_INDEX="bench-index",
+                      SEARCH_RESULTS_BUCKET=BUCKET, SAGEMAKER_ENDPOINT="bench-reranker",
+                      CONVERSATION_TABLE=CONVERSATION_TABLE, EMBEDDING_DIMENSION=8)
+    results = []
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr):
+        create_resources()
+        import retrieval_dag
+        retrieval_dag.load_stages()
+
+        bedrock = FakeBedrock(dimension=8, latency_ms=0.0, text_latency_ms=args.llm_ms)
+        bedrock_embed = FakeBedrock(dimension=8, latency_ms=args.embed_ms)
+        sagemaker = FakeSageMaker(latency_ms=args.rerank_ms)
+        opensearch = FakeOpenSearch(bm25_latency_ms=args.search_ms, knn_latency_ms=args.search_ms,
+                                    hits=fake_hits(20, "doc_"), knn_hits=fake_hits(20, "doc_", seed=1)[5:] + fake_hits(5, "knn_"))
+        retrieval_dag.load_stage("embedding").bedrock = bedrock_embed
+        retrieval_dag.load_stage("synthesize").bedrock = bedrock
+        for name in ("search", "mmr"):
+            retrieval_dag.load_stage(name).get_opensearch_client = lambda **kw: opensearch
+        retrieval_dag.load_stage("rerank").boto3 = types.SimpleNamespace(
+            client=lambda service, **kw: sagemaker if service == "sagemaker-runtime" else boto3.client(service, **kw)
+        )
+
+        for scenario, user_query in QUERIES.items():
+            timings = {"state_machine": [], "fast_path": []}
+            stage_timings = None
+            for i in range(args.iterations + 1):
+                request = {"session_id": f"bench-{scenario}", "query_id": f"bench-{scenario}-{i}",
+                           "user_query": user_query, "max_results": 5, "use_reranker": True, "use_mmr": True}
+                start = time.perf_counter()
+                run_state_machine(retrieval_dag, request, args.hop_ms)
+                state_machine_ms = (time.perf_counter() - start) * 1000
+
+                start = time.perf_counter()
+                response = retrieval_dag.run_retrieval(request)
+                fast_path_ms = (time.perf_counter() - start) * 1000
+                if response["statusCode"] != 200:
+                    raise RuntimeError(response.get("error"))
+                # First round warms imports and clients in both modes
+                if i:
+                    timings["state_machine"].append(state_machine_ms)
+                    timings["fast_path"].append(fast_path_ms)
+                    stage_timings = response["monitoring"]["stage_timings_ms"]
+
+            results.append({
+                "scenario": scenario,
+                "state_machine_p50_ms": statistics.median(timings["state_machine"]),
+                "state_machine_p95_ms": percentile(timings["state_machine"], 95),
+                "fast_path_p50_ms": statistics.median(timings["fast_path"]),
+                "fast_path_p95_ms": percentile(timings["fast_path"], 95),
+                "p50_saving_ms": statistics.median(timings["state_machine"]) - statistics.median(timings["fast_path"]),
+                "fast_path_stage_timings_ms": stage_timings
+            })
+
+    output = json.dumps({
+        "benchmark": "retrieval_fast_path",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Retrieval Result Cache Benchmark
+Replays a repetitive support query stream through aai_retrieval_fast_path's DAG in-process (moto
+S3/DynamoDB/CloudWatch/SES, fake Bedrock, SageMaker and OpenSearch with injected latency) with the
+result cache off and on (LRU + shared DynamoDB tier), bumping the index generation every
+--ingest-every requests as aai_store_opensearch does after an ingestion run.
+
+Reports the hit rate, retrieval stage time saved, and end-to-end p50/p95 on hits vs misses, and
+checks freshness: every hit must be results computed at the generation current when it was served
+(stale_hits counts the ones that were not, and should be 0). Then replays queries whose rerank
+misses its deadline and fails unless those degraded results are never stored or served.
+
+Usage:
+    python monitoring/benchmarks/retrieval_result_cache.py --requests 200 --ingest-every 50
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import types
+
+import boto3
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import AGENTS_DIR, use_local_aws_env
+from fakes import FakeBedrock, FakeOpenSearch, FakeSageMaker, fake_hits
+
+sys.path.insert(0, os.path.join(AGENTS_DIR, "orchestration", "lambdas", "aai_retrieval_fast_path"))
+
+BUCKET = "bench-search-results"
+CONVERSATION_TABLE = "bench-conversations"
+CACHE_TABLE = "bench-retrieval-cache"
+TICKETS_TABLE = "SupportTickets"
+SUPPORT_EMAIL = "support@yourcompany.com"
+INDEX_NAME = "bench-index"
+QUERIES = [
+    "camera battery drains quickly after update",
+    "how do I reset my router to factory settings",
+    "refund for a damaged laptop screen",
+    "smartwatch will not pair over bluetooth",
+    "printer shows offline on wifi",
+    "headphones have no sound in the left ear",
+    "cannot log in to my account after password change",
+    "tablet overheats while charging"
+]
+MODES = ["no_cache", "result_cache"]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def create_resources():
+    region = os.environ["AWS_REGION"]
+    boto3.client("s3").create_bucket(Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": region})
+    dynamodb = boto3.client("dynamodb")
+    dynamodb.create_table(
+        TableName=CONVERSATION_TABLE, BillingMode="PAY_PER_REQUEST",
+        KeySchema=[{"AttributeName": "session_id", "KeyType": "HASH"},
+                   {"AttributeName": "timestamp", "KeyType": "RANGE"}],
+        AttributeDefinitions=[{"AttributeName": "session_id", "AttributeType": "S"},
+                              {"AttributeName": "timestamp", "AttributeType": "N"}]
+    )
+    dynamodb.create_table(
+        TableName=TICKETS_TABLE, BillingMode="PAY_PER_REQUEST",
+        KeySchema=[{"AttributeName": "ticket_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "ticket_id", "AttributeType": "S"}]
+    )
+    dynamodb.create_table(
+        TableName=CACHE_TABLE, BillingMode="PAY_PER_REQUEST",
+        KeySchema=[{"AttributeName": "cache_key", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "cache_key", "AttributeType": "S"}]
+    )
+    boto3.client("ses").verify_email_identity(EmailAddress=SUPPORT_EMAIL)
+
+def build_workload(args):
+    rng = random.Random(args.seed)
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(len(QUERIES))]
+    return [rng.choices(QUERIES, weights)[0] for _ in range(args.requests)]
+
+def run_mode(dag, aai_cache, result_cache, stream, mode, args):
+    aai_cache.reset_caches()
+    result_cache.RESULT_CACHE_ENABLED = mode == "result_cache"
+    computed_at = {}
+    timings, hit_ms, miss_ms, saved_ms = [], [], [], []
+    hits = stale_hits = bumps = 0
+    for i, user_query in enumerate(stream):
+        if i and i % args.ingest_every == 0:
+            aai_cache.bump_index_generation(INDEX_NAME)
+            bumps += 1
+        generation = aai_cache.index_generation(INDEX_NAME)
+        request = {"session_id": f"bench-{mode}-{i}", "query_id": f"bench-{mode}-{i}", "user_query": user_query,
+                   "max_results": 5, "use_reranker": True, "use_mmr": True}
+        start = time.perf_counter()
+        response = dag.run_retrieval(request)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if response["statusCode"] != 200:
+            raise RuntimeError(response.get("error"))
+        timings.append(elapsed_ms)
+        stats = response["monitoring"]["result_cache"]
+        if stats["hit"]:
+            hits += 1
+            hit_ms.append(elapsed_ms)
+            saved_ms.append(stats["stage_time_saved_ms"])
+            stale_hits += computed_at[stats["cached_query_id"]] != generation
+        else:
+            miss_ms.append(elapsed_ms)
+            computed_at[request["query_id"]] = generation
+    return {
+        "mode": mode,
+        "generation_bumps": bumps,
+        "hit_rate": hits / len(stream),
+        "stale_hits": stale_hits,
+        "stage_time_saved_mean_ms": statistics.mean(saved_ms) if saved_ms else 0.0,
+        "p50_ms": statistics.median(timings),
+        "p95_ms": percentile(timings, 95),
+        "mean_ms": statistics.mean(timings),
+        "hit_p50_ms": statistics.median(hit_ms) if hit_ms else None,
+        "miss_p50_ms": statistics.median(miss_ms) if miss_ms else None
+    }
+
+def check_degraded(dag, aai_cache, result_cache, rerank):
+    """Requests whose rerank misses the deadline must not be cached; the same request afterwards is"""
+    aai_cache.reset_caches()
+    # Entries stored by the replay are in the shared tier under the current generation
+    aai_cache.bump_index_generation(INDEX_NAME)
+    result_cache.RESULT_CACHE_ENABLED = True
+    # Scores cached by the replay would spare the endpoint calls the deadline is meant to cut off
+    score_cache_enabled, rerank.SCORE_CACHE_ENABLED = rerank.SCORE_CACHE_ENABLED, False
+    deadline_ms = rerank.RERANK_DEADLINE_MS
+    stored = served = 0
+    for i, user_query in enumerate(QUERIES):
+        request = {"session_id": f"bench-degraded-{i}", "user_query": user_query,
+                   "max_results": 5, "use_reranker": True, "use_mmr": True}
+        rerank.RERANK_DEADLINE_MS = 1
+        for attempt in range(2):
+            response = dag.run_retrieval({**request, "query_id": f"bench-degraded-{i}-{attempt}"})
+            if response["monitoring"]["result_cache"]["hit"]:
+                served += 1
+                continue
+            retrieval = response["monitoring"]["retrieval_monitoring"]
+            if "cross_encoder" not in retrieval["degraded_stages"]:
+                raise RuntimeError(f"rerank with a 1 ms deadline not reported degraded: {retrieval['degraded_stages']}")
+            stored += retrieval["result_cached"]
+        rerank.RERANK_DEADLINE_MS = deadline_ms
+        dag.run_retrieval({**request, "query_id": f"bench-degraded-{i}-full"})
+        if not dag.run_retrieval({**request, "query_id": f"bench-degraded-{i}-again"})["monitoring"]["result_cache"]["hit"]:
+            raise RuntimeError(f"complete results for {user_query!r} were not cached")
+    rerank.SCORE_CACHE_ENABLED = score_cache_enabled
+    if stored or served:
+        raise RuntimeError(f"degraded results stored {stored} times, served {served} times")
+    return {"degraded_requests": 2 * len(QUERIES), "degraded_stored": stored, "degraded_served": served}
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval result cache on a repetitive query stream")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--ingest-every", type=int, default=50, help="Requests between index generation bumps")
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--embed-ms", type=float, default=40.0)
+    parser.add_argument("--llm-ms", type=float, default=400.0)
+    parser.add_argument("--search-ms", type=float, default=30.0)
+    parser.add_argument("--rerank-ms", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=17)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_local_aws_env(OPENSEARCH_DOMAIN="bench.local", OPENSEARCH_INDEX=INDEX_NAME,
+                      SEARCH_RESULTS_BUCKET=BUCKET, SAGEMAKER_ENDPOINT="bench-reranker",
+                      CONVERSATION_TABLE=CONVERSATION_TABLE, CACHE_TABLE=CACHE_TABLE, EMBEDDING_DIMENSION=8,
+                      EMBEDDING_CACHE_ENABLED="false")
+    stream = build_workload(args)
+    results = []
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr):
+        create_resources()
+        # CACHE_TABLE is read at import
+        import aai_cache
+        import aai_result_cache
+        import retrieval_dag
+        retrieval_dag.load_stages()
+
+        bedrock = FakeBedrock(dimension=8, latency_ms=0.0, text_latency_ms=args.llm_ms)
+        bedrock_embed = FakeBedrock(dimension=8, latency_ms=args.embed_ms)
+        sagemaker = FakeSageMaker(latency_ms=args.rerank_ms)
+        opensearch = FakeOpenSearch(bm25_latency_ms=args.search_ms, knn_latency_ms=args.search_ms,
+                                    hits=fake_hits(20, "doc_"), knn_hits=fake_hits(20, "doc_", seed=1)[5:] + fake_hits(5, "knn_"))
+        retrieval_dag.load_stage("embedding").bedrock = bedrock_embed
+        retrieval_dag.load_stage("synthesize").bedrock = bedrock
+        for name in ("search", "mmr"):
+            retrieval_dag.load_stage(name).get_opensearch_client = lambda **kw: opensearch
+        retrieval_dag.load_stage("rerank").boto3 = types.SimpleNamespace(
+            client=lambda service, **kw: sagemaker if service == "sagemaker-runtime" else boto3.client(service, **kw)
+        )
+
+        # Warm imports and clients outside the measured stream
+        retrieval_dag.run_retrieval({"session_id": "bench-warmup", "query_id": "bench-warmup",
+                                     "user_query": "warmup", "max_results": 5})
+        for mode in MODES:
+            results.append(run_mode(retrieval_dag, aai_cache, aai_result_cache, stream, mode, args))
+            print(f"{mode}: hit rate {results[-1]['hit_rate']:.2f}, stale hits {results[-1]['stale_hits']}, "
+                  f"p50 {results[-1]['p50_ms']:.1f} ms", file=sys.stderr)
+        degraded = check_degraded(retrieval_dag, aai_cache, aai_result_cache, retrieval_dag.load_stage("rerank"))
+        print(f"degraded rerank: {degraded['degraded_requests']} requests, none stored or served", file=sys.stderr)
+
+    output = json.dumps({
+        "benchmark": "retrieval_result_cache",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "distinct_queries": len(set(stream)),
+        "results": results,
+        "degraded": degraded
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Hybrid Search Concurrency Benchmark
+Runs aai_hybrid_search_fusion in-process against a latency-injecting fake OpenSearch
+(moto for S3/CloudWatch) in each SEARCH_EXECUTION_MODE and reports the search-stage
+latency distribution, which should approach max(bm25, knn) for msearch/parallel.
+
+Usage:
+    python monitoring/benchmarks/search_concurrency.py --bm25-ms 40 --knn-ms 90 --iterations 30
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+
+import boto3
+from moto import mock_aws
+
+sys.path.insert(0, os.path.dirname(__file__))
+from lambda_loader import load_lambda, use_local_aws_env
+from fakes import FakeOpenSearch
+
+MODES = ["sequential", "msearch", "parallel"]
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential vs concurrent BM25/kNN search legs")
+    parser.add_argument("--bm25-ms", type=float, default=40.0)
+    parser.add_argument("--knn-ms", type=float, default=90.0)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--max-results", type=int, default=10)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    use_local_aws_env(OPENSEARCH_DOMAIN="bench.local", OPENSEARCH_INDEX="bench-index",
+                      SEARCH_RESULTS_BUCKET="bench-search-results")
+    results = []
+    with mock_aws(), contextlib.redirect_stdout(sys.stderr):
+        boto3.client("s3").create_bucket(
+            Bucket="bench-search-results",
+            CreateBucketConfiguration={"LocationConstraint": os.environ["AWS_REGION"]}
+        )
+        search = load_lambda("retrieval", "aai_hybrid_search_fusion")
+        opensearch = FakeOpenSearch(bm25_latency_ms=args.bm25_ms, knn_latency_ms=args.knn_ms)
+        search.get_opensearch_client = lambda **kw: opensearch
+
+        event = {
+            "query_id": "bench",
+            "user_query": "camera battery drains quickly",
+            "queryEmbedding": [0.1] * 8,
+            "max_results": args.max_results
+        }
+        for mode in MODES:
+            stage_ms, search_ms = [], []
+            for i in range(args.iterations):
+                response = search.lambda_handler({**event, "query_id": f"bench-{mode}-{i}", "search_mode": mode}, None)
+                monitoring = response["monitoring"]
+                stage_ms.append(monitoring["total_time_ms"])
+                search_ms.append(monitoring["search_time_ms"])
+            results.append({
+                "mode": mode,
+                "search_p50_ms": statistics.median(search_ms),
+                "search_p95_ms": percentile(search_ms, 95),
+                "stage_p50_ms": statistics.median(stage_ms),
+                "stage_p95_ms": percentile(stage_ms, 95),
+                "last_leg_timings_ms": {"bm25": monitoring["bm25_time_ms"], "knn": monitoring["knn_time_ms"]}
+            })
+
+    output = json.dumps({
+        "benchmark": "search_concurrency",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "expected_ms": {"sequential": args.bm25_ms + args.knn_ms, "concurrent": max(args.bm25_ms, args.knn_ms)},
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
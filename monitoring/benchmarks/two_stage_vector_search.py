@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - Two-Stage Vector Search Benchmark
+Compares the single-stage 1024-dim kNN setup with the two-stage mode
+(COMPACT_DIMENSION candidate search, full-vector rescore) on a local evaluation set.
+Reports recall@k against exact full-dimension ground truth, per-query latency
+and index vector memory as JSON.
+
+Latency is measured with flat NumPy scans, which scale with dimension the same way
+HNSW distance computations do; it is a relative comparison, not a cluster measurement.
+Synthetic vectors concentrate energy in the leading dimensions the way Titan v2
+truncated embeddings are meant to; pass --embeddings to use real vectors instead.
+
+Usage:
+    python monitoring/benchmarks/two_stage_vector_search.py --docs 20000 --compact-dims 256,512
+    python monitoring/benchmarks/two_stage_vector_search.py --embeddings processed/embeddings/*.json
+"""
+
+import argparse
+import glob
+import json
+import time
+
+import numpy as np
+
+HNSW_M = 16  # lucene default max connections per node
+
+def unit(rows):
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+def synthetic_corpus(docs, queries, dimension, decay, seed):
+    rng = np.random.default_rng(seed)
+    scale = (np.arange(1, dimension + 1, dtype=np.float32)) ** -decay
+    corpus = unit(rng.standard_normal((docs, dimension)).astype(np.float32) * scale)
+    picks = rng.integers(0, docs, size=queries)
+    noise = rng.standard_normal((queries, dimension)).astype(np.float32) * scale * 0.5
+    return corpus, unit(corpus[picks] + noise)
+
+def load_embeddings(patterns, queries, seed):
+    vectors = []
+    for pattern in patterns:
+        for path in glob.glob(pattern):
+            with open(path) as f:
+                vectors.extend(item["embedding"] for item in json.load(f)["embeddings"] if item.get("embedding"))
+    corpus = unit(np.asarray(vectors, dtype=np.float32))
+    rng = np.random.default_rng(seed)
+    held_out = rng.choice(len(corpus), size=min(queries, len(corpus) // 10 or 1), replace=False)
+    mask = np.ones(len(corpus), dtype=bool)
+    mask[held_out] = False
+    return corpus[mask], corpus[held_out]
+
+def top_k(scores, k):
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+def vector_memory(docs, dimension):
+    return {"vector_bytes": docs * dimension * 4, "graph_bytes_estimate": docs * HNSW_M * 2 * 4}
+
+def evaluate(name, corpus, compact, queries, truth, k, depth):
+    latencies, recalls = [], []
+    dimension = compact.shape[1] if compact is not None else corpus.shape[1]
+    for q, expected in zip(queries, truth):
+        start = time.perf_counter()
+        if compact is None:
+            found = top_k(corpus @ q, k)
+        else:
+            q_compact = q[:dimension] / np.linalg.norm(q[:dimension])
+            candidates = top_k(compact @ q_compact, depth)
+            if depth > k:
+                found = candidates[top_k(corpus[candidates] @ q, k)]
+            else:
+                found = candidates[:k]
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(set(found.tolist()) & set(expected.tolist())) / k)
+
+    memory = vector_memory(len(corpus), dimension)
+    return {
+        "mode": name,
+        "search_dimension": dimension,
+        "candidate_depth": depth,
+        "recall_at_k": float(np.mean(recalls)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        # Full vectors are still stored for rescoring but stay out of the HNSW graph / page cache hot set
+        "knn_memory_bytes": memory["vector_bytes"] + memory["graph_bytes_estimate"],
+        "stored_vector_bytes": corpus.shape[0] * corpus.shape[1] * 4
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Single-stage vs two-stage truncated vector search")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--compact-dims", default="256,512")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--depth-factors", default="1,4,8", help="RESCORE_DEPTH_FACTOR values to sweep")
+    parser.add_argument("--decay", type=float, default=0.5, help="Synthetic per-dimension energy decay exponent")
+    parser.add_argument("--embeddings", nargs="*", help="aai_generate_embeddings output files to use instead of synthetic data")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    if args.embeddings:
+        corpus, queries = load_embeddings(args.embeddings, args.queries, args.seed)
+    else:
+        corpus, queries = synthetic_corpus(args.docs, args.queries, args.dimension, args.decay, args.seed)
+
+    truth = [top_k(corpus @ q, args.k) for q in queries]
+    results = [evaluate("single_stage", corpus, None, queries, truth, args.k, args.k)]
+    for compact_dim in (int(d) for d in args.compact_dims.split(",")):
+        compact = unit(corpus[:, :compact_dim])
+        for factor in (int(f) for f in args.depth_factors.split(",")):
+            mode = "compact_only" if factor == 1 else "two_stage"
+            results.append(evaluate(mode, corpus, compact, queries, truth, args.k, args.k * factor))
+
+    output = json.dumps({
+        "benchmark": "two_stage_vector_search",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {**vars(args), "docs": len(corpus), "queries": len(queries), "dimension": corpus.shape[1]},
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
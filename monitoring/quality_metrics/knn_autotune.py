@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Agentic AI RAG Pipeline - kNN Search Autotuner
+Measures the recall/latency trade-off of the kNN leg and recommends the cheapest setting that
+reaches a target recall, for aai_hybrid_search_fusion to read at startup (KNN_TUNING_KEY).
+
+Ground truth is brute-force top-k over the exported chunk vectors (the same space type as the
+index: innerproduct with NORMALIZE_EMBEDDINGS, l2 otherwise). Queries are sampled chunk vectors,
+the chunk itself left out of both rankings, or real query embeddings from --query-vectors (.npy).
+
+Backends:
+  - opensearch: the live domain (OPENSEARCH_DOMAIN / OPENSEARCH_INDEX, all partitions); vectors
+    are exported by scan, then every --k-factors x --ef-search pair is run as a kNN query on the
+    full-vector field (k = depth * factor, method_parameters.ef_search; 0 is the engine default)
+  - embedded: the embedded IVF index (aai_vector_index, current generation in VECTOR_INDEX_BUCKET,
+    or a build directory with --index-dir), swept over --nprobes in-process
+
+Reports recall@k (mean) and p50/p95 search latency per setting, and the recommended setting:
+the lowest p95 with recall >= --target-recall, else the highest recall. --write merges it into
+s3://SEARCH_RESULTS_BUCKET/<KNN_TUNING_KEY> under the backend's name; Lambdas pick it up on
+their next cold start.
+
+Usage:
+    python monitoring/quality_metrics/knn_autotune.py --backend opensearch --k 20 --queries 200 --write
+    python monitoring/quality_metrics/knn_autotune.py --backend embedded --nprobes 2,4,8,16,32 --write
+"""
+
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+
+import boto3
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "src", "shared", "layers", "python"))
+
+VECTOR_FIELD = "embedding"
+DEFAULT_TUNING_KEY = "tuning/knn_search.json"
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def parse_list(value, cast=int):
+    return [cast(v) for v in value.split(",") if v.strip()]
+
+def export_vectors(opensearch, index_name):
+    """Every chunk's _id and vector in the live index, across all partitions"""
+    from opensearchpy import helpers
+    from aai_index_partitions import INDEX_PARTITIONING, partition_pattern
+    target = partition_pattern(index_name) if INDEX_PARTITIONING != "none" else index_name
+    ids, vectors = [], []
+    query = {"query": {"match_all": {}}, "_source": [VECTOR_FIELD]}
+    for hit in helpers.scan(opensearch, index=target, query=query, size=1000):
+        vector = hit["_source"].get(VECTOR_FIELD)
+        if vector:
+            ids.append(hit["_id"])
+            vectors.append(np.asarray(vector, dtype=np.float32))
+    if not ids:
+        raise ValueError(f"No vectors found in {target}")
+    return ids, np.stack(vectors), target
+
+def similarity(vectors, query, metric):
+    if metric == "innerproduct":
+        return vectors @ query
+    return -((vectors - query) ** 2).sum(axis=1)
+
+def ground_truth(vectors, ids, queries, exclude, k, metric):
+    """Brute-force top-k _ids per query, without the query's own chunk"""
+    truth = []
+    for query, row in zip(queries, exclude):
+        scores = similarity(vectors, query, metric)
+        if row is not None:
+            scores[row] = -np.inf
+        top = np.argpartition(-scores, k - 1)[:k]
+        truth.append({ids[i] for i in top[np.argsort(-scores[top])]})
+    return truth
+
+def sample_queries(vectors, args):
+    if args.query_vectors:
+        queries = np.load(args.query_vectors).astype(np.float32)
+        return queries[:args.queries], [None] * min(len(queries), args.queries)
+    rng = np.random.default_rng(args.seed)
+    rows = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+    return vectors[rows], [int(row) for row in rows]
+
+def measure(search, queries, exclude_ids, truth, k):
+    """Recall@k and latency of one setting; search(query, size) returns (hit ids, ms)"""
+    recalls, latencies = [], []
+    for query, own_id, expected in zip(queries, exclude_ids, truth):
+        hit_ids, ms = search(query, k + (own_id is not None))
+        hit_ids = [i for i in hit_ids if i != own_id][:k]
+        recalls.append(len(set(hit_ids) & expected) / len(expected))
+        latencies.append(ms)
+    return {
+        "recall_at_k": statistics.mean(recalls),
+        "min_recall": min(recalls),
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": percentile(latencies, 95)
+    }
+
+def opensearch_settings(args):
+    """Exported vectors of the live index, and a search per k_factor x ef_search"""
+    from aai_opensearch_client import get_opensearch_client
+    opensearch = get_opensearch_client()
+    index_name = args.index or os.environ.get("OPENSEARCH_INDEX")
+    metric = args.metric or ("innerproduct" if os.environ.get("NORMALIZE_EMBEDDINGS", "false").lower() == "true" else "l2")
+    ids, vectors, target = export_vectors(opensearch, index_name)
+
+    def searcher(k_factor, ef_search):
+        def search(query, size):
+            knn = {"vector": query.tolist(), "k": max(size, math.ceil(size * k_factor))}
+            if ef_search:
+                knn["method_parameters"] = {"ef_search": ef_search}
+            body = {"size": size, "_source": False, "query": {"knn": {VECTOR_FIELD: knn}}}
+            start = time.time()
+            response = opensearch.search(index=target, body=body)
+            return [hit["_id"] for hit in response["hits"]["hits"]], (time.time() - start) * 1000
+        return search
+
+    settings = [({"k_factor": k_factor, "ef_search": ef_search}, searcher(k_factor, ef_search))
+                for k_factor in parse_list(args.k_factors, float) for ef_search in parse_list(args.ef_search)]
+    return ids, vectors, metric, settings
+
+def embedded_settings(args):
+    """Vectors of the embedded index, and a search per nprobe"""
+    from aai_vector_index import VectorIndex, get_vector_index
+    if args.index_dir:
+        index = VectorIndex(args.index_dir)
+    else:
+        index, _ = get_vector_index(args.index or os.environ.get("OPENSEARCH_INDEX"))
+    ids = [index.doc(row)["_id"] for row in range(index.rows)]
+
+    def searcher(nprobe):
+        def search(query, size):
+            start = time.time()
+            hits, _ = index.search(query, size, nprobe=nprobe)
+            return [hit["_id"] for hit in hits], (time.time() - start) * 1000
+        return search
+
+    settings = [({"nprobe": nprobe}, searcher(nprobe)) for nprobe in parse_list(args.nprobes)]
+    return ids, np.asarray(index.vectors), index.metric, settings
+
+def recommend(curve, target_recall):
+    reaching = [point for point in curve if point["recall_at_k"] >= target_recall]
+    if reaching:
+        return min(reaching, key=lambda p: (p["p95_ms"], -p["recall_at_k"])), True
+    return max(curve, key=lambda p: (p["recall_at_k"], -p["p95_ms"])), False
+
+def write_tuning(bucket, key, backend, setting):
+    """Merge one backend's recommended setting into the tuning file the search Lambda reads"""
+    s3 = boto3.client("s3")
+    try:
+        tuning = json.loads(s3.get_object(Bucket=bucket, Key=key)["Body"].read())
+    except s3.exceptions.NoSuchKey:
+        tuning = {}
+    tuning[backend] = setting
+    s3.put_object(Bucket=bucket, Key=key, Body=json.dumps(tuning, indent=2), ContentType="application/json")
+    return tuning
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep kNN search settings for recall@k vs latency")
+    parser.add_argument("--backend", choices=["opensearch", "embedded"], default="opensearch")
+    parser.add_argument("--index", help="OPENSEARCH_INDEX (default from the environment)")
+    parser.add_argument("--index-dir", help="Embedded backend: a local build directory instead of the published index")
+    parser.add_argument("--metric", choices=["innerproduct", "l2"], help="Opensearch backend: index space type")
+    parser.add_argument("--k", type=int, default=20, help="kNN depth (max_results * COLLAPSE_DEPTH_FACTOR)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-vectors", help=".npy of query embeddings instead of sampled chunks")
+    parser.add_argument("--k-factors", default="1,1.5,2,4", help="KNN_K_FACTOR values to sweep")
+    parser.add_argument("--ef-search", default="0,100,200,400", help="KNN_EF_SEARCH values to sweep (0: default)")
+    parser.add_argument("--nprobes", default="1,2,4,8,16,32", help="VECTOR_INDEX_NPROBE values to sweep")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--write", action="store_true", help="Store the recommendation for the search Lambda")
+    parser.add_argument("--bucket", default=os.environ.get("SEARCH_RESULTS_BUCKET"))
+    parser.add_argument("--key", default=os.environ.get("KNN_TUNING_KEY") or DEFAULT_TUNING_KEY)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    start = time.time()
+    ids, vectors, metric, settings = (opensearch_settings if args.backend == "opensearch" else embedded_settings)(args)
+    export_ms = (time.time() - start) * 1000
+    queries, exclude = sample_queries(vectors, args)
+    exclude_ids = [ids[row] if row is not None else None for row in exclude]
+    start = time.time()
+    truth = ground_truth(vectors, ids, queries, exclude, args.k, metric)
+    truth_info = {"rows": len(ids), "queries": len(queries), "metric": metric,
+                  "export_ms": export_ms, "brute_force_ms": (time.time() - start) * 1000}
+    print(f"ground truth: {len(ids)} vectors, {len(queries)} queries ({metric})", file=sys.stderr)
+
+    curve = []
+    for point, search in settings:
+        name = ", ".join(f"{key} {value}" for key, value in point.items())
+        point.update(measure(search, queries, exclude_ids, truth, args.k))
+        curve.append(point)
+        print(f"{name}: recall@{args.k} {point['recall_at_k']:.3f}, p50 {point['p50_ms']:.2f} ms, "
+              f"p95 {point['p95_ms']:.2f} ms", file=sys.stderr)
+
+    best, reached = recommend(curve, args.target_recall)
+    setting = {name: best[name] for name in ("k_factor", "ef_search", "nprobe") if name in best}
+    setting.update({
+        "recall_at_k": best["recall_at_k"],
+        "k": args.k,
+        "p95_ms": best["p95_ms"],
+        "target_recall": args.target_recall,
+        "target_reached": reached,
+        "index": args.index_dir or args.index or os.environ.get("OPENSEARCH_INDEX"),
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    })
+    if not reached:
+        print(f"WARNING: no setting reaches recall {args.target_recall}; recommending the highest recall",
+              file=sys.stderr)
+    if args.write:
+        if not args.bucket:
+            parser.error("--write needs --bucket or SEARCH_RESULTS_BUCKET")
+        write_tuning(args.bucket, args.key, args.backend, setting)
+        print(f"wrote {args.backend} settings to s3://{args.bucket}/{args.key}", file=sys.stderr)
+
+    output = json.dumps({
+        "tool": "knn_autotune",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": vars(args),
+        "ground_truth": truth_info,
+        "curve": curve,
+        "recommended": setting
+    }, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
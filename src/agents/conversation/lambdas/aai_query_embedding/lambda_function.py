@@ -2,20 +2,22 @@
 # Generates embeddings for user queries using Bedrock
 
 # lambda_get_query_embedding.py
-import os, json, boto3
+import boto3
+from aai_candidate_envelope import encode_vector
+from aai_query_vectors import EMBEDDING_CACHE_ENABLED, EMBEDDING_DIMENSION, query_embedding
 bedrock = boto3.client("bedrock-runtime")  # ensure region and permissions
 
-EMBED_MODEL = os.environ.get("EMBED_MODEL", "amazon.titan-embed-text-v2:0")
-
 def lambda_handler(event, context):
     user_query = event.get("user_query", "")
     if not user_query:
         raise ValueError("Missing user_query")
 
-    payload = json.dumps({"inputText": user_query})
-    resp = bedrock.invoke_model(modelId=EMBED_MODEL, body=payload)
-    body = resp['body'].read()
-    result = json.loads(body)
-    embedding = result.get("embedding")  # list[float]
+    dimension = int(event.get("dimension", EMBEDDING_DIMENSION))
+    # Model, normalization and the embedding cache settings live in aai_query_vectors
+    embedding, cache_stats = query_embedding(bedrock, user_query, dimension,
+                                             event.get("use_embedding_cache", EMBEDDING_CACHE_ENABLED))
 
-    return {"embedding": embedding}
+    # Plain list for direct callers that ask for it, compact float16 encoding for the state machine
+    if event.get("encoding") == "list" or not embedding:
+        return {"embedding": embedding, "cache": cache_stats}
+    return {"embedding": encode_vector(embedding), "cache": cache_stats}
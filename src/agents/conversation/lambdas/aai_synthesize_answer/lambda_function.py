@@ -2,6 +2,7 @@
 # Generates responses using Bedrock LLM with retrieved context
 
 import os, json, boto3, textwrap
+from aai_ticket_intent import wants_ticket
 bedrock = boto3.client("bedrock-runtime")
 LLM_MODEL = os.environ.get("LLM_MODEL", "amazon.titan-text-lite-v1")
 
@@ -76,15 +77,9 @@ def lambda_handler(event, context):
     source_ids = [m.get("ticket_id") or m.get("source") for m in metadata if m.get("ticket_id") or m.get("source")]
     source_ids = list(dict.fromkeys(source_ids))  # dedupe preserving order
 
-    # Check if user wants to create a ticket
-    user_query_lower = user_query.lower()
-    wants_ticket = any(phrase in user_query_lower for phrase in [
-        'yes', 'create ticket', 'raise ticket', 'support ticket', 
-        'contact support', 'escalate', 'help me'
-    ])
-    
     return {
         "answer": answer.strip(), 
         "sources": source_ids,
-        "create_ticket": wants_ticket
+        # Check if user wants to create a ticket
+        "create_ticket": wants_ticket(user_query)
     }
@@ -1,34 +1,67 @@
-import boto3
-from opensearchpy import OpenSearch, RequestsHttpConnection
-from requests_aws4auth import AWS4Auth
+from aai_index_partitions import INDEX_PARTITIONING, fixed_partitions, partition_pattern, partition_template
+from aai_opensearch_client import get_opensearch_client
+from aai_source_index import HIERARCHICAL_INDEX, source_index
 import os
 
+# Unit-normalized vectors are compared with a plain dot product instead of l2 distance
+NORMALIZE_EMBEDDINGS = os.environ.get("NORMALIZE_EMBEDDINGS", "false").lower() == "true"
+KNN_SPACE_TYPE = "innerproduct" if NORMALIZE_EMBEDDINGS else "l2"
+EMBEDDING_DIMENSION = int(os.environ.get("EMBEDDING_DIMENSION", "1024"))
+# Two-stage mode: only the truncated vectors get an HNSW graph, full vectors are kept for rescoring
+COMPACT_DIMENSION = int(os.environ.get("COMPACT_DIMENSION", "0"))
+
+def vector_mappings():
+    knn_method = {
+        "name": "hnsw",
+        "space_type": KNN_SPACE_TYPE,
+        "engine": "lucene"
+    }
+    if not COMPACT_DIMENSION:
+        return {"embedding": {"type": "knn_vector", "dimension": EMBEDDING_DIMENSION, "method": knn_method}}
+    return {
+        "embedding": {"type": "object", "enabled": False},
+        "embedding_compact": {"type": "knn_vector", "dimension": COMPACT_DIMENSION, "method": knn_method}
+    }
+
+def source_index_body():
+    """Source centroids: a full-dimension HNSW graph over one vector per document or ticket cluster"""
+    return {
+        "settings": {"index": {"number_of_shards": 1, "number_of_replicas": 0, "knn": True}},
+        "mappings": {
+            "properties": {
+                "embedding": {
+                    "type": "knn_vector",
+                    "dimension": EMBEDDING_DIMENSION,
+                    "method": {"name": "hnsw", "space_type": KNN_SPACE_TYPE, "engine": "lucene"}
+                },
+                "kind": {"type": "keyword"},
+                "source": {"type": "keyword"},
+                "metadata": {"type": "object", "enabled": False},
+                "chunk_count": {"type": "integer"},
+                # Running sum the centroid is recomputed from as later ingestion runs add chunks,
+                # and the chunk _ids already in it so re-ingested chunks are not counted twice
+                "vector_sum": {"type": "object", "enabled": False},
+                "chunk_ids": {"type": "keyword", "index": False, "doc_values": False},
+                "updated_at": {"type": "date"}
+            }
+        }
+    }
+
 def lambda_handler(event, context):
-    # OpenSearch domain endpoint - replace with your actual endpoint
-    host = os.environ.get("OPENSEARCH_DOMAIN")
     index_name = os.environ.get("OPENSEARCH_INDEX")
-    region = os.environ.get("AWS_REGION")
-    service = 'es'
     
-    # Get credentials from the AWS SDK
-    credentials = boto3.Session().get_credentials()
-    awsauth = AWS4Auth(credentials.access_key, credentials.secret_key, 
-                       region, service, session_token=credentials.token)
-    
-    # Create the OpenSearch client
-    opensearch = OpenSearch(
-        hosts = [{'host': host, 'port': 443}],
-        http_auth = awsauth,
-        use_ssl = True,
-        verify_certs = True,
-        connection_class = RequestsHttpConnection
-    )
+    # Shared pooled client (OPENSEARCH_DOMAIN / AWS_REGION from the environment)
+    opensearch = get_opensearch_client()
     
     # Read and store embeddings from S3 files
     try:
         #Delete index if it exists
         if opensearch.indices.exists(index=index_name):
             opensearch.indices.delete(index=index_name)
+        if INDEX_PARTITIONING != "none":
+            # Named deletes only, wildcard deletes may be disabled on the domain
+            for partition in opensearch.indices.get(index=partition_pattern(index_name), allow_no_indices=True):
+                opensearch.indices.delete(index=partition)
         
         # Create index with proper mapping for knn_vector
         index_body = {
@@ -61,15 +94,7 @@ def lambda_handler(event, context):
             },
             "mappings": {
                 "properties": {
-                    "embedding": {
-                        "type": "knn_vector",
-                        "dimension": 1024,
-                        "method": {
-                            "name": "hnsw",
-                            "space_type": "l2",
-                            "engine": "lucene"
-                        }
-                    },
+                    **vector_mappings(),
                     "text": {
                         "type": "text", #Explicit similarity: Applied BM25 similarity to the text field
                         "analyzer": "english_bm25",
@@ -77,6 +102,7 @@ def lambda_handler(event, context):
                     },
                     "source": {"type": "keyword"},
                     "ticket_id": {"type": "keyword"},
+                    "chunk_id": {"type": "integer"},
                     "created_at": {"type": "date"},
                     "metadata": {
                         "properties": {
@@ -91,10 +117,27 @@ def lambda_handler(event, context):
             }
         }
 
-        opensearch.indices.create(index=index_name, body=index_body)
-        print(f"Index {index_name} created successfully")
+        if INDEX_PARTITIONING != "none":
+            # Per-product partitions appear on first write, so they take their mapping from a template
+            opensearch.indices.put_index_template(name=partition_template(index_name), body={
+                "index_patterns": [partition_pattern(index_name)],
+                "template": index_body
+            })
+        
+        indices = fixed_partitions(index_name)
+        for partition in indices:
+            opensearch.indices.create(index=partition, body=index_body)
+            print(f"Index {partition} created successfully")
+        
+        if HIERARCHICAL_INDEX:
+            sources = source_index(index_name)
+            if opensearch.indices.exists(index=sources):
+                opensearch.indices.delete(index=sources)
+            opensearch.indices.create(index=sources, body=source_index_body())
+            indices.append(sources)
+            print(f"Index {sources} created successfully")
         
-        return {"status": "Index Created"}
+        return {"status": "Index Created", "indices": indices, "partitioning": INDEX_PARTITIONING}
 
     except Exception as e:
         return {
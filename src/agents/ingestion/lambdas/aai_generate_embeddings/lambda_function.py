@@ -9,6 +9,21 @@ region = os.environ.get("AWS_REGION")
 bedrock = boto3.client('bedrock-runtime', region_name=region)
 s3 = boto3.client("s3")
 embed_model = os.environ.get("EMBED_MODEL")
+NORMALIZE_EMBEDDINGS = os.environ.get("NORMALIZE_EMBEDDINGS", "false").lower() == "true"
+EMBEDDING_DIMENSION = int(os.environ.get("EMBEDDING_DIMENSION", "1024"))
+
+def normalize_vector(vector):
+    norm = sum(x * x for x in vector) ** 0.5
+    return [x / norm for x in vector] if norm else vector
+
+def build_embedding_request(text):
+    request = {"inputText": text}
+    # Titan v2 can return unit vectors itself; older models are normalized after the call
+    if "titan-embed-text-v2" in (embed_model or ""):
+        request["dimensions"] = EMBEDDING_DIMENSION
+        if NORMALIZE_EMBEDDINGS:
+            request["normalize"] = True
+    return json.dumps(request)
 
 def get_embedding(text):
     max_retries = 3
@@ -16,13 +31,14 @@ def get_embedding(text):
     
     for attempt in range(max_retries):
         try:
-            body = json.dumps({"inputText": text})
+            body = build_embedding_request(text)
             resp = bedrock.invoke_model(
                 modelId=embed_model,
                 body=body
             )
             result = json.loads(resp['body'].read())
-            return result['embedding']
+            embedding = result['embedding']
+            return normalize_vector(embedding) if NORMALIZE_EMBEDDINGS else embedding
         except ClientError as e:
             if e.response['Error']['Code'] == 'ThrottlingException' and attempt < max_retries - 1:
                 delay = base_delay * (2 ** attempt)
@@ -49,7 +65,7 @@ def lambda_handler(event, context):
         }
         
         # Add additional fields if they exist (for CSV files)
-        for field in ["ticket_id", "metadata", "created_at"]:
+        for field in ["ticket_id", "chunk_id", "metadata", "created_at"]:
             if field in chunk_data:
                 embedding_obj[field] = chunk_data[field]
         
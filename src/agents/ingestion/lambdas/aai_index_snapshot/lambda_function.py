@@ -0,0 +1,377 @@
+# Data Ingestion Agent - Portable Index Snapshot
+# Exports indexed chunks (text, metadata, vectors) to a sharded binary snapshot in S3
+# and rebuilds a fresh index from it without re-running Textract, chunking or Bedrock;
+# also builds the embedded vector and lexical indices searched in-Lambda (aai_vector_index,
+# aai_lexical_index)
+
+import boto3
+import json
+import os
+import shutil
+import struct
+import sys
+import time
+import zlib
+from array import array
+from datetime import datetime
+from aai_cache import bump_index_generation
+from aai_embedded_index import chunk_doc_id
+from aai_index_partitions import INDEX_PARTITIONING, fixed_partitions, partition_index, partition_pattern, partition_template
+from aai_lexical_index import LEXICAL_INDEX_BUCKET, build_lexical_index, publish_lexical_index
+from aai_opensearch_client import get_opensearch_client
+from aai_query_vectors import normalize_vector, truncate_vector
+from aai_vector_index import VECTOR_INDEX_BUCKET, build_vector_index, publish_vector_index
+from opensearchpy import helpers
+
+s3 = boto3.client("s3")
+
+RAW_DATA_BUCKET = os.environ.get("RAW_DATA_BUCKET")
+SNAPSHOT_BUCKET = os.environ.get("SNAPSHOT_BUCKET", RAW_DATA_BUCKET)
+SNAPSHOT_PREFIX = os.environ.get("SNAPSHOT_PREFIX", "snapshots/")
+SNAPSHOT_SHARD_DOCS = int(os.environ.get("SNAPSHOT_SHARD_DOCS", "5000"))
+RESTORE_BULK_CHUNK = int(os.environ.get("RESTORE_BULK_CHUNK", "500"))
+RESTORE_THREADS = int(os.environ.get("RESTORE_THREADS", "4"))
+VECTOR_FIELD = "embedding"
+# Derived from VECTOR_FIELD at restore time rather than stored twice
+COMPACT_FIELD = "embedding_compact"
+EMBEDDING_DIMENSION = int(os.environ.get("EMBEDDING_DIMENSION", "1024"))
+NORMALIZE_EMBEDDINGS = os.environ.get("NORMALIZE_EMBEDDINGS", "false").lower() == "true"
+# Inverted lists of the embedded vector index, 0 for about 4 * sqrt(chunks)
+VECTOR_INDEX_NLIST = int(os.environ.get("VECTOR_INDEX_NLIST", "0"))
+VECTOR_INDEX_BUILD_DIR = "/tmp/vector_index_build"
+LEXICAL_INDEX_BUILD_DIR = "/tmp/lexical_index_build"
+
+SHARD_MAGIC = b"AAISNAP1"
+FORMAT_VERSION = 1
+# Index settings that describe the index shape and can be replayed on a new index
+PORTABLE_SETTINGS = ["number_of_shards", "number_of_replicas", "knn", "similarity", "analysis", "refresh_interval"]
+
+def encode_shard(docs, dimension):
+    """
+    Shard layout (zlib-compressed):
+    magic | uint32 doc_count | uint32 dimension | float32[doc_count * dimension] | uint32 meta_len | JSON meta
+    Vectors are little-endian float32; docs without a vector are stored as zeros with "_v": false.
+    Each doc's meta keeps its _id and the _index (partition) it was exported from.
+    """
+    vectors = array("f")
+    meta = []
+    for doc in docs:
+        source = dict(doc["_source"])
+        vector = source.pop(VECTOR_FIELD, None)
+        source.pop(COMPACT_FIELD, None)
+        if vector and len(vector) == dimension:
+            vectors.extend(vector)
+        else:
+            vectors.extend([0.0] * dimension)
+            source["_v"] = False
+        source["_id"] = doc["_id"]
+        source["_index"] = doc["_index"]
+        meta.append(source)
+    if sys.byteorder == "big":
+        vectors.byteswap()
+    meta_bytes = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+    payload = b"".join([
+        SHARD_MAGIC,
+        struct.pack("<II", len(docs), dimension),
+        vectors.tobytes(),
+        struct.pack("<I", len(meta_bytes)),
+        meta_bytes
+    ])
+    return zlib.compress(payload, 6)
+
+def decode_shard(blob):
+    """Inverse of encode_shard: returns a list of (index, doc_id, source, vector) tuples"""
+    payload = zlib.decompress(blob)
+    if payload[:8] != SHARD_MAGIC:
+        raise ValueError("Not an index snapshot shard")
+    doc_count, dimension = struct.unpack_from("<II", payload, 8)
+    offset = 16
+    vectors = array("f")
+    vectors.frombytes(payload[offset:offset + doc_count * dimension * 4])
+    if sys.byteorder == "big":
+        vectors.byteswap()
+    offset += doc_count * dimension * 4
+    (meta_len,) = struct.unpack_from("<I", payload, offset)
+    meta = json.loads(payload[offset + 4:offset + 4 + meta_len])
+
+    docs = []
+    for i, source in enumerate(meta):
+        doc_id = source.pop("_id")
+        # Snapshots taken before partitioning was exported do not carry it
+        index = source.pop("_index", None)
+        has_vector = source.pop("_v", True)
+        vector = vectors[i * dimension:(i + 1) * dimension].tolist() if has_vector else None
+        docs.append((index, doc_id, source, vector))
+    return docs
+
+def read_manifest(bucket, prefix):
+    obj = s3.get_object(Bucket=bucket, Key=f"{prefix}manifest.json")
+    return json.loads(obj["Body"].read())
+
+def iter_snapshot(bucket, prefix):
+    """Yield (index, doc_id, source, vector) for every document in a snapshot"""
+    manifest = read_manifest(bucket, prefix)
+    for shard in manifest["shards"]:
+        blob = s3.get_object(Bucket=bucket, Key=shard["key"])["Body"].read()
+        for doc in decode_shard(blob):
+            yield doc
+
+def portable_index_body(opensearch, index_name):
+    """
+    Capture the live index settings/mapping (as created by aai_create_opensearch_index); for a
+    partitioned index those of the index template every partition is created from
+    """
+    if INDEX_PARTITIONING != "none":
+        response = opensearch.indices.get_index_template(name=partition_template(index_name))
+        template = response["index_templates"][0]["index_template"]["template"]
+        # Template settings nest under "index" or sit beside it (analysis), depending on how they were put
+        settings = {**{k: v for k, v in template.get("settings", {}).items() if k != "index"},
+                    **template.get("settings", {}).get("index", {})}
+        mappings = template["mappings"]
+    else:
+        settings = opensearch.indices.get_settings(index=index_name)[index_name]["settings"]["index"]
+        mappings = opensearch.indices.get_mapping(index=index_name)[index_name]["mappings"]
+    return {
+        "settings": {"index": {k: v for k, v in settings.items() if k in PORTABLE_SETTINGS}},
+        "mappings": mappings
+    }
+
+def export_snapshot(opensearch, index_name, bucket, snapshot_id):
+    prefix = f"{SNAPSHOT_PREFIX}{index_name}/{snapshot_id}/"
+    index_body = portable_index_body(opensearch, index_name)
+    target = partition_pattern(index_name) if INDEX_PARTITIONING != "none" else index_name
+    # Two-stage indices keep the full vector as a stored-only object field without a dimension
+    dimension = index_body["mappings"]["properties"][VECTOR_FIELD].get("dimension", EMBEDDING_DIMENSION)
+
+    shards = []
+    buffer = []
+    total_docs = 0
+    total_bytes = 0
+    partition_counts = {}
+
+    def flush():
+        nonlocal total_bytes
+        key = f"{prefix}part-{len(shards):05d}.bin"
+        blob = encode_shard(buffer, dimension)
+        s3.put_object(Bucket=bucket, Key=key, Body=blob, ContentType="application/octet-stream")
+        shards.append({"key": key, "doc_count": len(buffer), "bytes": len(blob)})
+        total_bytes += len(blob)
+        buffer.clear()
+
+    for hit in helpers.scan(opensearch, index=target, query={"query": {"match_all": {}}}, size=1000):
+        buffer.append(hit)
+        total_docs += 1
+        partition_counts[hit["_index"]] = partition_counts.get(hit["_index"], 0) + 1
+        if len(buffer) >= SNAPSHOT_SHARD_DOCS:
+            flush()
+    if buffer:
+        flush()
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "snapshot_id": snapshot_id,
+        "index_name": index_name,
+        "partitioning": INDEX_PARTITIONING,
+        "partitions": partition_counts,
+        "created_at": datetime.utcnow().isoformat(),
+        "vector_field": VECTOR_FIELD,
+        "dimension": dimension,
+        "doc_count": total_docs,
+        "total_bytes": total_bytes,
+        "index_body": index_body,
+        "shards": shards
+    }
+    s3.put_object(Bucket=bucket, Key=f"{prefix}manifest.json", Body=json.dumps(manifest),
+                  ContentType="application/json")
+    return {"snapshot_prefix": prefix, "doc_count": total_docs, "shard_count": len(shards), "total_bytes": total_bytes,
+            "partitions": partition_counts}
+
+def restore_snapshot(opensearch, bucket, prefix, target_index, overwrite=False):
+    manifest = read_manifest(bucket, prefix)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format: {manifest.get('format_version')}")
+
+    # Documents are routed to the partitions of the current INDEX_PARTITIONING, as aai_store_opensearch does
+    partitioned = INDEX_PARTITIONING != "none"
+    if partitioned:
+        existing = list(opensearch.indices.get(index=partition_pattern(target_index), allow_no_indices=True))
+    else:
+        existing = [target_index] if opensearch.indices.exists(index=target_index) else []
+    if existing:
+        if not overwrite:
+            raise ValueError(f"Index {', '.join(existing)} already exists, pass overwrite=true to replace it")
+        # Named deletes only, wildcard deletes may be disabled on the domain
+        for index in existing:
+            opensearch.indices.delete(index=index)
+
+    index_body = manifest["index_body"]
+    index_settings = index_body["settings"]["index"]
+    refresh_interval = index_settings.get("refresh_interval", "1s")
+    replicas = index_settings.get("number_of_replicas", 0)
+
+    # Load with refresh and replicas off, then restore both
+    create_body = json.loads(json.dumps(index_body))
+    create_body["settings"]["index"]["refresh_interval"] = "-1"
+    create_body["settings"]["index"]["number_of_replicas"] = 0
+    if partitioned:
+        # Per-product partitions appear during the load, so the template carries the load settings until it ends
+        opensearch.indices.put_index_template(name=partition_template(target_index), body={
+            "index_patterns": [partition_pattern(target_index)], "template": create_body
+        })
+    for index in fixed_partitions(target_index):
+        opensearch.indices.create(index=index, body=create_body)
+
+    vector_field = manifest["vector_field"]
+    compact_dimension = index_body["mappings"]["properties"].get(COMPACT_FIELD, {}).get("dimension")
+
+    def actions():
+        for _, doc_id, source, vector in iter_snapshot(bucket, prefix):
+            index = partition_index(target_index, source)
+            if vector is not None:
+                source[vector_field] = vector
+                if compact_dimension:
+                    source[COMPACT_FIELD] = truncate_vector(vector, compact_dimension)
+            yield {"_index": index, "_id": doc_id, "_source": source}
+
+    indexed = 0
+    failed = 0
+    partition_counts = {}
+    for ok, item in helpers.parallel_bulk(opensearch, actions(), thread_count=RESTORE_THREADS,
+                                          chunk_size=RESTORE_BULK_CHUNK, raise_on_error=False):
+        if ok:
+            indexed += 1
+            index = item["index"]["_index"]
+            partition_counts[index] = partition_counts.get(index, 0) + 1
+        else:
+            failed += 1
+
+    loaded = target_index
+    if partitioned:
+        opensearch.indices.put_index_template(name=partition_template(target_index), body={
+            "index_patterns": [partition_pattern(target_index)], "template": index_body
+        })
+        loaded = partition_pattern(target_index)
+    opensearch.indices.put_settings(
+        index=loaded,
+        body={"index": {"refresh_interval": refresh_interval, "number_of_replicas": replicas}}
+    )
+    opensearch.indices.refresh(index=loaded)
+    return {"target_index": target_index, "doc_count": manifest["doc_count"], "indexed_count": indexed, "failed_count": failed,
+            "partitions": partition_counts}
+
+def iter_index(opensearch, index_name, with_vectors=True):
+    """Yield (index, doc_id, source, vector) for every chunk, across all partitions"""
+    target = partition_pattern(index_name) if INDEX_PARTITIONING != "none" else index_name
+    query = {"query": {"match_all": {}}}
+    if not with_vectors:
+        query["_source"] = {"excludes": [VECTOR_FIELD, COMPACT_FIELD]}
+    for hit in helpers.scan(opensearch, index=target, query=query, size=1000):
+        source = hit["_source"]
+        yield hit["_index"], hit["_id"], source, source.get(VECTOR_FIELD)
+
+def iter_chunk_files(bucket, prefix, index_name, with_vectors=True):
+    """
+    Yield (index, doc_id, source, vector) for the chunks in ingestion's embedding files, as
+    aai_store_opensearch stores them: same partition, same _id, the newest copy of a chunk
+    """
+    objects = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        objects += page.get("Contents", [])
+    chunks = {}
+    for obj in sorted(objects, key=lambda o: o["LastModified"]):
+        data = json.loads(s3.get_object(Bucket=bucket, Key=obj["Key"])["Body"].read())
+        for item in data.get("embeddings", []):
+            embedding = item.get("embedding")
+            # aai_store_opensearch skips chunks without a valid embedding
+            if not isinstance(embedding, list) or not embedding:
+                continue
+            doc = {k: v for k, v in item.items() if k != VECTOR_FIELD}
+            vector = None
+            if with_vectors:
+                vector = array("f", normalize_vector(embedding) if NORMALIZE_EMBEDDINGS else embedding)
+            doc_id = chunk_doc_id(doc)
+            chunks[doc_id] = (partition_index(index_name, doc), doc_id, doc, vector)
+    return iter(chunks.values())
+
+def iter_build_source(opensearch, index_name, snapshot_bucket, snapshot_prefix=None, chunks_prefix=None, with_vectors=True):
+    """Chunks to build an embedded index from: an export snapshot, ingestion's embedding files or the live index"""
+    if snapshot_prefix:
+        return ((partition_index(index_name, source), doc_id, source, vector)
+                for _, doc_id, source, vector in iter_snapshot(snapshot_bucket, snapshot_prefix))
+    if chunks_prefix:
+        return iter_chunk_files(RAW_DATA_BUCKET, chunks_prefix, index_name, with_vectors)
+    return iter_index(opensearch, index_name, with_vectors)
+
+def build_embedded_index(opensearch, index_name, bucket, snapshot_bucket, snapshot_prefix=None, chunks_prefix=None):
+    """Build the IVF index and publish it as the next generation"""
+    docs = iter_build_source(opensearch, index_name, snapshot_bucket, snapshot_prefix, chunks_prefix)
+    shutil.rmtree(VECTOR_INDEX_BUILD_DIR, ignore_errors=True)
+    manifest = build_vector_index(docs, VECTOR_INDEX_BUILD_DIR, "innerproduct" if NORMALIZE_EMBEDDINGS else "l2",
+                                  VECTOR_INDEX_NLIST)
+    published = publish_vector_index(VECTOR_INDEX_BUILD_DIR, index_name, bucket)
+    shutil.rmtree(VECTOR_INDEX_BUILD_DIR, ignore_errors=True)
+    return {"index_name": index_name, "doc_count": manifest["rows"], "nlist": manifest["nlist"],
+            "metric": manifest["metric"], **published}
+
+def build_embedded_lexical_index(opensearch, index_name, bucket, snapshot_bucket, snapshot_prefix=None, chunks_prefix=None):
+    """Build the BM25 index (text and metadata only) and publish it as the next generation"""
+    docs = ((index, doc_id, source) for index, doc_id, source, _ in iter_build_source(
+        opensearch, index_name, snapshot_bucket, snapshot_prefix, chunks_prefix, with_vectors=False))
+    shutil.rmtree(LEXICAL_INDEX_BUILD_DIR, ignore_errors=True)
+    manifest = build_lexical_index(docs, LEXICAL_INDEX_BUILD_DIR)
+    published = publish_lexical_index(LEXICAL_INDEX_BUILD_DIR, index_name, bucket)
+    shutil.rmtree(LEXICAL_INDEX_BUILD_DIR, ignore_errors=True)
+    return {"index_name": index_name, "doc_count": manifest["rows"], "terms": manifest["terms"],
+            "postings": manifest["postings"], **published}
+
+def lambda_handler(event, context):
+    start_time = time.time()
+    index_name = os.environ.get("OPENSEARCH_INDEX")
+
+    action = event.get("action")
+    bucket = event.get("bucket", SNAPSHOT_BUCKET)
+
+    if action not in ("export", "restore", "build_vector_index", "build_lexical_index") or not bucket:
+        return {
+            'statusCode': 400,
+            'body': f'Expected action=export|restore|build_vector_index|build_lexical_index and a snapshot bucket: action={action}, bucket={bucket}'
+        }
+
+    # parallel_bulk threads share the pooled client's keep-alive connections
+    opensearch = get_opensearch_client(timeout=120)
+
+    try:
+        if action == "export":
+            source_index = event.get("index_name", index_name)
+            snapshot_id = event.get("snapshot_id") or datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+            result = export_snapshot(opensearch, source_index, bucket, snapshot_id)
+        elif action == "build_vector_index":
+            result = build_embedded_index(opensearch, event.get("index_name", index_name),
+                                          event.get("vector_index_bucket", VECTOR_INDEX_BUCKET), bucket,
+                                          event.get("snapshot_prefix"), event.get("chunks_prefix"))
+        elif action == "build_lexical_index":
+            result = build_embedded_lexical_index(opensearch, event.get("index_name", index_name),
+                                                  event.get("lexical_index_bucket", LEXICAL_INDEX_BUCKET), bucket,
+                                                  event.get("snapshot_prefix"), event.get("chunks_prefix"))
+        else:
+            prefix = event.get("snapshot_prefix")
+            if not prefix:
+                return {'statusCode': 400, 'body': 'Missing snapshot_prefix for restore'}
+            target_index = event.get("target_index", index_name)
+            result = restore_snapshot(opensearch, bucket, prefix, target_index, event.get("overwrite", False))
+
+        if action != "export":
+            # A restored index or a new embedded index generation changes what retrieval returns
+            result["index_generation"] = bump_index_generation(event.get("target_index", index_name) if action == "restore"
+                                                               else event.get("index_name", index_name))
+        result["action"] = action
+        result["total_time_ms"] = (time.time() - start_time) * 1000
+        print(f"SNAPSHOT_LOG: {json.dumps(result)}")
+        return {'statusCode': 200, **result}
+
+    except Exception as e:
+        print(f"ERROR: snapshot {action} failed: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': str(e)
+        }
@@ -2,16 +2,26 @@ import boto3
 import json
 import time
 from datetime import datetime
-from opensearchpy import OpenSearch, RequestsHttpConnection
-from requests_aws4auth import AWS4Auth
+from aai_cache import bump_index_generation
+from aai_embedded_index import chunk_doc_id
+from aai_index_partitions import partition_index
+from aai_opensearch_client import connection_stats, get_opensearch_client
+from aai_query_vectors import normalize_vector, truncate_vector
+from aai_source_index import HIERARCHICAL_INDEX, add_chunk, update_source_index
 import os
 
+NORMALIZE_EMBEDDINGS = os.environ.get("NORMALIZE_EMBEDDINGS", "false").lower() == "true"
+# Two-stage mode: also index the leading COMPACT_DIMENSION dims for the HNSW candidate search
+COMPACT_DIMENSION = int(os.environ.get("COMPACT_DIMENSION", "0"))
+
+# Write volume above which the ingestion pipeline schedules the index optimization stage
+OPTIMIZE_MIN_DOCS = int(os.environ.get("OPTIMIZE_MIN_DOCS", "100"))
+
 def lambda_handler(event, context):
     # OpenSearch domain endpoint - replace with your actual endpoint
     host = os.environ.get("OPENSEARCH_DOMAIN")
     index_name = os.environ.get("OPENSEARCH_INDEX")
     region = os.environ.get("AWS_REGION", "ap-south-1")
-    service = 'es'
     
     print(f"Environment variables: host={host}, index_name={index_name}, region={region}")
     
@@ -32,21 +42,14 @@ def lambda_handler(event, context):
     
     s3 = boto3.client("s3")
     
-    # Get credentials from the AWS SDK
-    credentials = boto3.Session().get_credentials()
-    awsauth = AWS4Auth(credentials.access_key, credentials.secret_key, 
-                       region, service, session_token=credentials.token)
-    
-    # Create the OpenSearch client
-    opensearch = OpenSearch(
-        hosts = [{'host': host, 'port': 443}],
-        http_auth = awsauth,
-        use_ssl = True,
-        verify_certs = True,
-        connection_class = RequestsHttpConnection
-    )
+    # Pooled client with refreshing credentials, reused across warm invocations
+    opensearch = get_opensearch_client(host=host, region=region)
     
     # Read and store embeddings from S3 files
+    indexed_total = 0
+    partition_counts = {}
+    # Per-source chunk embeddings for the hierarchical source index, written once all files are in
+    source_groups = {}
     try:
         for embedding_key in embedding_keys:
             obj = s3.get_object(Bucket=bucket, Key=embedding_key)
@@ -70,14 +73,20 @@ def lambda_handler(event, context):
                         skipped_count += 1
                         continue
                         
+                    # Embedding files written before normalized mode was enabled are normalized here
+                    if NORMALIZE_EMBEDDINGS:
+                        embedding = normalize_vector(embedding)
+                        
                     doc = {
                         "embedding": embedding,
                         "text": item.get("text", ""),
                         "source": item.get("source", "")
                     }
+                    if COMPACT_DIMENSION:
+                        doc["embedding_compact"] = truncate_vector(embedding, COMPACT_DIMENSION)
                     
-                    # Add additional fields if they exist
-                    for field in ["ticket_id", "metadata"]:
+                    # Add additional fields if they exist (chunk_id lets search merge adjacent chunks)
+                    for field in ["ticket_id", "chunk_id", "metadata"]:
                         if field in item:
                             doc[field] = item[field]
                     
@@ -87,10 +96,16 @@ def lambda_handler(event, context):
                     else:
                         doc["created_at"] = datetime.utcnow().isoformat()
                     
-                    # Index the document
+                    # Index the document into its source type (and product) partition, under an _id
+                    # derived from the chunk so the embedded indices built from these files agree on it
+                    target_index = partition_index(index_name, doc)
+                    doc_id = chunk_doc_id(doc)
                     try:
-                        response = opensearch.index(index=index_name, body=doc)
+                        response = opensearch.index(index=target_index, body=doc, id=doc_id)
                         processed_count += 1
+                        partition_counts[target_index] = partition_counts.get(target_index, 0) + 1
+                        if HIERARCHICAL_INDEX:
+                            add_chunk(source_groups, doc, doc_id, embedding)
                         print(f"Successfully indexed document {i}: {response.get('_id', 'unknown')}")
                     except Exception as index_error:
                         print(f"OpenSearch indexing error for item {i}: {str(index_error)}")
@@ -105,8 +120,23 @@ def lambda_handler(event, context):
                     continue
             
             print(f"Processing complete: {processed_count} indexed, {skipped_count} skipped")
+            indexed_total += processed_count
         
-        return {"status": "stored"}
+        sources_updated = update_source_index(opensearch, index_name, source_groups, NORMALIZE_EMBEDDINGS)
+        # Retrieval results cached before these chunks were searchable are no longer served
+        index_generation = bump_index_generation(index_name) if indexed_total else None
+        
+        return {
+            "status": "stored",
+            "indexed_count": indexed_total,
+            # Partitions written, comma-separated for the optimize stage's index APIs
+            "index_name": ",".join(sorted(partition_counts)) or index_name,
+            "partitions": partition_counts,
+            "sources_updated": sources_updated,
+            "index_generation": index_generation,
+            "optimize_index": indexed_total >= OPTIMIZE_MIN_DOCS,
+            "opensearch_connections": connection_stats()
+        }
 
     except Exception as e:
         return {
@@ -3,6 +3,26 @@ from opensearchpy import OpenSearch, RequestsHttpConnection
 from requests_aws4auth import AWS4Auth
 import os
 
+# Unit-normalized vectors are compared with a plain dot product instead of l2 distance
+NORMALIZE_EMBEDDINGS = os.environ.get("NORMALIZE_EMBEDDINGS", "false").lower() == "true"
+KNN_SPACE_TYPE = "innerproduct" if NORMALIZE_EMBEDDINGS else "l2"
+EMBEDDING_DIMENSION = int(os.environ.get("EMBEDDING_DIMENSION", "1024"))
+# Two-stage mode: only the truncated vectors get an HNSW graph, full vectors are kept for rescoring
+COMPACT_DIMENSION = int(os.environ.get("COMPACT_DIMENSION", "0"))
+
+def vector_mappings():
+    knn_method = {
+        "name": "hnsw",
+        "space_type": KNN_SPACE_TYPE,
+        "engine": "lucene"
+    }
+    if not COMPACT_DIMENSION:
+        return {"embedding": {"type": "knn_vector", "dimension": EMBEDDING_DIMENSION, "method": knn_method}}
+    return {
+        "embedding": {"type": "object", "enabled": False},
+        "embedding_compact": {"type": "knn_vector", "dimension": COMPACT_DIMENSION, "method": knn_method}
+    }
+
 def lambda_handler(event, context):
     # OpenSearch domain endpoint - replace with your actual endpoint
     host = os.environ.get("OPENSEARCH_DOMAIN")
@@ -61,15 +81,7 @@ def lambda_handler(event, context):
             },
             "mappings": {
                 "properties": {
-                    "embedding": {
-                        "type": "knn_vector",
-                        "dimension": 1024,
-                        "method": {
-                            "name": "hnsw",
-                            "space_type": "l2",
-                            "engine": "lucene"
-                        }
-                    },
+                    **vector_mappings(),
                     "text": {
                         "type": "text", #Explicit similarity: Applied BM25 similarity to the text field
                         "analyzer": "english_bm25",
@@ -77,6 +89,7 @@ def lambda_handler(event, context):
                     },
                     "source": {"type": "keyword"},
                     "ticket_id": {"type": "keyword"},
+                    "chunk_id": {"type": "integer"},
                     "created_at": {"type": "date"},
                     "metadata": {
                         "properties": {
@@ -0,0 +1,43 @@
+# Orchestration Agent - Retrieval Fast Path
+# Runs the whole retrieval RAG pipeline in one invocation (no Step Functions hops) and returns
+# the same output as the AaiKnowledgeRetrievalRagPipeline state machine
+
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+# Packaged from src/agents, so this directory is not on the import path by default
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from retrieval_dag import load_stages, run_retrieval
+
+# Import every stage during init so warm invocations only pay for the pipeline itself
+load_stages()
+
+def lambda_handler(event, context):
+    """
+    Accepts the state machine input ({session_id, query_id, user_query, max_results, ...})
+    or an API Gateway event carrying it as the JSON body
+    """
+    start_time = time.time()
+    try:
+        request = event.get("body") or event
+        if isinstance(request, str):
+            request = json.loads(request or "{}")
+        if not request.get("user_query"):
+            return {"statusCode": 400, "error": "user_query is required"}
+
+        result = run_retrieval(request)
+        print(f"FAST_PATH_TIMINGS: {json.dumps(result.get('monitoring', {}).get('stage_timings_ms', result.get('stage_timings_ms')))}")
+        return result
+
+    except Exception as e:
+        error_data = {
+            "error_type": "fast_path_error",
+            "error_message": str(e),
+            "timestamp": datetime.utcnow().isoformat(),
+            "total_time_ms": (time.time() - start_time) * 1000
+        }
+        print(f"ERROR: {json.dumps(error_data)}")
+        return {"statusCode": 500, "error": str(e), "monitoring": error_data}
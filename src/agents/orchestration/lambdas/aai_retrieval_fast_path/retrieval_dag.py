@@ -0,0 +1,299 @@
+# Orchestration Agent - Retrieval DAG Executor
+# Runs the retrieval state machine's stage handlers in-process as an asyncio DAG: stages
+# start as soon as their inputs are ready and failures follow the state machine's fallback edges
+
+import asyncio
+import importlib.util
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from aai_result_cache import lookup_results
+
+# src/agents both in the repository and in the fast-path package, which is zipped from src/agents
+AGENTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+# DAG node -> (agent, Lambda function) whose lambda_handler the node calls
+STAGE_FUNCTIONS = {
+    "history": ("conversation", "aai_read_history"),
+    "embedding": ("conversation", "aai_query_embedding"),
+    "search": ("retrieval", "aai_hybrid_search_fusion"),
+    "rerank": ("retrieval", "aai_cross_encoder_rerank"),
+    "mmr": ("retrieval", "aai_mmr_diversity"),
+    "final": ("retrieval", "aai_final_results"),
+    "synthesize": ("conversation", "aai_synthesize_answer"),
+    "ticket": ("escalation", "aai_create_ticket"),
+    "store": ("conversation", "aai_store_conversation"),
+}
+
+# Handlers are blocking (boto3), so concurrent stages run on worker threads
+STAGE_WORKERS = int(os.environ.get("FAST_PATH_WORKERS", "4"))
+stage_pool = ThreadPoolExecutor(max_workers=STAGE_WORKERS)
+
+_modules = {}
+_modules_lock = threading.Lock()
+
+class SearchFailed(Exception):
+    """No candidates to continue with: the state machine ends in SearchFailed"""
+
+def load_stage(name):
+    """Import a stage's lambda_function.py by path, once per execution environment"""
+    with _modules_lock:
+        if name not in _modules:
+            agent, function_name = STAGE_FUNCTIONS[name]
+            path = os.path.join(AGENTS_DIR, agent, "lambdas", function_name, "lambda_function.py")
+            spec = importlib.util.spec_from_file_location(f"fast_path_{function_name}", path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _modules[name] = module
+        return _modules[name]
+
+def load_stages():
+    """Import every stage up front (cold start) instead of on first use"""
+    for name in STAGE_FUNCTIONS:
+        load_stage(name)
+
+async def invoke(name, payload, timings, started):
+    """Run a stage handler on the worker pool and record when it ran"""
+    loop = asyncio.get_running_loop()
+    handler = load_stage(name).lambda_handler
+    start = time.time()
+    status = "ok"
+    try:
+        result = await loop.run_in_executor(stage_pool, handler, payload, None)
+        if isinstance(result, dict) and result.get("statusCode", 200) != 200:
+            status = "failed"
+        return result
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        timings[name] = {
+            "start_offset_ms": (start - started) * 1000,
+            "duration_ms": (time.time() - start) * 1000,
+            "status": status
+        }
+
+async def invoke_checked(name, payload, timings, started):
+    """Stage result, or a 500 result when the handler raised (the state machine's Catch)"""
+    try:
+        return await invoke(name, payload, timings, started)
+    except Exception as e:
+        return {"statusCode": 500, "error": str(e)}
+
+def build_nodes(request, timings, started, cached_results=None, result_cache_key=None):
+    """
+    Retrieval DAG with the same payloads as AaiKnowledgeRetrievalRagPipeline.
+    Each node is (dependencies, coroutine taking the dependency results). With cached final
+    results only history and the answer stages run; otherwise final stores under result_cache_key.
+    """
+    def run(name, payload):
+        return invoke(name, payload, timings, started)
+
+    async def history(_):
+        return await run("history", {"session_id": request["session_id"], "limit": request["max_results"]})
+
+    async def embedding(_):
+        return await run("embedding", {"user_query": request["user_query"]})
+
+    async def search(deps):
+        result = await invoke_checked("search", {
+            "query_id": request["query_id"],
+            "user_query": request["user_query"],
+            "queryEmbedding": deps["embedding"]["embedding"],
+            "max_results": request["max_results"],
+            "product_filter": request["product_filter"],
+            "adaptive_rerank": request["adaptive_rerank"],
+            "source_types": request["source_types"],
+            "hierarchical": request["hierarchical"],
+            "vector_backend": request["vector_backend"],
+            "lexical_backend": request["lexical_backend"],
+            "collapse_chunks": request["collapse_chunks"]
+        }, timings, started)
+        if result.get("statusCode") != 200:
+            raise SearchFailed(result.get("error"))
+        return result
+
+    async def rerank(deps):
+        return await invoke_checked("rerank", {
+            "query_id": request["query_id"],
+            "candidates": deps["search"]["candidates"],
+            "user_query": request["user_query"],
+            "use_reranker": request["use_reranker"],
+            "rerank_backend": request["rerank_backend"],
+            "rerank_plan": deps["search"].get("rerank_plan")
+        }, timings, started)
+
+    async def mmr(deps):
+        # RerankFailed: continue with the original search candidates
+        source = deps["rerank"] if deps["rerank"].get("statusCode") == 200 else deps["search"]
+        return await invoke_checked("mmr", {
+            "query_id": request["query_id"],
+            "candidates": source["candidates"],
+            "queryEmbedding": deps["embedding"]["embedding"],
+            "use_mmr": request["use_mmr"],
+            "mmr_lambda": request["mmr_lambda"],
+            "max_results": request["max_results"]
+        }, timings, started)
+
+    async def final(deps):
+        payload = {
+            "query_id": request["query_id"],
+            "user_query": request["user_query"],
+            "max_results": request["max_results"],
+            "use_reranker": request["use_reranker"],
+            "use_mmr": request["use_mmr"]
+        }
+        monitoring = [deps["search"].get("monitoring"), deps["rerank"].get("monitoring")]
+        if deps["mmr"].get("statusCode") == 200:
+            payload["candidates"] = deps["mmr"]["candidates"]
+            payload["all_monitoring"] = monitoring + [deps["mmr"].get("monitoring")]
+            # Results of a fallback path are not cached, as in the state machine
+            if deps["rerank"].get("statusCode") == 200:
+                payload["result_cache_key"] = result_cache_key
+        else:
+            # MMRFailed: continue with the reranked (or original) candidates, MMR off
+            source = deps["rerank"] if deps["rerank"].get("statusCode") == 200 else deps["search"]
+            payload["candidates"] = source["candidates"]
+            payload["use_mmr"] = False
+            payload["all_monitoring"] = monitoring
+        return await run("final", payload)
+
+    async def synthesize(deps):
+        return await run("synthesize", {
+            "user_query": request["user_query"],
+            "chunks": deps["final"]["chunks"],
+            "metadata": deps["final"]["metadata"],
+            "conversationHistory": deps["history"]["history"],
+            "query_id": request["query_id"],
+            "session_id": request["session_id"]
+        })
+
+    async def ticket(deps):
+        if not deps["synthesize"].get("create_ticket"):
+            return None
+        return await run("ticket", {
+            "session_id": request["session_id"],
+            "user_query": request["user_query"],
+            "agent_response": deps["synthesize"]["answer"],
+            "query_id": request["query_id"]
+        })
+
+    # Independent of ticket creation, so it runs alongside it
+    async def store(deps):
+        return await run("store", {
+            "query_id": request["query_id"],
+            "user_query": request["user_query"],
+            "answer": deps["synthesize"]["answer"],
+            "sources": deps["final"]["metadata"],
+            "session_id": request["session_id"]
+        })
+
+    async def cached_final(_):
+        return cached_results
+
+    if cached_results is not None:
+        return {
+            "history": ([], history),
+            "final": ([], cached_final),
+            "synthesize": (["final", "history"], synthesize),
+            "ticket": (["synthesize"], ticket),
+            "store": (["synthesize", "final"], store),
+        }
+    return {
+        "history": ([], history),
+        "embedding": ([], embedding),
+        "search": (["embedding"], search),
+        "rerank": (["search"], rerank),
+        "mmr": (["search", "rerank", "embedding"], mmr),
+        "final": (["search", "rerank", "mmr"], final),
+        "synthesize": (["final", "history"], synthesize),
+        "ticket": (["synthesize"], ticket),
+        "store": (["synthesize", "final"], store),
+    }
+
+async def run_dag(nodes):
+    """Start every node at once; each awaits only its own dependencies (nodes in topological order)"""
+    tasks = {}
+
+    async def run_node(name):
+        deps, fn = nodes[name]
+        results = await asyncio.gather(*(tasks[d] for d in deps))
+        return await fn(dict(zip(deps, results)))
+
+    for name in nodes:
+        tasks[name] = asyncio.ensure_future(run_node(name))
+    try:
+        await asyncio.gather(*tasks.values())
+    finally:
+        for task in tasks.values():
+            task.cancel()
+    return {name: task.result() for name, task in tasks.items()}
+
+def normalize_request(request):
+    """Fill the state machine input defaults used by aai_trigger_step_function_retrieval"""
+    session_id = request.get("session_id") or "fast-path"
+    return {
+        "session_id": session_id,
+        "query_id": request.get("query_id") or f"{session_id}_{int(time.time() * 1000)}",
+        "user_query": request["user_query"],
+        "max_results": request.get("max_results", 5),
+        "product_filter": request.get("product_filter"),
+        "use_reranker": request.get("use_reranker", False),
+        "use_mmr": request.get("use_mmr", False),
+        "mmr_lambda": request.get("mmr_lambda", 0.7),
+        "rerank_backend": request.get("rerank_backend"),
+        "adaptive_rerank": request.get("adaptive_rerank"),
+        "source_types": request.get("source_types"),
+        "hierarchical": request.get("hierarchical"),
+        "vector_backend": request.get("vector_backend"),
+        "lexical_backend": request.get("lexical_backend"),
+        "collapse_chunks": request.get("collapse_chunks")
+    }
+
+async def run_retrieval_dag(request):
+    """
+    Execute the retrieval pipeline for a state machine input and return the same shape as
+    its FinalResponse (or SearchFailed) state, plus per-node wall-clock timings
+    """
+    request = normalize_request(request)
+    started = time.time()
+    timings = {}
+    # Final results of an identical request at the current index generation skip retrieval
+    cached_results, result_cache = lookup_results(request)
+    timings["result_cache"] = {"start_offset_ms": 0, "duration_ms": result_cache.get("lookup_time_ms", 0),
+                               "status": "hit" if result_cache["hit"] else "miss"}
+    try:
+        results = await run_dag(build_nodes(request, timings, started, cached_results, result_cache["key"]))
+    except SearchFailed as e:
+        return {
+            "statusCode": 500,
+            "error": "Search and fusion stage failed",
+            "stage": "search_fusion",
+            "details": str(e),
+            "query_id": request["query_id"],
+            "stage_timings_ms": timings
+        }
+
+    final = results["final"]
+    return {
+        "statusCode": 200,
+        "answer": results["synthesize"]["answer"],
+        "sources": final["metadata"],
+        "query_id": request["query_id"],
+        "monitoring": {
+            "retrieval_monitoring": final["monitoring"],
+            "quality_s3_location": final.get("quality_s3_location"),
+            "embedding_cache": results["embedding"].get("cache") if "embedding" in results else None,
+            "result_cache": result_cache,
+            "executor": "fast_path",
+            "stage_timings_ms": timings,
+            "total_time_ms": (time.time() - started) * 1000,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    }
+
+def run_retrieval(request):
+    """Blocking entry point for local callers and tests"""
+    return asyncio.run(run_retrieval_dag(request))
@@ -3,10 +3,20 @@
 
 import json, os, uuid, time
 import boto3
+from boto3.dynamodb.conditions import Key
 from datetime import datetime
+from decimal import Decimal
+from aai_answer_cache import answer_generation, lookup_answer, store_answer
+from aai_query_vectors import query_embedding
+from aai_result_cache import lookup_results
+from aai_ticket_intent import wants_ticket
 
 
 sfn = boto3.client("stepfunctions")
+bedrock = boto3.client("bedrock-runtime")
+# Read and written here only for answer cache hits, which skip the state machine's history stages
+conversations = boto3.resource("dynamodb").Table(os.environ.get("CONVERSATION_TABLE", "AaiConversationHistory"))
+TTL_DAYS = int(os.environ.get("TTL_DAYS", "7"))
 STATE_MACHINE_ARN = os.environ.get("STEP_FUNCTION_RETRIEVAL_ARN", f"arn:aws:states:{os.environ.get('AWS_REGION', 'ap-south-1')}:{os.environ.get('AWS_ACCOUNT_ID')}:stateMachine:AaiKnowledgeRetrievalRagPipeline-{os.environ.get('ENVIRONMENT', 'dev')}")
 
 
@@ -28,6 +38,24 @@ def _extract_session_id(event_body, headers):
     # 4) generate
     return str(uuid.uuid4())
 
+def _session_has_history(session_id):
+    resp = conversations.query(KeyConditionExpression=Key("session_id").eq(session_id), Limit=1,
+                               ProjectionExpression="session_id")
+    return bool(resp.get("Items"))
+
+def _store_turn(session_id, user_query, answer, sources):
+    # The item aai_store_conversation writes, so the session's next question sees this turn
+    item = {
+        "session_id": session_id,
+        "timestamp": int(time.time() * 1000),
+        "user_query": user_query,
+        "agent_response": answer,
+        "sources": json.loads(json.dumps(sources), parse_float=Decimal)
+    }
+    if TTL_DAYS > 0:
+        item["ttl_epoch"] = int(time.time()) + TTL_DAYS * 24 * 3600
+    conversations.put_item(Item=item)
+
 def lambda_handler(event, context):
     start_time = time.time()
     
@@ -52,6 +80,19 @@ def lambda_handler(event, context):
         use_reranker = body.get("use_reranker", False)
         use_mmr = body.get("use_mmr", False)
         mmr_lambda = body.get("mmr_lambda", 0.7)
+        # None keeps the function's RERANK_BACKEND ("sagemaker" or "onnx")
+        rerank_backend = body.get("rerank_backend", None)
+        # None keeps the search function's ADAPTIVE_RERANK
+        adaptive_rerank = body.get("adaptive_rerank", None)
+        # None searches every index partition, e.g. ["documents"] skips the ticket partitions
+        source_types = body.get("source_types", None)
+        # None keeps the search function's HIERARCHICAL_SEARCH (sources first, then their chunks)
+        hierarchical = body.get("hierarchical", None)
+        # None keeps the search function's VECTOR_SEARCH_BACKEND / LEXICAL_SEARCH_BACKEND (domain or embedded index)
+        vector_backend = body.get("vector_backend", None)
+        lexical_backend = body.get("lexical_backend", None)
+        # None keeps the search function's COLLAPSE_CHUNKS (best chunk per ticket or document)
+        collapse_chunks = body.get("collapse_chunks", None)
         
         # Log request initiation
         request_log = {
@@ -64,6 +105,13 @@ def lambda_handler(event, context):
                 "max_results": max_results,
                 "product_filter": product_filter,
                 "use_reranker": use_reranker,
+                "rerank_backend": rerank_backend,
+                "adaptive_rerank": adaptive_rerank,
+                "source_types": source_types,
+                "hierarchical": hierarchical,
+                "vector_backend": vector_backend,
+                "lexical_backend": lexical_backend,
+                "collapse_chunks": collapse_chunks,
                 "use_mmr": use_mmr
             },
             "source_ip": headers.get("X-Forwarded-For", "unknown"),
@@ -79,39 +127,97 @@ def lambda_handler(event, context):
             "product_filter": product_filter,
             "use_reranker": use_reranker,
             "use_mmr": use_mmr,
-            "mmr_lambda": mmr_lambda
+            "mmr_lambda": mmr_lambda,
+            "rerank_backend": rerank_backend,
+            "adaptive_rerank": adaptive_rerank,
+            "source_types": source_types,
+            "hierarchical": hierarchical,
+            "vector_backend": vector_backend,
+            "lexical_backend": lexical_backend,
+            "collapse_chunks": collapse_chunks
         }
 
-        # Execute Step Function
-        sfn_start = time.time()
-        response = sfn.start_sync_execution(
-            stateMachineArn=STATE_MACHINE_ARN,
-            input=json.dumps(sfn_input)
-        )
-        sfn_duration = (time.time() - sfn_start) * 1000
-        
-        print("response", response)
+        # Semantic answer cache: a session's first question close enough to one answered recently
+        # (same index generation and retrieval parameters) gets that answer without the state machine
+        answer_start = time.time()
+        # A ticket request runs the state machine, so aai_create_ticket sees it
+        generation = None if wants_ticket(user_query) else answer_generation()
+        if generation is not None:
+            try:
+                # Later questions are answered with the session's history, so only first ones match
+                if _session_has_history(session_id):
+                    generation = None
+            except Exception as e:
+                print(f"WARNING: conversation history read failed, answer cache bypassed: {e}")
+                generation = None
+        embedding = None
+        if generation is not None:
+            try:
+                # Same cache keys as aai_query_embedding, so the execution's embedding stage hits
+                embedding, _ = query_embedding(bedrock, user_query)
+            except Exception as e:
+                print(f"WARNING: query embedding for the answer cache failed: {e}")
+        cached_answer, answer_cache = lookup_answer(sfn_input, embedding, generation)
+        if cached_answer:
+            try:
+                _store_turn(session_id, user_query, cached_answer["answer"], cached_answer["sources"] or [])
+            except Exception as e:
+                # Without the turn in history the session's next question loses context; run the pipeline
+                print(f"WARNING: conversation store failed, answer cache hit not served: {e}")
+                cached_answer = None
+                answer_cache.update(hit=False, error=str(e))
+        answer_cache["total_time_ms"] = (time.time() - answer_start) * 1000
+        result_cache = {"hit": False}
 
-        output_raw = response.get("output", "{}")
-        if isinstance(output_raw, dict):
-            output = output_raw
+        if cached_answer:
+            sfn_duration = 0
+            output = {"answer": cached_answer["answer"], "sources": cached_answer["sources"] or [], "monitoring": {}}
+            print(f"ANSWER_CACHE_LOG: {json.dumps({k: answer_cache.get(k) for k in ('similarity', 'tier', 'cached_query_id')})}")
         else:
-            output = json.loads(output_raw)
+            # Final results of an identical request at the current index generation: the state machine
+            # goes from history straight to synthesis; on a miss it stores its results under the key
+            cached_results, result_cache = lookup_results(sfn_input)
+            sfn_input["result_cache"] = result_cache
+            if cached_results:
+                sfn_input["cached_results"] = cached_results
 
-        print(f"Step Function Response: {output}")
-        
-        # Log Step Function execution
-        execution_log = {
-            "event_type": "step_function_completed",
-            "timestamp": datetime.utcnow().isoformat(),
-            "session_id": session_id,
-            "query_id": query_id,
-            "execution_arn": response.get("executionArn"),
-            "status": response.get("status"),
-            "duration_ms": sfn_duration,
-            "billing_details": response.get("billingDetails", {})
-        }
-        print(f"EXECUTION_LOG: {json.dumps(execution_log)}")
+            # Execute Step Function
+            sfn_start = time.time()
+            response = sfn.start_sync_execution(
+                stateMachineArn=STATE_MACHINE_ARN,
+                input=json.dumps(sfn_input)
+            )
+            sfn_duration = (time.time() - sfn_start) * 1000
+            
+            print("response", response)
+
+            output_raw = response.get("output", "{}")
+            if isinstance(output_raw, dict):
+                output = output_raw
+            else:
+                output = json.loads(output_raw)
+
+            print(f"Step Function Response: {output}")
+            
+            # Log Step Function execution
+            execution_log = {
+                "event_type": "step_function_completed",
+                "timestamp": datetime.utcnow().isoformat(),
+                "session_id": session_id,
+                "query_id": query_id,
+                "execution_arn": response.get("executionArn"),
+                "status": response.get("status"),
+                "duration_ms": sfn_duration,
+                "result_cache_hit": result_cache["hit"],
+                "billing_details": response.get("billingDetails", {})
+            }
+            print(f"EXECUTION_LOG: {json.dumps(execution_log)}")
+
+            # Only first-turn answers are reusable: later turns depend on the session's history, and
+            # a ticket request has to reach aai_create_ticket every time
+            if response.get("status") == "SUCCEEDED" and output.get("history_turns") == 0 and not output.get("create_ticket"):
+                answer_cache["stored"] = store_answer(answer_cache, sfn_input, embedding,
+                                                      output.get("answer"), output.get("sources", []))
 
         # Prepare response
         total_duration = (time.time() - start_time) * 1000
@@ -122,10 +228,18 @@ def lambda_handler(event, context):
             "query_id": query_id,
             "answer": output.get("answer", ""),
             "sources": output.get("sources", []),
-            "monitoring": output.get("monitoring", {}),
+            "monitoring": {**output.get("monitoring", {}), "answer_cache": answer_cache},
             "timing": {
                 "total_duration_ms": total_duration,
-                "step_function_duration_ms": sfn_duration
+                "step_function_duration_ms": sfn_duration,
+                # Query embedding and similarity lookup
+                "answer_cache_lookup_ms": answer_cache["total_time_ms"],
+                "answer_cache_hit": answer_cache["hit"],
+                "answer_cache_similarity": answer_cache.get("similarity"),
+                "answer_cache_hit_rate": answer_cache.get("environment_hit_rate"),
+                "result_cache_lookup_ms": result_cache.get("lookup_time_ms", 0),
+                "result_cache_hit": result_cache["hit"],
+                "stage_time_saved_ms": result_cache.get("stage_time_saved_ms", 0)
             }
         }
 
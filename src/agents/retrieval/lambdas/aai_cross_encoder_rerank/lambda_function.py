@@ -1,28 +1,177 @@
 # Knowledge Retrieval Agent - Cross-Encoder Reranking
-# Reranks search results using SageMaker cross-encoder model
+# Reranks search results using the SageMaker cross-encoder endpoint or an in-Lambda ONNX model
 
 import boto3
 import json
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
+from botocore.config import Config
+from aai_candidate_envelope import load_candidates, pack_candidates
+from aai_onnx_cross_encoder import get_cross_encoder
+from aai_cache import get_cache, query_hash
 
 s3 = boto3.client('s3')
 BUCKET_NAME = os.environ.get("SEARCH_RESULTS_BUCKET", "support-agent-search-results-dev")
+# 'sagemaker' (serverless endpoint) or 'onnx' (int8 MiniLM on the Lambda's CPU); events may override
+RERANK_BACKEND = os.environ.get("RERANK_BACKEND", "sagemaker")
+RERANK_BACKENDS = ("sagemaker", "onnx")
+# Scores keyed by (normalized query hash, doc _id, model/version): LRU + shared CACHE_TABLE
+SCORE_CACHE_ENABLED = os.environ.get("SCORE_CACHE_ENABLED", "true").lower() == "true"
+SCORE_CACHE_TTL_SECONDS = int(os.environ.get("SCORE_CACHE_TTL_SECONDS", "86400"))
+# Pairs are scored in shards of RERANK_SHARD_SIZE, RERANK_SHARD_CONCURRENCY endpoint calls at a time;
+# whatever has not finished by the deadline keeps its fusion position
+RERANK_SHARD_SIZE = int(os.environ.get("RERANK_SHARD_SIZE", "8"))
+RERANK_SHARD_CONCURRENCY = int(os.environ.get("RERANK_SHARD_CONCURRENCY", "4"))
+RERANK_DEADLINE_MS = float(os.environ.get("RERANK_DEADLINE_MS", "1500"))
+# Left for packing results and returning before the Lambda timeout
+DEADLINE_RESERVE_MS = 500
 
-def store_candidates_s3(candidates, query_id, stage):
-    key = f"candidates/{query_id}/{stage}.json"
-    s3.put_object(
-        Bucket=BUCKET_NAME,
-        Key=key,
-        Body=json.dumps(candidates),
-        ContentType='application/json'
+def endpoint_client(deadline_ms):
+    # A call that outlives the deadline is abandoned anyway, so don't let it hold a worker much longer
+    return boto3.client('sagemaker-runtime', config=Config(
+        read_timeout=max(1, int(deadline_ms / 1000) + 1),
+        retries={'max_attempts': 1}
+    ))
+
+def score_with_endpoint(user_query, candidates, sagemaker):
+    # Prepare query-document pairs in correct format
+    pairs = [{
+        "text": user_query,
+        "text_pair": hit[0]['_source']['text']
+    } for hit in candidates]
+    
+    # Get endpoint from environment
+    sagemaker_endpoint = os.environ.get('SAGEMAKER_ENDPOINT', "minilm-reranker-1756624753")
+    if not sagemaker_endpoint:
+        raise Exception('SAGEMAKER_ENDPOINT environment variable not set')
+    
+    # Call SageMaker endpoint
+    response = sagemaker.invoke_endpoint(
+        EndpointName=sagemaker_endpoint,
+        ContentType='application/json',
+        Body=json.dumps({"inputs": pairs})
     )
-    return key
+    
+    scores_response = json.loads(response['Body'].read().decode())
+    
+    # Extract scores from SageMaker response format
+    # scores returned from SageMaker are dictionaries (with labels and scores) rather than simple numeric values
+    if isinstance(scores_response[0], dict):
+        # Handle format like [{'label': 'LABEL_1', 'score': 0.95}, ...]
+        return [item['score'] if 'score' in item else item.get('LABEL_1', 0) for item in scores_response]
+    # Handle simple numeric array
+    return scores_response
+
+def score_with_onnx(user_query, candidates, model=None):
+    # Loaded on the first ONNX request of the execution environment, reused afterwards
+    model = model or get_cross_encoder()
+    return model.score(user_query, [hit[0]['_source']['text'] for hit in candidates])
+
+def model_version(backend):
+    """Part of the cache key, so a new endpoint or exported model never reuses old scores"""
+    if backend == 'onnx':
+        return f"onnx:{get_cross_encoder().version}"
+    return f"sagemaker:{os.environ.get('SAGEMAKER_ENDPOINT', 'minilm-reranker-1756624753')}"
+
+def score_sharded(user_query, candidates, backend, deadline_ms):
+    """Scores per candidate, None where the shard failed or missed the deadline"""
+    shards = [list(range(i, min(i + RERANK_SHARD_SIZE, len(candidates))))
+              for i in range(0, len(candidates), RERANK_SHARD_SIZE)]
+    if backend == 'onnx':
+        # Load outside the budget: a cold model load is once per execution environment
+        model = get_cross_encoder()
+    else:
+        sagemaker = endpoint_client(deadline_ms)
+    
+    def score_shard(shard):
+        pairs = [candidates[i] for i in shard]
+        if backend == 'onnx':
+            return score_with_onnx(user_query, pairs, model)
+        return score_with_endpoint(user_query, pairs, sagemaker)
+    
+    deadline_at = time.time() + deadline_ms / 1000
+    scores = [None] * len(candidates)
+    stats = {'shards': len(shards), 'completed': 0, 'failed': 0, 'timed_out': 0, 'deadline_ms': deadline_ms}
+    errors = []
+    
+    # Per request, so calls abandoned at the deadline never hold up the next invocation's shards
+    # The model already uses every vCPU, so ONNX shards go one at a time in fusion order
+    workers = 1 if backend == 'onnx' else max(1, min(RERANK_SHARD_CONCURRENCY, len(shards)))
+    pool = ThreadPoolExecutor(max_workers=workers)
+    futures = [pool.submit(score_shard, shard) for shard in shards]
+    wait(futures, timeout=max(0.0, deadline_at - time.time()))
+    # Queued shards are dropped; running ones finish in the background and are ignored
+    pool.shutdown(wait=False)
+    
+    for shard, future in zip(shards, futures):
+        if not future.done() or future.cancelled():
+            future.cancel()
+            continue
+        try:
+            for i, score in zip(shard, future.result()):
+                scores[i] = float(score)
+            stats['completed'] += 1
+        except Exception as e:
+            errors.append(e)
+            stats['failed'] += 1
+            print(f"WARNING: rerank shard of {len(shard)} pairs failed: {e}")
+    stats['timed_out'] = stats['shards'] - stats['completed'] - stats['failed']
+    
+    # Nothing to merge and not a deadline problem: fail like a single call would
+    if errors and stats['completed'] == 0 and stats['timed_out'] == 0:
+        raise errors[0]
+    return scores, stats
+
+def score_candidates(user_query, candidates, backend, use_cache, deadline_ms):
+    """Scores for all candidates (None = not scored in time), sending only cache misses to the model"""
+    if not use_cache:
+        scores, shard_stats = score_sharded(user_query, candidates, backend, deadline_ms)
+        return scores, {'enabled': False}, shard_stats
+    
+    cache = get_cache('rerank', SCORE_CACHE_TTL_SECONDS)
+    version = model_version(backend)
+    qhash = query_hash(user_query)
+    keys = [cache.key(version, qhash, hit[0]['_id']) for hit in candidates]
+    cached, stats = cache.get_many(keys)
+    
+    misses = [i for i, key in enumerate(keys) if key not in cached]
+    fresh = {}
+    shard_stats = {'shards': 0, 'completed': 0, 'failed': 0, 'timed_out': 0, 'deadline_ms': deadline_ms}
+    if misses:
+        miss_scores, shard_stats = score_sharded(user_query, [candidates[i] for i in misses], backend, deadline_ms)
+        fresh = {keys[i]: score for i, score in zip(misses, miss_scores) if score is not None}
+        cache.put_many(fresh)
+    
+    hits = len(candidates) - len(misses)
+    stats.update({
+        'enabled': True,
+        'hit_rate': hits / len(candidates) if candidates else 0.0,
+        'pairs_scored': len(fresh),
+        'pairs_saved': hits,
+        # Shard calls all candidates would have needed, less those made for the misses
+        'endpoint_calls_saved': (-(-len(candidates) // RERANK_SHARD_SIZE) - shard_stats['shards']
+                                 if backend == 'sagemaker' else 0)
+    })
+    return [cached.get(key, fresh.get(key)) for key in keys], stats, shard_stats
+
+def merge_scores(candidates, scores):
+    """Scored candidates reordered by score within the positions they held; unscored ones stay put"""
+    scored = [i for i, score in enumerate(scores) if score is not None]
+    by_score = sorted(scored, key=lambda i: scores[i], reverse=True)
+    merged = [(hit, fusion_score) for hit, fusion_score in candidates]
+    for slot, i in zip(scored, by_score):
+        merged[slot] = (candidates[i][0], scores[i])
+    return merged
 
-def load_candidates_s3(s3_key):
-    response = s3.get_object(Bucket=BUCKET_NAME, Key=s3_key)
-    return json.loads(response['Body'].read())
+def rerank_deadline_ms(event, context):
+    deadline_ms = float(event.get('rerank_deadline_ms') or RERANK_DEADLINE_MS)
+    if context is not None:
+        # Never let the scoring budget run into the function timeout
+        remaining = context.get_remaining_time_in_millis() - DEADLINE_RESERVE_MS
+        deadline_ms = min(deadline_ms, max(0.0, remaining))
+    return deadline_ms
 
 def lambda_handler(event, context):
     start_time = time.time()
@@ -34,7 +183,7 @@ def lambda_handler(event, context):
         if not event.get('use_reranker', False):
             return {
                 'statusCode': 200,
-                'candidates_s3_key': event.get('candidates_s3_key'),
+                'candidates': event.get('candidates'),
                 'monitoring': {
                     'query_id': query_id,
                     'stage': 'cross_encoder',
@@ -43,45 +192,47 @@ def lambda_handler(event, context):
                 }
             }
         
-        # Load candidates from S3
-        candidates_s3_key = event.get('candidates_s3_key')
-        candidates = load_candidates_s3(candidates_s3_key) if candidates_s3_key else event['candidates']
-        
-        sagemaker = boto3.client('sagemaker-runtime')
-        user_query = event['user_query']
+        # Adaptive plan from aai_hybrid_search_fusion: the legs already agree, pass the fusion order through
+        rerank_plan = event.get('rerank_plan')
+        if rerank_plan and rerank_plan['decision'] == 'skip':
+            cloudwatch.put_metric_data(
+                Namespace='RAG/CrossEncoder',
+                MetricData=[{'MetricName': 'RerankSkipped', 'Value': 1}]
+            )
+            return {
+                'statusCode': 200,
+                'candidates': event.get('candidates'),
+                'monitoring': {
+                    'query_id': query_id,
+                    'stage': 'cross_encoder',
+                    'enabled': True,
+                    'skipped': True,
+                    'rerank_plan': rerank_plan,
+                    'rerank_time_ms': 0,
+                    'total_time_ms': (time.time() - start_time) * 1000,
+                    'timestamp': datetime.utcnow().isoformat()
+                }
+            }
         
-        # Prepare query-document pairs in correct format
-        pairs = [{
-            "text": user_query,
-            "text_pair": hit[0]['_source']['text']
-        } for hit in candidates]
+        # Inline envelope, or S3 when the previous stage spilled it
+        candidates = load_candidates(event, s3, BUCKET_NAME)
+        # Only the head is scored on a partial plan; the tail keeps its fusion order
+        depth = rerank_plan['rerank_depth'] if rerank_plan else len(candidates)
         
-        # Get endpoint from environment
-        sagemaker_endpoint = os.environ.get('SAGEMAKER_ENDPOINT', "minilm-reranker-1756624753")
-        if not sagemaker_endpoint:
-            raise Exception('SAGEMAKER_ENDPOINT environment variable not set')
+        backend = event.get('rerank_backend') or RERANK_BACKEND
+        if backend not in RERANK_BACKENDS:
+            raise ValueError(f"Unknown rerank_backend: {backend}")
         
-        # Call SageMaker endpoint
         rerank_start = time.time()
-        response = sagemaker.invoke_endpoint(
-            EndpointName=sagemaker_endpoint,
-            ContentType='application/json',
-            Body=json.dumps({"inputs": pairs})
+        use_cache = event.get('use_score_cache', SCORE_CACHE_ENABLED)
+        deadline_ms = rerank_deadline_ms(event, context)
+        scores, cache_stats, shard_stats = score_candidates(
+            event['user_query'], candidates[:depth], backend, use_cache, deadline_ms
         )
+        scores += [None] * (len(candidates) - len(scores))
         
-        scores_response = json.loads(response['Body'].read().decode())
-        
-        # Extract scores from SageMaker response format
-        # scores returned from SageMaker are dictionaries (with labels and scores) rather than simple numeric values
-        if isinstance(scores_response[0], dict):
-            # Handle format like [{'label': 'LABEL_1', 'score': 0.95}, ...]
-            scores = [item['score'] if 'score' in item else item.get('LABEL_1', 0) for item in scores_response]
-        else:
-            # Handle simple numeric array
-            scores = scores_response
-        
-        reranked = [(candidates[i][0], scores[i]) for i in range(len(candidates))]
-        reranked = sorted(reranked, key=lambda x: x[1], reverse=True)
+        reranked = merge_scores(candidates, scores)
+        pairs_fallback = sum(1 for score in scores[:depth] if score is None)
         rerank_time = (time.time() - rerank_start) * 1000
         
         # Monitoring
@@ -89,28 +240,42 @@ def lambda_handler(event, context):
             'query_id': query_id,
             'stage': 'cross_encoder',
             'enabled': True,
+            'rerank_backend': backend,
             'timestamp': datetime.utcnow().isoformat(),
             'rerank_time_ms': rerank_time,
             'total_time_ms': (time.time() - start_time) * 1000,
             'input_count': len(candidates),
-            'output_count': len(reranked)
+            'output_count': len(reranked),
+            'pairs_scored': min(depth, len(candidates)) - pairs_fallback,
+            'pairs_fallback': pairs_fallback,
+            # Some pairs kept their fusion position (failed shard or deadline)
+            'degraded': pairs_fallback > 0,
+            'skipped': False,
+            'rerank_plan': rerank_plan,
+            'shards': shard_stats,
+            'score_cache': cache_stats
         }
         
         # Send metrics immediately
-        cloudwatch.put_metric_data(
-            Namespace='RAG/CrossEncoder',
-            MetricData=[
-                {'MetricName': 'RerankLatency', 'Value': rerank_time, 'Unit': 'Milliseconds'},
-                {'MetricName': 'CandidatesProcessed', 'Value': len(candidates)}
+        metric_data = [
+            {'MetricName': 'RerankLatency', 'Value': rerank_time, 'Unit': 'Milliseconds'},
+            {'MetricName': 'CandidatesProcessed', 'Value': len(candidates)},
+            {'MetricName': 'PairsFallback', 'Value': pairs_fallback},
+            {'MetricName': 'RerankSkipped', 'Value': 0}
+        ]
+        if cache_stats['enabled']:
+            metric_data += [
+                {'MetricName': 'ScoreCacheHitRate', 'Value': cache_stats['hit_rate']},
+                {'MetricName': 'EndpointCallsSaved', 'Value': cache_stats['endpoint_calls_saved']}
             ]
-        )
+        cloudwatch.put_metric_data(Namespace='RAG/CrossEncoder', MetricData=metric_data)
         
-        # Store reranked results in S3
-        results_s3_key = store_candidates_s3(reranked, query_id, 'cross_encoder')
+        results = pack_candidates(reranked, query_id, 'cross_encoder', s3, BUCKET_NAME)
+        monitoring['candidates_inline'] = 'inline' in results
         
         return {
             'statusCode': 200,
-            'candidates_s3_key': results_s3_key,
+            'candidates': results,
             'monitoring': monitoring
         }
         
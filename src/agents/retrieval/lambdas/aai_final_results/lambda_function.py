@@ -6,14 +6,12 @@ import json
 import time
 from datetime import datetime
 import os
+from aai_candidate_envelope import load_candidates
+from aai_result_cache import store_results
 
 s3 = boto3.client('s3')
 BUCKET_NAME = os.environ.get("SEARCH_RESULTS_BUCKET", "support-agent-search-results-dev")
 
-def load_candidates_s3(s3_key):
-    response = s3.get_object(Bucket=BUCKET_NAME, Key=s3_key)
-    return json.loads(response['Body'].read())
-
 def calculate_quality_metrics(results, user_query):
     if not results:
         return {'avg_score': 0, 'score_variance': 0, 'result_count': 0}
@@ -38,9 +36,8 @@ def lambda_handler(event, context):
     query_id = event.get('query_id')
     
     try:
-        # Load candidates from S3
-        candidates_s3_key = event.get('candidates_s3_key')
-        candidates = load_candidates_s3(candidates_s3_key) if candidates_s3_key else event['candidates']
+        # Inline envelope, or S3 when the previous stage spilled it
+        candidates = load_candidates(event, s3, BUCKET_NAME)
         
         max_results = event.get('max_results', 10)
         user_query = event.get('user_query', '')
@@ -104,6 +101,29 @@ def lambda_handler(event, context):
             ContentType='application/json'
         )
         
+        # Identical requests reuse these results until the index changes; the key comes from the
+        # result cache lookup before retrieval (none when caching is off or a stage fell back).
+        # Results of a degraded or failed stage are not stored, so a retry can do better
+        degraded_stages = [m.get('stage') for m in all_monitoring if m and (m.get('degraded') or 'error' in m)]
+        final_monitoring['degraded_stages'] = degraded_stages
+        retrieval_time = sum((m or {}).get('total_time_ms', 0) for m in all_monitoring) + total_time
+        result_cache_key = None if degraded_stages else event.get('result_cache_key')
+        final_monitoring['result_cached'] = store_results(result_cache_key, {
+            'query_id': query_id,
+            'chunks': chunks,
+            'metadata': metadata,
+            'quality_s3_location': s3_key,
+            'retrieval_time_ms': retrieval_time,
+            'monitoring': {
+                'query_id': query_id,
+                'stage': 'final_results',
+                'timestamp': final_monitoring['timestamp'],
+                'final_result_count': len(final_results),
+                'quality_metrics': quality_metrics,
+                'retrieval_time_ms': retrieval_time
+            }
+        })
+        
         # Send final metrics to CloudWatch
         cloudwatch.put_metric_data(
             Namespace='RAG/FinalResults',
@@ -3,117 +3,600 @@
 
 import boto3
 import json
+import math
 import time
 from datetime import datetime
-from opensearchpy import OpenSearch, RequestsHttpConnection
-from requests_aws4auth import AWS4Auth
+from aai_cache import LRUCache
+from aai_candidate_envelope import TEXT_MAX_CHARS, decode_vector, pack_candidates
+from aai_index_partitions import INDEX_PARTITIONING, SOURCE_TYPES, search_partitions
+from aai_lexical_index import get_lexical_index
+from aai_opensearch_client import connection_stats, get_opensearch_client
+from aai_query_vectors import truncate_vector
+from aai_source_index import group_filter, source_index
+from aai_vector_index import VECTOR_INDEX_NPROBE, get_vector_index
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 import os
 
 s3 = boto3.client('s3')
 BUCKET_NAME = os.environ.get("SEARCH_RESULTS_BUCKET", "support-agent-search-results-dev")
 
-def store_candidates_s3(candidates, query_id, stage):
-    key = f"candidates/{query_id}/{stage}.json"
-    s3.put_object(
-        Bucket=BUCKET_NAME,
-        Key=key,
-        Body=json.dumps(candidates),
-        ContentType='application/json'
-    )
-    return key
+NORMALIZE_EMBEDDINGS = os.environ.get("NORMALIZE_EMBEDDINGS", "false").lower() == "true"
+# Two-stage mode: HNSW search on a truncated vector field, rescored with the full vectors
+COMPACT_DIMENSION = int(os.environ.get("COMPACT_DIMENSION", "0"))
+RESCORE_DEPTH_FACTOR = int(os.environ.get("RESCORE_DEPTH_FACTOR", "4"))
+# sequential: two searches back to back; msearch: one _msearch round trip; parallel: two concurrent requests
+SEARCH_EXECUTION_MODE = os.environ.get("SEARCH_EXECUTION_MODE", "msearch")
+# opensearch: kNN leg on the domain; embedded: in-process IVF index built by aai_index_snapshot
+# (build_vector_index) and memory-mapped from /tmp, so only the BM25 leg makes a round trip
+VECTOR_SEARCH_BACKEND = os.environ.get("VECTOR_SEARCH_BACKEND", "opensearch")
+# The same for the BM25 leg (build_lexical_index); with both embedded no search reaches the domain
+LEXICAL_SEARCH_BACKEND = os.environ.get("LEXICAL_SEARCH_BACKEND", "opensearch")
+# Vectors are left out of hit _source; only MMR needs them and it fetches them by id
+VECTOR_FIELDS = ["embedding", "embedding_compact"]
+# product_filter on the kNN leg: 'efficient' filters inside the knn clause, or scores the matching
+# docs exactly when at most FILTERED_KNN_EXACT_MAX_DOCS match; 'post_filter' filters the ANN top-k
+FILTERED_KNN_MODE = os.environ.get("FILTERED_KNN_MODE", "efficient")
+FILTERED_KNN_EXACT_MAX_DOCS = int(os.environ.get("FILTERED_KNN_EXACT_MAX_DOCS", "2000"))
+# HNSW candidates per kNN leg as a multiple of its depth, and ef_search (0: the engine default)
+KNN_K_FACTOR = float(os.environ.get("KNN_K_FACTOR", "1"))
+KNN_EF_SEARCH = int(os.environ.get("KNN_EF_SEARCH", "0"))
+# Settings recommended by monitoring/quality_metrics/knn_autotune.py (in SEARCH_RESULTS_BUCKET), read
+# once per execution environment; per vector backend they replace KNN_K_FACTOR / KNN_EF_SEARCH or
+# VECTOR_INDEX_NPROBE. Empty: environment settings only
+KNN_TUNING_KEY = os.environ.get("KNN_TUNING_KEY", "")
+# An approximate filtered search that returns fewer hits than exist is retried with a larger k
+KNN_EXPANSION_FACTOR = int(os.environ.get("KNN_EXPANSION_FACTOR", "2"))
+KNN_MAX_K = int(os.environ.get("KNN_MAX_K", "1000"))
+# Filter cardinalities change only with ingestion, so they are reused for a while per environment
+FILTER_STATS_TTL_SECONDS = int(os.environ.get("FILTER_STATS_TTL_SECONDS", "300"))
+filter_stats_cache = LRUCache(1000)
+# Partitioned indexes (INDEX_PARTITIONING): hits each partition's legs return, as a factor of the
+# leg size, e.g. {"documents": 0.5}; partitions not listed return a full leg
+PARTITION_DEPTH_FACTORS = json.loads(os.environ.get("PARTITION_DEPTH_FACTORS", "{}"))
+# Hierarchical retrieval: first pick the HIERARCHICAL_TOP_SOURCES documents / ticket clusters whose
+# centroid is nearest the query (source index, built with HIERARCHICAL_INDEX), then search only their chunks
+HIERARCHICAL_SEARCH = os.environ.get("HIERARCHICAL_SEARCH", "false").lower() == "true"
+HIERARCHICAL_TOP_SOURCES = int(os.environ.get("HIERARCHICAL_TOP_SOURCES", "20"))
+# Adaptive reranking: skip the cross-encoder when BM25 and kNN already agree on the top hits,
+# otherwise rerank deeper the more they disagree (rerank_plan, honoured by aai_cross_encoder_rerank)
+ADAPTIVE_RERANK = os.environ.get("ADAPTIVE_RERANK", "false").lower() == "true"
+ADAPTIVE_SKIP_OVERLAP = float(os.environ.get("ADAPTIVE_SKIP_OVERLAP", "0.8"))
+ADAPTIVE_SKIP_GAP = float(os.environ.get("ADAPTIVE_SKIP_GAP", "0.2"))
+# Keep the best chunk per ticket (ticket_id) or document (source) after fusion; the legs search
+# COLLAPSE_DEPTH_FACTOR times deeper so enough distinct groups survive
+COLLAPSE_CHUNKS = os.environ.get("COLLAPSE_CHUNKS", "false").lower() == "true"
+COLLAPSE_DEPTH_FACTOR = int(os.environ.get("COLLAPSE_DEPTH_FACTOR", "2"))
+# Also fold adjacent chunks of the group into the kept chunk's text, up to the envelope text cap
+COLLAPSE_MERGE_ADJACENT = os.environ.get("COLLAPSE_MERGE_ADJACENT", "false").lower() == "true"
+
+def load_knn_tuning(key=KNN_TUNING_KEY):
+    """Tuned kNN settings per vector backend; a missing or unreadable file keeps the environment settings"""
+    if not key:
+        return {}
+    try:
+        return json.loads(s3.get_object(Bucket=BUCKET_NAME, Key=key)["Body"].read())
+    except Exception as e:
+        print(f"WARNING: kNN tuning s3://{BUCKET_NAME}/{key} not loaded: {str(e)}")
+        return {}
 
-def rrf_fusion(bm25_results, knn_results, k=60):
+knn_tuning = load_knn_tuning()
+
+def knn_settings(vector_backend):
+    tuned = knn_tuning.get(vector_backend) or {}
+    return {
+        'k_factor': tuned.get('k_factor', KNN_K_FACTOR),
+        'ef_search': tuned.get('ef_search', KNN_EF_SEARCH),
+        'nprobe': tuned.get('nprobe', VECTOR_INDEX_NPROBE),
+        'source': KNN_TUNING_KEY if tuned else 'environment',
+        'tuned_recall_at_k': tuned.get('recall_at_k')
+    }
+
+# Parallel mode and the embedded backends run a BM25 and a kNN leg per partition
+search_pool = ThreadPoolExecutor(max_workers=2 * len(SOURCE_TYPES))
+
+def rrf_fusion(*ranked_lists, k=60, weights=None):
+    """Reciprocal rank fusion of any number of rankings, optionally weighted per ranking"""
     scores = defaultdict(float)
     doc_data = {}
     
-    for rank, hit in enumerate(bm25_results, 1):
-        doc_id = hit['_id']
-        scores[doc_id] += 1 / (k + rank)
-        doc_data[doc_id] = hit
-    
-    for rank, hit in enumerate(knn_results, 1):
-        doc_id = hit['_id']
-        scores[doc_id] += 1 / (k + rank)
-        if doc_id not in doc_data:
-            doc_data[doc_id] = hit
+    for i, results in enumerate(ranked_lists):
+        weight = weights[i] if weights else 1.0
+        for rank, hit in enumerate(results, 1):
+            doc_id = hit['_id']
+            scores[doc_id] += weight / (k + rank)
+            if doc_id not in doc_data:
+                doc_data[doc_id] = hit
     
     sorted_docs = sorted(scores.items(), key=lambda x: x[1], reverse=True)
     return [(doc_data[doc_id], score) for doc_id, score in sorted_docs]
 
+def collapse_key(hit):
+    source = hit['_source']
+    return source.get('ticket_id') or source.get('source') or hit['_id']
+
+def join_overlapping(left, right):
+    """Concatenate consecutive chunks, dropping the overlap chunk_text_with_overlap repeats"""
+    for size in range(min(len(left), len(right)), 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + " " + right
+
+def merge_adjacent(best, members, max_chars=TEXT_MAX_CHARS):
+    """Grow the kept chunk with neighbouring chunk_ids of its group while the text fits"""
+    by_chunk = {m['_source']['chunk_id']: m for m in members if m['_source'].get('chunk_id') is not None}
+    first = last = best['_source'].get('chunk_id')
+    if first is None:
+        return []
+    text = best['_source']['text']
+    merged = []
+    while True:
+        grew = False
+        if first - 1 in by_chunk:
+            candidate = join_overlapping(by_chunk[first - 1]['_source']['text'], text)
+            if len(candidate) <= max_chars:
+                text, first, grew = candidate, first - 1, True
+                merged.append(first)
+        if last + 1 in by_chunk:
+            candidate = join_overlapping(text, by_chunk[last + 1]['_source']['text'])
+            if len(candidate) <= max_chars:
+                text, last, grew = candidate, last + 1, True
+                merged.append(last)
+        if not grew:
+            break
+    if merged:
+        best['_source']['text'] = text
+        best['_source']['merged_chunk_ids'] = sorted(merged + [best['_source']['chunk_id']])
+    return merged
+
+def collapse_chunks(fused_results, merge=COLLAPSE_MERGE_ADJACENT):
+    """Best-scoring chunk per ticket/document, in fused order, and collapse stats"""
+    groups = {}
+    for hit, score in fused_results:
+        groups.setdefault(collapse_key(hit), []).append((hit, score))
+    
+    collapsed = []
+    merged_chunks = 0
+    for members in groups.values():
+        best, score = members[0]
+        best['_source']['collapsed_chunks'] = len(members)
+        if merge and len(members) > 1:
+            merged_chunks += len(merge_adjacent(best, [hit for hit, _ in members[1:]]))
+        collapsed.append((best, score))
+    
+    stats = {
+        'chunks_in': len(fused_results),
+        'groups': len(collapsed),
+        'collapse_ratio': len(fused_results) / len(collapsed) if collapsed else 1.0,
+        'merged_chunks': merged_chunks
+    }
+    return collapsed, stats
+
+def top_gap(hits):
+    """Relative score drop from a leg's first hit to its second"""
+    if len(hits) < 2 or not hits[0]['_score']:
+        return 0.0
+    return (hits[0]['_score'] - hits[1]['_score']) / hits[0]['_score']
+
+def plan_rerank(bm25_hits, knn_hits, candidate_count, k):
+    """How many of the fused candidates the cross-encoder should score, and why"""
+    bm25_top = [hit['_id'] for hit in bm25_hits[:k]]
+    knn_top = [hit['_id'] for hit in knn_hits[:k]]
+    inputs = {
+        'k': k,
+        'overlap_at_k': len(set(bm25_top) & set(knn_top)) / k if k else 0.0,
+        'top1_agree': bool(bm25_top and knn_top and bm25_top[0] == knn_top[0]),
+        'bm25_top_gap': top_gap(bm25_hits),
+        'knn_top_gap': top_gap(knn_hits)
+    }
+    decisive_top = inputs['top1_agree'] or max(inputs['bm25_top_gap'], inputs['knn_top_gap']) >= ADAPTIVE_SKIP_GAP
+    if not bm25_top or not knn_top:
+        # One leg came back empty: no second opinion, so leave it all to the cross-encoder
+        depth = candidate_count
+    elif inputs['overlap_at_k'] >= ADAPTIVE_SKIP_OVERLAP and decisive_top:
+        depth = 0
+    else:
+        # Every top-k slot the legs disagree on adds one candidate below the top k
+        depth = min(candidate_count, k + math.ceil((1 - inputs['overlap_at_k']) * k))
+    
+    if depth == 0:
+        decision = 'skip'
+    elif depth >= candidate_count:
+        decision = 'full'
+    else:
+        decision = 'partial'
+    return {'decision': decision, 'rerank_depth': depth, 'candidate_count': candidate_count, 'inputs': inputs}
+
+def filter_cardinality(opensearch, index_name, filter_clause):
+    """(matching docs, total docs) for a filter, from one size-0 search"""
+    key = json.dumps([index_name, filter_clause], sort_keys=True)
+    cached = filter_stats_cache.get(key)
+    if cached:
+        return cached[0]
+    response = opensearch.search(index=index_name, body={
+        "size": 0,
+        "track_total_hits": True,
+        "aggs": {"filtered": {"filter": filter_clause}}
+    })
+    stats = (response["aggregations"]["filtered"]["doc_count"], response["hits"]["total"]["value"])
+    filter_stats_cache.put(key, stats, time.time() + FILTER_STATS_TTL_SECONDS)
+    return stats
+
+def build_knn_query(field, vector, k, size, source_spec, filter_clause=None, strategy="unfiltered", ef_search=0):
+    """kNN leg body for a filter strategy: unfiltered, post_filter, approximate or exact"""
+    if strategy == "exact":
+        # Brute-force scoring of only the matching docs: full recall, cost grows with the match count
+        query = {
+            "script_score": {
+                "query": {"bool": {"filter": [filter_clause]}},
+                "script": {
+                    "lang": "knn",
+                    "source": "knn_score",
+                    "params": {"field": field, "query_value": vector,
+                               "space_type": "innerproduct" if NORMALIZE_EMBEDDINGS else "l2"}
+                }
+            }
+        }
+    else:
+        knn = {"vector": vector, "k": k}
+        if ef_search:
+            knn["method_parameters"] = {"ef_search": ef_search}
+        if strategy == "approximate":
+            # Engine-level filtering: the graph search only collects matching docs
+            knn["filter"] = filter_clause
+        query = {"knn": {field: knn}}
+        if strategy == "post_filter":
+            query = {"bool": {"must": [query], "filter": [filter_clause]}}
+    return {"size": size, "_source": source_spec, "query": query}
+
+def vector_score(query_embedding, vector):
+    """Full-dimension similarity on the same scale OpenSearch uses for the index space type"""
+    if NORMALIZE_EMBEDDINGS:
+        return sum(x * y for x, y in zip(query_embedding, vector))
+    distance = sum((x - y) ** 2 for x, y in zip(query_embedding, vector))
+    return 1 / (1 + distance)
+
+def rescore_with_full_vectors(hits, query_embedding, size):
+    for hit in hits:
+        # Dropped after scoring so full vectors never reach the candidate payload
+        vector = hit['_source'].pop('embedding', None)
+        hit['_score'] = vector_score(query_embedding, vector) if vector else 0
+    hits.sort(key=lambda h: h['_score'], reverse=True)
+    return hits[:size]
+
+def timed_search(opensearch, index_name, body, **params):
+    start = time.time()
+    response = opensearch.search(index=index_name, body=body, **params)
+    return response, (time.time() - start) * 1000
+
+def run_searches(opensearch, searches, mode=SEARCH_EXECUTION_MODE, ignore_unavailable=False):
+    """
+    Run [(index, body), ...] and return [(response, time_ms), ...] in the same order.
+    In msearch mode the times are the server-side 'took' of each sub-search.
+    ignore_unavailable turns a missing index (a product partition not ingested yet) into no hits.
+    """
+    params = {"ignore_unavailable": True} if ignore_unavailable else {}
+    if mode == "msearch":
+        body = []
+        for index, search_body in searches:
+            body += [{"index": index, **params}, search_body]
+        responses = opensearch.msearch(body=body)["responses"]
+        for resp in responses:
+            if "error" in resp:
+                raise Exception(f"msearch leg failed: {resp['error']}")
+        return [(resp, resp.get("took", 0)) for resp in responses]
+    
+    if mode == "parallel":
+        futures = [search_pool.submit(timed_search, opensearch, index, body, **params) for index, body in searches]
+        return [future.result() for future in futures]
+    
+    return [timed_search(opensearch, index, body, **params) for index, body in searches]
+
+def partition_weights(plans, knn_hits, k):
+    """
+    Weight of each partition's BM25 ranking: its share of the merged kNN top-k relative to the
+    best-represented partition, so a partition the embedding finds little in counts for little
+    """
+    if len(plans) == 1:
+        return [1.0]
+    top_ids = {hit['_id'] for hit in knn_hits[:k]}
+    counts = [sum(1 for hit in plan['knn_hits'] if hit['_id'] in top_ids) for plan in plans]
+    return [(count + 1) / (max(counts) + 1) for count in counts]
+
+def partition_depth(partition, leg_size):
+    """Hits each leg returns from a partition, PARTITION_DEPTH_FACTORS times the leg size"""
+    return max(1, math.ceil(leg_size * PARTITION_DEPTH_FACTORS.get(partition, 1.0)))
+
+def select_sources(opensearch, index_name, query_embedding, top_sources):
+    """Sources nearest the query by centroid, and the time the lookup took"""
+    response, select_time = timed_search(opensearch, source_index(index_name), {
+        "size": top_sources,
+        "_source": {"excludes": ["embedding", "vector_sum"]},
+        "query": {"knn": {"embedding": {"vector": query_embedding, "k": top_sources}}}
+    })
+    return [hit["_source"] for hit in response["hits"]["hits"]], select_time
+
+def selected_chunks(groups, partition):
+    """Chunks of the selected sources stored in a partition ('all' holds every kind)"""
+    return sum(g["chunk_count"] for g in groups if partition == "all" or g["kind"] == partition)
+
+def plan_partition(opensearch, partition, index_name, filter_clause, filter_mode, user_query,
+                   query_embedding, leg_size, compact_dimension, cardinality=None, embedded_index=None,
+                   settings=None):
+    """
+    BM25 and kNN queries for one partition, with its filtered-kNN strategy. A known filter
+    cardinality (the chunk counts of selected sources) saves the size-0 lookup, as does
+    counting the matches in an embedded index. settings (knn_settings) give the HNSW candidates
+    (k and ef_search) or the embedded index's nprobe.
+    """
+    depth = partition_depth(partition, leg_size)
+    settings = settings or knn_settings(VECTOR_SEARCH_BACKEND)
+    bm25_query = {
+        "size": depth,
+        "_source": {"excludes": VECTOR_FIELDS},
+        "query": {
+            "bool": {
+                "must": [{"match": {"text": user_query}}]
+            }
+        }
+    }
+    
+    if compact_dimension:
+        # Candidate search over the compact field, deep enough for the rescore to recover recall
+        knn_depth = depth * RESCORE_DEPTH_FACTOR
+        knn_field, knn_vector = "embedding_compact", truncate_vector(query_embedding, compact_dimension)
+    else:
+        knn_depth = depth
+        knn_field, knn_vector = "embedding", query_embedding
+    
+    # Two-stage rescoring reads the full vectors from the candidates, then strips them
+    knn_source = {"excludes": ["embedding_compact"] if compact_dimension else VECTOR_FIELDS}
+    knn_strategy = "unfiltered"
+    knn_filter = None
+    
+    # Add product filter if specified
+    if filter_clause:
+        bm25_query["query"]["bool"]["filter"] = [filter_clause]
+        if filter_mode == "post_filter":
+            knn_strategy = "post_filter"
+            knn_filter = {'mode': filter_mode, 'strategy': knn_strategy}
+        else:
+            if cardinality is None and embedded_index:
+                matching, total = embedded_index.count(filter_clause, index_name), embedded_index.count(index_pattern=index_name)
+            elif cardinality is None:
+                matching, total = filter_cardinality(opensearch, index_name, filter_clause)
+            else:
+                matching, total = cardinality, None
+            knn_strategy = "exact" if matching <= FILTERED_KNN_EXACT_MAX_DOCS else "approximate"
+            knn_filter = {
+                'mode': filter_mode,
+                'strategy': knn_strategy,
+                'filter_cardinality': matching,
+                'index_docs': total,
+                'selectivity': matching / total if total else None
+            }
+    
+    knn_k = max(knn_depth, math.ceil(knn_depth * settings['k_factor']))
+    return {
+        'partition': partition,
+        'index': index_name,
+        'depth': depth,
+        'user_query': user_query,
+        'bm25_query': bm25_query,
+        'knn_query': build_knn_query(knn_field, knn_vector, knn_k, knn_depth, knn_source, filter_clause, knn_strategy,
+                                     settings['ef_search']),
+        'knn_strategy': knn_strategy,
+        'knn_filter': knn_filter,
+        'knn_depth': knn_depth,
+        'knn_k': knn_k,
+        'ef_search': settings['ef_search'],
+        'nprobe': settings['nprobe'],
+        'knn_field': knn_field,
+        'knn_vector': knn_vector,
+        'knn_source': knn_source,
+        'filter_clause': filter_clause
+    }
+
+def embedded_bm25(lexical_index, plan):
+    """A partition's BM25 leg on the embedded lexical index, as (response, time ms, search stats)"""
+    start = time.time()
+    hits, stats = lexical_index.search(plan['user_query'], plan['depth'], plan['filter_clause'], plan['index'])
+    return {"hits": {"hits": hits}}, (time.time() - start) * 1000, stats
+
+def embedded_knn(vector_index, plan):
+    """A partition's kNN leg on the embedded index, as (response, time ms, search stats)"""
+    start = time.time()
+    hits, stats = vector_index.search(
+        plan['knn_vector'], plan['knn_depth'], plan['filter_clause'], plan['index'],
+        exact=plan['knn_strategy'] == "exact", expand=plan['knn_strategy'] != "post_filter", nprobe=plan['nprobe']
+    )
+    return {"hits": {"hits": hits}}, (time.time() - start) * 1000, stats
+
+def expand_knn(opensearch, plan, knn_hits):
+    """
+    Fewer hits than matching docs means the filtered graph search ran out of candidates:
+    widen k until it fills or reaches KNN_MAX_K. Returns (hits, expansion time ms).
+    """
+    knn_filter = plan['knn_filter']
+    wanted = min(plan['knn_depth'], knn_filter['filter_cardinality'])
+    k = plan['knn_k']
+    expansions = 0
+    expand_start = time.time()
+    while len(knn_hits) < wanted and k < KNN_MAX_K:
+        k = min(k * KNN_EXPANSION_FACTOR, KNN_MAX_K)
+        expansions += 1
+        knn_resp, _ = timed_search(opensearch, plan['index'], build_knn_query(
+            plan['knn_field'], plan['knn_vector'], k, plan['knn_depth'], plan['knn_source'],
+            plan['filter_clause'], plan['knn_strategy'], plan['ef_search']
+        ))
+        knn_hits = knn_resp["hits"]["hits"]
+    expansion_time = (time.time() - expand_start) * 1000
+    knn_filter.update({'final_k': k, 'expansions': expansions, 'expansion_time_ms': expansion_time})
+    return knn_hits, expansion_time
+
 def lambda_handler(event, context):
     start_time = time.time()
     cloudwatch = boto3.client('cloudwatch')
-    host = os.environ.get("OPENSEARCH_DOMAIN")
     index_name = os.environ.get("OPENSEARCH_INDEX")
-    region = os.environ.get("AWS_REGION")
-    service = 'es'
     
     query_id = event.get('query_id', f"query_{int(time.time())}")
     
     try:
-        # OpenSearch setup
-        credentials = boto3.Session().get_credentials()
-        awsauth = AWS4Auth(credentials.access_key, credentials.secret_key, 
-                           region, service, session_token=credentials.token)
-        
-        opensearch = OpenSearch(
-            hosts=[{'host': host, 'port': 443}],
-            http_auth=awsauth,
-            use_ssl=True,
-            verify_certs=True,
-            connection_class=RequestsHttpConnection
-        )
+        # Pooled client, reused with its keep-alive connections on warm invocations
+        opensearch = get_opensearch_client()
         
         # Build queries
         max_results = event.get('max_results', 10)
         user_query = event['user_query']
-        query_embedding = event['queryEmbedding']
+        query_embedding = decode_vector(event['queryEmbedding'])
         product_filter = event.get('product_filter')
+        compact_dimension = int(event.get('compact_dimension', COMPACT_DIMENSION))
+        vector_backend = event.get('vector_backend') or VECTOR_SEARCH_BACKEND
+        vector_index = None
+        vector_index_info = None
+        if vector_backend == "embedded":
+            vector_index, vector_index_info = get_vector_index(index_name)
+            vector_index_info.update({'rows': vector_index.rows, 'nlist': vector_index.nlist})
+            # The embedded index holds the full vectors, so there is nothing to rescore
+            compact_dimension = 0
+        settings = knn_settings(vector_backend)
+        lexical_backend = event.get('lexical_backend') or LEXICAL_SEARCH_BACKEND
+        lexical_index = None
+        lexical_index_info = None
+        if lexical_backend == "embedded":
+            lexical_index, lexical_index_info = get_lexical_index(index_name)
+            lexical_index_info.update({'rows': lexical_index.rows, 'terms': len(lexical_index.terms)})
+        # None keeps the function's COLLAPSE_CHUNKS
+        collapse = event.get('collapse_chunks')
+        if collapse is None:
+            collapse = COLLAPSE_CHUNKS
+        # Several hits per ticket collapse into one, so each leg returns more hits
+        leg_size = max_results * COLLAPSE_DEPTH_FACTOR if collapse else max_results
         
-        bm25_query = {
-            "size": max_results,
-            "query": {
-                "bool": {
-                    "must": [{"match": {"text": user_query}}]
-                }
-            }
-        }
+        partitions = search_partitions(index_name, product_filter, event.get('source_types'))
+        filter_clause = {"term": {"metadata.product_purchased": product_filter}} if product_filter else None
+        filter_mode = event.get('filtered_knn_mode', FILTERED_KNN_MODE)
         
-        knn_query = {
-            "size": max_results,
-            "query": {
-                "knn": {
-                    "embedding": {
-                        "vector": query_embedding,
-                        "k": max_results
-                    }
-                }
+        # None keeps the function's HIERARCHICAL_SEARCH; a product filter already narrows the chunks
+        use_hierarchical = event.get('hierarchical')
+        if use_hierarchical is None:
+            use_hierarchical = HIERARCHICAL_SEARCH
+        hierarchy = {'enabled': False}
+        groups = []
+        select_time = 0
+        if use_hierarchical and not product_filter:
+            top_sources = int(event.get('top_sources') or HIERARCHICAL_TOP_SOURCES)
+            groups, select_time = select_sources(opensearch, index_name, query_embedding, top_sources)
+            hierarchy = {
+                'enabled': bool(groups),
+                'top_sources': top_sources,
+                'sources_selected': len(groups),
+                'documents_selected': sum(1 for g in groups if g['kind'] == 'documents'),
+                'ticket_clusters_selected': sum(1 for g in groups if g['kind'] == 'tickets'),
+                'selected_chunks': selected_chunks(groups, 'all'),
+                'select_time_ms': select_time
             }
-        }
         
-        # Add product filter if specified
-        if product_filter:
-            bm25_query["query"]["bool"]["filter"] = [{"term": {"metadata.product_purchased": product_filter}}]
-            knn_query["query"] = {
-                "bool": {
-                    "must": [knn_query["query"]],
-                    "filter": [{"term": {"metadata.product_purchased": product_filter}}]
-                }
-            }
+        if groups:
+            # Chunk legs restricted to the selected sources; partitions holding none of them are skipped
+            source_filter = group_filter(groups)
+            plans = [
+                plan_partition(opensearch, name, target, source_filter, filter_mode, user_query, query_embedding,
+                               leg_size, compact_dimension, selected_chunks(groups, name), settings=settings)
+                for name, target, _ in partitions if selected_chunks(groups, name)
+            ]
+        else:
+            plans = [
+                plan_partition(opensearch, name, target, filter_clause if needs_filter else None, filter_mode,
+                               user_query, query_embedding, leg_size, compact_dimension,
+                               embedded_index=vector_index or lexical_index, settings=settings)
+                for name, target, needs_filter in partitions
+            ]
+        
+        # Execute searches: BM25 and kNN legs of every partition in one fan-out
+        search_mode = event.get('search_mode', SEARCH_EXECUTION_MODE)
+        search_start = time.time()
+        searches = []
+        legs = []
+        for plan in plans:
+            for leg, embedded_index, run_embedded in (("bm25", lexical_index, embedded_bm25), ("knn", vector_index, embedded_knn)):
+                if embedded_index:
+                    # Embedded legs run in the pool while the others are on the domain
+                    legs.append((plan, leg, search_pool.submit(run_embedded, embedded_index, plan)))
+                else:
+                    legs.append((plan, leg, len(searches)))
+                    searches.append((plan['index'], plan[f'{leg}_query']))
+        domain_responses = []
+        if searches:
+            domain_responses = run_searches(opensearch, searches, search_mode, ignore_unavailable=INDEX_PARTITIONING != "none")
+        responses = []
+        for plan, leg, pending in legs:
+            if isinstance(pending, int):
+                responses.append(domain_responses[pending])
+            else:
+                leg_resp, leg_ms, plan[f'embedded_{leg}'] = pending.result()
+                responses.append((leg_resp, leg_ms))
+        # The source lookup runs before the fan-out, so it adds to the search stage
+        search_time = (time.time() - search_start) * 1000 + select_time
         
-        # Execute searches
-        bm25_start = time.time()
-        bm25_resp = opensearch.search(index=index_name, body=bm25_query)
-        bm25_time = (time.time() - bm25_start) * 1000
+        rescore_time = 0
+        partition_stats = []
+        for plan, (bm25_resp, bm25_leg_time), (knn_resp, knn_leg_time) in zip(plans, responses[0::2], responses[1::2]):
+            knn_hits = knn_resp["hits"]["hits"]
+            knn_filter = plan['knn_filter']
+            if plan['knn_strategy'] == "approximate" and not vector_index:
+                knn_hits, expansion_time = expand_knn(opensearch, plan, knn_hits)
+                knn_leg_time += expansion_time
+                search_time += expansion_time
+            if knn_filter:
+                knn_filter['knn_hits'] = len(knn_hits)
+            knn_candidates = len(knn_hits)
+            if compact_dimension:
+                rescore_start = time.time()
+                knn_hits = rescore_with_full_vectors(knn_hits, query_embedding, plan['depth'])
+                rescore_time += (time.time() - rescore_start) * 1000
+            plan.update({'bm25_hits': bm25_resp["hits"]["hits"], 'knn_hits': knn_hits})
+            partition_stats.append({
+                'partition': plan['partition'],
+                'index': plan['index'],
+                'depth': plan['depth'],
+                'bm25_results': len(plan['bm25_hits']),
+                'knn_candidates': knn_candidates,
+                'knn_results': len(knn_hits),
+                'bm25_time_ms': bm25_leg_time,
+                'knn_time_ms': knn_leg_time,
+                'knn_filter': knn_filter,
+                'embedded_bm25': plan.get('embedded_bm25'),
+                'embedded_knn': plan.get('embedded_knn')
+            })
         
-        knn_start = time.time()
-        knn_resp = opensearch.search(index=index_name, body=knn_query)
-        knn_time = (time.time() - knn_start) * 1000
+        # Partitions are searched side by side, so the slowest one sets each leg's latency
+        bm25_time = max((p['bm25_time_ms'] for p in partition_stats), default=0)
+        knn_time = max((p['knn_time_ms'] for p in partition_stats), default=0)
+        # One embedding space, so kNN scores compare across partitions and merge into one ranking;
+        # BM25 scores depend on each partition's term statistics and stay separate rankings for RRF
+        # Each leg is merged across partitions and cut to the leg size, as one index would return it
+        knn_hits = sorted((hit for plan in plans for hit in plan['knn_hits']), key=lambda h: h['_score'], reverse=True)
+        weights = partition_weights(plans, knn_hits, leg_size)
+        bm25_hits = [hit for hit, _ in rrf_fusion(*[plan['bm25_hits'] for plan in plans], weights=weights)]
+        knn_hits, bm25_hits = knn_hits[:leg_size], bm25_hits[:leg_size]
+        for stats, weight in zip(partition_stats, weights):
+            stats['bm25_weight'] = weight
+        knn_filter = next((p['knn_filter'] for p in partition_stats if p['knn_filter']), None)
+        # msearch legs share one round trip, so their times are the server's 'took': published under
+        # *ServerTime so BM25Latency / KNNLatency keep meaning client round-trip time
+        leg_timing = {leg: 'server' if search_mode == 'msearch' and not embedded else 'client'
+                      for leg, embedded in (('bm25', lexical_index), ('knn', vector_index))}
         
         # RRF Fusion
         rrf_start = time.time()
-        fused_results = rrf_fusion(bm25_resp["hits"]["hits"], knn_resp["hits"]["hits"])
+        fused_results = rrf_fusion(bm25_hits, knn_hits)
+        collapse_stats = {'enabled': False}
+        if collapse:
+            fused_results, collapse_stats = collapse_chunks(
+                fused_results, event.get('merge_adjacent_chunks', COLLAPSE_MERGE_ADJACENT)
+            )
+            collapse_stats['enabled'] = True
         rrf_time = (time.time() - rrf_start) * 1000
         
         # Monitoring data
@@ -123,30 +606,68 @@ def lambda_handler(event, context):
             'timestamp': datetime.utcnow().isoformat(),
             'bm25_time_ms': bm25_time,
             'knn_time_ms': knn_time,
+            'search_mode': search_mode,
+            'leg_timing': leg_timing,
+            'search_time_ms': search_time,
             'rrf_time_ms': rrf_time,
+            'knn_mode': 'two_stage' if compact_dimension else 'single_stage',
+            'compact_dimension': compact_dimension,
+            'knn_candidates': sum(p['knn_candidates'] for p in partition_stats),
+            'rescore_time_ms': rescore_time,
             'total_time_ms': (time.time() - start_time) * 1000,
-            'bm25_results': len(bm25_resp["hits"]["hits"]),
-            'knn_results': len(knn_resp["hits"]["hits"]),
-            'fused_results': len(fused_results)
+            'bm25_results': len(bm25_hits),
+            'knn_results': len(knn_hits),
+            'knn_filter': knn_filter,
+            'vector_backend': vector_backend,
+            'vector_index': vector_index_info,
+            'knn_settings': settings,
+            'lexical_backend': lexical_backend,
+            'lexical_index': lexical_index_info,
+            'partitioning': INDEX_PARTITIONING,
+            'partitions': partition_stats,
+            'hierarchy': hierarchy,
+            'fused_results': len(fused_results),
+            'collapse': collapse_stats,
+            'opensearch_connections': connection_stats()
         }
         
         # Send metrics to CloudWatch immediately
         cloudwatch.put_metric_data(
             Namespace='RAG/SearchFusion',
             MetricData=[
-                {'MetricName': 'BM25Latency', 'Value': bm25_time, 'Unit': 'Milliseconds'},
-                {'MetricName': 'KNNLatency', 'Value': knn_time, 'Unit': 'Milliseconds'},
-                {'MetricName': 'RRFLatency', 'Value': rrf_time, 'Unit': 'Milliseconds'}
-            ]
+                {'MetricName': 'BM25ServerTime' if leg_timing['bm25'] == 'server' else 'BM25Latency',
+                 'Value': bm25_time, 'Unit': 'Milliseconds'},
+                {'MetricName': 'KNNServerTime' if leg_timing['knn'] == 'server' else 'KNNLatency',
+                 'Value': knn_time, 'Unit': 'Milliseconds'},
+                {'MetricName': 'SearchLatency', 'Value': search_time, 'Unit': 'Milliseconds'},
+                {'MetricName': 'RRFLatency', 'Value': rrf_time, 'Unit': 'Milliseconds'},
+                {'MetricName': 'CollapseRatio', 'Value': collapse_stats.get('collapse_ratio', 1.0)}
+            ] + ([
+                {'MetricName': 'SourceSelectLatency', 'Value': select_time, 'Unit': 'Milliseconds'},
+                {'MetricName': 'SelectedChunks', 'Value': hierarchy['selected_chunks'], 'Unit': 'Count'}
+            ] if hierarchy['enabled'] else [])
         )
         
-        # Store candidates in S3
+        # Pass candidates inline in the state payload, spilling to S3 only when large
         final_candidates = fused_results[:event.get('max_results', 10) * 2]
-        candidates_s3_key = store_candidates_s3(final_candidates, query_id, 'search_fusion')
+        
+        # None keeps the function's ADAPTIVE_RERANK
+        use_adaptive = event.get('adaptive_rerank')
+        if use_adaptive is None:
+            use_adaptive = ADAPTIVE_RERANK
+        rerank_plan = None
+        if use_adaptive:
+            rerank_plan = plan_rerank(bm25_hits, knn_hits, len(final_candidates), max_results)
+        monitoring['rerank_plan'] = rerank_plan
+        
+        candidates = pack_candidates(final_candidates, query_id, 'search_fusion', s3, BUCKET_NAME)
+        monitoring['candidate_bytes'] = candidates['bytes']
+        monitoring['candidates_inline'] = 'inline' in candidates
         
         return {
             'statusCode': 200,
-            'candidates_s3_key': candidates_s3_key,
+            'candidates': candidates,
+            'rerank_plan': rerank_plan,
             'monitoring': monitoring
         }
         
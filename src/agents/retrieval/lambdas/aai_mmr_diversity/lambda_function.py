@@ -6,23 +6,41 @@ import json
 import time
 from datetime import datetime
 import os
+from aai_candidate_envelope import decode_vector, load_candidates, pack_candidates
+from aai_opensearch_client import get_opensearch_client
+
+# NumPy ships in the OpenSearch layer; the pure-Python engine is kept for environments without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 s3 = boto3.client('s3')
 BUCKET_NAME = os.environ.get("SEARCH_RESULTS_BUCKET", "support-agent-search-results-dev")
+OPENSEARCH_INDEX = os.environ.get("OPENSEARCH_INDEX")
 
-def store_candidates_s3(candidates, query_id, stage):
-    key = f"candidates/{query_id}/{stage}.json"
-    s3.put_object(
-        Bucket=BUCKET_NAME,
-        Key=key,
-        Body=json.dumps(candidates),
-        ContentType='application/json'
-    )
-    return key
-
-def load_candidates_s3(s3_key):
-    response = s3.get_object(Bucket=BUCKET_NAME, Key=s3_key)
-    return json.loads(response['Body'].read())
+def fetch_vectors(candidates):
+    """
+    Attach full embeddings to candidates whose vectors were filtered out of the search
+    response, with one mget restricted to the embedding field. Returns the docs fetched.
+    """
+    missing = [hit for hit, _ in candidates if 'embedding' not in hit['_source']]
+    if not missing:
+        return 0
+    
+    opensearch = get_opensearch_client()
+    # Hits from a partitioned index name their partition; older envelopes use OPENSEARCH_INDEX
+    docs = [{"_index": hit.get('_index', OPENSEARCH_INDEX), "_id": hit['_id']} for hit in missing]
+    response = opensearch.mget(index=OPENSEARCH_INDEX, body={"docs": docs}, _source_includes="embedding")
+    vectors = {
+        doc['_id']: doc['_source']['embedding']
+        for doc in response['docs']
+        if doc.get('found') and 'embedding' in doc.get('_source', {})
+    }
+    for hit, _ in candidates:
+        if hit['_id'] in vectors:
+            hit['_source']['embedding'] = vectors[hit['_id']]
+    return len(vectors)
 
 def cosine_similarity(a, b):
     """Simple cosine similarity"""
@@ -31,43 +49,78 @@ def cosine_similarity(a, b):
     norm_b = sum(x * x for x in b) ** 0.5
     return dot / (norm_a * norm_b) if norm_a and norm_b else 0
 
-def simple_mmr(candidates, query_embedding, top_k=10):
-    """Simplified MMR with cosine similarity"""
-    if len(candidates) <= top_k:
-        return candidates
+def dot_product(a, b):
+    """Cosine similarity of unit-normalized vectors"""
+    return sum(x * y for x, y in zip(a, b))
+
+# Normalized-vector mode skips both norm computations on every comparison
+NORMALIZE_EMBEDDINGS = os.environ.get("NORMALIZE_EMBEDDINGS", "false").lower() == "true"
+similarity = dot_product if NORMALIZE_EMBEDDINGS else cosine_similarity
+
+DEFAULT_MMR_LAMBDA = 0.7
+
+def candidate_vectors(candidates, dimension):
+    """Candidate embeddings; missing or mismatched vectors become zeros (no relevance, no redundancy)"""
+    vectors = []
+    for hit, _ in candidates:
+        emb = hit['_source'].get('embedding')
+        vectors.append(emb if emb and len(emb) == dimension else [0.0] * dimension)
+    return vectors
+
+def numpy_mmr(candidates, query_embedding, top_k=10, mmr_lambda=DEFAULT_MMR_LAMBDA):
+    """
+    MMR over a candidate matrix built once: relevance is one matrix-vector product and a
+    running max-similarity vector is updated with one more product per selection,
+    O(k*n*d) instead of recomputing every pairwise similarity each round
+    """
+    dimension = len(query_embedding)
+    matrix = np.asarray(candidate_vectors(candidates, dimension), dtype=np.float32)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    if not NORMALIZE_EMBEDDINGS:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+        query_norm = np.linalg.norm(query)
+        query = query / query_norm if query_norm else query
     
-    selected = []
-    remaining = list(candidates)
+    relevance = matrix @ query
+    max_sim = np.zeros(len(candidates), dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    order = []
     
-    while remaining and len(selected) < top_k:
-        best_idx = 0
-        best_score = -1
-        
-        for i, (hit, score) in enumerate(remaining):
-            # Get embedding, use zeros if missing
-            emb = hit['_source'].get('embedding', [0.0] * 1536)
-            
-            # Relevance to query
-            relevance = cosine_similarity(query_embedding, emb)
-            
-            # Penalty for similarity to selected items
-            max_sim = 0
-            if selected:
-                for sel_hit, _ in selected:
-                    sel_emb = sel_hit['_source'].get('embedding', [0.0] * 1536)
-                    sim = cosine_similarity(emb, sel_emb)
-                    max_sim = max(max_sim, sim)
-            
-            # MMR score: relevance - diversity penalty
-            mmr_score = 0.7 * relevance - 0.3 * max_sim
-            
-            if mmr_score > best_score:
-                best_score = mmr_score
-                best_idx = i
-        
-        selected.append(remaining.pop(best_idx))
+    for _ in range(min(top_k, len(candidates))):
+        mmr_scores = mmr_lambda * relevance - (1 - mmr_lambda) * max_sim
+        mmr_scores[~available] = -np.inf
+        best = int(np.argmax(mmr_scores))
+        order.append(best)
+        available[best] = False
+        np.maximum(max_sim, matrix @ matrix[best], out=max_sim)
     
-    return selected
+    return [candidates[i] for i in order]
+
+def simple_mmr(candidates, query_embedding, top_k=10, mmr_lambda=DEFAULT_MMR_LAMBDA):
+    """Pure-Python MMR with the same incremental max-similarity updates, used without NumPy"""
+    dimension = len(query_embedding)
+    vectors = candidate_vectors(candidates, dimension)
+    relevance = [similarity(query_embedding, emb) for emb in vectors]
+    max_sim = [0.0] * len(candidates)
+    remaining = list(range(len(candidates)))
+    order = []
+    
+    while remaining and len(order) < top_k:
+        best = max(remaining, key=lambda i: (mmr_lambda * relevance[i] - (1 - mmr_lambda) * max_sim[i], -i))
+        order.append(best)
+        remaining.remove(best)
+        for i in remaining:
+            max_sim[i] = max(max_sim[i], similarity(vectors[i], vectors[best]))
+    
+    return [candidates[i] for i in order]
+
+def mmr_rerank(candidates, query_embedding, top_k=10, mmr_lambda=DEFAULT_MMR_LAMBDA):
+    if len(candidates) <= top_k:
+        return candidates
+    if np is not None:
+        return numpy_mmr(candidates, query_embedding, top_k, mmr_lambda)
+    return simple_mmr(candidates, query_embedding, top_k, mmr_lambda)
 
 def lambda_handler(event, context):
     start_time = time.time()
@@ -80,7 +133,7 @@ def lambda_handler(event, context):
             # Pass through S3 key without processing
             return {
                 'statusCode': 200,
-                'candidates_s3_key': event.get('candidates_s3_key'),
+                'candidates': event.get('candidates'),
                 'monitoring': {
                     'query_id': query_id,
                     'stage': 'mmr',
@@ -89,18 +142,33 @@ def lambda_handler(event, context):
                 }
             }
         
-        # Load candidates from S3
-        candidates_s3_key = event.get('candidates_s3_key')
-        candidates = load_candidates_s3(candidates_s3_key) if candidates_s3_key else event['candidates']
+        # Inline envelope, or S3 when the previous stage spilled it
+        candidates = load_candidates(event, s3, BUCKET_NAME)
         
         max_results = event.get('max_results', 10)
         
-        query_embedding = event.get('queryEmbedding', [])
+        query_embedding = decode_vector(event.get('queryEmbedding', []))
+        mmr_lambda = event.get('mmr_lambda')
+        mmr_lambda = DEFAULT_MMR_LAMBDA if mmr_lambda is None else float(mmr_lambda)
+        
+        # Fetch vectors lazily, only when MMR actually has to choose between candidates
+        fetch_start = time.time()
+        vectors_fetched = fetch_vectors(candidates) if len(candidates) > max_results else 0
+        fetch_time = (time.time() - fetch_start) * 1000
         
         # Apply MMR
         mmr_start = time.time()
-        mmr_results = simple_mmr(candidates, query_embedding, max_results)
+        mmr_results = mmr_rerank(candidates, query_embedding, max_results, mmr_lambda)
         mmr_time = (time.time() - mmr_start) * 1000
+        # Candidates MMR chose between without a usable vector (scored as zeros)
+        vectors_missing = 0
+        if len(candidates) > max_results:
+            vectors_missing = sum(1 for hit, _ in candidates
+                                  if not query_embedding or len(hit['_source'].get('embedding') or []) != len(query_embedding))
+        
+        # Keep downstream payloads vector-free
+        for hit, _ in mmr_results:
+            hit['_source'].pop('embedding', None)
         
         # Monitoring
         monitoring = {
@@ -109,14 +177,19 @@ def lambda_handler(event, context):
             'enabled': True,
             'timestamp': datetime.utcnow().isoformat(),
             'mmr_time_ms': mmr_time,
+            'vector_fetch_time_ms': fetch_time,
+            'vectors_fetched': vectors_fetched,
             'total_time_ms': (time.time() - start_time) * 1000,
-            'relevance_weight': 0.7,
+            'relevance_weight': mmr_lambda,
+            'mmr_engine': 'numpy' if np is not None else 'python',
             'input_count': len(candidates),
-            'output_count': len(mmr_results)
+            'output_count': len(mmr_results),
+            'vectors_missing': vectors_missing,
+            'degraded': vectors_missing > 0
         }
         
-        # Store results in S3
-        results_s3_key = store_candidates_s3(mmr_results, query_id, 'mmr')
+        results = pack_candidates(mmr_results, query_id, 'mmr', s3, BUCKET_NAME)
+        monitoring['candidates_inline'] = 'inline' in results
         
         # Send metrics immediately
         cloudwatch.put_metric_data(
@@ -129,7 +202,7 @@ def lambda_handler(event, context):
         
         return {
             'statusCode': 200,
-            'candidates_s3_key': results_s3_key,
+            'candidates': results,
             'monitoring': monitoring
         }
         
@@ -0,0 +1,52 @@
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+from onnxruntime.quantization import QuantType, quantize_dynamic
+import boto3
+import torch
+import os
+import sys
+
+# Exports the cross-encoder the SageMaker endpoint serves (HF_MODEL_ID) to an int8 ONNX model for
+# the in-Lambda reranker (RERANK_BACKEND=onnx). Output: model.onnx + tokenizer.json in OUTPUT_DIR,
+# which create_reranker_layer.sh packages; pass an s3:// URI to also upload for RERANK_MODEL_S3_URI.
+
+# 1. Model config
+HF_MODEL_ID = os.environ.get("HF_MODEL_ID", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+OUTPUT_DIR = os.environ.get("OUTPUT_DIR", "dist/models/cross_encoder")
+s3_uri = sys.argv[1] if len(sys.argv) > 1 else None
+
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+tokenizer = AutoTokenizer.from_pretrained(HF_MODEL_ID)
+model = AutoModelForSequenceClassification.from_pretrained(HF_MODEL_ID)
+model.eval()
+
+# 2. Export fp32 graph with dynamic batch and sequence axes
+sample = tokenizer(["query"], ["document"], return_tensors="pt")
+fp32_path = os.path.join(OUTPUT_DIR, "model-fp32.onnx")
+input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+torch.onnx.export(
+    model,
+    tuple(sample[name] for name in input_names),
+    fp32_path,
+    input_names=input_names,
+    output_names=["logits"],
+    dynamic_axes={**{name: {0: "batch", 1: "sequence"} for name in input_names}, "logits": {0: "batch"}},
+    opset_version=14
+)
+
+# 3. Dynamic int8 quantization of the weights (~4x smaller, faster MatMuls on CPU)
+model_path = os.path.join(OUTPUT_DIR, "model.onnx")
+quantize_dynamic(fp32_path, model_path, weight_type=QuantType.QInt8)
+os.remove(fp32_path)
+
+# 4. Fast tokenizer as a single tokenizer.json (what the tokenizers package loads)
+tokenizer.save_pretrained(OUTPUT_DIR)
+
+print(f"Exported {HF_MODEL_ID} to {model_path} ({os.path.getsize(model_path) / 1e6:.1f} MB)")
+
+# 5. Optional upload for functions without the reranker layer
+if s3_uri:
+    bucket, _, prefix = s3_uri[len("s3://"):].partition("/")
+    s3 = boto3.client("s3")
+    for name in ("model.onnx", "tokenizer.json"):
+        s3.upload_file(os.path.join(OUTPUT_DIR, name), bucket, f"{prefix.rstrip('/')}/{name}".lstrip("/"))
+    print(f"Uploaded to {s3_uri}")
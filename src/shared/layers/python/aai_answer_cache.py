@@ -0,0 +1,190 @@
+# Shared - Semantic Answer Cache
+# Answers of recently answered first-turn queries with their query embeddings, scoped by index, index
+# generation and the retrieval parameters of the result cache key. aai_trigger_step_function_retrieval
+# returns a cached answer without starting the state machine when a new session's query embedding is
+# within ANSWER_CACHE_THRESHOLD cosine similarity of one.
+# Similarity search runs over this execution environment's entries; the shared aai_cache tier holds
+# every answer under its exact normalized query, so identical questions hit in every environment.
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from aai_cache import get_cache, index_generation, query_hash
+from aai_query_vectors import pack_float32, unpack_float32
+from aai_result_cache import RESULT_KEY_FIELDS
+from aai_ticket_intent import wants_ticket
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+# Cosine similarity of query embeddings above which a cached answer is returned
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = int(os.environ.get("ANSWER_CACHE_TTL_SECONDS", "900"))
+# Answered queries kept per execution environment for similarity search (least recently used go first)
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "500"))
+
+def unit(vector):
+    norm = sum(x * x for x in vector) ** 0.5
+    return [x / norm for x in vector] if norm else list(vector)
+
+class SemanticIndex:
+    """Bounded, expiring (scope, unit embedding) -> answer entries with nearest-neighbour lookup"""
+
+    def __init__(self, maxsize=ANSWER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def nearest(self, scope, vector):
+        """(key, entry, similarity) of the most similar live entry in scope, or (None, None, 0.0)"""
+        now = time.time()
+        with self.lock:
+            expired = [key for key, entry in self.entries.items() if entry["expires_at"] <= now]
+            for key in expired:
+                del self.entries[key]
+            self.expirations += len(expired)
+            candidates = [(key, entry) for key, entry in self.entries.items() if entry["scope"] == scope]
+            if not candidates:
+                return None, None, 0.0
+            if np is not None:
+                scores = np.asarray([entry["vector"] for _, entry in candidates], dtype=np.float32) @ np.asarray(vector, dtype=np.float32)
+                best = int(np.argmax(scores))
+                similarity = float(scores[best])
+            else:
+                scores = [sum(a * b for a, b in zip(entry["vector"], vector)) for _, entry in candidates]
+                best = max(range(len(scores)), key=scores.__getitem__)
+                similarity = scores[best]
+            key, entry = candidates[best]
+            self.entries.move_to_end(key)
+            return key, entry, similarity
+
+    def put(self, key, scope, vector, value, expires_at):
+        with self.lock:
+            self.entries[key] = {"scope": scope, "vector": vector, "value": value, "expires_at": expires_at}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+_index = SemanticIndex()
+_counts = {"lookups": 0, "hits": 0}
+_counts_lock = threading.Lock()
+
+def answer_cache():
+    # Exact-query tier; the LRU stays small since similarity lookups go through _index
+    return get_cache("answers", ANSWER_CACHE_TTL_SECONDS, lru_size=max(1, ANSWER_CACHE_SIZE // 10))
+
+def answer_scope(request, index_name, generation):
+    # The fields that key cached retrieval results also change the answer built from them
+    params = json.dumps([request.get(field) for field in RESULT_KEY_FIELDS], sort_keys=True)
+    return f"{index_name}#{generation}#{hashlib.sha256(params.encode('utf-8')).hexdigest()[:16]}"
+
+def answer_generation(index_name=None):
+    """
+    Index generation answers are scoped to, or None when the cache cannot be used (disabled, or
+    no shared CACHE_TABLE). Checked before the query is embedded for lookup_answer.
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    try:
+        return index_generation(index_name or os.environ.get("OPENSEARCH_INDEX"))
+    except Exception as e:
+        # Without the generation nothing can be served safely, but the pipeline itself still works
+        print(f"WARNING: index generation read failed, answer cache bypassed: {e}")
+        return None
+
+def _record(hit):
+    with _counts_lock:
+        _counts["lookups"] += 1
+        _counts["hits"] += hit
+        return _counts["lookups"], _counts["hits"] / _counts["lookups"]
+
+def lookup_answer(request, embedding, generation, index_name=None):
+    """
+    (cached answer or None, stats) at the generation answer_generation returned. The cached answer
+    is {'answer', 'sources', 'query', 'query_id'}. On a miss stats['key'] and stats['scope'] are
+    where store_answer puts this request's answer.
+    """
+    start = time.time()
+    index_name = index_name or os.environ.get("OPENSEARCH_INDEX")
+    if generation is None or not embedding:
+        # Only a shared table tells every execution environment about index changes
+        return None, {'enabled': False, 'hit': False, 'key': None}
+    if wants_ticket(request["user_query"]):
+        # A ticket request has to reach aai_create_ticket, however close it is to a cached question
+        return None, {'enabled': True, 'hit': False, 'key': None, 'ticket_intent': True}
+
+    scope = answer_scope(request, index_name, generation)
+    vector = unit(embedding)
+    cache = answer_cache()
+    key = cache.key(scope, query_hash(request["user_query"]))
+    _, entry, similarity = _index.nearest(scope, vector)
+    tier = None
+    cached = None
+    if entry is not None and similarity >= ANSWER_CACHE_THRESHOLD:
+        cached, tier = entry["value"], "semantic"
+    else:
+        # Asked in exactly these words in another execution environment
+        found, _ = cache.get_many([key])
+        if key in found:
+            cached, tier, similarity = found[key], "exact", 1.0
+            _index.put(key, scope, unit(unpack_float32(found[key]["embedding"])), found[key],
+                       time.time() + ANSWER_CACHE_TTL_SECONDS)
+
+    lookups, hit_rate = _record(cached is not None)
+    stats = {
+        'enabled': True,
+        'hit': cached is not None,
+        'tier': tier,
+        'key': key,
+        'scope': scope,
+        'index_generation': generation,
+        # Best match in this environment, whether or not it reached the threshold
+        'similarity': similarity,
+        'threshold': ANSWER_CACHE_THRESHOLD,
+        'matched_query': cached.get('query') if cached else None,
+        'cached_query_id': cached.get('query_id') if cached else None,
+        'lookup_time_ms': (time.time() - start) * 1000,
+        'entries': len(_index.entries),
+        'evictions': _index.evictions,
+        'expirations': _index.expirations,
+        # Since this execution environment started
+        'environment_lookups': lookups,
+        'environment_hit_rate': hit_rate
+    }
+    if cached is None:
+        return None, stats
+    return {k: cached.get(k) for k in ('answer', 'sources', 'query', 'query_id')}, stats
+
+def store_answer(stats, request, embedding, answer, sources):
+    """Cache an answer under the key and scope its lookup returned (a shared-tier failure is only logged)"""
+    if not stats.get('key') or not answer:
+        return False
+    value = {
+        'answer': answer,
+        'sources': sources,
+        'query': request["user_query"],
+        'query_id': request.get("query_id"),
+        'embedding': pack_float32(embedding)
+    }
+    _index.put(stats['key'], stats['scope'], unit(embedding), value, time.time() + ANSWER_CACHE_TTL_SECONDS)
+    answer_cache().put_many({stats['key']: value})
+    return True
+
+def reset_answer_cache():
+    _index.clear()
+    with _counts_lock:
+        _counts.update(lookups=0, hits=0)
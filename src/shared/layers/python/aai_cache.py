@@ -0,0 +1,230 @@
+# Shared - Two-Tier Cache
+# In-process LRU per execution environment in front of a shared DynamoDB table with TTL.
+# Namespaces ("rerank", ...) share one table; values are stored as JSON. The table also holds
+# the index generation counters that ingestion bumps and index-dependent caches key on.
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import boto3
+
+# DynamoDB table name; "memory" keeps the shared tier in process (no AWS), unset disables it
+CACHE_TABLE = os.environ.get("CACHE_TABLE")
+CACHE_LRU_SIZE = int(os.environ.get("CACHE_LRU_SIZE", "10000"))
+# DynamoDB BatchGetItem limit
+BATCH_GET_MAX_KEYS = 100
+
+def normalize_query(text):
+    """Case, whitespace and trailing punctuation don't change what is being asked"""
+    return re.sub(r"\s+", " ", (text or "").lower()).strip().rstrip("?!. ")
+
+def query_hash(text):
+    return hashlib.sha256(normalize_query(text).encode("utf-8")).hexdigest()[:32]
+
+class LRUCache:
+    def __init__(self, maxsize=CACHE_LRU_SIZE):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        # Entries pushed out by the size bound since the execution environment started
+        self.evictions = 0
+
+    def get(self, key):
+        """(value, expires_at) or None; expired entries are dropped on read"""
+        with self.lock:
+            entry = self.items.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return entry
+
+    def put(self, key, value, expires_at):
+        with self.lock:
+            self.items[key] = (value, expires_at)
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+class DynamoCacheStore:
+    """Shared tier: cache_key (hash key), value (JSON string), ttl_epoch (table TTL attribute)"""
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self.dynamodb = boto3.resource("dynamodb")
+        self.table = self.dynamodb.Table(table_name)
+
+    def get_many(self, keys):
+        found = {}
+        now = int(time.time())
+        for i in range(0, len(keys), BATCH_GET_MAX_KEYS):
+            request = {self.table_name: {"Keys": [{"cache_key": k} for k in keys[i:i + BATCH_GET_MAX_KEYS]]}}
+            # Unprocessed keys get one retry; whatever is still left counts as a miss
+            for _ in range(2):
+                response = self.dynamodb.batch_get_item(RequestItems=request)
+                for item in response.get("Responses", {}).get(self.table_name, []):
+                    # TTL deletion lags expiry, so check it here
+                    if int(item.get("ttl_epoch", 0)) > now:
+                        found[item["cache_key"]] = (json.loads(item["value"]), int(item["ttl_epoch"]))
+                request = response.get("UnprocessedKeys")
+                if not request:
+                    break
+        return found
+
+    def put_many(self, items, expires_at):
+        with self.table.batch_writer(overwrite_by_pkeys=["cache_key"]) as batch:
+            for key, value in items.items():
+                batch.put_item(Item={"cache_key": key, "value": json.dumps(value), "ttl_epoch": int(expires_at)})
+
+    def counter(self, key):
+        # Strongly consistent, so a bump is seen by the next read
+        item = self.table.get_item(Key={"cache_key": key}, ConsistentRead=True).get("Item")
+        return int(item["counter"]) if item else 0
+
+    def increment(self, key):
+        """Atomic +1 (no TTL: counters never expire)"""
+        response = self.table.update_item(
+            Key={"cache_key": key}, UpdateExpression="ADD #c :one",
+            ExpressionAttributeNames={"#c": "counter"}, ExpressionAttributeValues={":one": 1},
+            ReturnValues="UPDATED_NEW"
+        )
+        return int(response["Attributes"]["counter"])
+
+class MemoryCacheStore:
+    """Local stand-in for DynamoCacheStore (CACHE_TABLE=memory, for tests and local runs)"""
+
+    def __init__(self):
+        self.items = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.time()
+        with self.lock:
+            return {k: self.items[k] for k in keys if k in self.items and self.items[k][1] > now}
+
+    def put_many(self, items, expires_at):
+        with self.lock:
+            for key, value in items.items():
+                self.items[key] = (value, int(expires_at))
+
+    def counter(self, key):
+        with self.lock:
+            return self.counters.get(key, 0)
+
+    def increment(self, key):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+            return self.counters[key]
+
+class TieredCache:
+    def __init__(self, namespace, ttl_seconds, store=None, lru_size=CACHE_LRU_SIZE):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.store = store
+        self.lru = LRUCache(lru_size)
+
+    def key(self, *parts):
+        return "#".join([self.namespace, *(str(p) for p in parts)])
+
+    def lru_stats(self):
+        return {"lru_entries": len(self.lru.items), "lru_maxsize": self.lru.maxsize, "lru_evictions": self.lru.evictions}
+
+    def get_many(self, keys):
+        """Values found for keys, plus where each came from"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        stats = {"lru_hits": 0, "shared_hits": 0, "misses": 0, "shared_errors": 0}
+        remaining = []
+        for key in keys:
+            entry = self.lru.get(key)
+            if entry is None:
+                remaining.append(key)
+            else:
+                found[key] = entry[0]
+                stats["lru_hits"] += 1
+
+        if remaining and self.store is not None:
+            try:
+                shared = self.store.get_many(remaining)
+            except Exception as e:
+                # The cache only saves work; an unavailable table must not fail the request
+                print(f"WARNING: {self.namespace} cache read failed: {e}")
+                shared = {}
+                stats["shared_errors"] += 1
+            for key, (value, expires_at) in shared.items():
+                found[key] = value
+                self.lru.put(key, value, expires_at)
+            stats["shared_hits"] = len(shared)
+
+        stats["misses"] = len(keys) - len(found)
+        return found, stats
+
+    def put_many(self, items):
+        if not items:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        for key, value in items.items():
+            self.lru.put(key, value, expires_at)
+        if self.store is not None:
+            try:
+                self.store.put_many(items, expires_at)
+            except Exception as e:
+                print(f"WARNING: {self.namespace} cache write failed: {e}")
+
+_caches = {}
+_stores = {}
+_caches_lock = threading.Lock()
+
+def _shared_store(table_name):
+    """The shared tier for a table, one per execution environment (None without a table)"""
+    if not table_name:
+        return None
+    if table_name not in _stores:
+        _stores[table_name] = MemoryCacheStore() if table_name == "memory" else DynamoCacheStore(table_name)
+    return _stores[table_name]
+
+def get_cache(namespace, ttl_seconds, table_name=None, lru_size=None):
+    """One cache per namespace per execution environment, so the LRU survives warm invocations"""
+    table_name = table_name or CACHE_TABLE
+    with _caches_lock:
+        if namespace not in _caches:
+            _caches[namespace] = TieredCache(namespace, ttl_seconds, _shared_store(table_name), lru_size or CACHE_LRU_SIZE)
+        return _caches[namespace]
+
+def get_store(table_name=None):
+    with _caches_lock:
+        return _shared_store(table_name or CACHE_TABLE)
+
+def generation_key(index_name):
+    return f"generation#{index_name}"
+
+def index_generation(index_name, table_name=None):
+    """Current generation of an index's content, None when there is no shared table to hold it"""
+    store = get_store(table_name)
+    return store.counter(generation_key(index_name)) if store is not None else None
+
+def bump_index_generation(index_name, table_name=None):
+    """
+    Mark everything cached against the index as stale; called whenever its content changes.
+    Errors propagate: a change that could not be recorded must fail the writer, not go unseen.
+    """
+    store = get_store(table_name)
+    return store.increment(generation_key(index_name)) if store is not None else None
+
+def reset_caches():
+    with _caches_lock:
+        _caches.clear()
+        _stores.clear()
@@ -0,0 +1,141 @@
+# Shared - Compact Candidate Envelope
+# Binary encoding for retrieval candidates passed between Step Functions stages: travels
+# inline in the state payload when small, spills to S3 only above CANDIDATE_INLINE_MAX_BYTES
+
+import base64
+import json
+import os
+import struct
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ENVELOPE_FORMAT = "aaic1"
+ENVELOPE_MAGIC = b"AAIC"
+VECTOR_PREFIX = "f16:"
+# Step Functions caps the whole state at 256 KB and every stage result is kept in it
+INLINE_MAX_BYTES = int(os.environ.get("CANDIDATE_INLINE_MAX_BYTES", "32768"))
+# Safety cap above the ingest chunk size (CHUNK_CHAR_SIZE), not a summarization step
+TEXT_MAX_CHARS = int(os.environ.get("CANDIDATE_TEXT_MAX_CHARS", "2000"))
+VECTOR_FIELD = "embedding"
+DROPPED_FIELDS = ("embedding_compact",)
+
+def pack_float16(values):
+    if np is not None:
+        return np.asarray(values, dtype="<f2").tobytes()
+    return struct.pack(f"<{len(values)}e", *values)
+
+def unpack_float16(data):
+    if np is not None:
+        return np.frombuffer(data, dtype="<f2").astype(np.float32).tolist()
+    return list(struct.unpack(f"<{len(data) // 2}e", data))
+
+def encode_vector(vector):
+    """Float16 + base64 string, ~4x smaller than the JSON float list"""
+    return VECTOR_PREFIX + base64.b64encode(pack_float16(vector)).decode("ascii")
+
+def decode_vector(value):
+    """Accepts an encoded vector or a plain list (older payloads, direct invocations)"""
+    if isinstance(value, str) and value.startswith(VECTOR_PREFIX):
+        return unpack_float16(base64.b64decode(value[len(VECTOR_PREFIX):]))
+    return value
+
+def encode_candidates(candidates):
+    """
+    Layout (zlib-compressed):
+    magic | uint32 count | uint16 dim | float32 scores[count] | float16 vectors[count * dim] | JSON hits
+    dim is 0 when no candidate carries a vector; hits without one get "_v": false.
+    """
+    dimension = 0
+    for hit, _ in candidates:
+        vector = hit["_source"].get(VECTOR_FIELD)
+        if vector:
+            dimension = len(vector)
+            break
+
+    scores = []
+    vectors = []
+    hits = []
+    for hit, score in candidates:
+        source = {k: v for k, v in hit["_source"].items() if k != VECTOR_FIELD and k not in DROPPED_FIELDS}
+        if isinstance(source.get("text"), str):
+            source["text"] = source["text"][:TEXT_MAX_CHARS]
+        entry = {"_id": hit["_id"], "_source": source}
+        # Partitioned indexes: MMR fetches vectors from the partition the hit came from
+        if "_index" in hit:
+            entry["_index"] = hit["_index"]
+        if dimension:
+            vector = hit["_source"].get(VECTOR_FIELD)
+            if vector and len(vector) == dimension:
+                vectors.extend(vector)
+            else:
+                vectors.extend([0.0] * dimension)
+                entry["_v"] = False
+        scores.append(float(score))
+        hits.append(entry)
+
+    payload = b"".join([
+        ENVELOPE_MAGIC,
+        struct.pack("<IH", len(candidates), dimension),
+        struct.pack(f"<{len(scores)}f", *scores),
+        pack_float16(vectors) if dimension else b"",
+        json.dumps(hits, separators=(",", ":")).encode("utf-8")
+    ])
+    return zlib.compress(payload, 6)
+
+def decode_candidates(blob):
+    """Inverse of encode_candidates: [[hit, score], ...] in the same shape the stages already use"""
+    payload = zlib.decompress(blob)
+    if payload[:4] != ENVELOPE_MAGIC:
+        raise ValueError("Not a candidate envelope")
+    count, dimension = struct.unpack_from("<IH", payload, 4)
+    offset = 10
+    scores = struct.unpack_from(f"<{count}f", payload, offset)
+    offset += count * 4
+    vectors = []
+    if dimension:
+        vectors = unpack_float16(payload[offset:offset + count * dimension * 2])
+        offset += count * dimension * 2
+    hits = json.loads(payload[offset:])
+
+    candidates = []
+    for i, (hit, score) in enumerate(zip(hits, scores)):
+        if dimension and hit.pop("_v", True):
+            hit["_source"][VECTOR_FIELD] = vectors[i * dimension:(i + 1) * dimension]
+        candidates.append([hit, score])
+    return candidates
+
+def pack_candidates(candidates, query_id, stage, s3, bucket, inline_max_bytes=INLINE_MAX_BYTES):
+    """Envelope reference for the stage result: inline base64 when small, otherwise an S3 key"""
+    blob = encode_candidates(candidates)
+    encoded = base64.b64encode(blob).decode("ascii")
+    envelope = {"format": ENVELOPE_FORMAT, "count": len(candidates), "bytes": len(blob)}
+    if len(encoded) <= inline_max_bytes:
+        envelope["inline"] = encoded
+    else:
+        key = f"candidates/{query_id}/{stage}.bin"
+        s3.put_object(Bucket=bucket, Key=key, Body=blob, ContentType="application/octet-stream")
+        envelope["s3_key"] = key
+    return envelope
+
+def unpack_candidates(envelope, s3, bucket):
+    if "inline" in envelope:
+        return decode_candidates(base64.b64decode(envelope["inline"]))
+    blob = s3.get_object(Bucket=bucket, Key=envelope["s3_key"])["Body"].read()
+    return decode_candidates(blob)
+
+def load_candidates(event, s3, bucket):
+    """
+    Candidates from a stage event: an envelope under 'candidates', a plain candidate list
+    (direct invocations) or a legacy JSON 'candidates_s3_key'
+    """
+    candidates = event.get("candidates")
+    if isinstance(candidates, dict) and candidates.get("format") == ENVELOPE_FORMAT:
+        return unpack_candidates(candidates, s3, bucket)
+    if candidates is not None:
+        return candidates
+    response = s3.get_object(Bucket=bucket, Key=event["candidates_s3_key"])
+    return json.loads(response["Body"].read())
@@ -0,0 +1,261 @@
+# Shared - Embedded Indices
+# Common storage for the indices aai_hybrid_search_fusion searches in-process (aai_vector_index,
+# aai_lexical_index): row metadata and filter codes, generations published to S3, and the
+# per-environment copy in /tmp that is reloaded only when the generation changes
+
+import fnmatch
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+
+import boto3
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+TMP_INDEX_DIR = "/tmp/embedded_index"
+# Warm environments look for a newer generation at most this often
+EMBEDDED_INDEX_CHECK_SECONDS = int(os.environ.get("EMBEDDED_INDEX_CHECK_SECONDS", "60"))
+# Fields filters can use (besides the OpenSearch index a row came from); each is stored as int32 codes
+EMBEDDED_INDEX_FILTER_FIELDS = [f.strip() for f in os.environ.get(
+    "EMBEDDED_INDEX_FILTER_FIELDS", "source,metadata.product_purchased,metadata.type").split(",") if f.strip()]
+INDEX_FIELD = "_index"
+# Fields of _source that are not carried into the row metadata
+VECTOR_FIELDS = ("embedding", "embedding_compact")
+
+META_FILE = "meta.jsonl"
+MANIFEST_FILE = "manifest.json"
+
+_loaded = {}
+_load_lock = threading.Lock()
+_s3 = None
+
+def s3_client():
+    global _s3
+    if _s3 is None:
+        _s3 = boto3.client("s3")
+    return _s3
+
+def index_prefix(index_name, prefix):
+    return f"{prefix}{index_name}/"
+
+def field_value(source, field):
+    value = source
+    for part in field.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+def chunk_doc_id(doc):
+    """
+    Stable _id of a stored chunk, so indices built from the ingestion files rather than the
+    domain agree with it on ids (RRF fuses the legs by _id)
+    """
+    key = [doc.get("source", ""), doc.get("ticket_id"), doc.get("chunk_id")]
+    if doc.get("chunk_id") is None:
+        key.append(doc.get("text", ""))
+    return hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+
+def write_rows(directory, docs, filter_fields=EMBEDDED_INDEX_FILTER_FIELDS):
+    """
+    Write meta.jsonl for [(index, doc_id, source), ...] in row order and return the filter code
+    and metadata offset arrays, plus the manifest entries describing them
+    """
+    fields = [INDEX_FIELD] + list(filter_fields)
+    vocab = {field: {} for field in fields}
+    codes = {field: np.empty(len(docs), dtype=np.int32) for field in fields}
+    meta_offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, META_FILE), "wb") as meta:
+        for row, (index, doc_id, source) in enumerate(docs):
+            for field in fields:
+                value = index if field == INDEX_FIELD else field_value(source, field)
+                codes[field][row] = vocab[field].setdefault(str(value), len(vocab[field])) if value is not None else -1
+            line = json.dumps({"_index": index, "_id": doc_id, "_source": source}, separators=(",", ":")).encode("utf-8")
+            meta.write(line + b"\n")
+            meta_offsets[row + 1] = meta_offsets[row] + len(line) + 1
+    arrays = {"meta_offsets": meta_offsets}
+    for i, field in enumerate(fields):
+        arrays[f"filter_{i}"] = codes[field]
+    return arrays, {"filter_fields": fields, "vocab": {field: list(values) for field, values in vocab.items()}}
+
+def write_index(directory, arrays, manifest, extra_files=()):
+    """Save the arrays as .npy files; the manifest is written last, so a directory with one is complete"""
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), array)
+    manifest = {**manifest, "files": sorted(f"{name}.npy" for name in arrays) + [META_FILE] + list(extra_files)}
+    with open(os.path.join(directory, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f)
+    return manifest
+
+def current_generation(index_name, bucket, prefix):
+    try:
+        obj = s3_client().get_object(Bucket=bucket, Key=f"{index_prefix(index_name, prefix)}CURRENT.json")
+    except s3_client().exceptions.NoSuchKey:
+        return 0
+    return json.loads(obj["Body"].read())["generation"]
+
+def publish_index(directory, index_name, bucket, prefix):
+    """Upload a built index as the next generation; CURRENT.json is switched only once every file is in"""
+    generation = current_generation(index_name, bucket, prefix) + 1
+    key_prefix = f"{index_prefix(index_name, prefix)}{generation:06d}/"
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    total_bytes = 0
+    for name in manifest["files"] + [MANIFEST_FILE]:
+        path = os.path.join(directory, name)
+        s3_client().upload_file(path, bucket, key_prefix + name)
+        total_bytes += os.path.getsize(path)
+    s3_client().put_object(Bucket=bucket, Key=f"{index_prefix(index_name, prefix)}CURRENT.json",
+                           Body=json.dumps({"generation": generation, "key_prefix": key_prefix}),
+                           ContentType="application/json")
+    return {"generation": generation, "key_prefix": key_prefix, "total_bytes": total_bytes}
+
+class EmbeddedIndex:
+    """A built index opened with memory-mapped arrays; row metadata is read on demand"""
+
+    FORMAT = None
+    FORMAT_VERSION = 1
+    ARRAY_FILES = ()
+
+    def __init__(self, directory, generation=None):
+        start = time.time()
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        # Vector indices published before the lexical index existed carry no format
+        if self.manifest.get("format", "vector") != self.FORMAT or self.manifest["format_version"] != self.FORMAT_VERSION:
+            raise ValueError(f"Unsupported {self.FORMAT} index format: "
+                             f"{self.manifest.get('format')} v{self.manifest['format_version']}")
+        self.directory = directory
+        self.generation = generation
+        self.rows = self.manifest["rows"]
+        for name in self.ARRAY_FILES + ("meta_offsets",):
+            setattr(self, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r"))
+        self.codes = {field: np.load(os.path.join(directory, f"filter_{i}.npy"), mmap_mode="r")
+                      for i, field in enumerate(self.manifest["filter_fields"])}
+        self.vocab = {field: {value: code for code, value in enumerate(values)}
+                      for field, values in self.manifest["vocab"].items()}
+        self._meta_file = open(os.path.join(directory, META_FILE), "rb")
+        self._meta = mmap.mmap(self._meta_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.load_time_ms = (time.time() - start) * 1000
+
+    def close(self):
+        self._meta.close()
+        self._meta_file.close()
+
+    def _codes(self, field, values):
+        if field not in self.codes:
+            raise ValueError(f"Field {field} is not stored in the embedded index (EMBEDDED_INDEX_FILTER_FIELDS)")
+        wanted = [self.vocab[field][str(v)] for v in values if str(v) in self.vocab[field]]
+        return np.isin(self.codes[field], wanted)
+
+    def mask(self, clause):
+        """Rows matching an OpenSearch filter clause: term, terms and bool filter/must/should"""
+        if "term" in clause:
+            field, value = next(iter(clause["term"].items()))
+            return self._codes(field, [value.get("value") if isinstance(value, dict) else value])
+        if "terms" in clause:
+            field, values = next(iter(clause["terms"].items()))
+            return self._codes(field, values)
+        if "bool" not in clause:
+            raise ValueError(f"Unsupported filter for the embedded index: {list(clause)}")
+        spec = clause["bool"]
+        mask = np.ones(self.rows, dtype=bool)
+        for sub in spec.get("filter", []) + spec.get("must", []):
+            mask &= self.mask(sub)
+        if spec.get("should"):
+            mask &= np.logical_or.reduce([self.mask(sub) for sub in spec["should"]])
+        return mask
+
+    def index_names(self, index_pattern=None):
+        """OpenSearch indices (partitions) stored in the index, optionally matching a wildcard pattern"""
+        return [name for name in self.vocab[INDEX_FIELD] if not index_pattern or fnmatch.fnmatch(name, index_pattern)]
+
+    def restriction(self, filter_clause=None, index_pattern=None):
+        """Row mask for a filter and/or an index name (wildcards allowed), None when unrestricted"""
+        mask = self.mask(filter_clause) if filter_clause else None
+        names = self.index_names(index_pattern)
+        if len(names) < len(self.vocab[INDEX_FIELD]):
+            index_mask = np.isin(self.codes[INDEX_FIELD], [self.vocab[INDEX_FIELD][name] for name in names])
+            mask = index_mask if mask is None else mask & index_mask
+        return mask
+
+    def count(self, filter_clause=None, index_pattern=None):
+        mask = self.restriction(filter_clause, index_pattern)
+        return self.rows if mask is None else int(mask.sum())
+
+    def doc(self, row):
+        start, end = int(self.meta_offsets[row]), int(self.meta_offsets[row + 1])
+        return json.loads(self._meta[start:end])
+
+    def hits(self, rows, scores):
+        """Hits for the given rows, shaped as OpenSearch returns them"""
+        hits = []
+        for row, score in zip(rows, scores):
+            hit = self.doc(int(row))
+            hit["_score"] = float(score)
+            hits.append(hit)
+        return hits
+
+def download_generation(bucket, key_prefix, directory):
+    """Fetch one generation into /tmp; files land beside the target and are renamed into place"""
+    if os.path.exists(os.path.join(directory, MANIFEST_FILE)):
+        return directory
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    s3_client().download_file(bucket, key_prefix + MANIFEST_FILE, manifest_path + ".part")
+    with open(manifest_path + ".part") as f:
+        files = json.load(f)["files"]
+    for name in files:
+        path = os.path.join(directory, name)
+        s3_client().download_file(bucket, key_prefix + name, path + ".part")
+        os.replace(path + ".part", path)
+    os.replace(manifest_path + ".part", manifest_path)
+    return directory
+
+def get_embedded_index(index_class, index_name, bucket, prefix):
+    """
+    The current generation of an index, shared by every invocation of this execution environment.
+    S3 is checked every EMBEDDED_INDEX_CHECK_SECONDS; a new generation replaces the old one in /tmp.
+    Returns (index, load info).
+    """
+    if np is None:
+        raise RuntimeError("numpy is not installed; attach the OpenSearch dependencies layer")
+    key = (prefix, index_name)
+    with _load_lock:
+        loaded = _loaded.get(key)
+        now = time.time()
+        if loaded and now - loaded["checked_at"] < EMBEDDED_INDEX_CHECK_SECONDS:
+            return loaded["index"], {'generation': loaded["index"].generation, 'reloaded': False, 'load_time_ms': 0}
+
+        start = time.time()
+        obj = s3_client().get_object(Bucket=bucket, Key=f"{index_prefix(index_name, prefix)}CURRENT.json")
+        current = json.loads(obj["Body"].read())
+        if loaded and loaded["index"].generation == current["generation"]:
+            loaded["checked_at"] = now
+            return loaded["index"], {'generation': current["generation"], 'reloaded': False,
+                                     'load_time_ms': (time.time() - start) * 1000}
+
+        root = os.path.join(TMP_INDEX_DIR, index_prefix(index_name, prefix))
+        directory = download_generation(bucket, current["key_prefix"], os.path.join(root, f"{current['generation']:06d}"))
+        index = index_class(directory, current["generation"])
+        if loaded:
+            loaded["index"].close()
+        # /tmp is limited, so only the generation in use is kept
+        for name in os.listdir(root):
+            if os.path.join(root, name) != directory:
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        _loaded[key] = {"index": index, "checked_at": now}
+        return index, {'generation': current["generation"], 'reloaded': True,
+                       'load_time_ms': (time.time() - start) * 1000}
+
+def reset_embedded_indexes():
+    with _load_lock:
+        for loaded in _loaded.values():
+            loaded["index"].close()
+        _loaded.clear()
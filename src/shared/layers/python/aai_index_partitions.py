@@ -0,0 +1,66 @@
+# Shared - Index Partitions
+# Routes chunks to one index per source type (and optionally per product) so each partition
+# keeps its own BM25 term statistics and a small HNSW graph; search fans out over the partitions.
+
+import os
+import re
+
+# none: everything in OPENSEARCH_INDEX; source: <index>-tickets and <index>-documents;
+# source_product: ticket partitions are further split per product, <index>-tickets-<product>
+INDEX_PARTITIONING = os.environ.get("INDEX_PARTITIONING", "none")
+SOURCE_TYPES = ("tickets", "documents")
+TICKET_SOURCE = "support_log"
+
+def source_type(doc):
+    """CSV tickets (aai_preprocess_csv) vs Textract documents (aai_chunk_text)"""
+    return "tickets" if doc.get("ticket_id") or doc.get("source") == TICKET_SOURCE else "documents"
+
+def product_slug(product):
+    return re.sub(r"[^a-z0-9]+", "_", (product or "").lower()).strip("_") or "unknown"
+
+def partition_index(index_name, doc, partitioning=INDEX_PARTITIONING):
+    """Index a chunk is written to"""
+    if partitioning == "none":
+        return index_name
+    kind = source_type(doc)
+    if kind == "tickets" and partitioning == "source_product":
+        product = (doc.get("metadata") or {}).get("product_purchased")
+        return f"{index_name}-tickets-{product_slug(product)}"
+    return f"{index_name}-{kind}"
+
+def partition_pattern(index_name):
+    """Matches every partition of an index (index template, fan-out over all partitions)"""
+    return f"{index_name}-*"
+
+def partition_template(index_name):
+    """Index template giving new partitions (per-product ones on first write) the index mapping"""
+    return f"{index_name}-partitions"
+
+def fixed_partitions(index_name, partitioning=INDEX_PARTITIONING):
+    """Partitions that always exist; per-product ones are created from the template on first write"""
+    if partitioning == "none":
+        return [index_name]
+    if partitioning == "source_product":
+        return [f"{index_name}-documents"]
+    return [f"{index_name}-{kind}" for kind in SOURCE_TYPES]
+
+def search_partitions(index_name, product=None, source_types=None, partitioning=INDEX_PARTITIONING):
+    """
+    [(partition, index, product filter needed)] a query fans out to. Documents carry no product,
+    so a product filter skips their partition, and a per-product ticket partition needs no filter.
+    """
+    if partitioning == "none":
+        return [("all", index_name, bool(product))]
+    partitions = []
+    for kind in source_types or SOURCE_TYPES:
+        if kind not in SOURCE_TYPES:
+            continue
+        if kind == "documents":
+            if not product:
+                partitions.append(("documents", f"{index_name}-documents", False))
+        elif partitioning == "source_product":
+            target = f"{index_name}-tickets-{product_slug(product)}" if product else f"{index_name}-tickets-*"
+            partitions.append(("tickets", target, False))
+        else:
+            partitions.append(("tickets", f"{index_name}-tickets", bool(product)))
+    return partitions
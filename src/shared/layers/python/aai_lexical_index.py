@@ -0,0 +1,205 @@
+# Shared - Embedded Lexical Index
+# BM25 over the indexed chunk text without the OpenSearch domain: an analyzer mirroring english_bm25
+# (standard tokenizer, lowercase, stop, snowball), postings held as term -> row / term-frequency
+# arrays and Lucene's BM25 scoring, built offline by aai_index_snapshot (build_lexical_index) and
+# memory-mapped from /tmp like the embedded vector index
+
+import os
+import re
+import threading
+from array import array
+from collections import Counter
+
+from aai_embedded_index import (EMBEDDED_INDEX_FILTER_FIELDS, INDEX_FIELD, VECTOR_FIELDS, EmbeddedIndex,
+                                get_embedded_index, publish_index, write_index, write_rows)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import snowballstemmer
+except ImportError:
+    snowballstemmer = None
+
+LEXICAL_INDEX_BUCKET = os.environ.get("LEXICAL_INDEX_BUCKET", os.environ.get("RAW_DATA_BUCKET"))
+LEXICAL_INDEX_PREFIX = os.environ.get("LEXICAL_INDEX_PREFIX", "lexical-index/")
+# Same parameters as the index's BM25 similarity (aai_create_opensearch_index)
+BM25_K1 = 1.2
+BM25_B = 0.75
+TERMS_FILE = "terms.txt"
+
+# Lucene's _english_ stop set, the default of the stop filter
+ENGLISH_STOP_WORDS = frozenset([
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "if", "in", "into", "is", "it", "no", "not",
+    "of", "on", "or", "such", "that", "the", "their", "then", "there", "these", "they", "this", "to", "was",
+    "will", "with"
+])
+# Standard tokenizer word boundaries: letters/digits joined by apostrophes or periods ("don't", "v2.1"),
+# and digits joined by commas ("1,200")
+TOKEN_RE = re.compile(r"\w+(?:(?:['’.]|(?<=\d),(?=\d))\w+)*")
+
+_stemmers = threading.local()
+
+def stem(word, cache=None):
+    if cache is not None and word in cache:
+        return cache[word]
+    if snowballstemmer is None:
+        raise RuntimeError("snowballstemmer is not installed; attach the OpenSearch dependencies layer")
+    # Stemmer objects keep state between calls, so each thread gets its own
+    stemmer = getattr(_stemmers, "english", None)
+    if stemmer is None:
+        stemmer = _stemmers.english = snowballstemmer.stemmer("english")
+    stemmed = stemmer.stemWord(word)
+    if cache is not None:
+        cache[word] = stemmed
+    return stemmed
+
+def analyze(text, cache=None):
+    """Terms of a text as english_bm25 indexes them: standard tokenizer, lowercase, stop, snowball"""
+    return [stem(token, cache) for token in TOKEN_RE.findall(text.lower()) if token not in ENGLISH_STOP_WORDS]
+
+def int_to_int4(value):
+    bits = value.bit_length()
+    if bits < 4:
+        return value
+    shift = bits - 4
+    return ((value >> shift) & 0x07) | ((shift + 1) << 3)
+
+def int4_to_int(encoded):
+    bits = encoded & 0x07
+    shift = (encoded >> 3) - 1
+    return bits if shift == -1 else (bits | 0x08) << shift
+
+# Lucene stores a field's length as one byte (SmallFloat.intToByte4): exact up to 23 terms, then
+# 4 significant bits, so BM25 length normalization matches the domain's scores
+NORM_FREE_VALUES = 255 - int_to_int4(2 ** 31 - 1)
+
+def encode_length(length):
+    return length if length < NORM_FREE_VALUES else NORM_FREE_VALUES + int_to_int4(length - NORM_FREE_VALUES)
+
+def decode_length(norm):
+    return norm if norm < NORM_FREE_VALUES else NORM_FREE_VALUES + int4_to_int(norm - NORM_FREE_VALUES)
+
+def build_lexical_index(docs, directory, filter_fields=EMBEDDED_INDEX_FILTER_FIELDS):
+    """
+    Write a BM25 index for [(index, doc_id, source), ...] to directory: a sorted term list, each
+    term's postings as one slice of postings.npy / freqs.npy, and one length norm byte per row
+    """
+    rows = []
+    terms = {}
+    term_ids, term_rows, term_freqs = array("i"), array("i"), array("i")
+    lengths = []
+    stems = {}
+    for index, doc_id, source in docs:
+        tokens = analyze(source.get("text") or "", stems)
+        row = len(rows)
+        rows.append((index, doc_id, {k: v for k, v in source.items() if k not in VECTOR_FIELDS}))
+        lengths.append(len(tokens))
+        for term, freq in Counter(tokens).items():
+            term_ids.append(terms.setdefault(term, len(terms)))
+            term_rows.append(row)
+            term_freqs.append(freq)
+    if not rows:
+        raise ValueError("No documents to index")
+
+    # Term ids follow the sorted term list; postings of a term stay in row order
+    vocabulary = sorted(terms)
+    remap = np.empty(len(terms), dtype=np.int32)
+    remap[[terms[term] for term in vocabulary]] = np.arange(len(vocabulary), dtype=np.int32)
+    ids = remap[np.frombuffer(term_ids, dtype=np.int32)]
+    order = np.argsort(ids, kind="stable")
+    term_offsets = np.concatenate([[0], np.cumsum(np.bincount(ids, minlength=len(vocabulary)))]).astype(np.int64)
+
+    arrays, row_manifest = write_rows(directory, rows, filter_fields)
+    arrays.update({
+        "term_offsets": term_offsets,
+        "postings": np.frombuffer(term_rows, dtype=np.int32)[order],
+        "freqs": np.minimum(np.frombuffer(term_freqs, dtype=np.int32)[order], 65535).astype(np.uint16),
+        "norms": np.array([encode_length(length) for length in lengths], dtype=np.uint8)
+    })
+    with open(os.path.join(directory, TERMS_FILE), "w", encoding="utf-8") as f:
+        f.write("\n".join(vocabulary))
+
+    # BM25 statistics are per OpenSearch index (partition): docs with any term, and their mean length
+    lengths = np.asarray(lengths, dtype=np.int64)
+    index_codes = arrays[f"filter_{row_manifest['filter_fields'].index(INDEX_FIELD)}"]
+    indexed = lengths > 0
+    doc_count = np.bincount(index_codes[indexed], minlength=len(row_manifest["vocab"][INDEX_FIELD]))
+    term_count = np.bincount(index_codes, weights=lengths, minlength=len(doc_count))
+    return write_index(directory, arrays, {
+        "format": LexicalIndex.FORMAT,
+        "format_version": LexicalIndex.FORMAT_VERSION,
+        "rows": len(rows),
+        "terms": len(vocabulary),
+        "postings": len(order),
+        "k1": BM25_K1,
+        "b": BM25_B,
+        "index_doc_count": doc_count.tolist(),
+        "index_avg_length": [total / count if count else 1.0 for total, count in zip(term_count.tolist(), doc_count.tolist())],
+        **row_manifest
+    }, extra_files=[TERMS_FILE])
+
+def publish_lexical_index(directory, index_name, bucket=LEXICAL_INDEX_BUCKET, prefix=LEXICAL_INDEX_PREFIX):
+    return publish_index(directory, index_name, bucket, prefix)
+
+class LexicalIndex(EmbeddedIndex):
+    FORMAT = "lexical"
+    ARRAY_FILES = ("term_offsets", "postings", "freqs", "norms")
+
+    def __init__(self, directory, generation=None):
+        super().__init__(directory, generation)
+        with open(os.path.join(directory, TERMS_FILE), encoding="utf-8") as f:
+            self.terms = {term: i for i, term in enumerate(f.read().split("\n"))} if self.manifest["terms"] else {}
+        self.k1 = self.manifest["k1"]
+        self.b = self.manifest["b"]
+        self.index_doc_count = np.asarray(self.manifest["index_doc_count"], dtype=np.float64)
+        self.index_avg_length = np.asarray(self.manifest["index_avg_length"], dtype=np.float64)
+        self.length_table = np.array([decode_length(norm) for norm in range(256)], dtype=np.float64)
+        self.index_codes = self.codes[INDEX_FIELD]
+
+    def search(self, query_text, k, filter_clause=None, index_pattern=None):
+        """
+        Top-k BM25 hits for a match query (any query term), as OpenSearch returns them, and search
+        stats. Filters restrict the hits but, as in OpenSearch, not the term statistics.
+        """
+        query_terms = Counter(analyze(query_text))
+        scores = np.zeros(self.rows, dtype=np.float64)
+        matched_terms = 0
+        postings_scanned = 0
+        for term, query_freq in query_terms.items():
+            term_id = self.terms.get(term)
+            if term_id is None:
+                continue
+            start, end = int(self.term_offsets[term_id]), int(self.term_offsets[term_id + 1])
+            rows = self.postings[start:end]
+            freqs = self.freqs[start:end].astype(np.float64)
+            codes = self.index_codes[rows]
+            doc_freq = np.bincount(codes, minlength=len(self.index_doc_count))
+            idf = np.log(1 + (self.index_doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.length_table[self.norms[rows]] / self.index_avg_length[codes])
+            # A term repeated in the query is one more should clause, as in a match query
+            scores[rows] += query_freq * idf[codes] * freqs / (freqs + norm)
+            matched_terms += 1
+            postings_scanned += end - start
+
+        matched = scores > 0
+        mask = self.restriction(filter_clause, index_pattern)
+        if mask is not None:
+            matched &= mask
+        rows = np.flatnonzero(matched)
+        if len(rows) > k:
+            rows = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        stats = {
+            'query_terms': len(query_terms),
+            'matched_terms': matched_terms,
+            'postings_scanned': postings_scanned,
+            'matching_rows': int(matched.sum())
+        }
+        return self.hits(rows, scores[rows]), stats
+
+def get_lexical_index(index_name, bucket=LEXICAL_INDEX_BUCKET, prefix=LEXICAL_INDEX_PREFIX):
+    """The current lexical index generation of this environment, and load info"""
+    return get_embedded_index(LexicalIndex, index_name, bucket, prefix)
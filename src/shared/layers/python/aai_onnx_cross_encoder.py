@@ -0,0 +1,116 @@
+# Shared - ONNX Cross-Encoder
+# In-Lambda CPU reranker: int8-quantized MiniLM cross-encoder run with onnxruntime, loaded once
+# per execution environment from the reranker layer (/opt) or downloaded to /tmp
+
+import hashlib
+import os
+import threading
+import time
+
+import boto3
+
+try:
+    import numpy as np
+    import onnxruntime as ort
+    from tokenizers import Tokenizer
+except ImportError:
+    ort = None
+
+MODEL_FILE = "model.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+# Where create_reranker_layer.sh puts the exported model inside the layer
+LAYER_MODEL_DIR = "/opt/models/cross_encoder"
+TMP_MODEL_DIR = "/tmp/models/cross_encoder"
+
+RERANK_MODEL_DIR = os.environ.get("RERANK_MODEL_DIR")
+# s3://bucket/prefix/ holding model.onnx and tokenizer.json, used when no layer carries the model
+RERANK_MODEL_S3_URI = os.environ.get("RERANK_MODEL_S3_URI")
+# Query + chunk tokens; ms-marco MiniLM was trained at 512, chunks are ~1200 chars
+RERANK_MAX_SEQ_LEN = int(os.environ.get("RERANK_MAX_SEQ_LEN", "256"))
+RERANK_ONNX_BATCH_SIZE = int(os.environ.get("RERANK_ONNX_BATCH_SIZE", "16"))
+# 0 lets onnxruntime use every vCPU the function's memory setting provides
+RERANK_ONNX_THREADS = int(os.environ.get("RERANK_ONNX_THREADS", "0"))
+
+_model = None
+_model_lock = threading.Lock()
+
+def download_model(uri, target_dir):
+    """Copy model.onnx and tokenizer.json from S3 into /tmp once per execution environment"""
+    bucket, _, prefix = uri[len("s3://"):].partition("/")
+    s3 = boto3.client("s3")
+    os.makedirs(target_dir, exist_ok=True)
+    for name in (MODEL_FILE, TOKENIZER_FILE):
+        path = os.path.join(target_dir, name)
+        if not os.path.exists(path):
+            # Download beside the target and rename, so a timed-out init never leaves half a file
+            s3.download_file(bucket, f"{prefix.rstrip('/')}/{name}".lstrip("/"), path + ".part")
+            os.replace(path + ".part", path)
+    return target_dir
+
+def model_version(path):
+    """Identifies the exported weights (cached scores must not outlive a model swap)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+def resolve_model_dir():
+    if RERANK_MODEL_DIR:
+        return RERANK_MODEL_DIR
+    if os.path.exists(os.path.join(LAYER_MODEL_DIR, MODEL_FILE)):
+        return LAYER_MODEL_DIR
+    if RERANK_MODEL_S3_URI:
+        return download_model(RERANK_MODEL_S3_URI, TMP_MODEL_DIR)
+    raise RuntimeError("No ONNX cross-encoder: attach the reranker layer or set RERANK_MODEL_S3_URI")
+
+class OnnxCrossEncoder:
+    def __init__(self, model_dir, max_seq_len=RERANK_MAX_SEQ_LEN, batch_size=RERANK_ONNX_BATCH_SIZE,
+                 threads=RERANK_ONNX_THREADS):
+        start = time.time()
+        self.model_dir = model_dir
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=max_seq_len, strategy="longest_first")
+        # Pad each batch to its own longest pair, not to max_seq_len
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, MODEL_FILE), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.version = f"{model_version(os.path.join(model_dir, MODEL_FILE))}-L{max_seq_len}"
+        self.load_time_ms = (time.time() - start) * 1000
+
+    def score(self, query, documents):
+        """Relevance per document on the endpoint's scale (sigmoid of the cross-encoder logit)"""
+        scores = []
+        for i in range(0, len(documents), self.batch_size):
+            encodings = self.tokenizer.encode_batch([(query, doc) for doc in documents[i:i + self.batch_size]])
+            inputs = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64)
+            }
+            logits = self.session.run(None, {k: v for k, v in inputs.items() if k in self.input_names})[0]
+            scores.extend((1.0 / (1.0 + np.exp(-logits.reshape(len(encodings), -1)[:, 0]))).tolist())
+        return scores
+
+def get_cross_encoder():
+    """Model shared by every invocation of this execution environment, loaded on first use"""
+    global _model
+    if ort is None:
+        raise RuntimeError("onnxruntime and tokenizers are not installed; attach the reranker layer")
+    with _model_lock:
+        if _model is None:
+            _model = OnnxCrossEncoder(resolve_model_dir())
+        return _model
+
+def reset_cross_encoder():
+    global _model
+    with _model_lock:
+        _model = None
@@ -0,0 +1,126 @@
+# Shared - OpenSearch Client Pool
+# Module-scope OpenSearch clients with keep-alive connection pooling, reused across warm
+# invocations. Packaged into the opensearch-dependencies layer by create_opensearch_layer.sh
+
+import boto3
+import os
+import threading
+from opensearchpy import OpenSearch, RequestsHttpConnection
+from requests_aws4auth import AWS4Auth
+
+SERVICE = 'es'
+# Port/SSL are only overridden for local OpenSearch containers and benchmarks
+OPENSEARCH_PORT = int(os.environ.get("OPENSEARCH_PORT", "443"))
+OPENSEARCH_USE_SSL = os.environ.get("OPENSEARCH_USE_SSL", "true").lower() == "true"
+# Keep-alive sockets per host; covers the two concurrent search legs and parallel_bulk threads
+OPENSEARCH_POOL_MAXSIZE = int(os.environ.get("OPENSEARCH_POOL_MAXSIZE", "10"))
+
+_clients = {}
+_async_clients = {}
+_lock = threading.Lock()
+_client_stats = {"clients_created": 0, "client_reuses": 0}
+
+def refreshable_auth(region, service=SERVICE):
+    """
+    SigV4 auth that takes frozen credentials from the session provider on every request,
+    so a long-lived client keeps signing correctly after the role credentials rotate
+    """
+    credentials = boto3.Session().get_credentials()
+    return AWS4Auth(region=region, service=service, refreshable_credentials=credentials)
+
+def get_opensearch_client(host=None, region=None, timeout=30):
+    """
+    Return the cached client for (host, region, timeout), creating it on first use.
+    Call from the handler, not at import time, so a bad endpoint surfaces as a handler error.
+    """
+    host = host or os.environ.get("OPENSEARCH_DOMAIN")
+    region = region or os.environ.get("AWS_REGION")
+    key = (host, region, timeout)
+
+    client = _clients.get(key)
+    if client is not None:
+        _client_stats["client_reuses"] += 1
+        return client
+
+    with _lock:
+        if key not in _clients:
+            _clients[key] = OpenSearch(
+                hosts=[{'host': host, 'port': OPENSEARCH_PORT}],
+                http_auth=refreshable_auth(region),
+                use_ssl=OPENSEARCH_USE_SSL,
+                verify_certs=OPENSEARCH_USE_SSL,
+                connection_class=RequestsHttpConnection,
+                pool_maxsize=OPENSEARCH_POOL_MAXSIZE,
+                timeout=timeout
+            )
+            _client_stats["clients_created"] += 1
+        return _clients[key]
+
+def get_async_opensearch_client(host=None, region=None, timeout=30):
+    """
+    Async client for fan-out callers (needs aiohttp, installed with opensearch-py[async]).
+    aiohttp sessions are bound to the event loop that created them, so clients are cached
+    per running loop; callers should keep one loop alive across invocations to reuse them.
+    """
+    import asyncio
+    from opensearchpy import AsyncHttpConnection, AsyncOpenSearch, AWSV4SignerAsyncAuth
+
+    host = host or os.environ.get("OPENSEARCH_DOMAIN")
+    region = region or os.environ.get("AWS_REGION")
+    loop = asyncio.get_running_loop()
+
+    with _lock:
+        for stale in [k for k, (l, _) in _async_clients.items() if l.is_closed()]:
+            del _async_clients[stale]
+        key = (host, region, timeout, id(loop))
+        if key in _async_clients:
+            _client_stats["client_reuses"] += 1
+            return _async_clients[key][1]
+
+        client = AsyncOpenSearch(
+            hosts=[{'host': host, 'port': OPENSEARCH_PORT}],
+            http_auth=AWSV4SignerAsyncAuth(boto3.Session().get_credentials(), region, SERVICE),
+            use_ssl=OPENSEARCH_USE_SSL,
+            verify_certs=OPENSEARCH_USE_SSL,
+            connection_class=AsyncHttpConnection,
+            pool_maxsize=OPENSEARCH_POOL_MAXSIZE,
+            timeout=timeout
+        )
+        _async_clients[key] = (loop, client)
+        _client_stats["clients_created"] += 1
+        return client
+
+def connection_stats():
+    """
+    Cumulative counters for this execution environment. requests_sent - connections_opened
+    requests were served on an already-open keep-alive socket (no TCP/TLS handshake).
+    """
+    opened = 0
+    sent = 0
+    for client in list(_clients.values()):
+        for connection in client.transport.connection_pool.connections:
+            # The same adapter is mounted for http:// and https://
+            adapters = {id(a): a for a in connection.session.adapters.values()}
+            for adapter in adapters.values():
+                pools = adapter.poolmanager.pools
+                for pool_key in list(pools.keys()):
+                    pool = pools.get(pool_key)
+                    if pool is not None:
+                        opened += pool.num_connections
+                        sent += pool.num_requests
+    return {
+        "clients_created": _client_stats["clients_created"],
+        "client_reuses": _client_stats["client_reuses"],
+        "connections_opened": opened,
+        "requests_sent": sent,
+        "connections_reused": max(sent - opened, 0)
+    }
+
+def reset_clients():
+    """Drop cached sync clients and their sockets (tests/benchmarks emulating a cold start)"""
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        _client_stats["clients_created"] = 0
+        _client_stats["client_reuses"] = 0
@@ -0,0 +1,81 @@
+# Shared - Query Embeddings
+# Bedrock query embeddings behind the query embedding cache (aai_cache). Used by aai_query_embedding
+# and by the answer cache lookup in aai_trigger_step_function_retrieval; both use the same keys, so a
+# query embedded by one is a cache hit for the other. Also the vector helpers ingestion and search share.
+
+import base64
+import json
+import os
+import struct
+import time
+
+from aai_cache import get_cache, query_hash
+
+EMBED_MODEL = os.environ.get("EMBED_MODEL", "amazon.titan-embed-text-v2:0")
+# Must match ingestion: unit vectors let the index and MMR use a plain dot product
+NORMALIZE_EMBEDDINGS = os.environ.get("NORMALIZE_EMBEDDINGS", "false").lower() == "true"
+EMBEDDING_DIMENSION = int(os.environ.get("EMBEDDING_DIMENSION", "1024"))
+# Embeddings keyed by (model, dimension, normalization, normalized query hash): LRU + shared CACHE_TABLE
+EMBEDDING_CACHE_ENABLED = os.environ.get("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_TTL_SECONDS = int(os.environ.get("EMBEDDING_CACHE_TTL_SECONDS", "604800"))
+# Entries kept per execution environment; one 1024-dim embedding is about 5.5 KB cached
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "5000"))
+
+def normalize_vector(vector):
+    norm = sum(x * x for x in vector) ** 0.5
+    return [x / norm for x in vector] if norm else vector
+
+def truncate_vector(vector, dimension):
+    """Leading dimensions of a vector, re-normalized to unit length (the two-stage compact field)"""
+    return normalize_vector(vector[:dimension])
+
+def pack_float32(vector):
+    """Cached form: full float32 precision, a fraction of the size of a JSON float list"""
+    return base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+
+def unpack_float32(value):
+    data = base64.b64decode(value)
+    return list(struct.unpack(f"<{len(data) // 4}f", data))
+
+def embed_query(bedrock, user_query, dimension):
+    request = {"inputText": user_query}
+    if "titan-embed-text-v2" in EMBED_MODEL:
+        request["dimensions"] = dimension
+        if NORMALIZE_EMBEDDINGS:
+            request["normalize"] = True
+    resp = bedrock.invoke_model(modelId=EMBED_MODEL, body=json.dumps(request))
+    result = json.loads(resp['body'].read())
+    embedding = result.get("embedding")  # list[float]
+    if NORMALIZE_EMBEDDINGS and embedding:
+        embedding = normalize_vector(embedding)
+    return embedding
+
+def query_embedding(bedrock, user_query, dimension=EMBEDDING_DIMENSION, use_cache=EMBEDDING_CACHE_ENABLED):
+    """(embedding, cache stats): the cached embedding of the normalized query, else a Bedrock call"""
+    start = time.time()
+    embedding = None
+    cache_stats = {"enabled": False}
+    if use_cache:
+        cache = get_cache("query_embedding", EMBEDDING_CACHE_TTL_SECONDS, lru_size=EMBEDDING_CACHE_SIZE)
+        key = cache.key(EMBED_MODEL, dimension, int(NORMALIZE_EMBEDDINGS), query_hash(user_query))
+        cached, cache_stats = cache.get_many([key])
+        if key in cached:
+            embedding = unpack_float32(cached[key])
+    lookup_time = (time.time() - start) * 1000
+
+    embed_time = 0
+    if embedding is None:
+        embed_start = time.time()
+        embedding = embed_query(bedrock, user_query, dimension)
+        embed_time = (time.time() - embed_start) * 1000
+        if use_cache and embedding:
+            cache.put_many({key: pack_float32(embedding)})
+    if use_cache:
+        cache_stats.update(cache.lru_stats())
+        cache_stats.update({
+            "enabled": True,
+            "hit": "lru" if cache_stats["lru_hits"] else "shared" if cache_stats["shared_hits"] else None,
+            "lookup_time_ms": lookup_time
+        })
+    cache_stats.update({"embed_time_ms": embed_time, "total_time_ms": (time.time() - start) * 1000})
+    return embedding, cache_stats
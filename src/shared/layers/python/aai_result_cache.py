@@ -0,0 +1,82 @@
+# Shared - Retrieval Result Cache
+# Final retrieval results (what aai_final_results returns) per query and retrieval parameters, in the
+# aai_cache tiers under the index generation ingestion bumps, so results computed before the index
+# changed are never served. Looked up before retrieval by aai_trigger_step_function_retrieval and
+# aai_retrieval_fast_path; stored by aai_final_results under the key the lookup handed out.
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from aai_cache import get_cache, index_generation, query_hash
+
+RESULT_CACHE_ENABLED = os.environ.get("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_TTL_SECONDS = int(os.environ.get("RESULT_CACHE_TTL_SECONDS", "3600"))
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "1000"))
+# Request fields that change what retrieval returns; any difference is a different entry
+RESULT_KEY_FIELDS = ("product_filter", "max_results", "use_reranker", "use_mmr", "mmr_lambda", "rerank_backend",
+                     "adaptive_rerank", "source_types", "hierarchical", "vector_backend", "lexical_backend",
+                     "collapse_chunks")
+
+_counts = {"lookups": 0, "hits": 0}
+_counts_lock = threading.Lock()
+
+def result_cache():
+    return get_cache("results", RESULT_CACHE_TTL_SECONDS, lru_size=RESULT_CACHE_SIZE)
+
+def result_key(cache, request, index_name, generation):
+    params = json.dumps([request.get(field) for field in RESULT_KEY_FIELDS], sort_keys=True)
+    return cache.key(index_name, generation, query_hash(request["user_query"]),
+                     hashlib.sha256(params.encode("utf-8")).hexdigest()[:16])
+
+def lookup_results(request, index_name=None):
+    """
+    (cached final results or None, stats). On a miss stats['key'] is where aai_final_results
+    stores the results; it carries the generation read now, so results of a search that overlaps
+    an index change are stored under the old generation and never served after it.
+    """
+    start = time.time()
+    index_name = index_name or os.environ.get("OPENSEARCH_INDEX")
+    if not RESULT_CACHE_ENABLED:
+        return None, {'enabled': False, 'hit': False, 'key': None}
+    try:
+        generation = index_generation(index_name)
+    except Exception as e:
+        # Without the generation nothing can be served safely, but retrieval itself still works
+        print(f"WARNING: index generation read failed, result cache bypassed: {e}")
+        return None, {'enabled': False, 'hit': False, 'key': None, 'error': str(e)}
+    if generation is None:
+        # Only a shared table tells every execution environment about index changes
+        return None, {'enabled': False, 'hit': False, 'key': None}
+
+    cache = result_cache()
+    key = result_key(cache, request, index_name, generation)
+    found, stats = cache.get_many([key])
+    cached = found.get(key)
+    with _counts_lock:
+        _counts["lookups"] += 1
+        _counts["hits"] += cached is not None
+        hit_rate = _counts["hits"] / _counts["lookups"]
+    stats.update({
+        'enabled': True,
+        'hit': cached is not None,
+        'key': key,
+        'index_generation': generation,
+        'lookup_time_ms': (time.time() - start) * 1000,
+        # Retrieval stages the cached results took to compute, skipped on this request
+        'stage_time_saved_ms': cached.get('retrieval_time_ms', 0) if cached else 0,
+        'cached_query_id': cached.get('query_id') if cached else None,
+        # Since this execution environment started
+        'environment_lookups': _counts["lookups"],
+        'environment_hit_rate': hit_rate
+    })
+    return cached, stats
+
+def store_results(key, results):
+    """Cache final results under a key from lookup_results (a shared-tier failure is only logged)"""
+    if not key:
+        return False
+    result_cache().put_many({key: results})
+    return True
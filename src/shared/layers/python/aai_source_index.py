@@ -0,0 +1,95 @@
+# Shared - Source Index
+# One small document per source (a Textract document, or a cluster of support tickets) holding the
+# centroid of its chunk embeddings, so a query can pick the nearest sources first and then search
+# only their chunks instead of every chunk in the index.
+
+import hashlib
+import os
+from array import array
+from datetime import datetime
+from aai_index_partitions import TICKET_SOURCE, source_type
+
+# Ingestion maintains <index>_sources next to the chunk index (aai_store_opensearch)
+HIERARCHICAL_INDEX = os.environ.get("HIERARCHICAL_INDEX", "false").lower() == "true"
+# Tickets all share source=support_log, so they are grouped by these chunk metadata fields instead
+TICKET_CLUSTER_FIELDS = [f.strip() for f in os.environ.get("TICKET_CLUSTER_FIELDS", "product_purchased,type").split(",") if f.strip()]
+
+def source_index(index_name):
+    """Source centroid index of a chunk index; outside the <index>-* partition pattern"""
+    return f"{index_name}_sources"
+
+def source_group(doc, cluster_fields=TICKET_CLUSTER_FIELDS):
+    """(group id, group fields) of the document or ticket cluster a chunk belongs to"""
+    if source_type(doc) == "tickets":
+        metadata = doc.get("metadata") or {}
+        cluster = {field: metadata.get(field) for field in cluster_fields}
+        key = "|".join([TICKET_SOURCE] + [str(cluster[field]) for field in cluster_fields])
+        fields = {"kind": "tickets", "source": TICKET_SOURCE, "metadata": cluster}
+    else:
+        key = doc.get("source", "")
+        fields = {"kind": "documents", "source": key}
+    return hashlib.sha1(key.encode("utf-8")).hexdigest(), fields
+
+def add_chunk(groups, doc, doc_id, embedding):
+    """Collect one stored chunk's embedding under its group, keyed by the chunk's _id"""
+    group_id, fields = source_group(doc)
+    group = groups.get(group_id)
+    if group is None:
+        group = groups[group_id] = {**fields, "chunks": {}}
+    # float32 keeps a run's embeddings at 4 bytes per dimension until the source index is updated
+    group["chunks"][doc_id] = array("f", embedding)
+
+def centroid(vector_sum, count, normalize):
+    mean = [s / count for s in vector_sum]
+    if not normalize:
+        return mean
+    norm = sum(x * x for x in mean) ** 0.5
+    return [x / norm for x in mean] if norm else mean
+
+def update_source_index(opensearch, index_name, groups, normalize):
+    """
+    Merge this run's groups into the stored ones and rewrite their centroids. Contributions are
+    keyed by chunk _id, so a chunk already in a group's sum (a re-ingested file) is not added
+    again. Returns the number of source documents written.
+    """
+    if not groups:
+        return 0
+    target = source_index(index_name)
+    ids = sorted(groups)
+    existing = opensearch.mget(index=target, body={"ids": ids})["docs"]
+    actions = []
+    for group_id, stored in zip(ids, existing):
+        chunks = groups[group_id]["chunks"]
+        group = {k: v for k, v in groups[group_id].items() if k != "chunks"}
+        chunk_ids, vector_sum, chunk_count = [], None, 0
+        if stored.get("found"):
+            # Groups written before chunk_ids was stored keep their count; only new ids are deduplicated
+            previous = stored["_source"]
+            chunk_ids, vector_sum, chunk_count = previous.get("chunk_ids", []), previous["vector_sum"], previous["chunk_count"]
+        counted = set(chunk_ids)
+        added = [doc_id for doc_id in sorted(chunks) if doc_id not in counted]
+        if vector_sum is None:
+            vector_sum = [0.0] * len(chunks[added[0]])
+        for doc_id in added:
+            vector_sum = [s + x for s, x in zip(vector_sum, chunks[doc_id])]
+        group["chunk_ids"] = chunk_ids + added
+        group["vector_sum"] = vector_sum
+        group["chunk_count"] = chunk_count + len(added)
+        group["embedding"] = centroid(group["vector_sum"], group["chunk_count"], normalize)
+        group["updated_at"] = datetime.utcnow().isoformat()
+        actions += [{"index": {"_index": target, "_id": group_id}}, group]
+    response = opensearch.bulk(body=actions)
+    if response.get("errors"):
+        raise Exception(f"Source index update failed: {response['items'][:3]}")
+    return len(ids)
+
+def group_filter(groups):
+    """Chunk filter matching the selected sources: documents by source, ticket clusters by metadata"""
+    documents = [g["source"] for g in groups if g["kind"] == "documents"]
+    should = [{"terms": {"source": documents}}] if documents else []
+    for group in groups:
+        if group["kind"] == "tickets":
+            should.append({"bool": {"filter": [{"term": {"source": TICKET_SOURCE}}] + [
+                {"term": {f"metadata.{field}": value}} for field, value in group["metadata"].items() if value is not None
+            ]}})
+    return {"bool": {"should": should, "minimum_should_match": 1}}
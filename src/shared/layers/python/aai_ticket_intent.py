@@ -0,0 +1,13 @@
+# Shared - Ticket Intent
+# Whether a user query asks for a support ticket. aai_synthesize_answer sets create_ticket from it, and
+# the answer cache lookup in aai_trigger_step_function_retrieval skips such queries, since a cached
+# answer would bypass aai_create_ticket.
+
+TICKET_PHRASES = (
+    'yes', 'create ticket', 'raise ticket', 'support ticket',
+    'contact support', 'escalate', 'help me'
+)
+
+def wants_ticket(user_query):
+    user_query_lower = (user_query or "").lower()
+    return any(phrase in user_query_lower for phrase in TICKET_PHRASES)
@@ -0,0 +1,142 @@
+# Shared - Embedded Vector Index
+# IVF index over the indexed chunk vectors, built offline by aai_index_snapshot (build_vector_index),
+# published to S3 as plain .npy files and memory-mapped from /tmp, so aai_hybrid_search_fusion can run
+# the kNN leg in-process instead of on the OpenSearch domain
+
+import os
+
+from aai_embedded_index import (EMBEDDED_INDEX_FILTER_FIELDS, VECTOR_FIELDS, EmbeddedIndex, get_embedded_index,
+                                publish_index, write_index, write_rows)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+VECTOR_INDEX_BUCKET = os.environ.get("VECTOR_INDEX_BUCKET", os.environ.get("RAW_DATA_BUCKET"))
+VECTOR_INDEX_PREFIX = os.environ.get("VECTOR_INDEX_PREFIX", "vector-index/")
+# Inverted lists scanned per query; filtered searches widen it until k matching rows are found
+VECTOR_INDEX_NPROBE = int(os.environ.get("VECTOR_INDEX_NPROBE", "8"))
+
+def train_ivf(vectors, nlist, metric, iterations=10, sample_size=50000, seed=0):
+    """k-means centroids on a sample of the vectors (spherical for innerproduct)"""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), sample_size), replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = assign_lists(sample, centroids, metric)
+        for i in range(nlist):
+            members = sample[assign == i]
+            if len(members):
+                centroids[i] = members.mean(axis=0)
+        if metric == "innerproduct":
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-9)
+    return centroids
+
+def assign_lists(vectors, centroids, metric, batch=8192):
+    assign = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch):
+        block = vectors[start:start + batch]
+        if metric == "innerproduct":
+            assign[start:start + batch] = np.argmax(block @ centroids.T, axis=1)
+        else:
+            distances = (centroids ** 2).sum(axis=1) - 2 * block @ centroids.T
+            assign[start:start + batch] = np.argmin(distances, axis=1)
+    return assign
+
+def build_vector_index(docs, directory, metric, nlist=0, filter_fields=EMBEDDED_INDEX_FILTER_FIELDS):
+    """
+    Write an IVF index for [(index, doc_id, source, vector), ...] to directory. Rows are stored
+    grouped by inverted list, so each list is one contiguous slice of vectors.npy.
+    """
+    # Vectors are converted to float32 as they stream in, never held as Python float lists
+    rows, vectors = [], []
+    for index, doc_id, source, vector in docs:
+        if vector is not None and len(vector):
+            rows.append((index, doc_id, {k: v for k, v in source.items() if k not in VECTOR_FIELDS}))
+            vectors.append(np.asarray(vector, dtype=np.float32))
+    if not rows:
+        raise ValueError("No vectors to index")
+    vectors = np.stack(vectors)
+    nlist = min(len(rows), nlist or max(1, int(4 * len(rows) ** 0.5)))
+    centroids = train_ivf(vectors, nlist, metric)
+    assign = assign_lists(vectors, centroids, metric)
+    order = np.argsort(assign, kind="stable")
+    list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+
+    arrays, row_manifest = write_rows(directory, [rows[i] for i in order], filter_fields)
+    arrays.update({"vectors": vectors[order], "centroids": centroids, "list_offsets": list_offsets})
+    return write_index(directory, arrays, {
+        "format": VectorIndex.FORMAT,
+        "format_version": VectorIndex.FORMAT_VERSION,
+        "metric": metric,
+        "rows": len(rows),
+        "dimension": int(vectors.shape[1]),
+        "nlist": nlist,
+        **row_manifest
+    })
+
+def publish_vector_index(directory, index_name, bucket=VECTOR_INDEX_BUCKET, prefix=VECTOR_INDEX_PREFIX):
+    return publish_index(directory, index_name, bucket, prefix)
+
+class VectorIndex(EmbeddedIndex):
+    FORMAT = "vector"
+    ARRAY_FILES = ("vectors", "centroids", "list_offsets")
+
+    def __init__(self, directory, generation=None):
+        super().__init__(directory, generation)
+        self.metric = self.manifest["metric"]
+        self.nlist = self.manifest["nlist"]
+
+    def _scores(self, rows, query):
+        vectors = self.vectors[rows]
+        if self.metric == "innerproduct":
+            # OpenSearch's innerproduct scoring, so scores compare with the domain's kNN hits
+            dot = vectors @ query
+            return np.where(dot >= 0, dot + 1, 1 / (1 - np.minimum(dot, 0)))
+        return 1 / (1 + ((vectors - query) ** 2).sum(axis=1))
+
+    def _probe(self, query, nprobe):
+        if self.metric == "innerproduct":
+            closeness = self.centroids @ query
+        else:
+            closeness = -((self.centroids - query) ** 2).sum(axis=1)
+        lists = np.argsort(-closeness)[:nprobe]
+        return np.concatenate([np.arange(self.list_offsets[i], self.list_offsets[i + 1]) for i in lists])
+
+    def search(self, query, k, filter_clause=None, index_pattern=None, exact=False, expand=True, nprobe=VECTOR_INDEX_NPROBE):
+        """
+        Top-k hits as OpenSearch returns them, and search stats. exact scores every matching row;
+        otherwise the nprobe nearest lists are scanned, doubling nprobe while fewer than k matching
+        rows were found (unless expand is off, the post-filter behaviour).
+        """
+        query = np.asarray(query, dtype=np.float32)
+        mask = self.restriction(filter_clause, index_pattern)
+        matching = self.rows if mask is None else int(mask.sum())
+        expansions = 0
+        if exact:
+            rows = np.arange(self.rows) if mask is None else np.flatnonzero(mask)
+        else:
+            nprobe = min(nprobe, self.nlist)
+            while True:
+                rows = self._probe(query, nprobe)
+                if mask is not None:
+                    rows = rows[mask[rows]]
+                if not expand or len(rows) >= min(k, matching) or nprobe >= self.nlist:
+                    break
+                nprobe = min(nprobe * 2, self.nlist)
+                expansions += 1
+        scores = self._scores(rows, query) if len(rows) else np.empty(0, dtype=np.float32)
+        top = np.argsort(-scores)[:k]
+        stats = {
+            'strategy': 'exact' if exact else 'ivf',
+            'nprobe': None if exact else nprobe,
+            'expansions': expansions,
+            'rows_scored': int(len(rows)),
+            'matching_rows': matching
+        }
+        return self.hits(rows[top], scores[top]), stats
+
+def get_vector_index(index_name, bucket=VECTOR_INDEX_BUCKET, prefix=VECTOR_INDEX_PREFIX):
+    """The current vector index generation of this environment, and load info"""
+    return get_embedded_index(VectorIndex, index_name, bucket, prefix)